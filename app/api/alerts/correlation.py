@@ -0,0 +1,236 @@
+"""
+Correlation of new alerts with incidents, run by the alert write path
+(ingest.py) for alerts stored without an incident_id.
+
+Alerts are grouped by the ALERT_CORRELATION["KEYS"] fields (source and
+alert_type by default). `alert_correlation` holds one row per group naming its
+incident and when the group was last seen; an alert joins that incident if
+the group was seen within WINDOW_SECONDS before it and the incident is still
+in one of OPEN_STATUSES, and moves `last_seen`, so the window slides with the
+group. Failing that, an alert with an asset_id joins the most recent open
+incident on that asset, linked directly (incident_assets) or through a
+threat associated with both, if the incident was reported or correlated
+within the window. Alerts still unmatched open a new incident when their
+severity is at least OPEN_MIN_SEVERITY, one per group; the rest stay orphans.
+Every lookup goes through a primary key or an index.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+
+from app.api.common import cache, db_objects
+
+SEVERITY_ORDER = ["low", "medium", "high", "critical"]
+
+# Fields of an alert row that KEYS may name.
+KEY_FIELDS = {"source", "name", "alert_type", "severity", "asset_id"}
+
+ALERT_CORRELATION_TABLES = db_objects.register("alert_correlation", "table", """
+ALTER TABLE api_alert ADD COLUMN IF NOT EXISTS asset_id INTEGER;  -- not enforced; unknown assets match nothing
+
+CREATE TABLE IF NOT EXISTS alert_correlation (
+    correlation_key CHAR(32)  PRIMARY KEY,
+    -- deferred: a group is given its new incident's id before the incident is written
+    incident_id     INTEGER   NOT NULL REFERENCES api_incident (incident_id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+    last_seen       TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_alert_correlation_incident ON alert_correlation (incident_id, last_seen DESC);
+""")
+
+# Per alert (by position): the incident it joins, from its group if that is
+# live, else from its asset; and the group's current incident either way.
+# The incidents are locked like in ALERT_CONTEXT_QUERY, for the foreign keys.
+MATCH_QUERY = """
+    SELECT d.position, CASE WHEN g.live THEN g.incident_id ELSE a.incident_id END, g.incident_id
+    FROM unnest(%(keys)s::TEXT[], %(times)s::TIMESTAMP[], %(assets)s::INTEGER[])
+        WITH ORDINALITY AS d (correlation_key, alert_time, asset_id, position)
+    LEFT JOIN LATERAL (
+        SELECT c.incident_id,
+               c.last_seen >= d.alert_time - make_interval(secs => %(window)s) AND i.status = ANY(%(statuses)s) AS live
+        FROM alert_correlation c JOIN api_incident i ON i.incident_id = c.incident_id
+        WHERE c.correlation_key = d.correlation_key
+        FOR KEY SHARE OF i
+    ) g ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT i.incident_id
+        FROM api_incident i
+        WHERE i.incident_id IN (
+                SELECT ia.incident_id FROM incident_assets ia WHERE ia.asset_id = d.asset_id
+                UNION
+                SELECT tia.incident_id
+                FROM threat_asset_association taa
+                JOIN threat_incident_association tia ON tia.threat_id = taa.threat_id
+                WHERE taa.asset_id = d.asset_id
+            )
+          AND i.status = ANY(%(statuses)s)
+          AND (i.reported_date >= d.alert_time - make_interval(secs => %(window)s)
+               OR EXISTS (
+                   SELECT 1 FROM alert_correlation c
+                   WHERE c.incident_id = i.incident_id
+                     AND c.last_seen >= d.alert_time - make_interval(secs => %(window)s)
+               ))
+        ORDER BY i.reported_date DESC NULLS LAST, i.incident_id DESC
+        LIMIT 1
+        FOR KEY SHARE OF i
+    ) a ON d.asset_id IS NOT NULL AND g.live IS NOT TRUE
+"""
+
+# Give groups without a live incident a new one. Only groups still on the
+# incident MATCH_QUERY saw (`replace`) or gone quiet are taken over, so a
+# group another writer has just given an incident is left alone and not
+# returned. Sorted so concurrent writers lock the keys in the same order.
+CLAIM_GROUPS_QUERY = """
+    INSERT INTO alert_correlation AS c (correlation_key, incident_id, last_seen)
+    SELECT d.correlation_key, nextval(pg_get_serial_sequence('api_incident', 'incident_id')), d.last_seen
+    FROM unnest(%(keys)s::TEXT[], %(times)s::TIMESTAMP[]) AS d (correlation_key, last_seen)
+    ORDER BY d.correlation_key
+    ON CONFLICT (correlation_key) DO UPDATE
+    SET incident_id = EXCLUDED.incident_id, last_seen = EXCLUDED.last_seen
+    WHERE c.incident_id = ANY(%(replace)s) OR c.last_seen < EXCLUDED.last_seen - make_interval(secs => %(window)s)
+    RETURNING c.correlation_key, c.incident_id
+"""
+
+GROUP_INCIDENTS_QUERY = """
+    SELECT c.correlation_key, c.incident_id
+    FROM alert_correlation c JOIN api_incident i ON i.incident_id = c.incident_id
+    WHERE c.correlation_key = ANY(%s)
+    FOR KEY SHARE OF i
+"""
+
+OPEN_INCIDENTS_QUERY = """
+    INSERT INTO api_incident (incident_id, incident_type, description, severity, status, reported_date)
+    SELECT * FROM unnest(%s::INTEGER[], %s::TEXT[], %s::TEXT[], %s::TEXT[], %s::TEXT[], %s::TIMESTAMP[])
+"""
+
+# Point the groups at the incidents their alerts joined and slide their windows.
+TOUCH_GROUPS_QUERY = """
+    INSERT INTO alert_correlation AS c (correlation_key, incident_id, last_seen)
+    SELECT * FROM unnest(%s::TEXT[], %s::INTEGER[], %s::TIMESTAMP[]) AS d (correlation_key, incident_id, last_seen)
+    ORDER BY d.correlation_key
+    ON CONFLICT (correlation_key) DO UPDATE
+    SET incident_id = EXCLUDED.incident_id, last_seen = GREATEST(c.last_seen, EXCLUDED.last_seen)
+"""
+
+LINK_ASSETS_QUERY = """
+    INSERT INTO incident_assets (incident_id, asset_id, impact_level)
+    SELECT DISTINCT d.incident_id, d.asset_id, 'medium'
+    FROM unnest(%s::INTEGER[], %s::INTEGER[]) AS d (incident_id, asset_id)
+    JOIN api_asset a ON a.asset_id = d.asset_id
+    ORDER BY d.incident_id, d.asset_id
+    ON CONFLICT (incident_id, asset_id) DO NOTHING
+"""
+
+_lock = threading.Lock()
+_stats = {"correlated": 0, "orphaned": 0, "incidents_opened": 0}
+
+
+def correlation_key(row, fields):
+    values = ["" if row[field] is None else str(row[field]) for field in fields]
+    return hashlib.md5("\x1f".join(values).encode()).hexdigest()
+
+
+def correlation_stats():
+    with _lock:
+        return dict(_stats)
+
+
+def correlate(cursor, rows):
+    """Set incident_id on new alert rows (ingest.py) that have none, where they correlate.
+
+    Rows that already name an incident only move their group onto it.
+    """
+    config = settings.ALERT_CORRELATION
+    fields = [field for field in config["KEYS"] if field in KEY_FIELDS]
+    if not config["ENABLED"] or not rows or not fields:
+        return
+    params = {"window": config["WINDOW_SECONDS"], "statuses": list(config["OPEN_STATUSES"])}
+    keys = [correlation_key(row, fields) for row in rows]
+    pending = [index for index, row in enumerate(rows) if row["incident_id"] is None]
+    replace = _match(cursor, rows, keys, pending, params) if pending else set()
+    opened = _open_incidents(cursor, rows, keys, config, dict(params, replace=list(replace)))
+    _touch_groups(cursor, rows, keys)
+
+    orphaned = sum(rows[index]["incident_id"] is None for index in pending)
+    with _lock:
+        _stats["correlated"] += len(pending) - orphaned
+        _stats["orphaned"] += orphaned
+        _stats["incidents_opened"] += opened
+
+
+def _match(cursor, rows, keys, pending, params):
+    """Set the incident of each pending row that matches one; returns the
+    incidents of groups that are no longer live."""
+    cursor.execute(MATCH_QUERY, dict(
+        params,
+        keys=[keys[index] for index in pending],
+        times=[rows[index]["alert_time"] for index in pending],
+        assets=[rows[index]["asset_id"] for index in pending],
+    ))
+    replace = set()
+    for position, incident_id, group_incident_id in cursor.fetchall():
+        rows[pending[position - 1]]["incident_id"] = incident_id
+        if group_incident_id is not None and group_incident_id != incident_id:
+            replace.add(group_incident_id)
+    return replace
+
+
+def _touch_groups(cursor, rows, keys):
+    """Point each group at its rows' incident, and link the incidents to the rows' assets."""
+    groups = {}  # key -> (incident_id, last seen)
+    links = set()
+    for key, row in zip(keys, rows):
+        if row["incident_id"] is None:
+            continue
+        incident_id, last_seen = groups.get(key, (row["incident_id"], row["alert_time"]))
+        groups[key] = (row["incident_id"], max(last_seen, row["alert_time"]))
+        if row["asset_id"] is not None:
+            links.add((row["incident_id"], row["asset_id"]))
+    if groups:
+        cursor.execute(TOUCH_GROUPS_QUERY, [
+            list(groups), [incident_id for incident_id, _ in groups.values()],
+            [last_seen for _, last_seen in groups.values()],
+        ])
+    if links:
+        cursor.execute(LINK_ASSETS_QUERY, [[link[0] for link in links], [link[1] for link in links]])
+    cache.invalidate("incident", *{incident_id for incident_id, _ in groups.values()})
+
+
+def _open_incidents(cursor, rows, keys, config, params):
+    """Give unmatched rows of OPEN_MIN_SEVERITY and above an incident per group; returns how many opened."""
+    threshold = SEVERITY_ORDER.index(config["OPEN_MIN_SEVERITY"])
+    firsts = {}  # key -> first unmatched row of the group
+    last_seen = {}
+    for key, row in zip(keys, rows):
+        if row["incident_id"] is None and SEVERITY_ORDER.index(row["severity"]) >= threshold:
+            firsts.setdefault(key, row)
+            last_seen[key] = max(last_seen.get(key, row["alert_time"]), row["alert_time"])
+    if not firsts:
+        return 0
+
+    cursor.execute(CLAIM_GROUPS_QUERY, dict(params, keys=list(firsts), times=list(last_seen.values())))
+    claimed = dict(cursor.fetchall())
+    opened = len(claimed)
+    if claimed:
+        _insert_incidents(cursor, [(incident_id, firsts[key]) for key, incident_id in claimed.items()])
+    raced = [key for key in firsts if key not in claimed]
+    if raced:
+        # Another writer gave these groups a live incident first
+        cursor.execute(GROUP_INCIDENTS_QUERY, [raced])
+        claimed.update(cursor.fetchall())
+    for key, row in zip(keys, rows):
+        if row["incident_id"] is None and key in firsts and key in claimed:
+            row["incident_id"] = claimed[key]
+    return opened
+
+
+def _insert_incidents(cursor, new):
+    """Insert the incidents of claimed groups, given (incident_id, first row) pairs."""
+    cursor.execute(OPEN_INCIDENTS_QUERY, [
+        [incident_id for incident_id, _ in new],
+        [row["alert_type"] for _, row in new],
+        [f"Opened by alert correlation: {row['name']} ({row['source']})" for _, row in new],
+        [row["severity"] for _, row in new],
+        ["open"] * len(new),
+        [row["alert_time"] for _, row in new],
+    ])
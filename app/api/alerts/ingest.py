@@ -0,0 +1,342 @@
+"""
+Writing new alerts, shared by POST /alerts/, POST /alerts/bulk/ and the alert
+stream (stream.py), with deduplication and correlation.
+
+Alerts with the same source, name, alert_type and asset share a fingerprint.
+Time is cut into ALERT_DEDUP["WINDOW_SECONDS"] windows (aligned to the epoch,
+by alert_time): the first alert of a fingerprint in a window is stored, later
+ones only add to its `occurrences` and move its `last_seen`.
+`alert_dedup_key` holds one row per (fingerprint, window) naming that alert;
+its primary key is what makes concurrent writers agree on a single alert.
+Each process also remembers the keys it wrote in an LRU of LRU_SIZE entries,
+so repeats of a noisy alert go straight to the counter update. Keys are kept
+for KEY_RETENTION_SECONDS so late alerts still find their window.
+
+New alerts without an incident are then correlated with one (correlation.py).
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+from app.api.alerts.correlation import correlate
+from app.api.common import cache, db_objects
+from app.api.common.utils import on_commit
+
+# Columns written for a new alert, in COPY order.
+ALERT_COLUMNS = [
+    "alert_id", "source", "name", "alert_type", "alert_time", "severity", "status", "incident_id",
+    "fingerprint", "occurrences", "last_seen", "asset_id",
+]
+
+# Prune expired keys at most this often per process.
+PRUNE_INTERVAL_SECONDS = 60.0
+
+ALERT_DEDUP_TABLES = db_objects.register("alert_dedup_key", "table", """
+ALTER TABLE api_alert ADD COLUMN IF NOT EXISTS fingerprint CHAR(32);
+ALTER TABLE api_alert ADD COLUMN IF NOT EXISTS occurrences INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE api_alert ADD COLUMN IF NOT EXISTS last_seen TIMESTAMP;
+
+CREATE TABLE IF NOT EXISTS alert_dedup_key (
+    fingerprint  CHAR(32)  NOT NULL,
+    window_start TIMESTAMP NOT NULL,
+    alert_id     INTEGER   NOT NULL,
+    alert_time   TIMESTAMP NOT NULL,  -- of the alert the key names
+    PRIMARY KEY (fingerprint, window_start)
+);
+CREATE INDEX IF NOT EXISTS idx_alert_dedup_key_window ON alert_dedup_key (window_start);
+""")
+
+# The time new alerts without an alert_time get (what NOW() stores in the
+# timestamp column), and the referenced incidents that exist, locked until
+# the write has checked its foreign keys.
+ALERT_CONTEXT_QUERY = """
+    SELECT LOCALTIMESTAMP,
+           ARRAY(SELECT incident_id FROM api_incident WHERE incident_id = ANY(%s) FOR KEY SHARE)
+"""
+
+ALERT_IDS_QUERY = """
+    SELECT ARRAY(SELECT nextval(pg_get_serial_sequence('api_alert', 'alert_id')) FROM generate_series(1, %s))
+"""
+
+# Keys new to the database get an alert id; keys another writer already
+# holds are left alone (and counted below). Sorted so concurrent writers
+# take the key locks in the same order.
+CLAIM_KEYS_QUERY = """
+    INSERT INTO alert_dedup_key (fingerprint, window_start, alert_id, alert_time)
+    SELECT d.fingerprint, d.window_start, nextval(pg_get_serial_sequence('api_alert', 'alert_id')), d.alert_time
+    FROM unnest(%s::TEXT[], %s::TIMESTAMP[], %s::TIMESTAMP[]) AS d (fingerprint, window_start, alert_time)
+    ORDER BY d.fingerprint, d.window_start
+    ON CONFLICT (fingerprint, window_start) DO NOTHING
+    RETURNING fingerprint, window_start, alert_id
+"""
+
+# Keys whose alert was deleted start over with a new one.
+REPOINT_KEYS_QUERY = """
+    UPDATE alert_dedup_key k
+    SET alert_id = nextval(pg_get_serial_sequence('api_alert', 'alert_id')), alert_time = d.alert_time
+    FROM unnest(%s::TEXT[], %s::TIMESTAMP[], %s::TIMESTAMP[]) AS d (fingerprint, window_start, alert_time)
+    WHERE k.fingerprint = d.fingerprint AND k.window_start = d.window_start
+    RETURNING k.fingerprint, k.window_start, k.alert_id
+"""
+
+# Add repeats to existing alerts, found by id and alert_time (keys from the
+# LRU) or by key; the alert_time lets a partitioned api_alert skip all other
+# partitions. The alerts are locked in id order first so concurrent writers
+# cannot deadlock.
+COUNT_SQL = """
+    WITH d AS ({source}),
+    locked AS (
+        SELECT a.alert_id FROM api_alert a JOIN d ON d.alert_id = a.alert_id AND d.alert_time = a.alert_time
+        ORDER BY a.alert_id
+        FOR UPDATE OF a
+    )
+    UPDATE api_alert a
+    SET occurrences = a.occurrences + d.n, last_seen = GREATEST(a.last_seen, d.last_seen)
+    FROM d
+    WHERE a.alert_id = d.alert_id AND a.alert_time = d.alert_time AND a.alert_id IN (SELECT alert_id FROM locked)
+    RETURNING d.fingerprint, d.window_start, {columns}
+"""
+RETURNED_COLUMNS = ", ".join(f"a.{column}" for column in ALERT_COLUMNS)
+COUNT_BY_ID_QUERY = COUNT_SQL.format(columns=RETURNED_COLUMNS, source="""
+    SELECT * FROM unnest(%s::INTEGER[], %s::TIMESTAMP[], %s::TEXT[], %s::TIMESTAMP[], %s::INTEGER[], %s::TIMESTAMP[])
+        AS d (alert_id, alert_time, fingerprint, window_start, n, last_seen)
+""")
+COUNT_BY_KEY_QUERY = COUNT_SQL.format(columns=RETURNED_COLUMNS, source="""
+    SELECT k.alert_id, k.alert_time, d.*
+    FROM unnest(%s::TEXT[], %s::TIMESTAMP[], %s::INTEGER[], %s::TIMESTAMP[]) AS d (fingerprint, window_start, n, last_seen)
+    JOIN alert_dedup_key k ON k.fingerprint = d.fingerprint AND k.window_start = d.window_start
+""")
+
+PRUNE_KEYS_QUERY = "DELETE FROM alert_dedup_key WHERE window_start < LOCALTIMESTAMP - make_interval(secs => %s)"
+
+EPOCH = datetime(1970, 1, 1)
+
+_lock = threading.Lock()
+_recent = OrderedDict()  # (fingerprint, window_start) -> (alert_id, alert_time)
+_pruned_at = 0.0
+_stats = {"lru_hits": 0, "lru_misses": 0, "created": 0, "deduplicated": 0}
+
+
+def fingerprint(source, name, alert_type, asset_id=None):
+    parts = (source, name, alert_type) if asset_id is None else (source, name, alert_type, str(asset_id))
+    return hashlib.md5("\x1f".join(parts).encode()).hexdigest()
+
+
+def window_start(alert_time, seconds):
+    width = timedelta(seconds=seconds)
+    return EPOCH + (alert_time - EPOCH) // width * width
+
+
+def local_time(alert, now, timezone):
+    """The alert's time as stored: `now` when missing, aware times in the session's zone."""
+    alert_time = alert.alert_time or now
+    if alert_time.tzinfo is not None:
+        alert_time = alert_time.astimezone(timezone).replace(tzinfo=None)
+    return alert_time
+
+
+def validation_errors(error):
+    """Messages of a pydantic ValidationError, one per invalid field."""
+    return [
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" if item["loc"] else item["msg"]
+        for item in error.errors(include_url=False)
+    ]
+
+
+def _recall(keys):
+    found = {}
+    with _lock:
+        for key in keys:
+            alert = _recent.get(key)
+            if alert is not None:
+                _recent.move_to_end(key)
+                found[key] = alert
+        _stats["lru_hits"] += len(found)
+        _stats["lru_misses"] += len(keys) - len(found)
+    return found
+
+
+def _remember(entries):
+    size = settings.ALERT_DEDUP["LRU_SIZE"]
+    with _lock:
+        for key, alert in entries.items():
+            _recent[key] = alert
+            _recent.move_to_end(key)
+        while len(_recent) > size:
+            _recent.popitem(last=False)
+
+
+def _forget(keys):
+    with _lock:
+        for key in keys:
+            _recent.pop(key, None)
+
+
+def dedup_stats():
+    with _lock:
+        return dict(_stats, lru_entries=len(_recent))
+
+
+class _Group:
+    """Alerts of one (fingerprint, window) in a write."""
+
+    __slots__ = ("first", "indexes", "last_seen")
+
+    def __init__(self, first):
+        self.first = first
+        self.indexes = []
+        self.last_seen = first["alert_time"]
+
+
+def _copy(cursor, rows):
+    with cursor.copy(f"COPY api_alert ({', '.join(ALERT_COLUMNS)}) FROM STDIN") as copy:
+        for row in rows:
+            copy.write_row([row[column] for column in ALERT_COLUMNS])
+
+
+def write_alerts(cursor, alerts, now, timezone):
+    """Store validated AlertSchema alerts whose incidents exist (see ALERT_CONTEXT_QUERY).
+
+    `now` is the time for alerts without one, `timezone` the session's.
+    Returns one (stored alert row, duplicate) pair per alert, in order;
+    duplicates get the row of the alert they were counted on.
+    """
+    config = settings.ALERT_DEDUP
+    rows = [_row(alert, now, timezone) for alert in alerts]
+    if not rows:
+        return []
+    if not config["ENABLED"]:
+        return _write_each(cursor, rows)
+
+    groups = _group(rows, config["WINDOW_SECONDS"])
+    stored = {}  # key -> (stored row, created here)
+    _count_recalled(cursor, groups, stored)
+    pending = [key for key in groups if key not in stored]
+    if pending:
+        _create(cursor, groups, _claim_pending(cursor, pending, groups, stored), stored)
+
+    cache.invalidate("alert", *[row["alert_id"] for row, created_here in stored.values() if not created_here])
+    entries = {key: (row["alert_id"], row["alert_time"]) for key, (row, _) in stored.items()}
+    on_commit(lambda: _remember(entries))
+    _prune(cursor, config)
+    return _results(len(rows), groups, stored)
+
+
+def _row(alert, now, timezone):
+    alert_time = local_time(alert, now, timezone)
+    return {
+        "alert_id": None, "source": alert.source, "name": alert.name, "alert_type": alert.alert_type,
+        "alert_time": alert_time, "severity": alert.severity.value, "status": alert.status.value,
+        "incident_id": alert.incident_id, "fingerprint": fingerprint(alert.source, alert.name, alert.alert_type, alert.asset_id),
+        "occurrences": 1, "last_seen": alert_time, "asset_id": alert.asset_id,
+    }
+
+
+def _write_each(cursor, rows):
+    """Store every row as a new alert (deduplication off)."""
+    cursor.execute(ALERT_IDS_QUERY, [len(rows)])
+    for row, alert_id in zip(rows, cursor.fetchone()[0]):
+        row["alert_id"] = alert_id
+    correlate(cursor, rows)
+    _copy(cursor, rows)
+    return [(row, False) for row in rows]
+
+
+def _group(rows, seconds):
+    """The rows' _Groups by (fingerprint, window), in order of first appearance."""
+    groups = OrderedDict()
+    for index, row in enumerate(rows):
+        key = (row["fingerprint"], window_start(row["alert_time"], seconds))
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = _Group(row)
+        group.indexes.append(index)
+        group.last_seen = max(group.last_seen, row["alert_time"])
+    return groups
+
+
+def _count_recalled(cursor, groups, stored):
+    """Count groups whose key is in the LRU on their alert, by id."""
+    known = _recall(list(groups))
+    if not known:
+        return
+    keys = list(known)
+    cursor.execute(COUNT_BY_ID_QUERY, [
+        [known[key][0] for key in keys], [known[key][1] for key in keys],
+        [key[0] for key in keys], [key[1] for key in keys],
+        [len(groups[key].indexes) for key in keys], [groups[key].last_seen for key in keys],
+    ])
+    _store_counted(cursor, stored)
+    _forget([key for key in keys if key not in stored])
+
+
+def _claim_pending(cursor, pending, groups, stored):
+    """Claim new keys, count groups on keys other writers hold, and repoint
+    keys whose alert is gone; returns the claimed keys' new alert ids."""
+    claimed = _claim(cursor, CLAIM_KEYS_QUERY, pending, groups)
+    held = [key for key in pending if key not in claimed]
+    if not held:
+        return claimed
+    cursor.execute(COUNT_BY_KEY_QUERY, [
+        [key[0] for key in held], [key[1] for key in held],
+        [len(groups[key].indexes) for key in held], [groups[key].last_seen for key in held],
+    ])
+    _store_counted(cursor, stored)
+    orphaned = [key for key in held if key not in stored]
+    if orphaned:
+        claimed.update(_claim(cursor, REPOINT_KEYS_QUERY, orphaned, groups))
+    return claimed
+
+
+def _create(cursor, groups, claimed, stored):
+    """Store one new alert per claimed key, carrying its group's count."""
+    new_rows = []
+    for key, alert_id in claimed.items():
+        group = groups[key]
+        row = dict(group.first, alert_id=alert_id, occurrences=len(group.indexes), last_seen=group.last_seen)
+        stored[key] = (row, True)
+        new_rows.append(row)
+    if new_rows:
+        correlate(cursor, new_rows)
+        _copy(cursor, new_rows)
+
+
+def _results(count, groups, stored):
+    results = [None] * count
+    created = 0
+    for key, group in groups.items():
+        row, created_here = stored[key]
+        for position, index in enumerate(group.indexes):
+            duplicate = not (created_here and position == 0)
+            created += not duplicate
+            results[index] = (row, duplicate)
+    with _lock:
+        _stats["created"] += created
+        _stats["deduplicated"] += count - created
+    return results
+
+
+def _claim(cursor, query, keys, groups):
+    cursor.execute(query, [
+        [key[0] for key in keys], [key[1] for key in keys], [groups[key].first["alert_time"] for key in keys],
+    ])
+    return {(key_fingerprint, window): alert_id for key_fingerprint, window, alert_id in cursor.fetchall()}
+
+
+def _store_counted(cursor, stored):
+    for values in cursor.fetchall():
+        stored[(values[0], values[1])] = (dict(zip(ALERT_COLUMNS, values[2:])), False)
+
+
+def _prune(cursor, config):
+    global _pruned_at
+    now = time.monotonic()
+    with _lock:
+        if now - _pruned_at < PRUNE_INTERVAL_SECONDS:
+            return
+        _pruned_at = now
+    cursor.execute(PRUNE_KEYS_QUERY, [config["KEY_RETENTION_SECONDS"]])
@@ -0,0 +1,395 @@
+"""
+Range partitioning of `api_alert` by alert_time.
+
+The table is partitioned by ALERT_PARTITIONS["PERIOD"] (a day, week or month
+per partition, named api_alert_p<start>), with a DEFAULT partition catching
+alerts outside every range. `convert()` (`manage.py partition_alerts`) turns
+an existing plain table into this layout once; /settings/create_tables/
+creates it that way. After that:
+
+- `maintain()`, run by a background thread every MAINTENANCE_INTERVAL
+  seconds, creates the default partition if it is missing and the
+  partitions from the current period to PREMAKE periods ahead, taking over
+  any of their alerts that landed in the default partition, and retires partitions older than RETENTION_PERIODS by
+  detaching them (left as plain tables to archive) or dropping them. Late
+  alerts of periods without a partition stay in the default partition until
+  they expire too; they are then moved to an archive table or deleted.
+- `list_alerts` reads newest first one partition range at a time
+  (`time_slices()`), so a page of recent alerts only touches the hot
+  partition: PostgreSQL cannot scan partitions in order itself while a
+  default partition exists.
+
+The primary key becomes (alert_id, alert_time), as it must contain the
+partition key; alert_id alone stays unique through its sequence.
+"""
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+
+import psycopg
+from django.conf import settings
+
+from app.api.common import db_objects
+from app.api.common.utils import db_connection
+
+logger = logging.getLogger(__name__)
+
+TABLE = "api_alert"
+DEFAULT_PARTITION = "api_alert_default"
+
+# Shared by every API process so only one of them changes partitions at a time.
+PARTITION_LOCK_KEY = 7_340_005
+
+# Partition name suffix per period.
+NAME_FORMATS = {"day": "%Y%m%d", "week": "%Y%m%d", "month": "%Y%m"}
+
+# Seconds a process reuses the partition bounds it read for listings. Stale
+# bounds only cost an extra (empty) slice, never rows.
+BOUNDS_TTL_SECONDS = 60.0
+
+# Indexes of the listing and its filters, each ordered like the listing so a
+# filtered page is one ordered range scan per partition. On a partitioned
+# table they cascade to every partition.
+ALERT_INDEXES = [
+    db_objects.register(name, "index", f"CREATE INDEX IF NOT EXISTS {name} ON api_alert ({columns});")
+    for name, columns in (
+        ("idx_alert_time_id", "alert_time DESC NULLS LAST, alert_id DESC"),
+        ("idx_alert_incident_id", "incident_id"),
+        ("idx_alert_severity_time", "severity, alert_time DESC NULLS LAST, alert_id DESC"),
+        ("idx_alert_status_time", "status, alert_time DESC NULLS LAST, alert_id DESC"),
+        ("idx_alert_source_time", "source, alert_time DESC NULLS LAST, alert_id DESC"),
+    )
+]
+
+IS_PARTITIONED_QUERY = "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('api_alert')"
+
+PARTITIONS_QUERY = """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+    FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'api_alert'::regclass
+"""
+_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+# [lower, upper) of the periods from the current one to PREMAKE ahead, plus
+# those of alerts in {table} when it is given.
+PERIODS_SQL = """
+    SELECT lower, lower + %(step)s::INTERVAL FROM (
+        SELECT generate_series(
+            date_trunc(%(period)s, LOCALTIMESTAMP),
+            date_trunc(%(period)s, LOCALTIMESTAMP) + %(premake)s * %(step)s::INTERVAL,
+            %(step)s::INTERVAL
+        )
+        {data_periods}
+    ) AS periods (lower)
+"""
+DATA_PERIODS_SQL = "UNION SELECT DISTINCT date_trunc(%(period)s, {alert_time}) FROM {table}"
+
+# alert_time of alerts without one when converting; the partition key cannot be NULL.
+MISSING_TIME_FILLED = "COALESCE(alert_time, last_seen, LOCALTIMESTAMP)"
+
+# Views and materialized views over api_alert, directly or through each other,
+# with their indexes; in creation order, so each comes after what it reads.
+DEPENDENT_VIEWS_QUERY = """
+    WITH RECURSIVE dependents (oid) AS (
+        SELECT r.ev_class FROM pg_depend d JOIN pg_rewrite r ON r.oid = d.objid
+        WHERE d.refobjid = 'api_alert'::regclass AND r.ev_class <> 'api_alert'::regclass
+        UNION
+        SELECT r.ev_class FROM dependents v JOIN pg_depend d ON d.refobjid = v.oid JOIN pg_rewrite r ON r.oid = d.objid
+        WHERE r.ev_class <> v.oid
+    )
+    SELECT c.relname, c.relkind, pg_get_viewdef(c.oid),
+           ARRAY(SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i WHERE i.indrelid = c.oid)
+    FROM dependents v JOIN pg_class c ON c.oid = v.oid
+    ORDER BY c.oid
+"""
+
+EXPIRED_BEFORE_QUERY = "SELECT date_trunc(%(period)s, LOCALTIMESTAMP) - %(periods)s * %(step)s::INTERVAL"
+
+_thread = None
+_thread_lock = threading.Lock()
+_bounds = (0.0, None)  # (read at, lower bounds newest first, or None when not partitioned)
+
+
+def is_partitioned(cursor):
+    cursor.execute(IS_PARTITIONED_QUERY)
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def partitions(cursor):
+    """{name: (lower, upper)} of the range partitions."""
+    cursor.execute(PARTITIONS_QUERY)
+    ranges = {}
+    for name, bound in cursor.fetchall():
+        match = _BOUND.search(bound)
+        if match:
+            ranges[name] = tuple(datetime.fromisoformat(value) for value in match.groups())
+    return ranges
+
+
+def _step(period):
+    return f"1 {period}"
+
+
+def _partition_name(lower, period):
+    return f"{TABLE}_p{lower.strftime(NAME_FORMATS[period])}"
+
+
+def _bounds_sql(lower, upper):
+    # DDL takes no bind parameters; the bounds are timestamps computed by the server
+    return f"FROM ('{lower.isoformat(sep=' ')}') TO ('{upper.isoformat(sep=' ')}')"
+
+
+def _create_partition(cursor, lower, upper, period):
+    """Add the partition for [lower, upper), taking over its alerts from the default partition."""
+    name = _partition_name(lower, period)
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM api_alert_default WHERE alert_time >= %s AND alert_time < %s)",
+                   [lower, upper])
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES {_bounds_sql(lower, upper)}")
+        return name
+    # A partition cannot be created over rows of the default partition, so
+    # they are moved into a plain table that is then attached.
+    cursor.execute(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)")
+    cursor.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION} WHERE alert_time >= %(lower)s AND alert_time < %(upper)s RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+        """,
+        {"lower": lower, "upper": upper}
+    )
+    # Lets ATTACH skip scanning the new partition
+    cursor.execute(
+        f"ALTER TABLE {name} ADD CONSTRAINT {name}_bound "
+        f"CHECK (alert_time >= '{lower.isoformat(sep=' ')}' AND alert_time < '{upper.isoformat(sep=' ')}')"
+    )
+    cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES {_bounds_sql(lower, upper)}")
+    cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT {name}_bound")
+    return name
+
+
+def _expired_before(cursor, config):
+    """Start of the oldest period kept, or None when partitions are kept forever."""
+    if not config["RETENTION_PERIODS"]:
+        return None
+    cursor.execute(EXPIRED_BEFORE_QUERY, {
+        "period": config["PERIOD"], "periods": config["RETENTION_PERIODS"], "step": _step(config["PERIOD"]),
+    })
+    return cursor.fetchone()[0]
+
+
+def _add_partitions(cursor, config, existing):
+    params = {"period": config["PERIOD"], "premake": config["PREMAKE"], "step": _step(config["PERIOD"])}
+    cursor.execute(PERIODS_SQL.format(data_periods=""), params)
+    covered = set(lower for lower, _ in existing.values())
+    return [
+        _create_partition(cursor, lower, upper, config["PERIOD"])
+        for lower, upper in sorted(cursor.fetchall()) if lower not in covered
+    ]
+
+
+def _retire_partitions(cursor, config, existing, expired_before):
+    retired = []
+    for name, (_, upper) in sorted(existing.items(), key=lambda item: item[1]):
+        if expired_before is None or upper > expired_before:
+            break
+        cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+        if config["RETENTION_ACTION"] == "drop":
+            cursor.execute(f"DROP TABLE {name}")
+        retired.append(name)
+    return retired
+
+
+def _expire_default(cursor, config, expired_before):
+    """Retire default-partition alerts older than the kept periods; returns how many.
+
+    With RETENTION_ACTION "detach" they are moved to a plain table per
+    retention horizon, api_alert_default_before_<date>, to archive.
+    """
+    if expired_before is None:
+        return 0
+    if config["RETENTION_ACTION"] == "drop":
+        cursor.execute(f"DELETE FROM {DEFAULT_PARTITION} WHERE alert_time < %s", [expired_before])
+        return cursor.rowcount
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE alert_time < %s)", [expired_before])
+    if not cursor.fetchone()[0]:
+        return 0
+    archive = f"{DEFAULT_PARTITION}_before_{expired_before:%Y%m%d}"
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {archive} (LIKE {TABLE} INCLUDING DEFAULTS)")
+    cursor.execute(
+        f"""
+        WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE alert_time < %s RETURNING *)
+        INSERT INTO {archive} SELECT * FROM moved
+        """,
+        [expired_before]
+    )
+    return cursor.rowcount
+
+
+def maintain():
+    """Create due partitions and retire expired ones.
+
+    Returns {"created": [...], "retired": [...], "expired": <default-partition
+    alerts retired>}, or None when another process holds the lock or
+    api_alert is not partitioned.
+    """
+    global _bounds
+    config = settings.ALERT_PARTITIONS
+    try:
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", [PARTITION_LOCK_KEY])
+            if not cursor.fetchone()[0] or not is_partitioned(cursor):
+                return None
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT")
+            existing = partitions(cursor)
+            expired_before = _expired_before(cursor, config)
+            created = _add_partitions(cursor, config, existing)
+            retired = _retire_partitions(cursor, config, existing, expired_before)
+            expired = _expire_default(cursor, config, expired_before)
+    except psycopg.errors.UndefinedTable:
+        return None
+    if created or retired or expired:
+        logger.info("Alert partitions: created %s, retired %s, %d expired alerts retired from %s",
+                    created or "none", retired or "none", expired, DEFAULT_PARTITION)
+        _bounds = (0.0, None)
+    return {"created": created, "retired": retired, "expired": expired}
+
+
+def convert():
+    """Rebuild a plain api_alert as a partitioned table; returns the rows moved, or None if already partitioned.
+
+    Takes an exclusive lock on api_alert for the copy. Alerts without an
+    alert_time get MISSING_TIME_FILLED. Views over api_alert (the incident
+    dashboard) are recreated on the new table.
+    """
+    config = settings.ALERT_PARTITIONS
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [PARTITION_LOCK_KEY])
+        if is_partitioned(cursor):
+            return None
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(
+            "SELECT pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = 'api_alert'::regclass AND NOT tgisinternal"
+        )
+        triggers = [row[0] for row in cursor.fetchall()]
+        cursor.execute(DEPENDENT_VIEWS_QUERY)
+        views = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT attname FROM pg_attribute
+            WHERE attrelid = 'api_alert'::regclass AND attnum > 0 AND NOT attisdropped
+            ORDER BY attnum
+            """
+        )
+        columns = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(f"""
+            CREATE TABLE api_alert_partitioned (LIKE {TABLE} INCLUDING DEFAULTS) PARTITION BY RANGE (alert_time);
+            ALTER TABLE api_alert_partitioned
+              ALTER COLUMN alert_time SET NOT NULL,
+              ADD CONSTRAINT api_alert_partitioned_pkey PRIMARY KEY (alert_id, alert_time),
+              ADD CONSTRAINT api_alert_partitioned_incident_id_fkey FOREIGN KEY (incident_id)
+                REFERENCES api_incident (incident_id) ON DELETE SET NULL ON UPDATE CASCADE;
+            CREATE TABLE {DEFAULT_PARTITION} PARTITION OF api_alert_partitioned DEFAULT;
+        """)
+        cursor.execute(
+            PERIODS_SQL.format(data_periods=DATA_PERIODS_SQL.format(table=TABLE, alert_time=MISSING_TIME_FILLED)),
+            {"period": config["PERIOD"], "premake": config["PREMAKE"], "step": _step(config["PERIOD"])}
+        )
+        for lower, upper in sorted(cursor.fetchall()):
+            cursor.execute(
+                f"CREATE TABLE {_partition_name(lower, config['PERIOD'])} PARTITION OF api_alert_partitioned "
+                f"FOR VALUES {_bounds_sql(lower, upper)}"
+            )
+
+        selected = ", ".join(
+            MISSING_TIME_FILLED if column == "alert_time" else column
+            for column in columns
+        )
+        cursor.execute(f"INSERT INTO api_alert_partitioned ({', '.join(columns)}) SELECT {selected} FROM {TABLE}")
+        moved = cursor.rowcount
+
+        # The id sequence belongs to the old table's column; keep it past the drop
+        cursor.execute(f"""
+            ALTER SEQUENCE api_alert_alert_id_seq OWNED BY NONE;
+            DROP TABLE {TABLE} CASCADE;
+            ALTER TABLE api_alert_partitioned RENAME TO {TABLE};
+            ALTER TABLE {TABLE} RENAME CONSTRAINT api_alert_partitioned_pkey TO api_alert_pkey;
+            ALTER TABLE {TABLE} RENAME CONSTRAINT api_alert_partitioned_incident_id_fkey TO api_alert_incident_id_fkey;
+            ALTER SEQUENCE api_alert_alert_id_seq OWNED BY {TABLE}.alert_id;
+        """)
+        for trigger in triggers:
+            cursor.execute(trigger)
+        cursor.execute(f"ANALYZE {TABLE}")
+        # The views went with the old table (CASCADE)
+        for name, kind, definition, indexes in views:
+            cursor.execute(f"CREATE {'MATERIALIZED VIEW' if kind == 'm' else 'VIEW'} {name} AS {definition}")
+            for index in indexes:
+                cursor.execute(index)
+
+    # The registered indexes went with the old table
+    db_objects.install()
+    return moved
+
+
+def time_slices(lowers, now, since=None, until=None):
+    """[lower, upper) alert_time ranges to read a newest-first listing in, one partition each.
+
+    `lowers` are the partition lower bounds, newest first (None: not
+    partitioned). The first slice is open above and also covers the premade
+    partitions after `now`, which are still empty; the last is open below.
+    Together they read the default partition's rows in order too.
+    """
+    if not lowers:
+        return [(since, until)]
+    current = [lower for lower in lowers if lower <= now]
+    edges = [None] + current + [None]
+    slices = []
+    for upper, lower in zip(edges, edges[1:]):
+        if since is not None and upper is not None and upper <= since:
+            break
+        if until is not None and lower is not None and lower >= until:
+            continue
+        lower = since if lower is None or (since is not None and since > lower) else lower
+        upper = until if upper is None or (until is not None and until < upper) else upper
+        slices.append((lower, upper))
+    return slices
+
+
+async def alower_bounds(connection):
+    """Partition lower bounds, newest first, or None when api_alert is not partitioned; cached briefly."""
+    global _bounds
+    read_at, lowers = _bounds
+    if time.monotonic() - read_at < BOUNDS_TTL_SECONDS:
+        return lowers
+    cursor = await connection.execute(PARTITIONS_QUERY)
+    lowers = []
+    for _, bound in await cursor.fetchall():
+        match = _BOUND.search(bound)
+        if match:
+            lowers.append(datetime.fromisoformat(match.group(1)))
+    lowers = sorted(lowers, reverse=True) or None
+    _bounds = (time.monotonic(), lowers)
+    return lowers
+
+
+def _maintain_forever():
+    while True:
+        try:
+            maintain()
+        except Exception:
+            logger.exception("Alert partition maintenance failed; retrying")
+        time.sleep(settings.ALERT_PARTITIONS["MAINTENANCE_INTERVAL"])
+
+
+def start_maintainer():
+    """Start the background partition maintenance thread once per process."""
+    global _thread
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_maintain_forever, name="alert-partitions", daemon=True)
+            _thread.start()
@@ -1,14 +1,24 @@
-from ninja import Router
+from ninja import Query, Router
 
+from django.conf import settings
 from django.http import HttpResponse
+from pydantic import ValidationError
 from typing import Optional
+from datetime import datetime
 import json
 
-from app.api.alerts.schemas import AlertListSchema, AlertSchema
-from app.api.common.utils import get_connection
+from app.api.alerts import partitions
+from app.api.alerts.ingest import ALERT_CONTEXT_QUERY, validation_errors, write_alerts
+from app.api.alerts.schemas import AlertBulkRequest, AlertBulkResponse, AlertListSchema, AlertSchema, StatusEnum
+from app.api.common import cache, statements
+from app.api.common.pagination import DEFAULT_LIMIT, MAX_LIMIT, InvalidCursor, Keyset
+from app.api.common.renderers import schema_rows, trusted_response
+from app.api.common.utils import async_db_connection, db_connection
 
 router = Router(tags=["alerts"])
 
+ALERT_KEYSET = Keyset("alert_id", "alert_time", descending=True, nullable=True)
+
 def transform_alert_data(alert_data):
     """Transform alert data from database format to schema format."""
     severity_mapping = {
@@ -33,18 +43,51 @@ def transform_alert_data(alert_data):
 
     return alert_data
 
+def _slice_query(query, where_clauses, params, lower, upper):
+    """The page query limited to alert_time in [lower, upper); LIMIT is left to bind."""
+    slice_clauses, slice_params = list(where_clauses), list(params)
+    if lower is not None:
+        slice_clauses.append("alert_time >= %s")
+        slice_params.append(lower)
+    if upper is not None:
+        slice_clauses.append("alert_time < %s")
+        slice_params.append(upper)
+
+    if slice_clauses:
+        query += " WHERE " + " AND ".join(slice_clauses)
+
+    # Add ordering
+    query += f" ORDER BY {ALERT_KEYSET.order_by} LIMIT %s"
+    return query, slice_params
+
 @router.get("/", response=AlertListSchema)
-def list_alerts(
+async def list_alerts(
     request,
     severity: Optional[str] = None,
     status: Optional[str] = None,
-    source: Optional[str] = None
+    source: Optional[str] = None,
+    since: Optional[datetime] = Query(None, description="Only alerts at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only alerts before this time"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None
 ):
-    connection = get_connection()
-    print("Listing alerts with filters:", severity, status, source)
-    """List all alerts with optional filtering"""
-    with connection.cursor() as cursor:
-        query = "SELECT alert_id, source, name, alert_type, alert_time, severity, status, incident_id FROM api_alert"
+    """List alerts, newest first, with optional filtering and cursor pagination
+
+    On a partitioned api_alert the page is read one partition range at a time,
+    newest first (partitions.time_slices), until it is full, so recent pages
+    only touch the hot partitions.
+    """
+    try:
+        after_sql, after_params = ALERT_KEYSET.where(cursor)
+        after_time = after_params[0] if len(after_params) == 2 else None
+    except InvalidCursor:
+        return HttpResponse(status=400, content=json.dumps({"detail": "Invalid cursor"}))
+
+    async with async_db_connection() as connection, connection.cursor(row_factory=schema_rows(AlertSchema)) as cursor:
+        query = (
+            "SELECT alert_id, source, name, alert_type, alert_time, severity, status, incident_id, "
+            "occurrences, last_seen, asset_id FROM api_alert"
+        )
         params = []
 
         # Build WHERE clause for filters
@@ -58,81 +101,121 @@ def list_alerts(
         if source:
             where_clauses.append("source = %s")
             params.append(source)
-
-        if where_clauses:
-            query += " WHERE " + " AND ".join(where_clauses)
-
-        # Add ordering
-        query += " ORDER BY alert_time DESC"
-
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-
-        alerts = [
-            transform_alert_data({
-                "alert_id": row[0],
-                "source": row[1],
-                "name": row[2],
-                "alert_type": row[3],
-                "alert_time": row[4],
-                "severity": row[5],
-                "status": row[6],
-                "incident_id": row[7]
-            })
-            for row in rows
-        ]
-
-        return {"alerts": alerts, "count": len(alerts)}
+        if after_sql:
+            where_clauses.append(after_sql)
+            params.extend(after_params)
+
+        # Naive, like the column
+        since, until, after_time = (
+            value.astimezone(connection.info.timezone).replace(tzinfo=None) if value and value.tzinfo else value
+            for value in (since, until, after_time)
+        )
+        now = datetime.now(connection.info.timezone).replace(tzinfo=None)
+        rows = []
+        for lower, upper in partitions.time_slices(await partitions.alower_bounds(connection), now, since, until):
+            if after_time is not None and lower is not None and lower > after_time:
+                continue  # newer than the cursor
+            slice_query, slice_params = _slice_query(query, where_clauses, params, lower, upper)
+            slice_params.append(limit + 1 - len(rows))
+            await cursor.execute(slice_query, slice_params)
+            rows.extend(await cursor.fetchall())
+            if len(rows) > limit:
+                break
+        rows, next_cursor = ALERT_KEYSET.paginate(rows, limit, id_key="alert_id", sort_key="alert_time")
+
+    alerts = [transform_alert_data(row) for row in rows]
+    return trusted_response({"alerts": alerts, "count": len(alerts), "next_cursor": next_cursor})
 
 @router.post("/", response=AlertSchema)
 def create_alert(request, alert: AlertSchema):
     # print("alert: ", alert)
-    """Create a new alert"""
-    connection = get_connection()
-    with connection.cursor() as cursor:
+    """Create a new alert, or count it on the same alert of the current dedup window"""
+    with db_connection() as connection, connection.cursor() as cursor:
         # Validate incident_id if provided
-        if alert.incident_id:
-            cursor.execute("SELECT incident_id FROM api_incident WHERE incident_id = %s",
-                          [alert.incident_id])
-            if not cursor.fetchone():
-                return HttpResponse(
-                    status=400,
-                    content=json.dumps({"detail": "Referenced incident not found"})
-                )
+        cursor.execute(ALERT_CONTEXT_QUERY, [[alert.incident_id] if alert.incident_id else []])
+        now, found = cursor.fetchone()
+        if alert.incident_id and not found:
+            return HttpResponse(
+                status=400,
+                content=json.dumps({"detail": "Referenced incident not found"})
+            )
 
-        cursor.execute(
-            """
-            INSERT INTO api_alert (source, name, alert_type, alert_time, severity, status, incident_id)
-            VALUES (%s, %s, %s, NOW(), %s, %s, %s)
-            RETURNING alert_id, source, name, alert_type, alert_time, severity, status, incident_id
-            """,
-            [alert.source, alert.name, alert.alert_type, alert.severity, 'new', alert.incident_id]
+        # Single alerts are raised now, as new
+        alert.alert_time, alert.status = None, StatusEnum.NEW
+        [(row, duplicate)] = write_alerts(cursor, [alert], now, connection.info.timezone)
+        cache.invalidate("incident", row["incident_id"])
+        return row
+
+
+@router.post("/bulk/", response=AlertBulkResponse)
+def create_alerts_bulk(request, payload: AlertBulkRequest):
+    """Create many alerts in one transaction, with a result per alert.
+
+    Every alert is validated on its own and all referenced incidents are
+    checked with one lookup; the accepted alerts are then deduplicated and
+    the new ones written with a single COPY (ingest.py). Rejected alerts are
+    reported by index and, unless `atomic` is set, do not stop the others.
+    """
+    max_alerts = settings.ALERT_BULK["MAX_ALERTS"]
+    if len(payload.alerts) > max_alerts:
+        return HttpResponse(
+            status=400,
+            content=json.dumps({"detail": f"At most {max_alerts} alerts per request"})
         )
-        row = cursor.fetchone()
-        alert = {
-            "alert_id": row[0],
-            "source": row[1],
-            "name": row[2],
-            "alert_type": row[3],
-            "alert_time": row[4],
-            "severity": row[5],
-            "status": row[6],
-            "incident_id": row[7]
-        }
-        return alert
+
+    results = [
+        {"index": index, "alert_id": None, "duplicate": False, "errors": None} for index in range(len(payload.alerts))
+    ]
+    accepted = []
+    for index, item in enumerate(payload.alerts):
+        if not isinstance(item, dict):
+            results[index]["errors"] = ["Expected an alert object"]
+            continue
+        try:
+            accepted.append((index, AlertSchema.model_validate(item)))
+        except ValidationError as e:
+            results[index]["errors"] = validation_errors(e)
+
+    with db_connection() as connection, connection.cursor() as cursor:
+        cursor.execute(ALERT_CONTEXT_QUERY, [list({alert.incident_id for _, alert in accepted if alert.incident_id})])
+        now, incident_ids = cursor.fetchone()
+        found = set(incident_ids)
+        valid = []
+        for index, alert in accepted:
+            if alert.incident_id and alert.incident_id not in found:
+                results[index]["errors"] = ["Referenced incident not found"]
+            else:
+                valid.append((index, alert))
+        accepted = valid
+
+        rejected = len(results) - len(accepted)
+        created = 0
+        if accepted and not (payload.atomic and rejected):
+            stored = write_alerts(cursor, [alert for _, alert in accepted], now, connection.info.timezone)
+            for (index, _), (row, duplicate) in zip(accepted, stored):
+                results[index]["alert_id"] = row["alert_id"]
+                results[index]["duplicate"] = duplicate
+                created += not duplicate
+            cache.invalidate("incident", *incident_ids)
+        else:
+            accepted = []
+
+    return trusted_response(
+        {
+            "received": len(results), "created": created, "deduplicated": len(accepted) - created,
+            "rejected": rejected, "results": results,
+        },
+        status=400 if payload.atomic and rejected else 200,
+    )
 
 
 @router.get("/{alert_id}", response=AlertSchema)
-def get_alert(request, alert_id: int):
-    print(alert_id)
-    connection = get_connection()
+@cache.cached_entity("alert", "alert_id")
+async def get_alert(request, alert_id: int):
     """Get alert by ID"""
-    with connection.cursor() as cursor:
-        cursor.execute(
-            "SELECT alert_id, source, name, alert_type, alert_time, severity, status, incident_id FROM api_alert WHERE alert_id = %s",
-            [alert_id]
-        )
-        row = cursor.fetchone()
+    async with async_db_connection() as connection, connection.cursor() as cursor:
+        await statements.aexecute(cursor, "alert_by_id", [alert_id])
+        row = await cursor.fetchone()
         if not row:
             return HttpResponse(
                 status=404,
@@ -146,7 +229,10 @@ def get_alert(request, alert_id: int):
             "alert_time": row[4],
             "severity": row[5],
             "status": row[6],
-            "incident_id": row[7]
+            "incident_id": row[7],
+            "occurrences": row[8],
+            "last_seen": row[9],
+            "asset_id": row[10]
         }
 
         return transform_alert_data(alert)
@@ -154,12 +240,12 @@ def get_alert(request, alert_id: int):
 
 @router.put("/{alert_id}", response=AlertSchema)
 def update_alert(request, alert_id: int, alert: AlertSchema):
-    connection = get_connection()
     """Update an existing alert"""
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if alert exists
-        cursor.execute("SELECT alert_id FROM api_alert WHERE alert_id = %s", [alert_id])
-        if not cursor.fetchone():
+        statements.execute(cursor, "alert_exists", [alert_id])
+        existing = cursor.fetchone()
+        if not existing:
             return HttpResponse(
                 status=404,
                 content=json.dumps({"detail": "Alert not found"})
@@ -167,8 +253,7 @@ def update_alert(request, alert_id: int, alert: AlertSchema):
 
         # Validate incident_id if provided
         if alert.incident_id:
-            cursor.execute("SELECT incident_id FROM api_incident WHERE incident_id = %s",
-                           [alert.incident_id])
+            statements.execute(cursor, "incident_exists", [alert.incident_id])
             if not cursor.fetchone():
                 return HttpResponse(
                     status=400,
@@ -205,10 +290,7 @@ def update_alert(request, alert_id: int, alert: AlertSchema):
 
         if not update_fields:
             # If no fields to update, just return the current alert
-            cursor.execute(
-                "SELECT alert_id, source, name, alert_type, alert_time, severity, status, incident_id FROM api_alert WHERE alert_id = %s",
-                [alert_id]
-            )
+            statements.execute(cursor, "alert_by_id", [alert_id])
             row = cursor.fetchone()
             alert = {
                 "alert_id": row[0],
@@ -218,7 +300,10 @@ def update_alert(request, alert_id: int, alert: AlertSchema):
                 "alert_time": row[4],
                 "severity": row[5],
                 "status": row[6],
-                "incident_id": row[7]
+                "incident_id": row[7],
+                "occurrences": row[8],
+                "last_seen": row[9],
+                "asset_id": row[10]
             }
             return alert
 
@@ -231,12 +316,15 @@ def update_alert(request, alert_id: int, alert: AlertSchema):
             UPDATE api_alert
             SET {", ".join(update_fields)}
             WHERE alert_id = %s
-            RETURNING alert_id, source, name, alert_type, alert_time, severity, status, incident_id
+            RETURNING alert_id, source, name, alert_type, alert_time, severity, status, incident_id,
+                      occurrences, last_seen, asset_id
             """,
             params
         )
 
         row = cursor.fetchone()
+        cache.invalidate("alert", alert_id)
+        cache.invalidate("incident", existing[1], row[7])
         alert = {
             "alert_id": row[0],
             "source": row[1],
@@ -245,39 +333,44 @@ def update_alert(request, alert_id: int, alert: AlertSchema):
             "alert_time": row[4],
             "severity": row[5],
             "status": row[6],
-            "incident_id": row[7]
+            "incident_id": row[7],
+            "occurrences": row[8],
+            "last_seen": row[9],
+            "asset_id": row[10]
         }
         return alert
 
 @router.delete("/{alert_id}", response=dict)
 def delete_alert(request, alert_id: int):
-    connection = get_connection()
     """Delete an alert"""
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if alert exists
-        cursor.execute("SELECT alert_id FROM api_alert WHERE alert_id = %s", [alert_id])
-        if not cursor.fetchone():
+        statements.execute(cursor, "alert_exists", [alert_id])
+        existing = cursor.fetchone()
+        if not existing:
             return HttpResponse(status=404, content=json.dumps({"detail": "Alert not found"}))
 
         # Delete the alert
         cursor.execute("DELETE FROM api_alert WHERE alert_id = %s", [alert_id])
+        cache.invalidate("alert", alert_id)
+        cache.invalidate("incident", existing[1])
         return {"success": True, "message": "Alert deleted"}
 
 @router.post("/{alert_id}/assign-incident/{incident_id}")
 def assign_incident_to_alert(request, alert_id: int, incident_id: int):
-    connection = get_connection()
     """Assign an incident to an alert"""
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if alert exists
-        cursor.execute("SELECT alert_id FROM api_alert WHERE alert_id = %s", [alert_id])
-        if not cursor.fetchone():
+        statements.execute(cursor, "alert_exists", [alert_id])
+        existing = cursor.fetchone()
+        if not existing:
             return HttpResponse(
                 status=404,
                 content=json.dumps({"detail": "Alert not found"})
             )
 
         # Check if incident exists
-        cursor.execute("SELECT incident_id FROM api_incident WHERE incident_id = %s", [incident_id])
+        statements.execute(cursor, "incident_exists", [incident_id])
         if not cursor.fetchone():
             return HttpResponse(
                 status=404,
@@ -296,6 +389,8 @@ def assign_incident_to_alert(request, alert_id: int, incident_id: int):
         )
 
         row = cursor.fetchone()
+        cache.invalidate("alert", alert_id)
+        cache.invalidate("incident", existing[1], incident_id)
         alert = {
             "alert_id": row[0],
             "source": row[1],
@@ -312,11 +407,10 @@ def assign_incident_to_alert(request, alert_id: int, incident_id: int):
 
 @router.post("/{alert_id}/remove-incident/")
 def remove_incident_from_alert(request, alert_id: int):
-    connection = get_connection()
     """Remove incident assignment from an alert"""
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if alert exists
-        cursor.execute("SELECT alert_id, incident_id FROM api_alert WHERE alert_id = %s", [alert_id])
+        statements.execute(cursor, "alert_exists", [alert_id])
         row = cursor.fetchone()
         if not row:
             return HttpResponse(
@@ -329,6 +423,8 @@ def remove_incident_from_alert(request, alert_id: int):
                 status=400,
                 content=json.dumps({"detail": "Alert already has no incident assigned"})
             )
+        cache.invalidate("alert", alert_id)
+        cache.invalidate("incident", row[1])
 
         # Update the alert to remove the incident_id
         cursor.execute(
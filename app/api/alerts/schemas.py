@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Any, List, Optional
 from datetime import datetime
 from enum import Enum
 from ninja import Schema
@@ -46,6 +46,9 @@ class AlertSchema(Schema):
     severity: SeverityEnum = Field(..., description="Severity level of the alert")
     status: StatusEnum = Field(StatusEnum.NEW, description="Current status of the alert")
     incident_id: Optional[int] = Field(None, description="ID of the associated incident")
+    asset_id: Optional[int] = Field(None, description="ID of the asset the alert is about, used for correlation")
+    occurrences: int = Field(1, description="Times the alert was raised within its dedup window")
+    last_seen: Optional[datetime] = Field(None, description="Time of the latest duplicate, if any")
 
 
     @field_validator('source', 'alert_type')
@@ -71,4 +74,25 @@ class AlertSchema(Schema):
 
 class AlertListSchema(Schema):
     alerts: List[AlertSchema]
-    count: int
\ No newline at end of file
+    count: int
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to fetch the next page")
+
+class AlertBulkRequest(Schema):
+    # Validated row by row, so one bad alert does not reject the batch
+    alerts: List[Any] = Field(..., description="Alerts in the POST /alerts/ shape; alert_time defaults to now")
+    atomic: bool = Field(False, description="Insert nothing if any alert is rejected")
+
+
+class AlertBulkResult(Schema):
+    index: int  # position in the request
+    alert_id: Optional[int] = None  # set when stored
+    duplicate: bool = False  # counted on an existing alert instead of created
+    errors: Optional[List[str]] = None  # set when rejected
+
+
+class AlertBulkResponse(Schema):
+    received: int
+    created: int
+    deduplicated: int
+    rejected: int
+    results: List[AlertBulkResult]  # request order
@@ -0,0 +1,302 @@
+"""
+Streaming alert ingestion: POST /app/v1/cyber/alerts/stream/ with one JSON
+alert per line (application/x-ndjson), in the POST /alerts/ shape.
+
+Django's ASGI handler reads a whole request body before calling a view, so
+this endpoint is served by `AlertStreamApp`, an ASGI wrapper around the
+Django application (app/asgi.py), and is not available under WSGI. The body
+is read as it arrives and cut into micro-batches of at most BATCH_SIZE lines
+or BATCH_BYTES, or whatever arrived within FLUSH_MS. Each batch is parsed,
+validated, deduplicated and written with one COPY (ingest.py) in its own
+transaction, in a worker thread so the event loop stays free. At most
+MAX_PENDING_BATCHES wait for the writer, and the body is not read while they
+do.
+
+That bounds memory only on servers that stream request bodies to the
+application, such as uvicorn, where a slow database slows the sender.
+Daphne does not: it spools the whole body and queues all of it for the
+application before the first read, so the entire stream is held in this
+process. Bodies are therefore capped at MAX_BODY_BYTES on every server; a
+larger Content-Length is refused with 413 before reading, and a chunked body
+that grows past the cap is cut off there with 413. Bounded memory for
+uncapped streams needs a server that streams request bodies.
+
+Requests to STREAM_PATH do not pass through the Django middleware (no CORS
+headers, no request recording); they are filed in the route metrics
+(metrics.py) here, with the statements of all their batches.
+
+Committed batches stay committed if the stream fails later. The response,
+sent once the body has ended and every batch is written, counts the
+accepted (of which deduplicated) and rejected alerts and gives the first
+MAX_ERRORS rejections by line number.
+"""
+import asyncio
+import logging
+import time
+
+import orjson
+from django.conf import settings
+from pydantic import ValidationError
+
+from app.api.alerts.ingest import ALERT_CONTEXT_QUERY, validation_errors, write_alerts
+from app.api.alerts.schemas import AlertSchema
+from app.api.common import cache, metrics
+from app.api.common.utils import begin_request_scope, db_connection, end_request_scope
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = "/app/v1/cyber/alerts/stream/"
+STREAM_ROUTE = STREAM_PATH.lstrip("/")  # as the route metrics label it
+
+class StreamState:
+    """Counters of one stream, shared by the reader and the writer."""
+
+    def __init__(self):
+        self.lines = 0
+        self.accepted = 0
+        self.deduplicated = 0  # of accepted, counted on an existing alert
+        self.rejected = 0
+        self.batches = 0
+        self.errors = []
+        self.failed = None  # detail of the error that stopped the writer
+        self.too_large = False  # the body passed MAX_BODY_BYTES and was cut off
+        # DB usage of all batches, for metrics.observe_request()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+
+    def reject(self, line, errors):
+        self.rejected += 1
+        if len(self.errors) < settings.ALERT_STREAM["MAX_ERRORS"]:
+            self.errors.append({"line": line, "errors": errors})
+
+
+def write_batch(lines, state):
+    """Validate and COPY one micro-batch of (line number, line); runs in a worker thread."""
+    alerts = []
+    for line_number, line in lines:
+        if line is None:
+            state.reject(line_number, [f"Line longer than {settings.ALERT_STREAM['MAX_LINE_BYTES']} bytes"])
+            continue
+        try:
+            item = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            state.reject(line_number, ["Invalid JSON"])
+            continue
+        if not isinstance(item, dict):
+            state.reject(line_number, ["Expected an alert object"])
+            continue
+        try:
+            alerts.append((line_number, AlertSchema.model_validate(item)))
+        except ValidationError as e:
+            state.reject(line_number, validation_errors(e))
+    if not alerts:
+        return
+
+    # A request scope per batch: its transaction, and its statements counted
+    scope, token = begin_request_scope()
+    failed = True
+    try:
+        with db_connection() as connection, connection.cursor() as cursor:
+            cursor.execute(ALERT_CONTEXT_QUERY, [list({alert.incident_id for _, alert in alerts if alert.incident_id})])
+            now, incident_ids = cursor.fetchone()
+            found = set(incident_ids)
+            valid = []
+            for line_number, alert in alerts:
+                if alert.incident_id and alert.incident_id not in found:
+                    state.reject(line_number, ["Referenced incident not found"])
+                else:
+                    valid.append(alert)
+            stored = write_alerts(cursor, valid, now, connection.info.timezone) if valid else []
+        failed = False
+    finally:
+        end_request_scope(scope, token, failed)
+        state.queries += scope.queries
+        state.db_seconds += scope.db_seconds
+        state.rows += scope.rows
+    cache.invalidate("incident", *incident_ids)
+    state.accepted += len(stored)
+    state.deduplicated += sum(duplicate for _, duplicate in stored)
+
+
+async def _writer(batches, state):
+    while True:
+        batch = await batches.get()
+        if batch is None:
+            return
+        if state.failed:
+            continue  # drain, so the reader is never left waiting on a full queue
+        try:
+            await asyncio.to_thread(write_batch, batch, state)
+            state.batches += 1
+        except Exception as e:
+            logger.exception("Alert stream batch at line %d failed", batch[0][0])
+            state.failed = str(e) or e.__class__.__name__
+
+
+class _Batcher:
+    """Cuts body chunks into lines and the lines into micro-batches."""
+
+    def __init__(self, batches, state):
+        config = settings.ALERT_STREAM
+        self.batches = batches
+        self.state = state
+        self.batch_size = config["BATCH_SIZE"]
+        self.batch_bytes = config["BATCH_BYTES"]
+        self.flush_after = config["FLUSH_MS"] / 1000
+        self.max_line = config["MAX_LINE_BYTES"]
+        self.lines, self.size, self.line_number, self.started = [], 0, 0, None
+        self.tail, self.discarding = b"", False
+
+    def timeout(self):
+        """Seconds until the pending lines are due, or None if there are none."""
+        return None if self.started is None else max(0.0, self.started + self.flush_after - time.monotonic())
+
+    async def flush(self):
+        if self.lines:
+            # Blocks while MAX_PENDING_BATCHES are queued: backpressure on the body
+            await self.batches.put(self.lines)
+            self.lines, self.size, self.started = [], 0, None
+
+    def add(self, line):
+        """Add a line, or None for one rejected as too long."""
+        self.line_number += 1
+        if line is not None and not line.strip():
+            return
+        self.state.lines += 1
+        self.lines.append((self.line_number, line))
+        self.size += len(line or b"")
+        if self.started is None:
+            self.started = time.monotonic()
+
+    async def push(self, line):
+        """Add a line and flush once the batch holds BATCH_SIZE lines or BATCH_BYTES."""
+        self.add(line)
+        if len(self.lines) >= self.batch_size or self.size >= self.batch_bytes:
+            await self.flush()
+
+    async def feed(self, body):
+        *complete, self.tail = (self.tail + body).split(b"\n")
+        for line in complete:
+            if self.discarding:
+                # The rest of a line already rejected as too long
+                self.discarding = False
+                continue
+            await self.push(line if len(line) <= self.max_line else None)
+        if len(self.tail) > self.max_line:
+            if not self.discarding:
+                await self.push(None)
+            self.tail, self.discarding = b"", True
+        if self.started is not None and time.monotonic() - self.started >= self.flush_after:
+            await self.flush()
+
+    async def finish(self):
+        """Add an unterminated last line, unless the stream was cut short, and flush."""
+        state = self.state
+        if self.tail.strip() and not (self.discarding or state.failed or state.too_large):
+            self.add(self.tail)
+        await self.flush()
+
+
+async def _read_lines(receive, batches, state):
+    """Split the body into micro-batches; returns False if the client went away."""
+    max_body = settings.ALERT_STREAM["MAX_BODY_BYTES"]
+    batcher = _Batcher(batches, state)
+    received, more = 0, True
+    while more and not state.failed:
+        try:
+            message = await asyncio.wait_for(receive(), batcher.timeout())
+        except asyncio.TimeoutError:
+            await batcher.flush()
+            continue
+        if message["type"] == "http.disconnect":
+            await batcher.flush()
+            return False
+        more = message.get("more_body", False)
+        body = message.get("body", b"")
+        received += len(body)
+        if received > max_body:
+            # Lines already read are written; the rest of the body is not
+            state.too_large = True
+            break
+        await batcher.feed(body)
+    await batcher.finish()
+    return True
+
+
+async def ingest(receive, send, state):
+    batches = asyncio.Queue(maxsize=settings.ALERT_STREAM["MAX_PENDING_BATCHES"])
+    writer = asyncio.create_task(_writer(batches, state))
+    try:
+        connected = await _read_lines(receive, batches, state)
+    finally:
+        await batches.put(None)
+        await writer
+    if not connected:
+        return
+
+    body = {
+        "lines": state.lines,
+        "accepted": state.accepted,
+        "deduplicated": state.deduplicated,
+        "rejected": state.rejected,
+        "batches": state.batches,
+        "errors": state.errors,
+        "errors_truncated": state.rejected > len(state.errors),
+    }
+    if state.failed:
+        body["detail"] = f"Ingestion stopped: {state.failed}"
+        await _respond(send, 500, body)
+    elif state.too_large:
+        body["detail"] = f"Body larger than {settings.ALERT_STREAM['MAX_BODY_BYTES']} bytes; the rest was not read"
+        await _respond(send, 413, body)
+    else:
+        await _respond(send, 200, body)
+
+
+async def _respond(send, status, body):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json")],
+    })
+    await send({"type": "http.response.body", "body": orjson.dumps(body)})
+
+
+class AlertStreamApp:
+    """ASGI application serving STREAM_PATH itself and everything else through `app`."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != STREAM_PATH:
+            return await self.app(scope, receive, send)
+        # 499: the client went away before the response (nginx's convention)
+        started, state, status = time.perf_counter(), StreamState(), 499
+
+        async def send_recording(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.serve(scope, receive, send_recording, state)
+        except BaseException:
+            status = 500
+            raise
+        finally:
+            if metrics.enabled():
+                metrics.observe_request(scope["method"], STREAM_ROUTE, status, time.perf_counter() - started, state)
+
+    @staticmethod
+    async def serve(scope, receive, send, state):
+        if scope["method"] != "POST":
+            return await _respond(send, 405, {"detail": "Method not allowed"})
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > settings.ALERT_STREAM["MAX_BODY_BYTES"]:
+            return await _respond(send, 413, {
+                "detail": f"Body larger than {settings.ALERT_STREAM['MAX_BODY_BYTES']} bytes",
+            })
+        await ingest(receive, send, state)
@@ -1,6 +1,8 @@
 from ninja import NinjaAPI, Swagger
 import importlib.util
 
+from app.api.common.renderers import ORJSONRenderer
+
 api = NinjaAPI(
     title="Cyber API",
     version="1.0.0",
@@ -12,6 +14,7 @@ api = NinjaAPI(
         }
     ),
     urls_namespace="api",
+    renderer=ORJSONRenderer(),
 )
 
 # Only add routers if they haven't been added already
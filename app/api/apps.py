@@ -1,5 +1,23 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+_installed_after_migrate = False
+
+
+def install_db_objects(sender, **kwargs):
+    # post_migrate is only sent for apps with models and this one has none,
+    # so install on the first app's signal of the migrate run.
+    global _installed_after_migrate
+    if _installed_after_migrate:
+        return
+    _installed_after_migrate = True
+    from app.api.common import db_objects
+    db_objects.install()
 
 
 class APIConfig(AppConfig):
     name = 'app.api'
+
+    def ready(self):
+        # Functions and triggers are (re)deployed with the schema, not per request
+        post_migrate.connect(install_db_objects, dispatch_uid="app.api.install_db_objects")
@@ -1,40 +1,46 @@
-from ninja import Router
+from ninja import Query, Router
 
 from django.http import HttpResponse
-from typing import List
+from typing import List, Optional
 import json
 
 from app.api.assets.schemas import AssetSchema, AssetCreateSchema, AssetUpdateSchema
-from app.api.common.utils import get_connection
+from app.api.common import cache, statements
+from app.api.common.pagination import DEFAULT_LIMIT, MAX_LIMIT, InvalidCursor, Keyset
+from app.api.common.renderers import schema_rows, trusted_response
+from app.api.common.utils import async_db_connection, db_connection
 
 router = Router(tags=["assets"])
 
+ASSET_KEYSET = Keyset("asset_id", descending=False)
+
 @router.get("/", response=List[AssetSchema])
-def list_assets(request):
-    connection = get_connection()
-    """Get all assets"""
-    with connection.cursor() as cursor:
-        cursor.execute(f"SELECT asset_id, asset_name, asset_type, location, owner, criticality_level FROM api_asset")
-        assets = []
-        for row in cursor.fetchall():
-            asset = {
-                "asset_id": row[0],
-                "asset_name": row[1],
-                "asset_type": row[2],
-                "location": row[3],
-                "owner": row[4],
-                "criticality_level": row[5],
-            }
-            assets.append(asset)
-        return assets
+async def list_assets(
+    request,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None
+):
+    """Get assets by id; the next page's cursor is sent in X-Next-Cursor"""
+    try:
+        after_sql, after_params = ASSET_KEYSET.where(cursor)
+    except InvalidCursor:
+        return HttpResponse(status=400, content=json.dumps({"detail": "Invalid cursor"}))
+
+    query = "SELECT asset_id, asset_name, asset_type, location, owner, criticality_level FROM api_asset"
+    if after_sql:
+        query += " WHERE " + after_sql
+    query += f" ORDER BY {ASSET_KEYSET.order_by} LIMIT %s"
+
+    async with async_db_connection() as connection, connection.cursor(row_factory=schema_rows(AssetSchema)) as cursor:
+        await cursor.execute(query, after_params + [limit + 1])
+        assets, next_cursor = ASSET_KEYSET.paginate(await cursor.fetchall(), limit, id_key="asset_id")
+    return trusted_response(assets, headers={"X-Next-Cursor": next_cursor})
 
 
 @router.post("/", response=AssetSchema)
 def create_asset(request, asset_data: AssetCreateSchema):
-    print(asset_data)
-    connection = get_connection()
     """Create a new asset"""
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if asset_name already exists
         cursor.execute(
             "SELECT asset_id FROM api_asset WHERE asset_name = %s",
@@ -74,15 +80,12 @@ def create_asset(request, asset_data: AssetCreateSchema):
         return asset
 
 @router.get("/{asset_id}", response=AssetSchema)
-def get_asset(request, asset_id: int):
-    connection = get_connection()
+@cache.cached_entity("asset", "asset_id")
+async def get_asset(request, asset_id: int):
     """Get asset by ID"""
-    with connection.cursor() as cursor:
-        cursor.execute(
-            f"SELECT asset_id, asset_name, asset_type, location, owner, criticality_level FROM api_asset WHERE asset_id = %s",
-            [asset_id]
-        )
-        row = cursor.fetchone()
+    async with async_db_connection() as connection, connection.cursor() as cursor:
+        await statements.aexecute(cursor, "asset_by_id", [asset_id])
+        row = await cursor.fetchone()
         if not row:
             return HttpResponse(status=404, content=json.dumps({"detail": "Asset not found"}))
 
@@ -98,11 +101,10 @@ def get_asset(request, asset_id: int):
 
 @router.put("/{asset_id}", response=AssetSchema)
 def update_asset(request, asset_id: int, asset_data: AssetUpdateSchema):
-    connection = get_connection()
     """Update an existing asset"""
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if asset exists
-        cursor.execute("SELECT asset_id FROM api_asset WHERE asset_id = %s", [asset_id])
+        statements.execute(cursor, "asset_exists", [asset_id])
         if not cursor.fetchone():
             return HttpResponse(
                 status=404,
@@ -135,10 +137,7 @@ def update_asset(request, asset_id: int, asset_data: AssetUpdateSchema):
 
         if not update_fields:
             # If no fields to update, just return the current asset
-            cursor.execute(
-                f"SELECT asset_id, asset_name, asset_type, location, owner, criticality_level FROM api_asset WHERE asset_id = %s",
-                [asset_id]
-            )
+            statements.execute(cursor, "asset_by_id", [asset_id])
             row = cursor.fetchone()
             asset = {
                 "asset_id": row[0],
@@ -165,6 +164,10 @@ def update_asset(request, asset_id: int, asset_data: AssetUpdateSchema):
         )
 
         row = cursor.fetchone()
+        cache.invalidate("asset", asset_id)
+        cache.invalidate_related(
+            cursor, "incident", "SELECT incident_id FROM incident_assets WHERE asset_id = %s", [asset_id]
+        )
         asset = {
             "asset_id": row[0],
             "asset_name": row[1],
@@ -178,14 +181,22 @@ def update_asset(request, asset_id: int, asset_data: AssetUpdateSchema):
 
 @router.delete("/{asset_id}")
 def delete_asset(request, asset_id: int):
-    connection = get_connection()
     """Delete a asset"""
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if asset exists
-        cursor.execute("SELECT asset_id FROM api_asset WHERE asset_id = %s", [asset_id])
+        statements.execute(cursor, "asset_exists", [asset_id])
         if not cursor.fetchone():
             return HttpResponse(status=404, content=json.dumps({"detail": "Asset not found"}))
 
+        # Cached incidents and threats list the asset; drop them before the cascade
+        cache.invalidate_related(
+            cursor, "incident", "SELECT incident_id FROM incident_assets WHERE asset_id = %s", [asset_id]
+        )
+        cache.invalidate_related(
+            cursor, "threat", "SELECT threat_id FROM threat_asset_association WHERE asset_id = %s", [asset_id]
+        )
+        cache.invalidate("asset", asset_id)
+
         # Delete asset
         cursor.execute("DELETE FROM api_asset WHERE asset_id = %s", [asset_id])
         return {"success": True, "message": "Asset deleted"}
\ No newline at end of file
@@ -0,0 +1,17 @@
+"""
+Background threads of a server process, started by both app/asgi.py and
+app/wsgi.py (and so also by `manage.py runserver`). Each starts at most once
+per process; work shared between processes is serialized by advisory locks.
+"""
+from app.api.alerts.partitions import start_maintainer
+from app.api.dashboard.refresh import start_refresher as start_dashboard_refresher
+from app.api.risk.refresh import start_refresher as start_risk_refresher
+
+
+def start_background_workers():
+    # Keep the materialized incident dashboard current.
+    start_dashboard_refresher()
+    # Rescore incidents queued by writes and age the stored time factors.
+    start_risk_refresher()
+    # Create upcoming alert partitions and retire expired ones.
+    start_maintainer()
@@ -0,0 +1,273 @@
+import functools
+import inspect
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from app.api.common.utils import on_commit
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "entity"
+
+# Keys deleted per round trip when clearing the shared tier.
+CLEAR_BATCH_SIZE = 1000
+
+# After a Redis error, skip the shared tier for this many seconds instead of
+# paying a connection attempt on every request.
+REDIS_BACKOFF_SECONDS = 30.0
+
+_lock = threading.Lock()
+_l1 = OrderedDict()
+_redis_down_until = 0.0
+_stats = {
+    "l1_hits": 0,
+    "l2_hits": 0,
+    "misses": 0,
+    "sets": 0,
+    "invalidations": 0,
+    "l1_evictions": 0,
+    "redis_errors": 0,
+}
+
+
+def entity_key(entity, entity_id):
+    return f"{KEY_PREFIX}:{entity}:{entity_id}"
+
+
+def _count(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+
+
+def _l1_get(key):
+    with _lock:
+        item = _l1.get(key)
+        if item is None:
+            return None
+        if item[0] < time.monotonic():
+            del _l1[key]
+            return None
+        _l1.move_to_end(key)
+        return item
+
+
+def _l1_set(key, value):
+    config = settings.ENTITY_CACHE
+    with _lock:
+        _l1[key] = (time.monotonic() + config["L1_TIMEOUT"], value)
+        _l1.move_to_end(key)
+        while len(_l1) > config["L1_MAX_ENTRIES"]:
+            _l1.popitem(last=False)
+            _stats["l1_evictions"] += 1
+
+
+def _redis_available():
+    return time.monotonic() >= _redis_down_until
+
+
+def _redis_failed(exc):
+    global _redis_down_until
+    _redis_down_until = time.monotonic() + REDIS_BACKOFF_SECONDS
+    _count("redis_errors")
+    logger.warning("Entity cache: Redis unavailable, using the in-process tier only (%s)", exc)
+
+
+def _redis_get(key):
+    if not _redis_available():
+        return None
+    try:
+        return cache.get(key)
+    except Exception as exc:
+        _redis_failed(exc)
+        return None
+
+
+def _redis_set(key, value):
+    if not _redis_available():
+        return
+    try:
+        cache.set(key, value, settings.ENTITY_CACHE["TIMEOUT"])
+    except Exception as exc:
+        _redis_failed(exc)
+
+
+async def _aredis_get(key):
+    if not _redis_available():
+        return None
+    try:
+        return await cache.aget(key)
+    except Exception as exc:
+        _redis_failed(exc)
+        return None
+
+
+async def _aredis_set(key, value):
+    if not _redis_available():
+        return
+    try:
+        await cache.aset(key, value, settings.ENTITY_CACHE["TIMEOUT"])
+    except Exception as exc:
+        _redis_failed(exc)
+
+
+def _found(key, value):
+    if value is None:
+        _count("misses")
+        return None
+    _count("l2_hits")
+    _l1_set(key, value)
+    return value
+
+
+def lookup(entity, entity_id):
+    """Look an entity up in L1, then Redis; returns None on a miss."""
+    key = entity_key(entity, entity_id)
+    item = _l1_get(key)
+    if item is not None:
+        _count("l1_hits")
+        return item[1]
+    return _found(key, _redis_get(key))
+
+
+async def alookup(entity, entity_id):
+    key = entity_key(entity, entity_id)
+    item = _l1_get(key)
+    if item is not None:
+        _count("l1_hits")
+        return item[1]
+    return _found(key, await _aredis_get(key))
+
+
+def store(entity, entity_id, value):
+    key = entity_key(entity, entity_id)
+    _l1_set(key, value)
+    _redis_set(key, value)
+    _count("sets")
+
+
+async def astore(entity, entity_id, value):
+    key = entity_key(entity, entity_id)
+    _l1_set(key, value)
+    await _aredis_set(key, value)
+    _count("sets")
+
+
+def _delete(keys):
+    with _lock:
+        for key in keys:
+            _l1.pop(key, None)
+        _stats["invalidations"] += len(keys)
+    if _redis_available():
+        try:
+            cache.delete_many(keys)
+        except Exception as exc:
+            _redis_failed(exc)
+
+
+def invalidate(entity, *entity_ids):
+    """Drop cached copies of the given entities.
+
+    Keys are dropped straight away and again once the request's transaction
+    commits, so a read racing the write cannot re-cache the old row.
+    """
+    keys = [entity_key(entity, entity_id) for entity_id in entity_ids if entity_id is not None]
+    if not keys:
+        return
+    _delete(keys)
+    on_commit(lambda: _delete(keys))
+
+
+def _redis_clear():
+    """Delete this layer's keys from Redis; other users of the database keep theirs."""
+    client = cache._cache.get_client(write=True)
+    batch = []
+    for key in client.scan_iter(match=cache.make_key(f"{KEY_PREFIX}:*"), count=CLEAR_BATCH_SIZE):
+        batch.append(key)
+        if len(batch) >= CLEAR_BATCH_SIZE:
+            client.delete(*batch)
+            batch = []
+    if batch:
+        client.delete(*batch)
+
+
+def _clear():
+    with _lock:
+        _stats["invalidations"] += len(_l1)
+        _l1.clear()
+    if _redis_available():
+        try:
+            _redis_clear()
+        except Exception as exc:
+            _redis_failed(exc)
+
+
+def invalidate_all():
+    """Drop every cached entity, e.g. after the tables were truncated."""
+    _clear()
+    on_commit(_clear)
+
+
+def invalidate_related(cursor, entity, query, params):
+    """Invalidate the `entity` ids returned by `query` (first column)."""
+    cursor.execute(query, params)
+    invalidate(entity, *[row[0] for row in cursor.fetchall()])
+
+
+def _cacheable(result):
+    """Return the value to cache for a handler result, or None for errors."""
+    if isinstance(result, dict):
+        return result
+    if isinstance(result, tuple) and len(result) == 2 and result[0] == 200:
+        return result
+    return None
+
+
+def cached_entity(entity, id_param):
+    """Read-through cache for a GET-by-id handler (sync or async).
+
+    Only successful results are cached; 404s and other error responses always
+    reach the database. Writes call `invalidate(entity, id)`.
+    """
+    def decorator(view_func):
+        if inspect.iscoroutinefunction(view_func):
+            @functools.wraps(view_func)
+            async def async_wrapper(request, **kwargs):
+                entity_id = kwargs[id_param]
+                value = await alookup(entity, entity_id)
+                if value is not None:
+                    return value
+                result = await view_func(request, **kwargs)
+                value = _cacheable(result)
+                if value is not None:
+                    await astore(entity, entity_id, value)
+                return result
+            return async_wrapper
+
+        @functools.wraps(view_func)
+        def wrapper(request, **kwargs):
+            entity_id = kwargs[id_param]
+            value = lookup(entity, entity_id)
+            if value is not None:
+                return value
+            result = view_func(request, **kwargs)
+            value = _cacheable(result)
+            if value is not None:
+                store(entity, entity_id, value)
+            return result
+        return wrapper
+    return decorator
+
+
+def cache_stats():
+    """Snapshot of hit/miss counters for monitoring."""
+    with _lock:
+        stats = dict(_stats)
+        stats["l1_size"] = len(_l1)
+    lookups = stats["l1_hits"] + stats["l2_hits"] + stats["misses"]
+    stats["hit_ratio"] = (stats["l1_hits"] + stats["l2_hits"]) / lookups if lookups else 0.0
+    return stats
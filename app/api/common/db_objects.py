@@ -0,0 +1,157 @@
+"""
+Versioned installer for database functions, views, triggers, indexes and the
+bookkeeping tables they use.
+
+Modules register the DDL for the objects they rely on with `register()`.
+`install()` runs at startup (asgi/wsgi), after `manage.py migrate` and from
+`manage.py install_db_objects`: it records a SHA-256 checksum of each object's
+DDL in `db_object_versions` and only re-runs the DDL when the checksum changed
+or the object has gone missing, so request handlers never issue DDL
+themselves.
+"""
+import hashlib
+import importlib
+import logging
+from collections import OrderedDict
+
+import psycopg
+
+from app.api.common.utils import db_connection
+
+logger = logging.getLogger(__name__)
+
+VERSION_TABLE = "db_object_versions"
+
+# Serializes installs across API processes starting at the same time.
+INSTALL_LOCK_KEY = 7_340_002
+
+# Importing the API module imports every router, and with them every registration.
+REGISTRATION_MODULE = "app.api.api"
+
+_PRESENCE_QUERIES = {
+    "function": "SELECT to_regproc(%s) IS NOT NULL",
+    "procedure": "SELECT to_regproc(%s) IS NOT NULL",
+    "view": "SELECT to_regclass(%s) IS NOT NULL",
+    "table": "SELECT to_regclass(%s) IS NOT NULL",
+    "index": "SELECT to_regclass(%s) IS NOT NULL",
+    "trigger": "SELECT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = %s AND NOT tgisinternal)",
+}
+
+_registry = OrderedDict()
+
+
+class DbObject:
+    def __init__(self, name, kind, sql):
+        if kind not in _PRESENCE_QUERIES:
+            raise ValueError(f"Unsupported database object kind: {kind}")
+        self.name = name
+        self.kind = kind
+        self.sql = sql
+        self.checksum = hashlib.sha256(" ".join(sql.split()).encode()).hexdigest()
+
+
+def register(name, kind, sql):
+    """Declare a database object; objects install in registration order."""
+    obj = DbObject(name, kind, sql)
+    existing = _registry.get(name)
+    if existing is not None and existing.checksum != obj.checksum:
+        raise ValueError(f"Database object {name!r} is already registered with different DDL")
+    _registry[name] = obj
+    return obj
+
+
+def registered():
+    importlib.import_module(REGISTRATION_MODULE)
+    return list(_registry.values())
+
+
+def _ensure_version_table(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+          name         VARCHAR(128) PRIMARY KEY,
+          kind         VARCHAR(20) NOT NULL,
+          checksum     CHAR(64) NOT NULL,
+          installed_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+
+
+def _is_present(cursor, obj):
+    cursor.execute(_PRESENCE_QUERIES[obj.kind], [obj.name])
+    return cursor.fetchone()[0]
+
+
+def install(names=None, force=False):
+    """Install registered objects whose DDL changed or that are missing.
+
+    Returns {"installed": [...], "unchanged": [...], "skipped": {name: reason}}.
+    Objects whose tables do not exist yet are skipped and picked up by the
+    next install (e.g. after /settings/create_tables/).
+    """
+    objects = registered()
+    if names is not None:
+        unknown = set(names) - {obj.name for obj in objects}
+        if unknown:
+            raise KeyError(f"Unknown database objects: {', '.join(sorted(unknown))}")
+        objects = [obj for obj in objects if obj.name in names]
+
+    result = {"installed": [], "unchanged": [], "skipped": {}}
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [INSTALL_LOCK_KEY])
+        _ensure_version_table(cursor)
+        cursor.execute(f"SELECT name, checksum FROM {VERSION_TABLE}")
+        installed = dict(cursor.fetchall())
+
+        for obj in objects:
+            if not force and installed.get(obj.name) == obj.checksum and _is_present(cursor, obj):
+                result["unchanged"].append(obj.name)
+                continue
+            try:
+                with conn.transaction():
+                    cursor.execute(obj.sql)
+                    cursor.execute(
+                        f"""
+                        INSERT INTO {VERSION_TABLE} (name, kind, checksum, installed_at)
+                        VALUES (%s, %s, %s, NOW())
+                        ON CONFLICT (name) DO UPDATE
+                          SET kind = EXCLUDED.kind, checksum = EXCLUDED.checksum,
+                              installed_at = EXCLUDED.installed_at
+                        """,
+                        [obj.name, obj.kind, obj.checksum]
+                    )
+                result["installed"].append(obj.name)
+            except psycopg.errors.UndefinedTable as e:
+                result["skipped"][obj.name] = str(e).strip()
+
+    if result["installed"]:
+        logger.info("Installed database objects: %s", ", ".join(result["installed"]))
+    return result
+
+
+def install_on_startup():
+    """Run `install()` when a server process starts; never prevents startup."""
+    try:
+        return install()
+    except Exception:
+        logger.exception("Installing database objects failed; they will be retried at the next start")
+        return None
+
+
+def status():
+    """Registered objects with their expected and installed checksums."""
+    objects = registered()
+    with db_connection() as conn, conn.cursor() as cursor:
+        _ensure_version_table(cursor)
+        cursor.execute(f"SELECT name, checksum, installed_at FROM {VERSION_TABLE}")
+        installed = {row[0]: row[1:] for row in cursor.fetchall()}
+        return [
+            {
+                "name": obj.name,
+                "kind": obj.kind,
+                "checksum": obj.checksum,
+                "installed_checksum": installed.get(obj.name, (None, None))[0],
+                "installed_at": installed.get(obj.name, (None, None))[1],
+                "present": _is_present(cursor, obj),
+            }
+            for obj in objects
+        ]
@@ -0,0 +1,184 @@
+import bisect
+import functools
+import hashlib
+import re
+import threading
+
+from django.conf import settings
+
+# Prometheus metrics of this process, served in the text exposition format
+# by the `/metrics` view (app/api/common/views.py).
+#
+# Every statement run through the pooled connections (CountingCursor in
+# utils.py) is timed and attributed to a fingerprint: its SQL with literals,
+# placeholders and IN lists folded, so one query shape is one series whatever
+# the parameters. The request scope collects the same numbers per request and
+# RequestScopeMiddleware files them under the request's route, next to the
+# request latency. Each worker process keeps its own registry; scrape every
+# process (or aggregate at the scraper).
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+QUERY_BUCKETS = [1, 2, 3, 5, 10, 20, 50, 100]
+
+# Series label of statements beyond MAX_STATEMENTS distinct fingerprints.
+OTHER_STATEMENTS = "other"
+
+_WHITESPACE = re.compile(r"\s+")
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|%[sbt]|\$\d+")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+_lock = threading.Lock()
+_statements = {}
+_requests = {}
+
+
+class Histogram:
+    """Bucket counts, sum and count of one series."""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, buckets, value):
+        self.counts[bisect.bisect_left(buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """(id, normalized text) of a statement; equal for every parameter set."""
+    text = _COMMENTS.sub(" ", sql)
+    text = _LITERALS.sub("?", text)
+    text = _LISTS.sub("(...)", text)
+    text = _WHITESPACE.sub(" ", text).strip()
+    return hashlib.md5(text.encode()).hexdigest()[:12], text
+
+
+def enabled():
+    return settings.METRICS["ENABLED"]
+
+
+def record_statement(key, seconds, rows, failed):
+    """Add one execution of fingerprint `key` (from `fingerprint()`)."""
+    with _lock:
+        stat = _statements.get(key[0])
+        if stat is None:
+            if len(_statements) >= settings.METRICS["MAX_STATEMENTS"]:
+                key = (OTHER_STATEMENTS, OTHER_STATEMENTS)
+                stat = _statements.get(OTHER_STATEMENTS)
+            if stat is None:
+                stat = _statements[key[0]] = {
+                    "statement": key[1][:settings.METRICS["STATEMENT_LABEL_LENGTH"]],
+                    "calls": 0, "errors": 0, "seconds": 0.0, "rows": 0,
+                }
+        stat["calls"] += 1
+        stat["errors"] += failed
+        stat["seconds"] += seconds
+        stat["rows"] += rows
+
+
+def observe_request(method, route, status, seconds, scope):
+    """File a finished request and its scope's DB usage under its route."""
+    with _lock:
+        series = _requests.get((method, route))
+        if series is None:
+            series = _requests[(method, route)] = {
+                "latency": {},
+                "queries": Histogram(QUERY_BUCKETS),
+                "db_seconds": 0.0,
+                "rows": 0,
+            }
+        latency = series["latency"].get(status)
+        if latency is None:
+            latency = series["latency"][status] = Histogram(LATENCY_BUCKETS)
+        latency.observe(LATENCY_BUCKETS, seconds)
+        series["queries"].observe(QUERY_BUCKETS, scope.queries)
+        series["db_seconds"] += scope.db_seconds
+        series["rows"] += scope.rows
+
+
+def reset():
+    with _lock:
+        _statements.clear()
+        _requests.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _histogram_lines(name, buckets, histogram, **labels):
+    cumulative = 0
+    for bound, count in zip(buckets + ["+Inf"], histogram.counts):
+        cumulative += count
+        yield f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}"
+    yield f"{name}_sum{_labels(**labels)} {histogram.sum}"
+    yield f"{name}_count{_labels(**labels)} {histogram.count}"
+
+
+def _header(name, kind, text):
+    return [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+
+
+def render(gauges=None, counters=None):
+    """The registry in the Prometheus text format, plus extra {name: (help, value)} series."""
+    with _lock:
+        statements = {key: dict(stat) for key, stat in _statements.items()}
+        requests = {
+            key: {
+                "latency": {status: _copy(histogram) for status, histogram in series["latency"].items()},
+                "queries": _copy(series["queries"]),
+                "db_seconds": series["db_seconds"],
+                "rows": series["rows"],
+            }
+            for key, series in _requests.items()
+        }
+
+    lines = _header("cyber_http_request_duration_seconds", "histogram",
+                    "Time to the response headers, by route and status.")
+    for (method, route), series in sorted(requests.items()):
+        for status, histogram in sorted(series["latency"].items()):
+            lines.extend(_histogram_lines("cyber_http_request_duration_seconds", LATENCY_BUCKETS, histogram,
+                                          method=method, route=route, status=status))
+    lines += _header("cyber_http_request_db_queries", "histogram", "Statements run per request, by route.")
+    for (method, route), series in sorted(requests.items()):
+        lines.extend(_histogram_lines("cyber_http_request_db_queries", QUERY_BUCKETS, series["queries"],
+                                      method=method, route=route))
+    for name, field, text in (
+        ("cyber_http_request_db_seconds_total", "db_seconds", "Time spent in statements, by route."),
+        ("cyber_http_request_db_rows_total", "rows", "Rows returned by statements, by route."),
+    ):
+        lines += _header(name, "counter", text)
+        for (method, route), series in sorted(requests.items()):
+            lines.append(f"{name}{_labels(method=method, route=route)} {series[field]}")
+
+    for name, field, text in (
+        ("cyber_db_statement_calls_total", "calls", "Executions by statement fingerprint."),
+        ("cyber_db_statement_errors_total", "errors", "Failed executions by statement fingerprint."),
+        ("cyber_db_statement_seconds_total", "seconds", "Execution time by statement fingerprint."),
+        ("cyber_db_statement_rows_total", "rows", "Rows returned by statement fingerprint."),
+    ):
+        lines += _header(name, "counter", text)
+        for key, stat in sorted(statements.items()):
+            lines.append(f"{name}{_labels(fingerprint=key, statement=stat['statement'])} {stat[field]}")
+
+    for kind, extra in (("gauge", gauges), ("counter", counters)):
+        for name, (text, value) in sorted((extra or {}).items()):
+            lines += _header(name, kind, text)
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _copy(histogram):
+    copy = Histogram.__new__(Histogram)
+    copy.counts, copy.sum, copy.count = list(histogram.counts), histogram.sum, histogram.count
+    return copy
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from app.api.common import metrics
+from app.api.common.utils import aend_request_scope, begin_request_scope, end_request_scope
+
+logger = logging.getLogger(__name__)
+
+
+class RequestScopeMiddleware:
+    """Run each request as a single unit of work against the database.
+
+    Handlers (and helpers they call) share one pooled connection per request;
+    the transaction is committed when the response is produced and rolled back
+    if a handler raised or the response is a server error. The connection and
+    round-trip counts are reported in `X-DB-Connections` / `X-DB-Round-Trips`,
+    statement count and time in `X-DB-Queries` / `X-DB-Time-Ms`, and the
+    request is filed in the route metrics (metrics.py).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        scope, token = begin_request_scope()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            end_request_scope(scope, token, failed=True)
+            raise
+        end_request_scope(scope, token, failed=response.status_code >= 500)
+        return self.annotate(request, response, scope, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        scope, token = begin_request_scope()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            await aend_request_scope(scope, token, failed=True)
+            raise
+        await aend_request_scope(scope, token, failed=response.status_code >= 500)
+        return self.annotate(request, response, scope, started)
+
+    @staticmethod
+    def annotate(request, response, scope, started):
+        response["X-DB-Connections"] = str(scope.connections)
+        response["X-DB-Round-Trips"] = str(scope.round_trips)
+        response["X-DB-Queries"] = str(scope.queries)
+        response["X-DB-Time-Ms"] = f"{scope.db_seconds * 1000:.3f}"
+        if metrics.enabled():
+            # Streaming bodies are still being sent; their latency is to the headers
+            match = request.resolver_match
+            metrics.observe_request(
+                request.method, match.route if match is not None else "unmatched",
+                response.status_code, time.perf_counter() - started, scope,
+            )
+        logger.debug(
+            "%s %s: %d connection(s), %d round trip(s), %d statement(s) in %.1f ms, %d row(s); fingerprints %s",
+            request.method, request.path, scope.connections, scope.round_trips,
+            scope.queries, scope.db_seconds * 1000, scope.rows, scope.statements,
+        )
+        return response
+
+
+class RequestRecorderMiddleware:
+    """Append requests to REQUEST_RECORDING["PATH"] as JSON lines, for load replay.
+
+    One object per request, in the format `benchmarks/replay.py` reads:
+    request_id, ts (epoch seconds), method, path, query, headers
+    (content-type), body (parsed JSON or text; null and flagged body_omitted
+    when over MAX_BODY_BYTES), and the outcome: status, duration_ms and
+    db_round_trips. Values under REDACT_KEYS anywhere in a JSON body (such as
+    passwords) are replaced by REDACTED. Async requests append from a worker
+    thread, off the event loop. Removed from the stack when no PATH is
+    configured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = settings.REQUEST_RECORDING
+        if not config["PATH"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = config["SAMPLE_RATE"]
+        self.max_body = config["MAX_BODY_BYTES"]
+        self.redact_keys = config["REDACT_KEYS"]
+        self.lock = threading.Lock()
+        self.file = open(config["PATH"], "a", buffering=1, encoding="utf-8")
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        entry, started = self.begin(request), time.perf_counter()
+        response = self.get_response(request)
+        self.append(self.finish(entry, response, started))
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+        entry, started = self.begin(request), time.perf_counter()
+        response = await self.get_response(request)
+        await asyncio.to_thread(self.append, self.finish(entry, response, started))
+        return response
+
+    def begin(self, request):
+        body = None
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+        if 0 < length <= self.max_body:
+            # Read now so the handler still sees it (Django caches request.body)
+            raw = request.body
+            try:
+                body = self.redact(json.loads(raw))
+            except ValueError:
+                body = raw.decode("utf-8", errors="replace")
+        entry = {
+            "request_id": uuid.uuid4().hex,
+            "ts": round(time.time(), 6),
+            "method": request.method,
+            "path": request.path,
+            "query": request.META.get("QUERY_STRING", ""),
+            "headers": {"content-type": request.content_type} if length else {},
+            "body": body,
+        }
+        if length > self.max_body:
+            entry["body_omitted"] = True
+        return entry
+
+    def redact(self, value):
+        if isinstance(value, dict):
+            return {
+                key: "REDACTED" if key.lower() in self.redact_keys else self.redact(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, list):
+            return [self.redact(item) for item in value]
+        return value
+
+    @staticmethod
+    def finish(entry, response, started):
+        """The JSON line of `entry` with the outcome of `response`."""
+        # Streaming bodies are still being sent; their time is to the headers
+        entry["status"] = response.status_code
+        entry["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        entry["db_round_trips"] = int(response.get("X-DB-Round-Trips", 0))
+        return json.dumps(entry, default=str) + "\n"
+
+    def append(self, line):
+        with self.lock:
+            self.file.write(line)
@@ -0,0 +1,107 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+# Keyset ("cursor") pagination for the list endpoints.
+#
+# A page is ordered by a sort column plus the primary key as tie-breaker, and
+# the cursor is the (sort value, id) of the last row returned, so fetching the
+# next page is an index range scan from that position however deep it is.
+# Cursors are opaque to clients: base64url-encoded JSON.
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(token, size):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise InvalidCursor(str(exc)) from exc
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("unexpected cursor shape")
+    return values
+
+
+def _cursor_id(value):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise InvalidCursor("cursor id is not an integer")
+    return value
+
+
+def _cursor_time(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError) as exc:
+        raise InvalidCursor("cursor sort value is not a timestamp") from exc
+
+
+class Keyset:
+    """Ordering and cursor predicate for one list endpoint.
+
+    `sort_column` may be None to page on `id_column` alone; otherwise it is a
+    timestamp column. Nullable sort columns are ordered NULLS LAST so rows
+    without a value are still reached.
+    """
+
+    def __init__(self, id_column, sort_column=None, descending=True, nullable=False):
+        self.id_column = id_column
+        self.sort_column = sort_column
+        self.descending = descending
+        self.nullable = nullable
+
+    @property
+    def order_by(self):
+        direction = "DESC" if self.descending else "ASC"
+        if self.sort_column is None:
+            return f"{self.id_column} {direction}"
+        nulls = " NULLS LAST" if self.nullable else ""
+        return f"{self.sort_column} {direction}{nulls}, {self.id_column} {direction}"
+
+    def where(self, token):
+        """Return (sql, params) selecting the rows after `token`, or (None, []).
+
+        The params are the cursor's (sort value as a datetime, id) or (id).
+        """
+        if not token:
+            return None, []
+        op = "<" if self.descending else ">"
+        if self.sort_column is None:
+            (last_id,) = decode_cursor(token, 1)
+            return f"{self.id_column} {op} %s", [_cursor_id(last_id)]
+
+        last_value, last_id = decode_cursor(token, 2)
+        last_id = _cursor_id(last_id)
+        if last_value is None:
+            # Already inside the trailing NULL group
+            return f"({self.sort_column} IS NULL AND {self.id_column} {op} %s)", [last_id]
+        last_value = _cursor_time(last_value)
+        sql = f"({self.sort_column}, {self.id_column}) {op} (%s, %s)"
+        if self.nullable:
+            sql = f"({sql} OR {self.sort_column} IS NULL)"
+        return sql, [last_value, last_id]
+
+    def paginate(self, rows, limit, id_key, sort_key=None):
+        """Split rows fetched with LIMIT limit + 1 into (page, next_cursor).
+
+        `id_key` / `sort_key` index (or key) the row; next_cursor is None on the last page.
+        """
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        last = rows[-1]
+        if self.sort_column is None:
+            return rows, encode_cursor([last[id_key]])
+        return rows, encode_cursor([last[sort_key], last[id_key]])
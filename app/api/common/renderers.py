@@ -0,0 +1,90 @@
+import orjson
+from django.http import HttpResponse, StreamingHttpResponse
+from ninja.renderers import BaseRenderer
+from ninja.responses import NinjaJSONEncoder
+
+# orjson serializes dicts, lists, str/int/float, datetimes, UUIDs and enums in
+# C; anything else (Decimal, timedelta, pydantic models, IP addresses) falls
+# back to the encoder Ninja uses by default, so responses keep their shape.
+_fallback = NinjaJSONEncoder()
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+# Bytes of NDJSON lines written to the client at a time.
+NDJSON_CHUNK_SIZE = 64 * 1024
+
+
+def dumps(data):
+    return orjson.dumps(data, default=_fallback.default, option=OPTIONS)
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = "application/json"
+
+    def render(self, request, data, *, response_status):
+        return dumps(data)
+
+
+def trusted_response(data, status=200, headers=None):
+    """Render data built straight from database rows, skipping response-schema validation.
+
+    Only use this where the rows already have the schema's shape, e.g. from a
+    `schema_rows()` cursor. The route's `response=` schema still documents the
+    payload in OpenAPI.
+    """
+    response = HttpResponse(dumps(data), status=status, content_type="application/json")
+    for name, value in (headers or {}).items():
+        if value is not None:
+            response[name] = value
+    return response
+
+
+def schema_rows(schema):
+    """psycopg row factory producing dicts with exactly the fields of `schema`.
+
+    Columns are matched to fields by name; fields the query does not select
+    get the schema default (None when the field has no default), and columns
+    the schema does not declare are dropped, as validation would.
+    """
+    plan = []
+    for name, field in schema.model_fields.items():
+        default = None if field.is_required() else field.get_default(call_default_factory=True)
+        plan.append((name, default))
+
+    def factory(cursor):
+        index = {column.name: i for i, column in enumerate(cursor.description or ())}
+        columns = [(name, index.get(name), default) for name, default in plan]
+
+        def make_row(values):
+            return {
+                name: values[i] if i is not None else default
+                for name, i, default in columns
+            }
+        return make_row
+    return factory
+
+
+def ndjson_response(rows, headers=None):
+    """Stream an async iterable of dicts as newline-delimited JSON, one object per line.
+
+    Lines are sent in chunks of about NDJSON_CHUNK_SIZE bytes as rows arrive,
+    so memory stays flat and the first chunk goes out as soon as the first
+    rows are read. The status is sent up front; a failure mid-stream ends the
+    body early.
+    """
+    async def lines():
+        chunk, size = [], 0
+        async for row in rows:
+            line = dumps(row) + b"\n"
+            chunk.append(line)
+            size += len(line)
+            if size >= NDJSON_CHUNK_SIZE:
+                yield b"".join(chunk)
+                chunk, size = [], 0
+        if chunk:
+            yield b"".join(chunk)
+
+    response = StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+    for name, value in (headers or {}).items():
+        if value is not None:
+            response[name] = value
+    return response
@@ -0,0 +1,103 @@
+import threading
+import time
+
+# Named hot statements.
+#
+# Handlers run these through `execute()` / `aexecute()` instead of passing the
+# SQL inline: each statement is prepared server-side the first time a pooled
+# connection runs it (psycopg keeps the prepared name per connection), so later
+# calls on that connection skip parsing and planning. Calls are timed per name
+# for profiling; see `statement_stats()`.
+
+STATEMENTS = {
+    # Existence checks
+    "incident_exists": "SELECT incident_id FROM api_incident WHERE incident_id = %s",
+    "alert_exists": "SELECT alert_id, incident_id FROM api_alert WHERE alert_id = %s",
+    "asset_exists": "SELECT asset_id FROM api_asset WHERE asset_id = %s",
+    "vulnerability_exists": "SELECT vulnerability_id FROM api_vulnerability WHERE vulnerability_id = %s",
+    "threat_exists": "SELECT threat_id FROM api_threatintelligence WHERE threat_id = %s",
+    "user_exists": "SELECT user_id FROM api_user WHERE user_id = %s",
+    # Point lookups
+    "incident_status": "SELECT status FROM api_incident WHERE incident_id = %s",
+    "username": "SELECT username FROM api_user WHERE user_id = %s",
+    "alert_by_id": (
+        "SELECT alert_id, source, name, alert_type, alert_time, severity, status, incident_id, "
+        "occurrences, last_seen, asset_id FROM api_alert WHERE alert_id = %s"
+    ),
+    "asset_by_id": (
+        "SELECT asset_id, asset_name, asset_type, location, owner, criticality_level "
+        "FROM api_asset WHERE asset_id = %s"
+    ),
+    "vulnerability_by_id": (
+        "SELECT vulnerability_id, title, description, severity, cve_reference, remediation_steps, "
+        "discovery_date, patch_available FROM api_vulnerability WHERE vulnerability_id = %s"
+    ),
+    "user_by_id": (
+        "SELECT user_id, username, email, role, last_login, is_active, date_joined "
+        "FROM api_user WHERE user_id = %s"
+    ),
+}
+
+_lock = threading.Lock()
+_stats = {}
+
+
+def register(name, sql):
+    """Add a statement defined next to the router that owns it."""
+    existing = STATEMENTS.get(name)
+    if existing is not None and existing != sql:
+        raise ValueError(f"Statement {name!r} is already registered with different SQL")
+    STATEMENTS[name] = sql
+    return name
+
+
+def _record(name, started, failed):
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+        stat["calls"] += 1
+        stat["errors"] += failed
+        stat["total_ms"] += elapsed_ms
+        stat["max_ms"] = max(stat["max_ms"], elapsed_ms)
+
+
+def execute(cursor, name, params):
+    """Run registered statement `name` as a prepared statement on `cursor`."""
+    sql = STATEMENTS[name]
+    started = time.perf_counter()
+    failed = True
+    try:
+        cursor.execute(sql, params, prepare=True)
+        failed = False
+        return cursor
+    finally:
+        _record(name, started, failed)
+
+
+async def aexecute(cursor, name, params):
+    """Async counterpart of `execute()`."""
+    sql = STATEMENTS[name]
+    started = time.perf_counter()
+    failed = True
+    try:
+        await cursor.execute(sql, params, prepare=True)
+        failed = False
+        return cursor
+    finally:
+        _record(name, started, failed)
+
+
+def statement_stats():
+    """Per-statement call counts and latency (ms), for profiling."""
+    with _lock:
+        stats = {name: dict(stat) for name, stat in _stats.items()}
+    for stat in stats.values():
+        stat["mean_ms"] = stat["total_ms"] / stat["calls"] if stat["calls"] else 0.0
+    return stats
+
+
+def reset_statement_stats():
+    with _lock:
+        _stats.clear()
@@ -0,0 +1,393 @@
+"""
+Deterministic synthetic data at benchmark scale.
+
+`generate()` fills every table, association tables included, with rows drawn
+from a seeded NumPy generator and loads them with COPY. The same seed, sizes
+and `end` date always produce the same rows. Sizes scale with the number of
+incidents (see RATIOS) and can be overridden one by one; the data is skewed
+the way production data is: a few assets, vulnerabilities and threat actors
+show up in most links, alert counts per incident are heavy-tailed, most
+incidents are recent and old ones are mostly resolved.
+
+New rows get ids above the existing ones, so the generator can be run on top
+of the seed data or of an earlier run (or after `reset`, which truncates).
+"""
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone
+
+import numpy as np
+
+from app.api.alerts import partitions
+from app.api.common.utils import db_connection
+
+# Rows per incident of every other table (at least the minimum in brackets).
+RATIOS = {
+    "users": (0.001, 20),
+    "assets": (0.1, 50),
+    "vulnerabilities": (0.02, 50),
+    "threats": (0.01, 20),
+    "alerts": (5.0, 50),
+    "asset_vulnerabilities": (0.3, 50),
+    "incident_assets": (2.0, 10),
+    "threat_assets": (0.02, 20),
+    "threat_vulnerabilities": (0.02, 20),
+    "threat_incidents": (0.7, 10),
+    "activity_logs": (2.0, 50),
+}
+
+# Loaded in this order, so every foreign key points at rows already there.
+TABLES = [
+    "api_user", "api_asset", "api_vulnerability", "asset_vulnerabilities", "api_incident",
+    "incident_assets", "api_alert", "api_threatintelligence", "threat_asset_association",
+    "threat_vulnerability_association", "threat_incident_association", "user_activity_logs",
+]
+
+SEQUENCES = [
+    ("api_user", "user_id"), ("api_asset", "asset_id"), ("api_vulnerability", "vulnerability_id"),
+    ("api_incident", "incident_id"), ("api_alert", "alert_id"), ("api_threatintelligence", "threat_id"),
+    ("user_activity_logs", "log_id"),
+]
+
+# Row triggers touching api_threatintelligence once per association row; the
+# generated threats already carry a last_updated, so they are off during the load.
+ROW_TRIGGERS = [
+    ("threat_asset_association", "tr_asset_assoc_touch"),
+    ("threat_vulnerability_association", "tr_vuln_assoc_touch"),
+    ("threat_incident_association", "tr_incident_assoc_touch"),
+]
+
+# (value, weight)
+SEVERITIES = [("low", 40), ("medium", 35), ("high", 18), ("critical", 7)]
+# Critical alerts must name an incident (AlertSchema), so orphans are never critical
+ORPHAN_SEVERITIES = [choice for choice in SEVERITIES if choice[0] != "critical"]
+ROLES = [("user", 60), ("analyst", 30), ("manager", 8), ("admin", 2)]
+ASSET_TYPES = [("Workstation", 45), ("Server", 20), ("Laptop", 15), ("Network", 8),
+               ("Database", 6), ("Virtual Machine", 5), ("IoT Device", 1)]
+LOCATIONS = [("Data Center", 30), ("Cloud", 25), ("HQ Office", 25), ("Branch Office", 15), ("Remote", 5)]
+INCIDENT_TYPES = [("Phishing", 30), ("Malware", 22), ("Unauthorized Access", 15), ("Vulnerability", 12),
+                  ("DDoS", 8), ("Data Breach", 6), ("Insider Threat", 4), ("Ransomware", 3)]
+ALERT_SOURCES = [("SIEM", 30), ("IDS", 25), ("Firewall", 20), ("Antivirus", 12),
+                 ("Email Gateway", 8), ("Network Monitor", 5)]
+ALERT_TYPES = {
+    "SIEM": "Abnormal Login", "IDS": "Signature Match", "Firewall": "Rule Violation",
+    "Antivirus": "Malware Detection", "Email Gateway": "Phishing Detection",
+    "Network Monitor": "Traffic Anomaly",
+}
+ALERT_STATUSES = [("new", 20), ("acknowledged", 15), ("resolved", 40), ("closed", 25)]
+CONFIDENCE_LEVELS = [("low", 30), ("medium", 35), ("high", 25), ("very_high", 10)]
+INDICATOR_TYPES = [("ip_address", 35), ("domain", 25), ("hash", 20), ("url", 12), ("email", 8)]
+VULN_STATUSES = [("Open", 45), ("In Progress", 15), ("Mitigated", 15), ("Resolved", 25)]
+ACTIVITY_TYPES = [("Login", 55), ("Alert Investigation", 15), ("Report Generation", 10),
+                  ("Configuration Change", 8), ("Asset Creation", 7), ("Password Reset", 5)]
+
+# Every synthetic user gets the same (bcrypt) password hash.
+PASSWORD_HASH = "$2a$12$tI3KXJZxFZhJ/d9cu95kZOp4.m496bBgRKuVN9g7xhRHEOy7.EpMe"
+
+# Incidents and alerts are spread over this many days before `end`.
+SPAN_DAYS = 365
+
+
+def sizes_for(incidents, **overrides):
+    """Row counts of every table for `incidents` incidents; keyword arguments override them."""
+    sizes = {"incidents": incidents}
+    for name, (ratio, minimum) in RATIOS.items():
+        sizes[name] = max(int(incidents * ratio), minimum)
+    sizes.update({name: count for name, count in overrides.items() if count is not None})
+    return sizes
+
+
+class _Draw:
+    """Seeded draws shared by the table builders."""
+
+    def __init__(self, seed):
+        self.rng = np.random.default_rng(seed)
+
+    def weighted(self, choices, size):
+        values = np.array([value for value, _ in choices], dtype=object)
+        weights = np.array([weight for _, weight in choices], dtype=np.float64)
+        return values[self.rng.choice(len(values), size=size, p=weights / weights.sum())]
+
+    def popular(self, ids, size, exponent=1.1):
+        """`size` picks from `ids` with Zipf-like popularity (in a random order of ids)."""
+        ranks = np.arange(1, len(ids) + 1, dtype=np.float64)
+        weights = ranks ** -exponent
+        order = self.rng.permutation(ids)
+        return order[self.rng.choice(len(ids), size=size, p=weights / weights.sum())]
+
+    def heavy_tailed(self, parents, total):
+        """Child counts per parent (negative binomial), scaled to about `total`."""
+        mean = total / max(parents, 1)
+        return self.rng.poisson(self.rng.gamma(0.6, mean / 0.6, parents))
+
+    def days_ago(self, size, mean_days):
+        """Ages in days, most of them recent, none older than SPAN_DAYS."""
+        return np.minimum(self.rng.exponential(mean_days, size), SPAN_DAYS)
+
+    def pairs(self, left, right, size, exponent=1.1):
+        """Up to `size` distinct (left, right) pairs; right side skewed by popularity."""
+        a = self.rng.choice(left, size=size)
+        b = self.popular(right, size, exponent)
+        keys = np.unique(a.astype(np.int64) * (int(right.max()) + 1) + b)
+        return keys // (int(right.max()) + 1), keys % (int(right.max()) + 1)
+
+
+def _next_ids(cursor):
+    ids = {}
+    for table, column in SEQUENCES:
+        cursor.execute(f"SELECT COALESCE(MAX({column}), 0) + 1 FROM {table}")
+        ids[table] = cursor.fetchone()[0]
+    return ids
+
+
+def _copy(cursor, table, columns, rows):
+    """COPY `rows` into `table`; returns how many were written."""
+    written = 0
+    with cursor.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+        for row in rows:
+            copy.write_row(row)
+            written += 1
+    return written
+
+
+def _installed_triggers(cursor):
+    cursor.execute(
+        "SELECT tgrelid::regclass::text, tgname FROM pg_trigger WHERE tgname = ANY(%s)",
+        [[trigger for _, trigger in ROW_TRIGGERS]]
+    )
+    return [tuple(row) for row in cursor.fetchall()]
+
+
+def _timestamps(end, days):
+    return [end - timedelta(days=float(d)) for d in days]
+
+
+class _Load:
+    """One generator run: its draws, sizes and first ids, and the COPY of each table."""
+
+    def __init__(self, cursor, draw, sizes, end, first):
+        self.cursor = cursor
+        self.draw = draw
+        self.rng = draw.rng
+        self.sizes = sizes
+        self.end = end
+        self.first = first
+        self.counts = {}
+        self.timings = {}
+
+    def ids(self, table, count):
+        return np.arange(self.first[table], self.first[table] + count)
+
+    def __call__(self, table, columns, rows):
+        started = time.perf_counter()
+        self.counts[table] = _copy(self.cursor, table, columns, rows)
+        self.timings[table] = round(time.perf_counter() - started, 3)
+
+
+def generate(incidents, seed=0, end=None, reset=False, **overrides):
+    """Generate and load the synthetic data set; returns row counts and timings.
+
+    `end` (a naive UTC datetime) is the newest timestamp in the data; it
+    defaults to the start of the current UTC day so reruns on the same day
+    match. Keyword arguments override sizes (see `sizes_for`).
+    """
+    sizes = sizes_for(incidents, **overrides)
+    end = end or datetime.combine(datetime.now(timezone.utc).date(), dt_time())
+    started = time.perf_counter()
+
+    with db_connection() as conn, conn.cursor() as cursor:
+        if reset:
+            cursor.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+        row_triggers = _installed_triggers(cursor)
+        for table, trigger in row_triggers:
+            cursor.execute(f"ALTER TABLE {table} DISABLE TRIGGER {trigger}")
+        load = _Load(cursor, _Draw(seed), sizes, end, _next_ids(cursor))
+
+        user_ids, roles = _users(load)
+        asset_ids = _assets(load, user_ids)
+        vuln_ids = _vulnerabilities(load, asset_ids)
+        incident_ids, age, incident_severity = _incidents(load, user_ids, roles, asset_ids)
+        _alerts(load, incident_ids, age, incident_severity)
+        _threats(load, asset_ids, vuln_ids, incident_ids)
+        _activity_logs(load, user_ids)
+
+        for table, trigger in row_triggers:
+            cursor.execute(f"ALTER TABLE {table} ENABLE TRIGGER {trigger}")
+        for table, column in SEQUENCES:
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), COALESCE(MAX({column}), 0) + 1, false) "
+                f"FROM {table}"
+            )
+        for table in TABLES:
+            cursor.execute(f"ANALYZE {table}")
+
+    # Alerts older than the existing partitions landed in the default one
+    partitions.maintain()
+
+    return {
+        "seed": seed,
+        "end": end.isoformat(),
+        "rows": load.counts,
+        "copy_s": load.timings,
+        "total_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def _users(load):
+    draw, rng, end = load.draw, load.rng, load.end
+    user_ids = load.ids("api_user", load.sizes["users"])
+    roles = draw.weighted(ROLES, len(user_ids))
+    joined = _timestamps(end, rng.uniform(30, 3 * SPAN_DAYS, len(user_ids)))
+    logged_in = rng.exponential(7, len(user_ids))
+    active = rng.random(len(user_ids)) > 0.05
+    load("api_user", ["user_id", "username", "email", "role", "password", "last_login", "is_active", "date_joined"], (
+        (int(uid), f"user{uid}", f"user{uid}@example.com", roles[i], PASSWORD_HASH,
+         end - timedelta(days=float(logged_in[i])) if logged_in[i] < 90 else None, bool(active[i]), joined[i])
+        for i, uid in enumerate(user_ids)
+    ))
+    return user_ids, roles
+
+
+def _assets(load, user_ids):
+    draw = load.draw
+    asset_ids = load.ids("api_asset", load.sizes["assets"])
+    asset_types = draw.weighted(ASSET_TYPES, len(asset_ids))
+    locations = draw.weighted(LOCATIONS, len(asset_ids))
+    criticality = draw.weighted(SEVERITIES, len(asset_ids))
+    owners = draw.popular(user_ids, len(asset_ids))
+    load("api_asset", ["asset_id", "asset_name", "asset_type", "location", "owner", "criticality_level"], (
+        (int(aid), f"{asset_types[i]} {aid}", asset_types[i], locations[i], int(owners[i]), criticality[i])
+        for i, aid in enumerate(asset_ids)
+    ))
+    return asset_ids
+
+
+def _vulnerabilities(load, asset_ids):
+    """Vulnerabilities and the assets they were found on."""
+    draw, rng, end = load.draw, load.rng, load.end
+    vuln_ids = load.ids("api_vulnerability", load.sizes["vulnerabilities"])
+    vuln_severity = draw.weighted(SEVERITIES, len(vuln_ids))
+    discovered = _timestamps(end, rng.uniform(0, 4 * SPAN_DAYS, len(vuln_ids)))
+    patched = rng.random(len(vuln_ids)) < 0.7
+    load("api_vulnerability", ["vulnerability_id", "title", "description", "severity", "cve_reference",
+                               "remediation_steps", "discovery_date", "patch_available"], (
+        (int(vid), f"Vulnerability {vid}", "Synthetic vulnerability", vuln_severity[i],
+         f"CVE-{discovered[i].year}-{10000 + int(vid)}", "Apply the vendor patch", discovered[i], bool(patched[i]))
+        for i, vid in enumerate(vuln_ids)
+    ))
+
+    av_assets, av_vulns = draw.pairs(asset_ids, vuln_ids, load.sizes["asset_vulnerabilities"])
+    av_status = draw.weighted(VULN_STATUSES, len(av_assets))
+    av_days = rng.uniform(0, SPAN_DAYS, len(av_assets))
+    load("asset_vulnerabilities", ["asset_id", "vulnerability_id", "date_discovered", "status"], (
+        (int(av_assets[i]), int(av_vulns[i]), (end - timedelta(days=float(av_days[i]))).date(), av_status[i])
+        for i in range(len(av_assets))
+    ))
+    return vuln_ids
+
+
+def _incidents(load, user_ids, roles, asset_ids):
+    """Incidents and their assets; old ones are mostly resolved or closed."""
+    draw, rng, end = load.draw, load.rng, load.end
+    incident_ids = load.ids("api_incident", load.sizes["incidents"])
+    age = draw.days_ago(len(incident_ids), SPAN_DAYS / 6)
+    reported = _timestamps(end, age)
+    settled = rng.random(len(incident_ids)) < 1 - np.exp(-age / 10)
+    statuses = np.where(
+        settled,
+        np.where(rng.random(len(incident_ids)) < 0.6, "resolved", "closed"),
+        draw.weighted([("open", 55), ("investigating", 35), ("contained", 10)], len(incident_ids)),
+    )
+    resolve_days = np.minimum(rng.exponential(3, len(incident_ids)), age)
+    incident_types = draw.weighted(INCIDENT_TYPES, len(incident_ids))
+    incident_severity = draw.weighted(SEVERITIES, len(incident_ids))
+    analysts = user_ids[np.isin(roles, ["analyst", "manager"])]
+    assignees = draw.popular(analysts if len(analysts) else user_ids, len(incident_ids))
+    load("api_incident", ["incident_id", "incident_type", "description", "severity", "status",
+                          "assigned_to_id", "reported_date", "resolved_date"], (
+        (int(iid), incident_types[i], f"Synthetic {incident_types[i].lower()} incident", incident_severity[i],
+         statuses[i], int(assignees[i]), reported[i],
+         reported[i] + timedelta(days=float(resolve_days[i])) if settled[i] else None)
+        for i, iid in enumerate(incident_ids)
+    ))
+
+    ia_incidents, ia_assets = draw.pairs(incident_ids, asset_ids, load.sizes["incident_assets"])
+    impact = draw.weighted(SEVERITIES, len(ia_incidents))
+    load("incident_assets", ["incident_id", "asset_id", "impact_level"], (
+        (int(ia_incidents[i]), int(ia_assets[i]), impact[i]) for i in range(len(ia_incidents))
+    ))
+    return incident_ids, age, incident_severity
+
+
+def _alerts(load, incident_ids, age, incident_severity):
+    """Alerts: heavy-tailed per incident, a fifth not linked to any incident."""
+    draw, rng, end = load.draw, load.rng, load.end
+    linked = int(load.sizes["alerts"] * 0.8)
+    per_incident = draw.heavy_tailed(len(incident_ids), linked)
+    owner_index = np.repeat(np.arange(len(incident_ids)), per_incident)
+    orphans = max(load.sizes["alerts"] - len(owner_index), 0)
+    alert_ids = load.ids("api_alert", len(owner_index) + orphans)
+    alert_age = np.concatenate([
+        np.maximum(age[owner_index] + rng.uniform(-1, 0.5, len(owner_index)), 0),
+        draw.days_ago(orphans, SPAN_DAYS / 12),
+    ])
+    alert_severity = np.concatenate([
+        np.where(rng.random(len(owner_index)) < 0.6, incident_severity[owner_index],
+                 draw.weighted(SEVERITIES, len(owner_index))),
+        draw.weighted(ORPHAN_SEVERITIES, orphans),
+    ])
+    alert_sources = draw.weighted(ALERT_SOURCES, len(alert_ids))
+    alert_statuses = draw.weighted(ALERT_STATUSES, len(alert_ids))
+    alert_incidents = [int(incident_ids[i]) for i in owner_index] + [None] * orphans
+    load("api_alert", ["alert_id", "source", "name", "alert_type", "alert_time", "severity", "status",
+                       "incident_id"], (
+        (int(aid), alert_sources[i], f"{alert_sources[i]} alert", ALERT_TYPES[alert_sources[i]],
+         end - timedelta(days=float(alert_age[i])), alert_severity[i], alert_statuses[i], alert_incidents[i])
+        for i, aid in enumerate(alert_ids)
+    ))
+
+
+def _threats(load, asset_ids, vuln_ids, incident_ids):
+    """Threat intelligence and its associations."""
+    draw, rng, end = load.draw, load.rng, load.end
+    threat_ids = load.ids("api_threatintelligence", load.sizes["threats"])
+    indicator_types = draw.weighted(INDICATOR_TYPES, len(threat_ids))
+    confidence = draw.weighted(CONFIDENCE_LEVELS, len(threat_ids))
+    identified = rng.uniform(0, 2 * SPAN_DAYS, len(threat_ids))
+    updated = identified * rng.random(len(threat_ids))
+    cves = draw.popular(vuln_ids, len(threat_ids))
+    load("api_threatintelligence", ["threat_id", "threat_actor_name", "indicator_type", "indicator_value",
+                                    "confidence_level", "description", "related_cve", "date_identified",
+                                    "last_updated"], (
+        (int(tid), f"Actor {tid % 500}", indicator_types[i], f"{indicator_types[i]}-{tid}", confidence[i],
+         "Synthetic threat intelligence", f"CVE-{10000 + int(cves[i])}",
+         (end - timedelta(days=float(identified[i]))).date(), (end - timedelta(days=float(updated[i]))).date())
+        for i, tid in enumerate(threat_ids)
+    ))
+
+    for table, column, ids, count in (
+        ("threat_asset_association", "asset_id", asset_ids, load.sizes["threat_assets"]),
+        ("threat_vulnerability_association", "vulnerability_id", vuln_ids, load.sizes["threat_vulnerabilities"]),
+    ):
+        left, right = draw.pairs(threat_ids, ids, count)
+        load(table, ["threat_id", column, "notes"], (
+            (int(left[i]), int(right[i]), "Synthetic association") for i in range(len(left))
+        ))
+    # Popular threat actors are behind most incidents
+    ti_incidents, ti_threats = draw.pairs(incident_ids, threat_ids, load.sizes["threat_incidents"], exponent=1.3)
+    load("threat_incident_association", ["threat_id", "incident_id", "notes"], (
+        (int(ti_threats[i]), int(ti_incidents[i]), "Synthetic association") for i in range(len(ti_incidents))
+    ))
+
+
+def _activity_logs(load, user_ids):
+    """Activity logs: a few users do most of the work."""
+    draw = load.draw
+    log_ids = load.ids("user_activity_logs", load.sizes["activity_logs"])
+    log_users = draw.popular(user_ids, len(log_ids))
+    activity = draw.weighted(ACTIVITY_TYPES, len(log_ids))
+    log_days = draw.days_ago(len(log_ids), SPAN_DAYS / 4)
+    load("user_activity_logs", ["log_id", "user_id", "activity_type", "timestamp", "description"], (
+        (int(lid), int(log_users[i]), activity[i], load.end - timedelta(days=float(log_days[i])),
+         f"Synthetic {activity[i].lower()}")
+        for i, lid in enumerate(log_ids)
+    ))
@@ -1,12 +1,460 @@
+import asyncio
+import atexit
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
 import psycopg
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
 
 from django.conf import settings
 
-def get_connection():
-    return psycopg.connect(
+from app.api.common import metrics
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# The async pool is bound to the event loop it was opened on, so it is only
+# used when the ASGI entrypoint opts in (Daphne runs a single long-lived loop).
+_async_pool = None
+_async_pool_loop = None
+_async_pool_enabled = False
+
+# Counters kept next to the pool so monitoring can see how long handlers
+# wait for a connection and how many connections are currently handed out.
+_stats_lock = threading.Lock()
+_stats = {
+    "checkouts": 0,
+    "checkout_errors": 0,
+    "checkout_ms_total": 0.0,
+    "checkout_ms_max": 0.0,
+    "waiting": 0,
+    "in_use": 0,
+}
+
+# Unit of work for the current HTTP request (see RequestScopeMiddleware).
+_request_scope = ContextVar("db_request_scope", default=None)
+
+
+class RequestScope:
+    """Connections borrowed on behalf of one request.
+
+    The first `db_connection()` / `async_db_connection()` in the request checks
+    a connection out; nested calls reuse it and the transaction is committed
+    or rolled back once, when the request finishes.
+    """
+
+    def __init__(self):
+        self.connection = None
+        self.async_connection = None
+        self.connections = 0
+        self.round_trips = 0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.statements = {}  # fingerprint id -> executions
+        self.failed = False
+        self.after_commit = []
+
+
+class CountingCursor(psycopg.Cursor):
+    def execute(self, query, *args, **kwargs):
+        _count_round_trip()
+        started, failed = time.perf_counter(), True
+        try:
+            super().execute(query, *args, **kwargs)
+            failed = False
+            return self
+        finally:
+            _record_statement(self, query, started, failed)
+
+    def executemany(self, query, *args, **kwargs):
+        _count_round_trip()
+        started, failed = time.perf_counter(), True
+        try:
+            super().executemany(query, *args, **kwargs)
+            failed = False
+        finally:
+            _record_statement(self, query, started, failed)
+
+
+class AsyncCountingCursor(psycopg.AsyncCursor):
+    async def execute(self, query, *args, **kwargs):
+        _count_round_trip()
+        started, failed = time.perf_counter(), True
+        try:
+            await super().execute(query, *args, **kwargs)
+            failed = False
+            return self
+        finally:
+            _record_statement(self, query, started, failed)
+
+    async def executemany(self, query, *args, **kwargs):
+        _count_round_trip()
+        started, failed = time.perf_counter(), True
+        try:
+            await super().executemany(query, *args, **kwargs)
+            failed = False
+        finally:
+            _record_statement(self, query, started, failed)
+
+
+def _count_round_trip():
+    scope = _request_scope.get()
+    if scope is not None:
+        scope.round_trips += 1
+
+
+def _record_statement(cursor, query, started, failed):
+    """Time one statement against its fingerprint and the current request (metrics.py)."""
+    if not metrics.enabled():
+        return
+    seconds = time.perf_counter() - started
+    rows = cursor.rowcount if not failed and cursor.description is not None and cursor.rowcount > 0 else 0
+    if isinstance(query, bytes):
+        query = query.decode()
+    elif not isinstance(query, str):
+        query = query.as_string(cursor)  # psycopg.sql.Composed
+    key = metrics.fingerprint(query)
+    metrics.record_statement(key, seconds, rows, failed)
+    scope = _request_scope.get()
+    if scope is not None:
+        scope.queries += 1
+        scope.db_seconds += seconds
+        scope.rows += rows
+        scope.statements[key[0]] = scope.statements.get(key[0], 0) + 1
+
+
+def _configure(conn):
+    conn.cursor_factory = CountingCursor
+
+
+async def _configure_async(conn):
+    conn.cursor_factory = AsyncCountingCursor
+
+
+def _conninfo():
+    return psycopg.conninfo.make_conninfo(
         dbname=settings.DATABASES['default']["NAME"],
         user=settings.DATABASES['default']["USER"],
         password=settings.DATABASES['default']["PASSWORD"],
         host=settings.DATABASES['default']["HOST"],
         port=settings.DATABASES['default']["PORT"],
-    )
\ No newline at end of file
+    )
+
+
+def get_connection():
+    """Open a dedicated, unpooled connection.
+
+    Only use this for maintenance work that must not share a pooled session
+    (e.g. DROP DATABASE with autocommit). Handlers use `db_connection()`.
+    """
+    return psycopg.connect(_conninfo())
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = settings.DB_POOL
+                _pool = ConnectionPool(
+                    _conninfo(),
+                    min_size=config["MIN_SIZE"],
+                    max_size=config["MAX_SIZE"],
+                    max_idle=config["MAX_IDLE"],
+                    max_lifetime=config["MAX_LIFETIME"],
+                    timeout=config["TIMEOUT"],
+                    check=ConnectionPool.check_connection,
+                    configure=_configure,
+                    name="cyber",
+                    open=True,
+                )
+                atexit.register(close_pool)
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def _checkout():
+    pool = get_pool()
+    with _stats_lock:
+        _stats["waiting"] += 1
+    started = time.perf_counter()
+    try:
+        conn = pool.getconn()
+    except Exception:
+        _record_checkout_error()
+        raise
+    _record_checkout(started)
+    return conn
+
+
+def _checkin(conn):
+    get_pool().putconn(conn)
+    _record_checkin()
+
+
+@contextmanager
+def db_connection():
+    """Borrow a connection from the pool for the duration of the block.
+
+    The transaction is committed when the block exits normally and rolled
+    back if it raises; the connection always goes back to the pool. Inside a
+    request scope the request's connection is reused instead, and the scope
+    commits or rolls back when the request ends.
+    """
+    scope = _request_scope.get()
+    if scope is not None:
+        if scope.connection is None:
+            scope.connection = _checkout()
+            scope.connections += 1
+        try:
+            yield scope.connection
+        except BaseException:
+            scope.failed = True
+            raise
+        return
+
+    conn = _checkout()
+    try:
+        with conn:
+            yield conn
+    finally:
+        _checkin(conn)
+
+
+def _record_checkout(started):
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _stats_lock:
+        _stats["waiting"] -= 1
+        _stats["in_use"] += 1
+        _stats["checkouts"] += 1
+        _stats["checkout_ms_total"] += elapsed_ms
+        _stats["checkout_ms_max"] = max(_stats["checkout_ms_max"], elapsed_ms)
+
+
+def _record_checkout_error():
+    with _stats_lock:
+        _stats["waiting"] -= 1
+        _stats["checkout_errors"] += 1
+
+
+def _record_checkin():
+    with _stats_lock:
+        _stats["in_use"] -= 1
+
+
+def enable_async_pool():
+    """Allow `async_db_connection()` to keep a pool on the server event loop."""
+    global _async_pool_enabled
+    _async_pool_enabled = True
+
+
+async def get_async_pool():
+    """Return the async pool for the running loop, or None if unavailable.
+
+    Outside the ASGI server (runserver, test client, management commands)
+    async views run on short-lived loops, so no pool is kept there.
+    """
+    global _async_pool, _async_pool_loop
+    if not _async_pool_enabled:
+        return None
+    loop = asyncio.get_running_loop()
+    if _async_pool is None:
+        config = settings.DB_POOL
+        _async_pool_loop = loop
+        _async_pool = AsyncConnectionPool(
+            _conninfo(),
+            min_size=config["MIN_SIZE"],
+            max_size=config["ASYNC_MAX_SIZE"],
+            max_idle=config["MAX_IDLE"],
+            max_lifetime=config["MAX_LIFETIME"],
+            timeout=config["TIMEOUT"],
+            check=AsyncConnectionPool.check_connection,
+            configure=_configure_async,
+            name="cyber-async",
+            open=False,
+        )
+        await _async_pool.open(wait=False)
+    if _async_pool_loop is not loop:
+        return None
+    return _async_pool
+
+
+async def _acheckout():
+    pool = await get_async_pool()
+    with _stats_lock:
+        _stats["waiting"] += 1
+    started = time.perf_counter()
+    try:
+        if pool is not None:
+            conn = await pool.getconn()
+        else:
+            conn = await psycopg.AsyncConnection.connect(
+                _conninfo(), cursor_factory=AsyncCountingCursor
+            )
+    except Exception:
+        _record_checkout_error()
+        raise
+    _record_checkout(started)
+    return conn
+
+
+async def _acheckin(conn):
+    pool = getattr(conn, "_pool", None)
+    if pool is not None:
+        await pool.putconn(conn)
+    else:
+        await conn.close()
+    _record_checkin()
+
+
+@asynccontextmanager
+async def async_db_connection():
+    """Async counterpart of `db_connection()` for `async def` handlers.
+
+    One-off connections (no async pool on this loop) are never kept in the
+    request scope, since the loop they belong to may not outlive the block.
+    """
+    scope = _request_scope.get()
+    if scope is not None and await get_async_pool() is not None:
+        if scope.async_connection is None:
+            scope.async_connection = await _acheckout()
+            scope.connections += 1
+        try:
+            yield scope.async_connection
+        except BaseException:
+            scope.failed = True
+            raise
+        return
+
+    conn = await _acheckout()
+    try:
+        async with conn:
+            yield conn
+    finally:
+        await _acheckin(conn)
+
+
+async def astream_rows(query, params=None, row_factory=None, batch_size=1000):
+    """Yield the rows of `query` from a server-side cursor, `batch_size` at a time.
+
+    Meant for streaming responses, which are iterated after the request scope
+    has ended: the rows are read in a transaction on a connection of their own,
+    released as soon as the iteration finishes or is abandoned.
+    """
+    conn = await _acheckout()
+    try:
+        async with conn:
+            async with conn.cursor(name="stream_rows", row_factory=row_factory) as cursor:
+                cursor.itersize = batch_size
+                _count_round_trip()
+                await cursor.execute(query, params)
+                async for row in cursor:
+                    yield row
+    finally:
+        await _acheckin(conn)
+
+
+def on_commit(callback):
+    """Run `callback` once the current request's transaction has committed.
+
+    Outside a request scope `db_connection()` commits per block, so the
+    callback runs immediately. Callbacks are dropped on rollback.
+    """
+    scope = _request_scope.get()
+    if scope is None:
+        callback()
+    else:
+        scope.after_commit.append(callback)
+
+
+def _run_after_commit(scope):
+    callbacks, scope.after_commit = scope.after_commit, []
+    for callback in callbacks:
+        callback()
+
+
+def begin_request_scope():
+    """Start a unit of work for the current request; returns (scope, token)."""
+    scope = RequestScope()
+    return scope, _request_scope.set(scope)
+
+
+def end_request_scope(scope, token, failed=False):
+    """Commit (or roll back) the request's transaction and release its connection."""
+    _request_scope.reset(token)
+    if scope.connection is not None:
+        _finish_sync_connection(scope, failed)
+    if not (failed or scope.failed):
+        _run_after_commit(scope)
+
+
+async def aend_request_scope(scope, token, failed=False):
+    """Async counterpart of `end_request_scope()`."""
+    _request_scope.reset(token)
+    conn = scope.async_connection
+    try:
+        if conn is not None:
+            try:
+                if failed or scope.failed:
+                    await conn.rollback()
+                else:
+                    scope.round_trips += 1
+                    await conn.commit()
+            finally:
+                await _acheckin(conn)
+    finally:
+        if scope.connection is not None:
+            # Sync handlers ran in a worker thread; finish their transaction off-loop.
+            await asyncio.to_thread(_finish_sync_connection, scope, failed)
+    if scope.after_commit and not (failed or scope.failed):
+        await asyncio.to_thread(_run_after_commit, scope)
+
+
+def _finish_sync_connection(scope, failed):
+    conn = scope.connection
+    try:
+        if failed or scope.failed:
+            conn.rollback()
+        else:
+            scope.round_trips += 1
+            conn.commit()
+    finally:
+        _checkin(conn)
+
+
+def pool_stats():
+    """Snapshot of pool usage for monitoring."""
+    with _stats_lock:
+        stats = dict(_stats)
+    checkouts = stats["checkouts"]
+    stats["checkout_ms_avg"] = stats["checkout_ms_total"] / checkouts if checkouts else 0.0
+    if _pool is not None:
+        pool = _pool.get_stats()
+        stats.update({
+            "pool_min": pool.get("pool_min", 0),
+            "pool_max": pool.get("pool_max", 0),
+            "pool_size": pool.get("pool_size", 0),
+            "pool_available": pool.get("pool_available", 0),
+            "connections_errors": pool.get("connections_errors", 0),
+            "connections_lost": pool.get("connections_lost", 0),
+            "requests_queued": pool.get("requests_queued", 0),
+            "requests_errors": pool.get("requests_errors", 0),
+        })
+    if _async_pool is not None:
+        pool = _async_pool.get_stats()
+        stats.update({
+            "async_pool_size": pool.get("pool_size", 0),
+            "async_pool_available": pool.get("pool_available", 0),
+        })
+    return stats
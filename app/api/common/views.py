@@ -0,0 +1,54 @@
+from django.http import Http404, HttpResponse
+
+from app.api.alerts.correlation import correlation_stats
+from app.api.alerts.ingest import dedup_stats
+from app.api.common import metrics
+from app.api.common.utils import pool_stats
+
+# pool_stats() keys exported as gauges / counters: {key: (metric, help)}
+POOL_GAUGES = {
+    "in_use": ("cyber_db_pool_in_use", "Connections handed out."),
+    "waiting": ("cyber_db_pool_waiting", "Callers waiting for a connection."),
+    "pool_size": ("cyber_db_pool_size", "Connections open in the sync pool."),
+    "pool_available": ("cyber_db_pool_available", "Idle connections in the sync pool."),
+    "async_pool_size": ("cyber_db_async_pool_size", "Connections open in the async pool."),
+    "async_pool_available": ("cyber_db_async_pool_available", "Idle connections in the async pool."),
+}
+POOL_COUNTERS = {
+    "checkouts": ("cyber_db_pool_checkouts_total", "Connections checked out."),
+    "checkout_errors": ("cyber_db_pool_checkout_errors_total", "Failed checkouts."),
+}
+# dedup_stats() keys, likewise
+DEDUP_GAUGES = {
+    "lru_entries": ("cyber_alert_dedup_lru_entries", "Dedup windows remembered by this process."),
+}
+DEDUP_COUNTERS = {
+    "created": ("cyber_alert_dedup_created_total", "Alerts stored as new."),
+    "deduplicated": ("cyber_alert_dedup_deduplicated_total", "Alerts counted on an existing alert."),
+    "lru_hits": ("cyber_alert_dedup_lru_hits_total", "Dedup windows found in the process LRU."),
+    "lru_misses": ("cyber_alert_dedup_lru_misses_total", "Dedup windows looked up in the database."),
+}
+# correlation_stats() keys
+CORRELATION_COUNTERS = {
+    "correlated": ("cyber_alert_correlation_correlated_total", "New alerts linked to an incident by correlation."),
+    "orphaned": ("cyber_alert_correlation_orphaned_total", "New alerts left without an incident."),
+    "incidents_opened": ("cyber_alert_correlation_incidents_opened_total", "Incidents opened by correlation."),
+}
+
+
+def prometheus_metrics(request):
+    """Prometheus scrape endpoint of this process (metrics.py)."""
+    if not metrics.enabled():
+        raise Http404
+    stats = pool_stats()
+    gauges = {name: (text, stats[key]) for key, (name, text) in POOL_GAUGES.items() if key in stats}
+    counters = {name: (text, stats[key]) for key, (name, text) in POOL_COUNTERS.items() if key in stats}
+    counters["cyber_db_pool_checkout_seconds_total"] = (
+        "Time spent waiting for connections.", stats["checkout_ms_total"] / 1000
+    )
+    dedup = dedup_stats()
+    gauges.update({name: (text, dedup[key]) for key, (name, text) in DEDUP_GAUGES.items()})
+    counters.update({name: (text, dedup[key]) for key, (name, text) in DEDUP_COUNTERS.items()})
+    correlation = correlation_stats()
+    counters.update({name: (text, correlation[key]) for key, (name, text) in CORRELATION_COUNTERS.items()})
+    return HttpResponse(metrics.render(gauges, counters), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,98 @@
+"""
+Keeps the materialized incident dashboard fresh.
+
+Statement-level triggers on every table the dashboard reads record the
+writing transaction in `incident_dashboard_change` and NOTIFY
+`incident_dashboard_dirty`. A background thread LISTENs for that channel and
+runs `REFRESH MATERIALIZED VIEW CONCURRENTLY`, so readers are never blocked.
+A refresh first deletes the changes committed so far; the refresh itself
+runs on a later snapshot, so it covers them, while changes still in flight
+keep their rows and mark the view stale until the next refresh.
+`incident_dashboard_refresh` records when the last refresh ran.
+"""
+import logging
+import threading
+import time
+
+import psycopg
+from django.conf import settings
+
+from app.api.common.utils import db_connection, get_connection
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "incident_dashboard_dirty"
+
+# Shared by every API process so only one of them refreshes at a time.
+REFRESH_LOCK_KEY = 7_340_001
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def refresh_dashboard(force=False):
+    """Refresh the materialized view if it has pending changes (or `force`).
+
+    Returns True when a refresh ran. Another process already refreshing, or
+    the view not being installed yet, is not an error.
+    """
+    try:
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", [REFRESH_LOCK_KEY])
+            if not cursor.fetchone()[0]:
+                return False
+            cursor.execute(
+                """
+                SELECT refreshed_at IS NULL OR refreshed_at < NOW() - make_interval(secs => %s)
+                FROM incident_dashboard_refresh
+                """,
+                [settings.DASHBOARD_REFRESH["MAX_AGE"]]
+            )
+            too_old = cursor.fetchone()[0]
+            cursor.execute("DELETE FROM incident_dashboard_change")
+            if not (force or too_old or cursor.rowcount):
+                return False
+
+            started = time.perf_counter()
+            cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY incident_management_dashboard_mv")
+            cursor.execute(
+                """
+                UPDATE incident_dashboard_refresh
+                SET refreshed_at = NOW(), duration_ms = %s
+                """,
+                [(time.perf_counter() - started) * 1000]
+            )
+        return True
+    except psycopg.errors.UndefinedTable:
+        return False
+
+
+def _listen_forever():
+    config = settings.DASHBOARD_REFRESH
+    while True:
+        try:
+            conn = get_connection()
+            conn.autocommit = True
+            with conn:
+                conn.execute(f"LISTEN {CHANNEL}")
+                refresh_dashboard()
+                while True:
+                    notified = any(True for _ in conn.notifies(timeout=config["INTERVAL"], stop_after=1))
+                    if notified:
+                        # Let a burst of writes settle into one refresh
+                        time.sleep(config["DEBOUNCE"])
+                        for _ in conn.notifies(timeout=0):
+                            pass
+                    refresh_dashboard()
+        except Exception:
+            logger.exception("Incident dashboard refresher failed; retrying")
+            time.sleep(config["INTERVAL"])
+
+
+def start_refresher():
+    """Start the background refresher thread once per process."""
+    global _thread
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_listen_forever, name="dashboard-refresh", daemon=True)
+            _thread.start()
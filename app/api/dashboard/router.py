@@ -1,14 +1,21 @@
 from ninja import Router, Query
 from typing import Optional
+import json
 
+from django.http import HttpResponse
 
 from psycopg import OperationalError
 
-from app.api.common.utils import get_connection
+from app.api.common import db_objects
+from app.api.common.pagination import MAX_LIMIT, InvalidCursor, Keyset
+from app.api.common.utils import db_connection
+from app.api.dashboard.refresh import refresh_dashboard
 from app.api.dashboard.schemas import PaginatedIncidentDashboard, IncidentDashboardFilterParams
 
 router = Router(tags=["dashboard"])
 
+DASHBOARD_KEYSET = Keyset("incident_id", "reported_date", descending=True, nullable=True)
+
 
 
 
@@ -18,16 +25,76 @@ class SimpleMessage(Schema):
     success: bool
     detail: str
 
+# Tables the dashboard aggregates; a write to any of them marks it stale.
+DASHBOARD_SOURCE_TABLES = [
+    "api_incident",
+    "api_user",
+    "incident_assets",
+    "api_asset",
+    "asset_vulnerabilities",
+    "api_vulnerability",
+    "threat_incident_association",
+    "api_threatintelligence",
+    "api_alert",
+]
+
+# Refresh bookkeeping and change tracking, deployed by db_objects so they
+# exist before the dashboard is first created or read.
+DASHBOARD_OBJECTS = [
+    db_objects.register("incident_dashboard_refresh", "table", """
+        CREATE TABLE IF NOT EXISTS incident_dashboard_refresh (
+          id               BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+          refreshed_at     TIMESTAMPTZ,
+          duration_ms      DOUBLE PRECISION
+        );
+        INSERT INTO incident_dashboard_refresh DEFAULT VALUES ON CONFLICT (id) DO NOTHING;
+    """),
+    # One row per writing transaction since the last refresh. Rows appear
+    # when their writes commit, so a refresh never counts a change it could
+    # not see.
+    db_objects.register("incident_dashboard_change", "table", """
+        CREATE TABLE IF NOT EXISTS incident_dashboard_change (
+          xact_id xid8 PRIMARY KEY
+        );
+    """),
+    db_objects.register("mark_incident_dashboard_dirty", "function", """
+        CREATE OR REPLACE FUNCTION mark_incident_dashboard_dirty()
+        RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+          INSERT INTO incident_dashboard_change VALUES (pg_current_xact_id()) ON CONFLICT DO NOTHING;
+          PERFORM pg_notify('incident_dashboard_dirty', '');
+          RETURN NULL;
+        END;
+        $$;
+    """),
+    db_objects.register("trg_incident_dashboard_dirty", "trigger", "".join(
+        f"""
+        DROP TRIGGER IF EXISTS trg_incident_dashboard_dirty ON {table};
+        CREATE TRIGGER trg_incident_dashboard_dirty
+          AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+          FOR EACH STATEMENT EXECUTE FUNCTION mark_incident_dashboard_dirty();
+        """
+        for table in DASHBOARD_SOURCE_TABLES
+    )),
+]
+
+
 @router.post("/create_view/", response=SimpleMessage)
 def create_view(request):
     """
-    Creates or replaces the `refresh_incident_management_dashboard_view` stored procedure
-    which in turn (re)creates the `incident_management_dashboard` view.
+    (Re)creates the dashboard: the `incident_management_dashboard_mv` materialized view
+    with its unique index and the `incident_management_dashboard` view on top of it (which
+    adds the live resolution time). The refresh bookkeeping and change triggers
+    (DASHBOARD_OBJECTS) are installed first if they are missing.
     """
     try:
-        conn = get_connection()
-        view = """
-          CREATE OR REPLACE VIEW incident_management_dashboard AS
+        ddl = """
+          DROP VIEW IF EXISTS incident_management_dashboard;
+          DROP MATERIALIZED VIEW IF EXISTS incident_management_dashboard_mv;
+
+          CREATE MATERIALIZED VIEW incident_management_dashboard_mv AS
           SELECT 
               i.incident_id,
               i.incident_type,
@@ -52,13 +119,7 @@ def create_view(request):
               COUNT(DISTINCT al.alert_id)             AS related_alerts_count,
               MAX(al.severity)                        AS highest_alert_severity,
               COUNT(DISTINCT CASE WHEN al.status = 'new' THEN al.alert_id END)
-                                                     AS unacknowledged_alerts_count,
-              CASE 
-                WHEN i.status IN ('resolved','closed') THEN
-                  EXTRACT(EPOCH FROM (i.resolved_date - i.reported_date))/3600
-                ELSE
-                  EXTRACT(EPOCH FROM (NOW() - i.reported_date))/3600
-              END                                     AS resolution_time_hours
+                                                     AS unacknowledged_alerts_count
           FROM api_incident i
           LEFT JOIN api_user u    ON i.assigned_to_id = u.user_id
           LEFT JOIN incident_assets ia ON ia.incident_id = i.incident_id
@@ -84,29 +145,50 @@ def create_view(request):
               u.username,
               u.email,
               u.role
-          ORDER BY 
-            CASE i.status
-              WHEN 'open'          THEN 1
-              WHEN 'investigating' THEN 2
-              WHEN 'resolved'      THEN 3
-              WHEN 'closed'        THEN 4
-              ELSE 5
-            END,
-            CASE i.severity
-              WHEN 'critical' THEN 1
-              WHEN 'high'     THEN 2
-              WHEN 'medium'   THEN 3
-              WHEN 'low'      THEN 4
-              ELSE 5
-            END,
-            i.reported_date DESC;
+          WITH NO DATA;
+
+          -- Required by REFRESH ... CONCURRENTLY
+          CREATE UNIQUE INDEX incident_management_dashboard_mv_pk
+            ON incident_management_dashboard_mv (incident_id);
+          CREATE INDEX incident_management_dashboard_mv_reported
+            ON incident_management_dashboard_mv (reported_date DESC NULLS LAST, incident_id DESC);
+          CREATE INDEX incident_management_dashboard_mv_status
+            ON incident_management_dashboard_mv (incident_status, incident_severity);
+
+          CREATE VIEW incident_management_dashboard AS
+          SELECT d.*,
+                 CASE
+                   WHEN d.incident_status IN ('resolved','closed') THEN
+                     EXTRACT(EPOCH FROM (d.resolved_date - d.reported_date))/3600
+                   ELSE
+                     EXTRACT(EPOCH FROM (NOW() - d.reported_date))/3600
+                 END AS resolution_time_hours
+          FROM incident_management_dashboard_mv d;
+
         """
-        with conn.cursor() as cursor:
-            cursor.execute(view)
-        conn.commit()
-        return {"success": True, "detail": "View created or replaced successfully"}
+        result = db_objects.install([obj.name for obj in DASHBOARD_OBJECTS])
+        if result["skipped"]:
+            skipped = "; ".join(result["skipped"].values())
+            return {"success": False, "detail": f"Create the tables first: {skipped}"}
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(ddl)
+            cursor.execute("DELETE FROM incident_dashboard_change")
+            cursor.execute("REFRESH MATERIALIZED VIEW incident_management_dashboard_mv")
+            cursor.execute("UPDATE incident_dashboard_refresh SET refreshed_at = NOW()")
+        return {"success": True, "detail": "Dashboard view created and populated successfully"}
     except OperationalError as e:
-        return {"message": f"View operation failed: {str(e)}", "success": False}
+        return {"success": False, "detail": f"View operation failed: {str(e)}"}
+
+
+@router.post("/refresh/", response=SimpleMessage)
+def refresh_view(request):
+    """Refreshes the materialized dashboard now, without waiting for the background refresher."""
+    try:
+        if refresh_dashboard(force=True):
+            return {"success": True, "detail": "Dashboard refreshed"}
+        return {"success": False, "detail": "Dashboard is not installed or a refresh is already running"}
+    except OperationalError as e:
+        return {"success": False, "detail": f"Refresh failed: {str(e)}"}
 
 
 @router.get("/", response=PaginatedIncidentDashboard)
@@ -118,7 +200,8 @@ def get_dashboard_incidents(
     min_resolution_time_hours: Optional[float] = Query(None),
     max_resolution_time_hours: Optional[float] = Query(None),
     page: int = Query(1, alias="page", ge=1),
-    per_page: int = Query(10, alias="per_page", ge=1),
+    per_page: int = Query(10, alias="per_page", ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page; replaces page"),
 ):
     # pack into your filter schema (optional, but keeps your code DRY)
     filters = IncidentDashboardFilterParams(
@@ -130,8 +213,11 @@ def get_dashboard_incidents(
     )
 
     try:
-        conn = get_connection()
+        after_sql, after_params = DASHBOARD_KEYSET.where(cursor)
+    except InvalidCursor:
+        return HttpResponse(status=400, content=json.dumps({"detail": "Invalid cursor"}))
 
+    try:
         base_q = "SELECT * FROM incident_management_dashboard WHERE 1=1"
         params: list = []
 
@@ -151,20 +237,38 @@ def get_dashboard_incidents(
             base_q += " AND resolution_time_hours <= %s"
             params.append(filters.max_resolution_time_hours)
 
-        # total count
-        count_sql = f"SELECT COUNT(*) FROM ({base_q}) AS cnt"
-        with conn.cursor() as cursor:
-            cursor.execute(count_sql, params)
-            total = cursor.fetchone()[0]
-
-        # apply ordering and pagination
-        base_q += " ORDER BY reported_date DESC LIMIT %s OFFSET %s"
-        params.extend([per_page, (page - 1) * per_page])
-        with conn.cursor() as cursor:
-            cursor.execute(base_q, params)
-            cols = [c[0] for c in cursor.description]
-            rows = [dict(zip(cols, r)) for r in cursor.fetchall()]
-
-        return {"items": rows, "count": total}
+        # total count, plus how current the materialized data is (stale until first refreshed)
+        count_sql = f"""
+            SELECT (SELECT COUNT(*) FROM ({base_q}) AS cnt),
+                   s.refreshed_at,
+                   s.refreshed_at IS NULL OR EXISTS (SELECT 1 FROM incident_dashboard_change)
+            FROM (SELECT) AS one LEFT JOIN incident_dashboard_refresh s ON TRUE
+        """
+        with db_connection() as conn:
+            with conn.cursor() as db_cursor:
+                db_cursor.execute(count_sql, params)
+                total, refreshed_at, stale = db_cursor.fetchone()
+
+            # apply ordering and pagination; a cursor seeks straight to the page instead of OFFSET
+            if after_sql:
+                base_q += " AND " + after_sql
+                params.extend(after_params)
+            base_q += f" ORDER BY {DASHBOARD_KEYSET.order_by} LIMIT %s OFFSET %s"
+            params.extend([per_page + 1, 0 if cursor else (page - 1) * per_page])
+            with conn.cursor() as db_cursor:
+                db_cursor.execute(base_q, params)
+                cols = [c[0] for c in db_cursor.description]
+                rows = [dict(zip(cols, r)) for r in db_cursor.fetchall()]
+        rows, next_cursor = DASHBOARD_KEYSET.paginate(
+            rows, per_page, id_key="incident_id", sort_key="reported_date"
+        )
+
+        return {
+            "items": rows,
+            "count": total,
+            "refreshed_at": refreshed_at,
+            "stale": stale,
+            "next_cursor": next_cursor,
+        }
     except OperationalError as e:
         return {"message": f"Database operation failed: {str(e)}", "success": False}
\ No newline at end of file
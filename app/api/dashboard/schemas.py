@@ -38,4 +38,7 @@ class IncidentDashboardFilterParams(Schema):
 
 class PaginatedIncidentDashboard(Schema):
     items: List[IncidentDashboardResponse]
-    count: int
\ No newline at end of file
+    count: int
+    refreshed_at: Optional[datetime] = None  # when the materialized dashboard was last refreshed
+    stale: bool = False  # underlying tables changed since then; a refresh is pending
+    next_cursor: Optional[str] = None  # pass as `cursor` for the next page
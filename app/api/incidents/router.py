@@ -4,7 +4,7 @@ from datetime import datetime
 from typing import Optional
 
 from django.http import HttpResponse
-from ninja import Router
+from ninja import Query, Router
 from .schemas import (
     IncidentSchema,
     IncidentAssetSchema,
@@ -13,156 +13,213 @@ from .schemas import (
     IncidentDeleteResponseSchema,
     ThreatIncidentAssociationSchema
 )
-from ..common.utils import get_connection
+from ..common import cache, db_objects, statements
+from ..common.pagination import DEFAULT_LIMIT, MAX_LIMIT, InvalidCursor, Keyset
+from ..common.utils import db_connection
 from ..schemas import ErrorSchema
 
 router = Router(tags=["incidents"])
 
+INCIDENT_KEYSET = Keyset("i.incident_id", "i.reported_date", descending=True, nullable=True)
+
+# Ordered like INCIDENT_KEYSET, so a page is one index range scan. Replaces
+# the NULLS FIRST index /settings/create_tables/ used to create.
+INCIDENT_LISTING_INDEX = db_objects.register("idx_incident_reported_id", "index", """
+DROP INDEX IF EXISTS idx_incident_reported_date;
+CREATE INDEX IF NOT EXISTS idx_incident_reported_id ON api_incident (reported_date DESC NULLS LAST, incident_id DESC);
+""")
+
+# Alerts, threats and assets of the incidents in CTE `p`, aggregated as JSON
+# arrays by LATERAL subqueries (each served by the incident_id indexes).
+INCIDENT_DETAIL_COLUMNS = """
+    SELECT p.incident_id, p.incident_type, p.description, p.severity, p.status,
+           p.reported_date, p.resolved_date, p.assigned_to_id, p.username,
+           al.alerts, th.threats, ast.assets
+"""
+INCIDENT_CHILDREN_JOINS = """
+    LEFT JOIN LATERAL (
+        SELECT coalesce(json_agg(json_build_object(
+                   'alert_id', a.alert_id,
+                   'source', a.source,
+                   'name', a.name,
+                   'alert_type', a.alert_type,
+                   'alert_time', a.alert_time,
+                   'severity', a.severity,
+                   'status', CASE WHEN a.status IN ('new', 'acknowledged', 'resolved', 'closed')
+                                  THEN a.status ELSE 'new' END,
+                   'incident_id', a.incident_id
+               )), '[]') AS alerts
+        FROM api_alert a
+        WHERE a.incident_id = p.incident_id
+    ) al ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT coalesce(json_agg(json_build_object(
+                   'threat_id', ti.threat_id,
+                   'threat_actor_name', ti.threat_actor_name,
+                   'indicator_type', ti.indicator_type,
+                   'indicator_value', ti.indicator_value,
+                   'confidence_level', ti.confidence_level,
+                   'description', ti.description,
+                   'related_cve', ti.related_cve
+               )), '[]') AS threats
+        FROM threat_incident_association tia
+        JOIN api_threatintelligence ti ON ti.threat_id = tia.threat_id
+        WHERE tia.incident_id = p.incident_id
+    ) th ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT coalesce(json_agg(json_build_object(
+                   'asset_id', a.asset_id,
+                   'asset_name', a.asset_name,
+                   'asset_type', a.asset_type,
+                   'location', a.location,
+                   'owner', a.owner,
+                   'criticality_level', a.criticality_level
+               )), '[]') AS assets
+        FROM incident_assets ia
+        JOIN api_asset a ON a.asset_id = ia.asset_id
+        WHERE ia.incident_id = p.incident_id
+    ) ast ON TRUE
+"""
+
+# One round trip per page instead of three extra queries per incident.
+DETAILED_INCIDENTS_QUERY = """
+    WITH p AS (
+        SELECT i.incident_id, i.incident_type, i.description, i.severity, i.status,
+               i.reported_date, i.resolved_date, i.assigned_to_id, u.username
+        FROM api_incident i
+        LEFT JOIN api_user u ON i.assigned_to_id = u.user_id
+        {where_clause}
+        ORDER BY """ + INCIDENT_KEYSET.order_by + """
+        LIMIT %s
+    )
+""" + INCIDENT_DETAIL_COLUMNS + """
+    FROM p
+""" + INCIDENT_CHILDREN_JOINS + """
+    ORDER BY p.reported_date DESC NULLS LAST, p.incident_id DESC
+"""
+
+COUNT_INCIDENTS_QUERY = "SELECT count(*) FROM api_incident i {where_clause}"
+
+# Single statement for the detail page; registered so each pooled connection
+# prepares it once and reuses the plan.
+INCIDENT_DETAIL_QUERY = """
+    WITH p AS (
+        SELECT i.incident_id, i.incident_type, i.description, i.severity, i.status,
+               i.reported_date, i.resolved_date, i.assigned_to_id, u.username
+        FROM api_incident i
+        LEFT JOIN api_user u ON i.assigned_to_id = u.user_id
+        WHERE i.incident_id = %s
+    )
+""" + INCIDENT_DETAIL_COLUMNS + """
+    FROM p
+""" + INCIDENT_CHILDREN_JOINS
+statements.register("incident_detail", INCIDENT_DETAIL_QUERY)
+
+
+def incident_detail_from_row(row):
+    return {
+        "incident_id": row[0],
+        "incident_type": row[1],
+        "description": row[2],
+        "severity": row[3],
+        "status": row[4],
+        "reported_date": row[5],
+        "resolved_date": row[6],
+        "assigned_to_id": row[7],
+        "assigned_to_username": row[8] if row[7] else None,
+        "alerts": row[9],
+        "threats": row[10],
+        "assets": row[11]
+    }
+
+
 @router.get("/", response=list[IncidentDetailSchema])
 def list_detailed_incidents(
         request,
+        response: HttpResponse,
         status: Optional[str] = None,
         severity: Optional[str] = None,
         incident_type: Optional[str] = None,
-        assigned_to_id: Optional[int] = None
+        assigned_to_id: Optional[int] = None,
+        reported_after: Optional[datetime] = None,
+        reported_before: Optional[datetime] = None,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT),
+        cursor: Optional[str] = None,
 ):
-    """List all incidents with detailed information and optional filtering"""
-    results = []
-    connection = get_connection()
-    with connection.cursor() as cursor:
-        # Build WHERE clause for filters
-        where_clauses = []
-        params = []
-
-        if status:
-            where_clauses.append("i.status = %s")
-            params.append(status)
-        if severity:
-            where_clauses.append("i.severity = %s")
-            params.append(severity)
-        if incident_type:
-            where_clauses.append("i.incident_type LIKE %s")
-            params.append(f"%{incident_type}%")
-        if assigned_to_id:
-            where_clauses.append("i.assigned_to_id = %s")
-            params.append(assigned_to_id)
-
-        where_clause = f" WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
-
-        # Get basic incident information
-        cursor.execute(
-            f"""
-            SELECT i.incident_id, i.incident_type, i.description, i.severity, i.status,
-                   i.reported_date, i.resolved_date, i.assigned_to_id, u.username
-            FROM api_incident i
-            LEFT JOIN api_user u ON i.assigned_to_id = u.user_id
-            {where_clause}
-            ORDER BY i.reported_date DESC
-            """,
-            params
-        )
-
-        incidents = cursor.fetchall()
+    """List incidents with their alerts, threats and assets, newest first, filtered and paginated.
+
+    Without limit or cursor every matching incident is returned, as before
+    paging was added; with either, pages hold `limit` (default 100) incidents
+    and the next page's cursor is sent in X-Next-Cursor (and a Link header)
+    while there is one. The total number of matching incidents is returned
+    in the X-Total-Count header.
+    """
+    try:
+        after_sql, after_params = INCIDENT_KEYSET.where(cursor)
+    except InvalidCursor:
+        return HttpResponse(status=400, content=json.dumps({"detail": "Invalid cursor"}))
+
+    # Build WHERE clause for filters
+    where_clauses = []
+    params = []
+
+    if status:
+        where_clauses.append("i.status = %s")
+        params.append(status)
+    if severity:
+        where_clauses.append("i.severity = %s")
+        params.append(severity)
+    if incident_type:
+        where_clauses.append("i.incident_type LIKE %s")
+        params.append(f"%{incident_type}%")
+    if assigned_to_id:
+        where_clauses.append("i.assigned_to_id = %s")
+        params.append(assigned_to_id)
+    if reported_after:
+        where_clauses.append("i.reported_date >= %s")
+        params.append(reported_after)
+    if reported_before:
+        where_clauses.append("i.reported_date < %s")
+        params.append(reported_before)
+
+    count_where = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+    if after_sql:
+        where_clauses.append(after_sql)
+    where_clause = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+    paged = limit is not None or cursor is not None
+    limit = limit or DEFAULT_LIMIT
+
+    with db_connection() as connection, connection.cursor() as db_cursor:
+        # LIMIT NULL is no limit
+        db_cursor.execute(DETAILED_INCIDENTS_QUERY.format(where_clause=where_clause),
+                          params + after_params + [limit + 1 if paged else None])
+        rows = db_cursor.fetchall()
+        db_cursor.execute(COUNT_INCIDENTS_QUERY.format(where_clause=count_where), params)
+        total = db_cursor.fetchone()[0]
+
+    next_cursor = None
+    if paged:
+        rows, next_cursor = INCIDENT_KEYSET.paginate(rows, limit, id_key=0, sort_key=5)
+    _page_headers(request, response, total, next_cursor, limit)
+    return [incident_detail_from_row(row) for row in rows]
+
+
+def _page_headers(request, response, total, next_cursor, limit):
+    response["X-Total-Count"] = str(total)
+    if next_cursor:
+        query = request.GET.copy()
+        query["cursor"], query["limit"] = next_cursor, limit
+        response["X-Next-Cursor"] = next_cursor
+        response["Link"] = f'<{request.build_absolute_uri(request.path)}?{query.urlencode()}>; rel="next"'
 
-        for inc in incidents:
-            incident_id = inc[0]
-
-            # Get related alerts
-            cursor.execute(
-                """
-                SELECT alert_id, source, name, alert_type, alert_time, severity, status
-                FROM api_alert
-                WHERE incident_id = %s
-                """,
-                [incident_id]
-            )
-            alerts = [
-                {
-                    "alert_id": row[0],
-                    "source": row[1],
-                    "name": row[2],
-                    "alert_type": row[3],
-                    "alert_time": row[4],
-                    "severity": row[5],
-                    "status": row[6] if row[6] in ['new', 'acknowledged', 'resolved', 'closed'] else 'new',
-                    "incident_id": incident_id
-                }
-                for row in cursor.fetchall()
-            ]
 
-            # Get related threats
-            cursor.execute(
-                """
-                SELECT ti.threat_id, ti.threat_actor_name, ti.indicator_type,
-                       ti.indicator_value, ti.confidence_level, ti.description, ti.related_cve
-                FROM api_threatintelligence ti
-                JOIN threat_incident_association tia ON ti.threat_id = tia.threat_id
-                WHERE tia.incident_id = %s
-                """,
-                [incident_id]
-            )
-            threats = [
-                {
-                    "threat_id": row[0],
-                    "threat_actor_name": row[1],
-                    "indicator_type": row[2],
-                    "indicator_value": row[3],
-                    "confidence_level": row[4],
-                    "description": row[5],
-                    "related_cve": row[6]
-                }
-                for row in cursor.fetchall()
-            ]
-
-            # Get related assets
-            cursor.execute(
-                """
-                SELECT a.asset_id, a.asset_name, a.asset_type, a.location, a.owner, a.criticality_level
-                FROM api_asset a
-                JOIN incident_assets ia ON a.asset_id = ia.asset_id
-                WHERE ia.incident_id = %s
-                """,
-                [incident_id]
-            )
-            assets = [
-                {
-                    "asset_id": row[0],
-                    "asset_name": row[1],
-                    "asset_type": row[2],
-                    "location": row[3],
-                    "owner": row[4],
-                    "criticality_level": row[5]
-                }
-                for row in cursor.fetchall()
-            ]
-
-            # Combine all data into a single incident record
-            incident = {
-                "incident_id": inc[0],
-                "incident_type": inc[1],
-                "description": inc[2],
-                "severity": inc[3],
-                "status": inc[4],
-                "reported_date": inc[5],
-                "resolved_date": inc[6],
-                "assigned_to_id": inc[7],
-                "assigned_to_username": inc[8] if inc[7] else None,
-                "alerts": alerts,
-                "threats": threats,
-                "assets": assets
-            }
-
-            results.append(incident)
-
-    return results
 @router.post("/", response=IncidentSchema)
 def create_incident(request, incident: IncidentSchema):
-    connection = get_connection()
     """Create a new incident"""
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Validate assigned_to user if provided
         if incident.assigned_to_id:
-            cursor.execute("SELECT user_id FROM api_user WHERE user_id = %s", [incident.assigned_to_id])
+            statements.execute(cursor, "user_exists", [incident.assigned_to_id])
             if not cursor.fetchone():
                 return HttpResponse(
                     status=400,
@@ -194,7 +251,7 @@ def create_incident(request, incident: IncidentSchema):
         # If assigned_to is not None, fetch the username
         username = None
         if row[7]:  # assigned_to
-            cursor.execute("SELECT username FROM api_user WHERE user_id = %s", [row[7]])
+            statements.execute(cursor, "username", [row[7]])
             user_row = cursor.fetchone()
             username = user_row[0] if user_row else None
 
@@ -213,20 +270,11 @@ def create_incident(request, incident: IncidentSchema):
     return incident
 
 @router.get("/{incident_id}", response=IncidentDetailSchema)
+@cache.cached_entity("incident", "incident_id")
 def get_incident(request, incident_id: int):
-    connection = get_connection()
-    """Get incident by ID with related alerts and user details"""
-    with connection.cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT i.incident_id, i.incident_type, i.description, i.severity, i.status, 
-                   i.reported_date, i.resolved_date, i.assigned_to_id, u.username
-            FROM api_incident i
-            LEFT JOIN api_user u ON i.assigned_to_id = u.user_id
-            WHERE i.incident_id = %s
-            """,
-            [incident_id]
-        )
+    """Get incident by ID with related alerts, threats and assets"""
+    with db_connection() as connection, connection.cursor() as cursor:
+        statements.execute(cursor, "incident_detail", [incident_id])
         row = cursor.fetchone()
         if not row:
             return HttpResponse(
@@ -234,105 +282,13 @@ def get_incident(request, incident_id: int):
                 content=json.dumps({"detail": "Incident not found"})
             )
 
-        # Get related alerts
-        cursor.execute(
-            """
-            SELECT alert_id, source, name, alert_type, alert_time, severity, status
-            FROM api_alert
-            WHERE incident_id = %s
-            """,
-            [incident_id]
-        )
-        alert_rows = cursor.fetchall()
-
-        alerts = [
-            {
-                "alert_id": row[0],
-                "source": row[1],
-                "name": row[2],
-                "alert_type": row[3],
-                "alert_time": row[4],
-                "severity": row[5],
-                "status": row[6] if row[6] in ['new', 'acknowledged', 'resolved', 'closed'] else 'new',
-                # Map invalid status to valid status
-                "incident_id": incident_id
-            }
-            for row in alert_rows
-        ]
-
-        # Get related threat intelligence
-        cursor.execute(
-            """
-            SELECT ti.threat_id, ti.threat_actor_name, ti.indicator_type, 
-                   ti.indicator_value, ti.confidence_level, ti.description, ti.related_cve
-            FROM api_threatintelligence ti
-            JOIN threat_incident_association tia ON ti.threat_id = tia.threat_id
-            WHERE tia.incident_id = %s
-            """,
-            [incident_id]
-        )
-        threat_rows = cursor.fetchall()
-
-        threats = [
-            {
-                "threat_id": row[0],
-                "threat_actor_name": row[1],
-                "indicator_type": row[2],
-                "indicator_value": row[3],
-                "confidence_level": row[4],
-                "description": row[5],
-                "related_cve": row[6]
-            }
-            for row in threat_rows
-        ]
-
-        # Get related assets
-        cursor.execute(
-            """
-            SELECT a.asset_id, a.asset_name, a.asset_type, a.location, a.owner, a.criticality_level, ia.impact_level
-            FROM api_asset a
-            JOIN incident_assets ia ON a.asset_id = ia.asset_id
-            WHERE ia.incident_id = %s
-            """,
-            [incident_id]
-        )
-        asset_rows = cursor.fetchall()
-
-        assets = [
-            {
-                "asset_id": row[0],
-                "asset_name": row[1],
-                "asset_type": row[2],
-                "location": row[3],
-                "owner": row[4],
-                "criticality_level": row[5]
-            }
-            for row in asset_rows
-        ]
-
-        incident = {
-            "incident_id": row[0],
-            "incident_type": row[1],
-            "description": row[2],
-            "severity": row[3],
-            "status": row[4],
-            "reported_date": row[5],
-            "resolved_date": row[6],
-            "assigned_to_id": row[7],
-            "assigned_to_username": row[8] if row[7] else None,
-            "alerts": alerts,
-            "threats": threats,
-            "assets": assets
-        }
-
-        return incident
+        return incident_detail_from_row(row)
 
 @router.put("/{incident_id}", response=IncidentUpdateResponseSchema)
 def update_incident(request, incident_id: int, incident_data: IncidentSchema):
-    connection = get_connection()
     # Check if incident exists
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT incident_id FROM api_incident WHERE incident_id = %s", [incident_id])
+    with db_connection() as connection, connection.cursor() as cursor:
+        statements.execute(cursor, "incident_exists", [incident_id])
         if not cursor.fetchone():
             return HttpResponse(
                 status=404,
@@ -341,7 +297,7 @@ def update_incident(request, incident_id: int, incident_data: IncidentSchema):
 
         # Automatically set resolved_date when status changes to resolved
         if incident_data.status == 'resolved':
-            cursor.execute("SELECT status FROM api_incident WHERE incident_id = %s", [incident_id])
+            statements.execute(cursor, "incident_status", [incident_id])
             current_status = cursor.fetchone()[0]  # Access the first element of the tuple
             if current_status != 'resolved':
                 # Status is changing to resolved, set resolved_date to now
@@ -349,7 +305,7 @@ def update_incident(request, incident_id: int, incident_data: IncidentSchema):
 
         # Validate assigned_to user if provided
         if incident_data.assigned_to_id is not None:
-            cursor.execute("SELECT user_id FROM api_user WHERE user_id = %s", [incident_data.assigned_to_id])
+            statements.execute(cursor, "user_exists", [incident_data.assigned_to_id])
             if not cursor.fetchone():
                 return HttpResponse(
                     status=400,
@@ -391,12 +347,13 @@ def update_incident(request, incident_id: int, incident_data: IncidentSchema):
         # Build SQL update
         if not update_fields:
             # If no fields to update, just return the current incident
-            return get_incident(request, incident_id)
+            return get_incident(request, incident_id=incident_id)
 
         # Combine params with incident_id
         params.append(incident_id)
 
         # Execute update query
+        cache.invalidate("incident", incident_id)
         cursor.execute(
             f"""
              UPDATE api_incident
@@ -412,10 +369,9 @@ def update_incident(request, incident_id: int, incident_data: IncidentSchema):
 @router.delete("/{incident_id}", response=IncidentDeleteResponseSchema)
 def delete_incident(request, incident_id: int):
     """Delete an incident"""
-    connection = get_connection()
     # Check if incident exists and delete it
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT incident_id FROM api_incident WHERE incident_id = %s", [incident_id])
+    with db_connection() as connection, connection.cursor() as cursor:
+        statements.execute(cursor, "incident_exists", [incident_id])
         row = cursor.fetchone()
         if not row:
             return HttpResponse(
@@ -423,6 +379,15 @@ def delete_incident(request, incident_id: int):
                 content=json.dumps({"detail": "Incident not found"})
             )
 
+        # Cached alerts and threats reference the incident; drop them with it
+        cache.invalidate("incident", incident_id)
+        cache.invalidate_related(
+            cursor, "alert", "SELECT alert_id FROM api_alert WHERE incident_id = %s", [incident_id]
+        )
+        cache.invalidate_related(
+            cursor, "threat", "SELECT threat_id FROM threat_incident_association WHERE incident_id = %s", [incident_id]
+        )
+
         # Delete related associations first to maintain referential integrity
         cursor.execute("DELETE FROM incident_assets WHERE incident_id = %s", [incident_id])
         cursor.execute("DELETE FROM threat_incident_association WHERE incident_id = %s", [incident_id])
@@ -437,10 +402,9 @@ def delete_incident(request, incident_id: int):
 @router.get("/assets/{incident_id}", response={200: list[IncidentAssetSchema], 400: ErrorSchema})
 def get_assets_from_incident(request, incident_id: int):
     assets = []
-    connection = get_connection()
     # Verify incident exists
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT incident_id FROM api_incident WHERE incident_id = %s", [incident_id])
+    with db_connection() as connection, connection.cursor() as cursor:
+        statements.execute(cursor, "incident_exists", [incident_id])
         if not cursor.fetchone():
             return HttpResponse(
                 status=404,
@@ -468,9 +432,8 @@ def get_assets_from_incident(request, incident_id: int):
 
 @router.post("/assets/", response={201: IncidentAssetSchema, 400: ErrorSchema})
 def add_asset_to_incident(request, incident_asset_data: IncidentAssetSchema):
-    connection = get_connection()
     # Verify incident exists
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if association already exists
         cursor.execute(
             "SELECT incident_id FROM incident_assets WHERE incident_id = %s AND asset_id = %s",
@@ -484,8 +447,7 @@ def add_asset_to_incident(request, incident_asset_data: IncidentAssetSchema):
             )
 
         # Validate that the incident and asset exist
-        cursor.execute("SELECT incident_id FROM api_incident WHERE incident_id = %s",
-                       [incident_asset_data.incident_id])
+        statements.execute(cursor, "incident_exists", [incident_asset_data.incident_id])
         if not cursor.fetchone():
             return HttpResponse(
                 status=400,
@@ -493,8 +455,7 @@ def add_asset_to_incident(request, incident_asset_data: IncidentAssetSchema):
             )
 
         # Verify asset exists
-        cursor.execute("SELECT asset_id FROM api_asset WHERE asset_id = %s",
-                       [incident_asset_data.asset_id])
+        statements.execute(cursor, "asset_exists", [incident_asset_data.asset_id])
         if not cursor.fetchone():
             return HttpResponse(
                 status=400,
@@ -502,6 +463,7 @@ def add_asset_to_incident(request, incident_asset_data: IncidentAssetSchema):
             )
 
         # Create new association
+        cache.invalidate("incident", incident_asset_data.incident_id)
         cursor.execute("""
             INSERT INTO incident_assets (incident_id, asset_id, impact_level) VALUES (%s, %s, %s)
             RETURNING id, incident_id, asset_id, impact_level
@@ -515,9 +477,7 @@ def add_asset_to_incident(request, incident_asset_data: IncidentAssetSchema):
 def update_asset_in_incident(request, incident_asset_data: IncidentAssetSchema,
                           original_incident_id: Optional[int] = None,
                           original_asset_id: Optional[int] = None):
-
-    connection = get_connection()
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Verify the original association exists
         cursor.execute(
             "SELECT incident_id FROM incident_assets WHERE incident_id = %s AND asset_id = %s",
@@ -531,8 +491,7 @@ def update_asset_in_incident(request, incident_asset_data: IncidentAssetSchema,
             )
 
         # Verify that the incident and asset exist
-        cursor.execute("SELECT incident_id FROM api_incident WHERE incident_id = %s",
-                       [incident_asset_data.incident_id])
+        statements.execute(cursor, "incident_exists", [incident_asset_data.incident_id])
 
         if not cursor.fetchone():
             return HttpResponse(
@@ -540,14 +499,14 @@ def update_asset_in_incident(request, incident_asset_data: IncidentAssetSchema,
                 content=json.dumps({"detail": "Referenced incident not found"})
             )
 
-        cursor.execute("SELECT asset_id FROM api_asset WHERE asset_id = %s",
-                       [incident_asset_data.asset_id])
+        statements.execute(cursor, "asset_exists", [incident_asset_data.asset_id])
         if not cursor.fetchone():
             return HttpResponse(
                 status=400,
                 content=json.dumps({"detail": "Referenced asset not found"})
             )
 
+        cache.invalidate("incident", original_incident_id, incident_asset_data.incident_id)
         # Check if we're updating an existing association
         if ((original_incident_id != incident_asset_data.incident_id) or (original_asset_id != incident_asset_data.asset_id)):
             # Update the association (either same pair with new impact_level or completely new pair)
@@ -584,9 +543,8 @@ def update_asset_in_incident(request, incident_asset_data: IncidentAssetSchema,
 
 @router.delete("/assets/{incident_id}/{asset_id}", response={200: dict, 404: ErrorSchema})
 def remove_asset_from_incident(request, incident_id: int, asset_id: int):
-    connection = get_connection()
     # Check if association exists
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         cursor.execute(
             "SELECT incident_id FROM incident_assets WHERE incident_id = %s AND asset_id = %s",
             [incident_id, asset_id]
@@ -598,6 +556,7 @@ def remove_asset_from_incident(request, incident_id: int, asset_id: int):
             )
 
         # Delete the association
+        cache.invalidate("incident", incident_id)
         cursor.execute(
             "DELETE FROM incident_assets WHERE incident_id = %s AND asset_id = %s",
             [incident_id, asset_id]
@@ -609,9 +568,8 @@ def remove_asset_from_incident(request, incident_id: int, asset_id: int):
 def get_threats_by_incident(request, incident_id: int):
     """Get all threat associations for an incident"""
     associations = []
-    connection = get_connection()
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT incident_id FROM api_incident WHERE incident_id = %s", [incident_id])
+    with db_connection() as connection, connection.cursor() as cursor:
+        statements.execute(cursor, "incident_exists", [incident_id])
         if not cursor.fetchone():
             return HttpResponse(
                 status=404,
@@ -634,10 +592,8 @@ def get_threats_by_incident(request, incident_id: int):
 
 @router.post("/threats/", response=ThreatIncidentAssociationSchema)
 def add_threat_to_incident(request, threat_incident_data: ThreatIncidentAssociationSchema):
-    connection = get_connection()
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT incident_id FROM api_incident WHERE incident_id = %s",
-                      [threat_incident_data.incident_id])
+    with db_connection() as connection, connection.cursor() as cursor:
+        statements.execute(cursor, "incident_exists", [threat_incident_data.incident_id])
 
         if not cursor.fetchone():
             return HttpResponse(
@@ -645,8 +601,7 @@ def add_threat_to_incident(request, threat_incident_data: ThreatIncidentAssociat
                 content=json.dumps({"detail": "Referenced incident not found"})
             )
 
-        cursor.execute("SELECT threat_id FROM api_threatintelligence WHERE threat_id = %s",
-                      [threat_incident_data.threat_id])
+        statements.execute(cursor, "threat_exists", [threat_incident_data.threat_id])
 
         if not cursor.fetchone():
             return HttpResponse(
@@ -667,6 +622,8 @@ def add_threat_to_incident(request, threat_incident_data: ThreatIncidentAssociat
             )
 
         # Create new association
+        cache.invalidate("incident", threat_incident_data.incident_id)
+        cache.invalidate("threat", threat_incident_data.threat_id)
         notes = threat_incident_data.notes or ""
         cursor.execute(
             "INSERT INTO threat_incident_association (threat_id, incident_id, notes) VALUES (%s, %s, %s)",
@@ -679,21 +636,18 @@ def add_threat_to_incident(request, threat_incident_data: ThreatIncidentAssociat
 def update_incident_threat(request, threat_incident_data: ThreatIncidentAssociationSchema,
                            original_threat_id: Optional[int] = None,
                            original_incident_id: Optional[int] = None):
-    connection = get_connection()
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if we're updating an existing association
         if original_threat_id and original_incident_id:
             # Verify that the new threat and incident exist
-            cursor.execute("SELECT incident_id FROM api_incident WHERE incident_id = %s",
-                           [threat_incident_data.incident_id])
+            statements.execute(cursor, "incident_exists", [threat_incident_data.incident_id])
             if not cursor.fetchone():
                 return HttpResponse(
                     status=400,
                     content=json.dumps({"detail": "Referenced incident not found"})
                 )
 
-            cursor.execute("SELECT threat_id FROM api_threatintelligence WHERE threat_id = %s",
-                           [threat_incident_data.threat_id])
+            statements.execute(cursor, "threat_exists", [threat_incident_data.threat_id])
             if not cursor.fetchone():
                 return HttpResponse(
                     status=400,
@@ -725,6 +679,8 @@ def update_incident_threat(request, threat_incident_data: ThreatIncidentAssociat
                     )
 
                 # Update the association with new threat/incident pair
+                cache.invalidate("incident", original_incident_id, threat_incident_data.incident_id)
+                cache.invalidate("threat", original_threat_id, threat_incident_data.threat_id)
                 cursor.execute(
                     """DELETE FROM threat_incident_association 
                        WHERE threat_id = %s AND incident_id = %s""",
@@ -766,9 +722,8 @@ def update_incident_threat(request, threat_incident_data: ThreatIncidentAssociat
 
 @router.delete("/threats/{incident_id}/{threat_id}")
 def remove_threat_from_incident(request, incident_id: int, threat_id: int):
-    connection = get_connection()
     # Check if association exists
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         cursor.execute(
             "SELECT threat_id FROM threat_incident_association WHERE threat_id = %s AND incident_id = %s",
             [threat_id, incident_id]
@@ -780,6 +735,8 @@ def remove_threat_from_incident(request, incident_id: int, threat_id: int):
             )
 
         # Delete association
+        cache.invalidate("incident", incident_id)
+        cache.invalidate("threat", threat_id)
         cursor.execute(
             "DELETE FROM threat_incident_association WHERE threat_id = %s AND incident_id = %s",
             [threat_id, incident_id]
@@ -0,0 +1,25 @@
+import json
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from app.api.common import synthetic
+
+
+class Command(BaseCommand):
+    help = "Load a deterministic synthetic data set (seeded, via COPY) sized for benchmarking"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--incidents", type=int, default=100_000, help="Incidents to create; other tables scale with it")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--end", help="Newest timestamp in the data (ISO format, UTC); defaults to today 00:00")
+        parser.add_argument("--reset", action="store_true", help="Truncate every table first")
+        for name in synthetic.RATIOS:
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, dest=name, help=f"Override the number of {name}")
+
+    def handle(self, *args, incidents, seed, end, reset, **options):
+        overrides = {name: options[name] for name in synthetic.RATIOS}
+        result = synthetic.generate(
+            incidents, seed=seed, end=datetime.fromisoformat(end) if end else None, reset=reset, **overrides
+        )
+        self.stdout.write(json.dumps(result, indent=2))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from app.api.common import db_objects
+
+
+class Command(BaseCommand):
+    help = "Install database functions and triggers whose definition changed since the last install"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Reinstall every object")
+
+    def handle(self, *args, force=False, **options):
+        result = db_objects.install(force=force)
+        for name in result["installed"]:
+            self.stdout.write(f"installed  {name}")
+        for name in result["unchanged"]:
+            self.stdout.write(f"unchanged  {name}")
+        for name, reason in result["skipped"].items():
+            self.stdout.write(self.style.WARNING(f"skipped    {name}: {reason}"))
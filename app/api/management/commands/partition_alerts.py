@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from app.api.alerts import partitions
+
+
+class Command(BaseCommand):
+    help = "Convert api_alert to a table partitioned by alert_time, then create and retire partitions as due"
+
+    def handle(self, *args, **options):
+        moved = partitions.convert()
+        if moved is None:
+            self.stdout.write("api_alert is already partitioned")
+        else:
+            self.stdout.write(f"converted  api_alert ({moved} alerts)")
+        result = partitions.maintain()
+        if result is None:
+            self.stdout.write(self.style.WARNING("skipped    maintenance: another process holds the lock"))
+            return
+        for name in result["created"]:
+            self.stdout.write(f"created    {name}")
+        for name in result["retired"]:
+            self.stdout.write(f"retired    {name}")
+        if result["expired"]:
+            self.stdout.write(f"expired    {result['expired']} alerts from {partitions.DEFAULT_PARTITION}")
@@ -0,0 +1,236 @@
+"""
+In-process risk engine for what-if weight profiles.
+
+The inputs of every incident's score (counts of related rows, the level
+labels the SQL functions compare, the incident's age) are loaded once into
+NumPy arrays; scoring every incident under a weight profile is then a handful
+of vectorized operations instead of a SQL recompute. `PRODUCTION_PROFILE`
+mirrors `incident_risk_factors()`, so its scores match the stored ones up to
+rounding.
+"""
+import copy
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+
+from app.api.common.utils import db_connection
+
+PRODUCTION_PROFILE = {
+    "base": {"levels": {"critical": 80, "high": 60, "medium": 40, "low": 20}, "default": 10},
+    "asset": {"weight": 5, "cap": 50, "levels": {"critical": 2, "high": 1.5, "medium": 1}, "default": 0.5},
+    "vulnerability": {"weight": 3, "cap": 40, "levels": {"critical": 2, "high": 1.5}, "default": 1},
+    "threat": {"weight": 10, "cap": 30, "levels": {"very_high": 1.5, "high": 1.0, "medium": 0.5}, "default": 0.25},
+    "alert": {"weight": 5, "cap": 30, "levels": {"critical": 2, "high": 1.5, "medium": 1}, "default": 0.5},
+    "time": {"weight": 1, "cap": 30},
+    "max_score": 100,
+}
+
+FACTORS = ("asset", "vulnerability", "threat", "alert")
+
+# Statuses whose time factor is 0, as in incident_risk_factors().
+CLOSED_STATUSES = ("resolved", "closed")
+
+# One row per incident. Levels are the labels the production CASEs look at:
+# MAX() of the text column for assets and threats, the most severe match for
+# vulnerabilities and alerts (NULL falls through to the profile default).
+FEATURES_QUERY = """
+    WITH asset_f AS (
+        SELECT ia.incident_id, COUNT(*) AS n, MAX(a.criticality_level) AS level
+        FROM incident_assets ia
+        JOIN api_asset a ON a.asset_id = ia.asset_id
+        GROUP BY ia.incident_id
+    ),
+    vuln_f AS (
+        SELECT ia.incident_id, COUNT(*) AS n,
+               CASE
+                 WHEN bool_or(v.severity = 'critical') THEN 'critical'
+                 WHEN bool_or(v.severity = 'high')     THEN 'high'
+               END AS level
+        FROM incident_assets ia
+        JOIN asset_vulnerabilities av ON av.asset_id = ia.asset_id
+        JOIN api_vulnerability v ON v.vulnerability_id = av.vulnerability_id
+        GROUP BY ia.incident_id
+    ),
+    threat_f AS (
+        SELECT tia.incident_id, COUNT(*) AS n, MAX(ti.confidence_level) AS level
+        FROM threat_incident_association tia
+        JOIN api_threatintelligence ti ON ti.threat_id = tia.threat_id
+        GROUP BY tia.incident_id
+    ),
+    alert_f AS (
+        SELECT a.incident_id, COUNT(*) AS n,
+               CASE
+                 WHEN bool_or(a.severity = 'critical') THEN 'critical'
+                 WHEN bool_or(a.severity = 'high')     THEN 'high'
+                 WHEN bool_or(a.severity = 'medium')   THEN 'medium'
+               END AS level
+        FROM api_alert a
+        WHERE a.incident_id IS NOT NULL
+        GROUP BY a.incident_id
+    )
+    SELECT i.incident_id, i.severity, i.status,
+           (EXTRACT(EPOCH FROM (LOCALTIMESTAMP - i.reported_date)) / 86400)::FLOAT8 AS age_days,
+           COALESCE(asset_f.n, 0),  asset_f.level,
+           COALESCE(vuln_f.n, 0),   vuln_f.level,
+           COALESCE(threat_f.n, 0), threat_f.level,
+           COALESCE(alert_f.n, 0),  alert_f.level
+    FROM api_incident i
+    LEFT JOIN asset_f  ON asset_f.incident_id  = i.incident_id
+    LEFT JOIN vuln_f   ON vuln_f.incident_id   = i.incident_id
+    LEFT JOIN threat_f ON threat_f.incident_id = i.incident_id
+    LEFT JOIN alert_f  ON alert_f.incident_id  = i.incident_id
+"""
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def merge_profile(overrides):
+    """PRODUCTION_PROFILE with `overrides` (same shape, any subset) applied."""
+    profile = copy.deepcopy(PRODUCTION_PROFILE)
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(profile.get(key), dict):
+            for sub_key, sub_value in value.items():
+                if isinstance(sub_value, dict) and isinstance(profile[key].get(sub_key), dict):
+                    profile[key][sub_key].update(sub_value)
+                else:
+                    profile[key][sub_key] = sub_value
+        else:
+            profile[key] = value
+    return profile
+
+
+def _encode(labels):
+    """Integer codes into a vocabulary of the distinct labels (None included)."""
+    vocabulary = sorted(set(labels), key=lambda label: (label is None, label or ""))
+    index = {label: i for i, label in enumerate(vocabulary)}
+    return np.fromiter((index[label] for label in labels), dtype=np.int32, count=len(labels)), vocabulary
+
+
+def _lookup(codes, vocabulary, levels, default):
+    """Per-incident value of `levels[label]` (or `default`)."""
+    table = np.array([levels.get(label, default) for label in vocabulary], dtype=np.float64)
+    return table[codes]
+
+
+def _round(values):
+    # The SQL factors are NUMERIC(5,2)
+    return np.round(values, 2)
+
+
+class RiskEngine:
+    """Score inputs of every incident, as columns."""
+
+    def __init__(self, rows):
+        columns = list(zip(*rows)) if rows else [()] * 12
+        self.incident_ids = np.array(columns[0], dtype=np.int64)
+        self.severity_codes, self.severities = _encode(columns[1])
+        self.status_codes, self.statuses = _encode(columns[2])
+        self.age_days = np.array([np.nan if age is None else age for age in columns[3]], dtype=np.float64)
+        self.counts = {}
+        self.levels = {}
+        for i, factor in enumerate(FACTORS):
+            self.counts[factor] = np.array(columns[4 + 2 * i], dtype=np.float64)
+            self.levels[factor] = _encode(columns[5 + 2 * i])
+        self.closed = self.status_mask(CLOSED_STATUSES)
+        self.loaded_at = datetime.now(timezone.utc)
+        self.production_scores = self.score(PRODUCTION_PROFILE)
+
+    @classmethod
+    def load(cls):
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(FEATURES_QUERY)
+            return cls(cursor.fetchall())
+
+    def __len__(self):
+        return len(self.incident_ids)
+
+    def status_mask(self, statuses):
+        """Boolean mask of incidents whose status is in `statuses` (None: all)."""
+        if statuses is None:
+            return np.ones(len(self), dtype=bool)
+        wanted = np.array([status in statuses for status in self.statuses], dtype=bool)
+        return wanted[self.status_codes]
+
+    def score(self, profile):
+        """Risk score of every incident under `profile` (a full profile, see merge_profile)."""
+        base = profile["base"]
+        total = _round(_lookup(self.severity_codes, self.severities, base["levels"], base["default"]))
+        for factor in FACTORS:
+            weights = profile[factor]
+            codes, vocabulary = self.levels[factor]
+            multiplier = _lookup(codes, vocabulary, weights["levels"], weights["default"])
+            total += _round(np.minimum(weights["weight"] * self.counts[factor] * multiplier, weights["cap"]))
+
+        # fmin: an unknown age (NULL reported_date) is the cap, as LEAST() ignores the NULL
+        time_factor = np.fmin(profile["time"]["weight"] * self.age_days, profile["time"]["cap"])
+        total += _round(np.where(self.closed, 0.0, time_factor))
+        return np.minimum(total, profile["max_score"])
+
+    def ranks(self, scores, mask):
+        """1-based rank of each selected incident, highest score first.
+
+        Ties go to the higher incident_id, like the stored listing's
+        ORDER BY risk_score DESC, incident_id DESC.
+        """
+        selected = np.flatnonzero(mask)
+        order = np.lexsort((-self.incident_ids[selected], -scores[selected]))
+        ranks = np.empty(len(selected), dtype=np.int64)
+        ranks[order] = np.arange(1, len(selected) + 1)
+        return selected, ranks
+
+    def simulate(self, overrides, statuses, limit):
+        """Rescore under `overrides` and compare ranks with the production profile."""
+        started = time.perf_counter()
+        profile = merge_profile(overrides)
+        scores = self.score(profile)
+        mask = self.status_mask(statuses)
+        selected, simulated_ranks = self.ranks(scores, mask)
+        _, production_ranks = self.ranks(self.production_scores, mask)
+        changes = production_ranks - simulated_ranks
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        top = np.argsort(simulated_ranks)[:limit]
+        items = [
+            {
+                "incident_id": int(self.incident_ids[selected[i]]),
+                "severity": self.severities[self.severity_codes[selected[i]]],
+                "status": self.statuses[self.status_codes[selected[i]]],
+                "production_score": _as_float(self.production_scores[selected[i]]),
+                "simulated_score": _as_float(scores[selected[i]]),
+                "production_rank": int(production_ranks[i]),
+                "simulated_rank": int(simulated_ranks[i]),
+                "rank_change": int(changes[i]),
+            }
+            for i in top
+        ]
+        return {
+            "profile": profile,
+            "incidents": len(selected),
+            "moved": int(np.count_nonzero(changes)),
+            "max_rank_change": int(np.abs(changes).max()) if len(changes) else 0,
+            "mean_abs_rank_change": float(np.abs(changes).mean()) if len(changes) else 0.0,
+            "loaded_at": self.loaded_at,
+            "simulate_ms": round(elapsed_ms, 3),
+            "items": items,
+        }
+
+
+def _as_float(value):
+    return None if np.isnan(value) else float(value)
+
+
+def get_engine(reload=False):
+    """The process-wide engine, reloaded once it is older than MAX_AGE seconds (or `reload`)."""
+    global _engine
+    with _engine_lock:
+        engine = _engine
+        too_old = engine is not None and (
+            (datetime.now(timezone.utc) - engine.loaded_at).total_seconds() > settings.RISK_SIMULATION["MAX_AGE"]
+        )
+        if engine is None or reload or too_old:
+            engine = _engine = RiskEngine.load()
+        return engine
@@ -0,0 +1,154 @@
+"""
+Risk score history (`incident_risk_snapshot` and friends, see router.py).
+
+Every INTERVAL seconds the refresher thread records the stored scores, but
+only as deltas: an incident gets a snapshot when one of its event-driven
+factors changed or its score moved by at least MIN_CHANGE points (the time
+factor alone moves it one point a day). Each snapshot is folded into the
+incident's daily bucket as it is written, and the open-incident portfolio
+gets one pre-aggregated row per run plus its own daily bucket, so history
+and trend reads never scan raw snapshots. Raw rows are kept for
+RAW_RETENTION_DAYS, daily buckets for DAILY_RETENTION_DAYS.
+"""
+import psycopg
+from django.conf import settings
+
+from app.api.common.utils import db_connection
+from app.api.risk.statuses import OPEN_STATUS_PREDICATE
+
+# Shared by every API process so only one of them snapshots at a time.
+SNAPSHOT_LOCK_KEY = 7_340_004
+
+# Score bands of the portfolio rows; the recommended_action thresholds.
+BANDS = {"critical": 90, "high": 75, "medium": 50}
+
+SNAPSHOT_SQL = """
+    WITH changed AS (
+        SELECT s.incident_id, s.risk_score, s.base_score, s.asset_factor, s.vuln_factor,
+               s.threat_factor, s.alert_factor, s.time_factor
+        FROM incident_risk_score s
+        LEFT JOIN incident_risk_snapshot_last l ON l.incident_id = s.incident_id
+        WHERE l.incident_id IS NULL
+           OR (s.base_score, s.asset_factor, s.vuln_factor, s.threat_factor, s.alert_factor)
+              IS DISTINCT FROM (l.base_score, l.asset_factor, l.vuln_factor, l.threat_factor, l.alert_factor)
+           OR ABS(s.risk_score - l.risk_score) >= %(min_change)s
+    ),
+    raw AS (
+        INSERT INTO incident_risk_snapshot (
+            incident_id, taken_at, risk_score, base_score, asset_factor, vuln_factor,
+            threat_factor, alert_factor, time_factor
+        )
+        SELECT incident_id, NOW(), risk_score, base_score, asset_factor, vuln_factor,
+               threat_factor, alert_factor, time_factor
+        FROM changed
+    ),
+    last AS (
+        INSERT INTO incident_risk_snapshot_last (
+            incident_id, taken_at, risk_score, base_score, asset_factor, vuln_factor,
+            threat_factor, alert_factor
+        )
+        SELECT incident_id, NOW(), risk_score, base_score, asset_factor, vuln_factor,
+               threat_factor, alert_factor
+        FROM changed
+        ON CONFLICT (incident_id) DO UPDATE
+          SET taken_at      = EXCLUDED.taken_at,
+              risk_score    = EXCLUDED.risk_score,
+              base_score    = EXCLUDED.base_score,
+              asset_factor  = EXCLUDED.asset_factor,
+              vuln_factor   = EXCLUDED.vuln_factor,
+              threat_factor = EXCLUDED.threat_factor,
+              alert_factor  = EXCLUDED.alert_factor
+    )
+    INSERT INTO incident_risk_daily AS d (
+        incident_id, day, samples, open_score, min_score, max_score, close_score,
+        base_score, asset_factor, vuln_factor, threat_factor, alert_factor, time_factor
+    )
+    SELECT incident_id, (NOW() AT TIME ZONE 'UTC')::DATE, 1, risk_score, risk_score, risk_score, risk_score,
+           base_score, asset_factor, vuln_factor, threat_factor, alert_factor, time_factor
+    FROM changed
+    ON CONFLICT (incident_id, day) DO UPDATE
+      SET samples       = d.samples + 1,
+          min_score     = LEAST(d.min_score, EXCLUDED.close_score),
+          max_score     = GREATEST(d.max_score, EXCLUDED.close_score),
+          close_score   = EXCLUDED.close_score,
+          base_score    = EXCLUDED.base_score,
+          asset_factor  = EXCLUDED.asset_factor,
+          vuln_factor   = EXCLUDED.vuln_factor,
+          threat_factor = EXCLUDED.threat_factor,
+          alert_factor  = EXCLUDED.alert_factor,
+          time_factor   = EXCLUDED.time_factor
+"""
+
+# The incidents of the open listing (OPEN_STATUSES).
+PORTFOLIO_SQL = f"""
+    WITH raw AS (
+        INSERT INTO risk_portfolio_snapshot (
+            taken_at, incidents, mean_score, max_score, critical, high, medium, low
+        )
+        SELECT NOW(), COUNT(*), COALESCE(AVG(risk_score), 0)::NUMERIC(5,2), MAX(risk_score),
+               COUNT(*) FILTER (WHERE risk_score >= %(critical)s),
+               COUNT(*) FILTER (WHERE risk_score >= %(high)s AND risk_score < %(critical)s),
+               COUNT(*) FILTER (WHERE risk_score >= %(medium)s AND risk_score < %(high)s),
+               COUNT(*) FILTER (WHERE risk_score < %(medium)s)
+        FROM incident_risk_score
+        WHERE {OPEN_STATUS_PREDICATE}
+        RETURNING *
+    )
+    INSERT INTO risk_portfolio_daily AS d (
+        day, samples, sum_mean_score, min_mean_score, max_mean_score, max_score,
+        incidents, critical, high, medium, low
+    )
+    SELECT (taken_at AT TIME ZONE 'UTC')::DATE, 1, mean_score, mean_score, mean_score, max_score,
+           incidents, critical, high, medium, low
+    FROM raw
+    ON CONFLICT (day) DO UPDATE
+      SET samples        = d.samples + 1,
+          sum_mean_score = d.sum_mean_score + EXCLUDED.sum_mean_score,
+          min_mean_score = LEAST(d.min_mean_score, EXCLUDED.min_mean_score),
+          max_mean_score = GREATEST(d.max_mean_score, EXCLUDED.max_mean_score),
+          max_score      = GREATEST(d.max_score, EXCLUDED.max_score),
+          incidents      = EXCLUDED.incidents,
+          critical       = EXCLUDED.critical,
+          high           = EXCLUDED.high,
+          medium         = EXCLUDED.medium,
+          low            = EXCLUDED.low
+"""
+
+PRUNE_SQL = [
+    "DELETE FROM incident_risk_snapshot WHERE taken_at < NOW() - make_interval(days => %(raw_days)s::INTEGER)",
+    "DELETE FROM risk_portfolio_snapshot WHERE taken_at < NOW() - make_interval(days => %(raw_days)s::INTEGER)",
+    "DELETE FROM incident_risk_daily WHERE day < (NOW() AT TIME ZONE 'UTC')::DATE - %(daily_days)s::INTEGER",
+    "DELETE FROM risk_portfolio_daily WHERE day < (NOW() AT TIME ZONE 'UTC')::DATE - %(daily_days)s::INTEGER",
+]
+
+
+def take_snapshot(force=False):
+    """Record changed scores and the portfolio once per INTERVAL (or `force`), then prune.
+
+    Returns the number of incidents snapshotted, or None when no snapshot was
+    due, another process is taking one, or the history tables are not
+    installed yet.
+    """
+    config = settings.RISK_HISTORY
+    try:
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", [SNAPSHOT_LOCK_KEY])
+            if not cursor.fetchone()[0]:
+                return None
+            if not force:
+                cursor.execute(
+                    "SELECT MAX(taken_at) > NOW() - make_interval(secs => %s) FROM risk_portfolio_snapshot",
+                    [config["INTERVAL"]]
+                )
+                if cursor.fetchone()[0]:
+                    return None
+
+            cursor.execute(SNAPSHOT_SQL, {"min_change": config["MIN_CHANGE"]})
+            snapshotted = cursor.rowcount
+            cursor.execute(PORTFOLIO_SQL, BANDS)
+            retention = {"raw_days": config["RAW_RETENTION_DAYS"], "daily_days": config["DAILY_RETENTION_DAYS"]}
+            for statement in PRUNE_SQL:
+                cursor.execute(statement, retention)
+        return snapshotted
+    except psycopg.errors.UndefinedTable:
+        return None
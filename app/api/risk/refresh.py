@@ -0,0 +1,180 @@
+"""
+Keeps the persisted incident risk scores (`incident_risk_score`) current.
+
+Statement-level triggers on every table a score reads queue the affected
+incidents in `incident_risk_dirty` and NOTIFY `incident_risk_dirty`. A
+background thread LISTENs for that channel and rescores the queued incidents
+in batches with `incident_risk_factors()`. The time factor grows with an
+incident's age without any write, so the same thread sweeps it every
+SWEEP_INTERVAL seconds, rewriting only the rows whose rounded value changed,
+and records the score history (history.py) every RISK_HISTORY["INTERVAL"].
+"""
+import logging
+import threading
+import time
+
+import psycopg
+from django.conf import settings
+
+from app.api.common.utils import db_connection, get_connection
+from app.api.risk.history import take_snapshot
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "incident_risk_dirty"
+
+# Shared by every API process so only one of them sweeps at a time.
+SWEEP_LOCK_KEY = 7_340_003
+
+# SKIP LOCKED lets several processes drain the queue side by side. An incident
+# queued again while its batch is being scored waits for that batch to commit
+# and is then picked up by the next one. The queue's size swings too much for
+# its statistics to be right, so the batch is matched as an array, which is
+# always a primary-key lookup, rather than joined.
+DEQUEUE_SQL = """
+    DELETE FROM incident_risk_dirty
+    WHERE incident_id = ANY (ARRAY(
+        SELECT incident_id FROM incident_risk_dirty
+        ORDER BY queued_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    ))
+    RETURNING incident_id
+"""
+
+# Deleted incidents return no factors; their rows went with ON DELETE CASCADE.
+RESCORE_SQL = """
+    INSERT INTO incident_risk_score (
+        incident_id, incident_type, severity, status, reported_date, base_score,
+        asset_factor, vuln_factor, threat_factor, alert_factor, time_factor, computed_at
+    )
+    SELECT incident_id, incident_type, severity, status, reported_date, base_score,
+           asset_factor, vuln_factor, threat_factor, alert_factor, time_factor, NOW()
+    FROM public.incident_risk_factors(NULL, %s)
+    ON CONFLICT (incident_id) DO UPDATE
+      SET incident_type = EXCLUDED.incident_type,
+          severity      = EXCLUDED.severity,
+          status        = EXCLUDED.status,
+          reported_date = EXCLUDED.reported_date,
+          base_score    = EXCLUDED.base_score,
+          asset_factor  = EXCLUDED.asset_factor,
+          vuln_factor   = EXCLUDED.vuln_factor,
+          threat_factor = EXCLUDED.threat_factor,
+          alert_factor  = EXCLUDED.alert_factor,
+          time_factor   = EXCLUDED.time_factor,
+          computed_at   = EXCLUDED.computed_at
+"""
+
+# Same expression as incident_risk_factors(). Closed incidents and incidents
+# already at the 30-day cap never change, so they are not even read.
+SWEEP_SQL = """
+    UPDATE incident_risk_score s
+    SET time_factor = t.time_factor
+    FROM (
+        SELECT incident_id,
+               LEAST(
+                   EXTRACT(EPOCH FROM (LOCALTIMESTAMP - reported_date)) / 86400,
+                   30
+               )::NUMERIC(5,2) AS time_factor
+        FROM incident_risk_score
+        WHERE status NOT IN ('resolved','closed') AND time_factor < 30
+    ) AS t
+    WHERE s.incident_id = t.incident_id AND s.time_factor <> t.time_factor
+"""
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def refresh_scores(batch_size=None):
+    """Rescore queued incidents until the queue is empty.
+
+    Returns the number of incidents taken off the queue. Incidents another
+    process is scoring are skipped, and the score tables not being installed
+    yet is not an error.
+    """
+    batch_size = batch_size or settings.RISK_SCORES["BATCH_SIZE"]
+    refreshed = 0
+    try:
+        while True:
+            with db_connection() as conn, conn.cursor() as cursor:
+                cursor.execute(DEQUEUE_SQL, [batch_size])
+                incident_ids = [row[0] for row in cursor.fetchall()]
+                if incident_ids:
+                    # Never prepared: the plan must see the ids to pick index lookups
+                    cursor.execute(RESCORE_SQL, [incident_ids], prepare=False)
+            refreshed += len(incident_ids)
+            if len(incident_ids) < batch_size:
+                return refreshed
+    except (psycopg.errors.UndefinedTable, psycopg.errors.UndefinedFunction):
+        return refreshed
+
+
+def sweep_time_factors(force=False):
+    """Bring the stored time factors up to date once per SWEEP_INTERVAL (or `force`).
+
+    Returns the number of rows rewritten, or None when the sweep was not due,
+    another process is sweeping, or the score tables are not installed yet.
+    """
+    try:
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", [SWEEP_LOCK_KEY])
+            if not cursor.fetchone()[0]:
+                return None
+            if not force:
+                cursor.execute(
+                    "SELECT swept_at > NOW() - make_interval(secs => %s) FROM incident_risk_sweep",
+                    [settings.RISK_SCORES["SWEEP_INTERVAL"]]
+                )
+                row = cursor.fetchone()
+                if row is not None and row[0]:
+                    return None
+
+            started = time.perf_counter()
+            cursor.execute(SWEEP_SQL)
+            swept = cursor.rowcount
+            cursor.execute(
+                """
+                INSERT INTO incident_risk_sweep (swept_at, swept_rows, duration_ms)
+                VALUES (NOW(), %s, %s)
+                ON CONFLICT (id) DO UPDATE
+                  SET swept_at = EXCLUDED.swept_at, swept_rows = EXCLUDED.swept_rows,
+                      duration_ms = EXCLUDED.duration_ms
+                """,
+                [swept, (time.perf_counter() - started) * 1000]
+            )
+        return swept
+    except psycopg.errors.UndefinedTable:
+        return None
+
+
+def _listen_forever():
+    config = settings.RISK_SCORES
+    while True:
+        try:
+            conn = get_connection()
+            conn.autocommit = True
+            with conn:
+                conn.execute(f"LISTEN {CHANNEL}")
+                while True:
+                    refresh_scores()
+                    sweep_time_factors()
+                    take_snapshot()
+                    notified = any(True for _ in conn.notifies(timeout=config["INTERVAL"], stop_after=1))
+                    if notified:
+                        # Let a burst of writes settle into fewer, larger batches
+                        time.sleep(config["DEBOUNCE"])
+                        for _ in conn.notifies(timeout=0):
+                            pass
+        except Exception:
+            logger.exception("Incident risk score refresher failed; retrying")
+            time.sleep(config["INTERVAL"])
+
+
+def start_refresher():
+    """Start the background refresher thread once per process."""
+    global _thread
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_listen_forever, name="risk-score-refresh", daemon=True)
+            _thread.start()
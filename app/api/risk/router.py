@@ -1,12 +1,21 @@
 from typing import Optional, Dict, List
 
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 
-from ninja import Router, Schema
+from ninja import Query, Router, Schema
 
 from psycopg import OperationalError
 
-from app.api.common.utils import get_connection
+from app.api.common import db_objects
+from app.api.common.renderers import ndjson_response, schema_rows
+from app.api.common.utils import astream_rows, db_connection
+from app.api.risk.engine import get_engine
+from app.api.risk.refresh import refresh_scores, sweep_time_factors
+from app.api.risk.schemas import (
+    RiskHistoryPoint, RiskHistoryResponse, RiskSimulationRequest, RiskSimulationResponse,
+    RiskTrendPoint, RiskTrendResponse,
+)
+from app.api.risk.statuses import OPEN_STATUS_PREDICATE, OPEN_STATUSES
 
 router = Router(tags=["risk"])
 
@@ -24,29 +33,631 @@ class SimpleMessage(Schema):
     detail: str
 
 
+# Installed by app.api.common.db_objects at startup / migrate time, never per request.
+RISK_SCORE_FUNCTION = db_objects.register("calculate_incident_risk_score", "function", """
+CREATE OR REPLACE FUNCTION public.calculate_incident_risk_score(p_incident_id INTEGER)
+RETURNS TABLE (
+    incident_id        INTEGER,
+    incident_type      VARCHAR,
+    severity           VARCHAR,
+    risk_score         NUMERIC(5,2),
+    risk_factors       JSONB,
+    recommended_action VARCHAR
+)
+LANGUAGE plpgsql AS $$
+DECLARE
+    -- rename the timestamp var so it doesn't clash
+    v_now       TIMESTAMP   := NOW();
+    v_severity  VARCHAR;
+    asset_factor      NUMERIC(5,2) := 0;
+    vuln_factor       NUMERIC(5,2) := 0;
+    threat_factor     NUMERIC(5,2) := 0;
+    alert_factor      NUMERIC(5,2) := 0;
+    time_factor       NUMERIC(5,2) := 0;
+    base_score        NUMERIC(5,2);
+    risk_factors_json JSONB;
+BEGIN
+    -- grab the incident's severity
+    SELECT i.severity
+      INTO v_severity
+    FROM api_incident i
+    WHERE i.incident_id = p_incident_id;            
+
+    -- CASE expression to set base_score
+    base_score := CASE v_severity
+        WHEN 'critical' THEN 80
+        WHEN 'high'     THEN 60
+        WHEN 'medium'   THEN 40
+        WHEN 'low'      THEN 20
+        ELSE 10
+    END;
+
+    -- asset factor
+    SELECT
+      CASE WHEN COUNT(*) = 0 THEN 0
+           ELSE 5 * COUNT(*) *
+               CASE
+                 WHEN MAX(a.criticality_level) = 'critical' THEN 2
+                 WHEN MAX(a.criticality_level) = 'high'     THEN 1.5
+                 WHEN MAX(a.criticality_level) = 'medium'   THEN 1
+                 ELSE 0.5
+               END
+      END
+      INTO asset_factor
+    FROM incident_assets ia
+    JOIN api_asset a ON a.asset_id = ia.asset_id
+    WHERE ia.incident_id = p_incident_id;
+    asset_factor := LEAST(asset_factor, 50);
+
+    -- vulnerability factor
+    SELECT
+      CASE WHEN COUNT(*) = 0 THEN 0
+           ELSE 3 * COUNT(*) *
+               CASE
+                 WHEN bool_or(v.severity = 'critical') THEN 2
+                 WHEN bool_or(v.severity = 'high')     THEN 1.5
+                 ELSE 1
+               END
+      END
+      INTO vuln_factor
+    FROM incident_assets ia
+    JOIN asset_vulnerabilities av ON av.asset_id = ia.asset_id
+    JOIN api_vulnerability v ON v.vulnerability_id = av.vulnerability_id
+    WHERE ia.incident_id = p_incident_id;
+    vuln_factor := LEAST(vuln_factor, 40);
+
+    -- threat intelligence factor
+    SELECT
+      CASE WHEN COUNT(*) = 0 THEN 0
+           ELSE 10 * COUNT(*) *
+               CASE
+                 WHEN MAX(ti.confidence_level) = 'very_high' THEN 1.5
+                 WHEN MAX(ti.confidence_level) = 'high'      THEN 1.0
+                 WHEN MAX(ti.confidence_level) = 'medium'    THEN 0.5
+                 ELSE 0.25
+               END
+      END
+      INTO threat_factor
+    FROM threat_incident_association tia
+    JOIN api_threatintelligence ti ON ti.threat_id = tia.threat_id
+    WHERE tia.incident_id = p_incident_id;
+    threat_factor := LEAST(threat_factor, 30);
+
+    -- alert factor
+    SELECT
+      CASE WHEN COUNT(*) = 0 THEN 0
+           ELSE 5 * COUNT(*) *
+               CASE
+                 WHEN bool_or(a.severity = 'critical') THEN 2
+                 WHEN bool_or(a.severity = 'high')     THEN 1.5
+                 WHEN bool_or(a.severity = 'medium')   THEN 1
+                 ELSE 0.5
+               END
+      END
+      INTO alert_factor
+    FROM api_alert a
+    WHERE a.incident_id = p_incident_id;
+    alert_factor := LEAST(alert_factor, 30);
+
+    -- time factor (days since reported, capped at 30)
+    SELECT
+      CASE WHEN status IN ('resolved','closed') THEN 0
+           ELSE LEAST(
+               EXTRACT(EPOCH FROM (v_now - reported_date)) / 86400,
+               30
+           )
+      END
+      INTO time_factor
+    FROM api_incident i
+    WHERE i.incident_id = p_incident_id;
+
+    -- assemble JSON
+    risk_factors_json := jsonb_build_object(
+        'asset_factor',         asset_factor,
+        'vulnerability_factor', vuln_factor,
+        'threat_factor',        threat_factor,
+        'alert_factor',         alert_factor,
+        'time_factor',          time_factor
+    );
+
+    -- final RETURN QUERY
+    RETURN QUERY
+    SELECT
+        i.incident_id,
+        i.incident_type,
+        i.severity,
+        LEAST(
+            base_score + asset_factor + vuln_factor
+          + threat_factor + alert_factor + time_factor,
+            100
+        )::NUMERIC(5,2) AS risk_score,
+        risk_factors_json,
+        CASE
+          WHEN base_score + asset_factor + vuln_factor
+             + threat_factor + alert_factor + time_factor >= 90
+            THEN 'Immediate executive response required'::VARCHAR
+          WHEN base_score + asset_factor + vuln_factor
+             + threat_factor + alert_factor + time_factor >= 75
+            THEN 'Escalate to security manager'::VARCHAR
+          WHEN base_score + asset_factor + vuln_factor
+             + threat_factor + alert_factor + time_factor >= 50
+            THEN 'Assign to dedicated analyst'::VARCHAR
+          ELSE 'Follow standard procedures'::VARCHAR
+        END AS recommended_action                
+    FROM api_incident i
+    WHERE i.incident_id = p_incident_id;
+END;
+$$;
+""")
+
+
+
+# Persisted scores, one row per incident, kept current by app.api.risk.refresh.
+# A row stores the factors; risk_score and recommended_action are generated
+# from them, so the time-factor sweep only has to rewrite time_factor.
+# Tables are created IF NOT EXISTS: editing a column here does not migrate
+# an existing table.
+RISK_SCORE_TABLES = db_objects.register("incident_risk_score", "table", f"""
+CREATE TABLE IF NOT EXISTS incident_risk_score (
+    incident_id   INTEGER PRIMARY KEY REFERENCES api_incident (incident_id) ON DELETE CASCADE,
+    incident_type VARCHAR,
+    severity      VARCHAR,
+    status        VARCHAR,
+    reported_date TIMESTAMP,
+    base_score    NUMERIC(5,2),
+    asset_factor  NUMERIC(5,2),
+    vuln_factor   NUMERIC(5,2),
+    threat_factor NUMERIC(5,2),
+    alert_factor  NUMERIC(5,2),
+    time_factor   NUMERIC(5,2),
+    risk_score    NUMERIC(5,2) GENERATED ALWAYS AS (
+        LEAST(base_score + asset_factor + vuln_factor + threat_factor + alert_factor + time_factor, 100)::NUMERIC(5,2)
+    ) STORED,
+    recommended_action VARCHAR GENERATED ALWAYS AS (
+        CASE
+          WHEN base_score + asset_factor + vuln_factor + threat_factor + alert_factor + time_factor >= 90
+            THEN 'Immediate executive response required'
+          WHEN base_score + asset_factor + vuln_factor + threat_factor + alert_factor + time_factor >= 75
+            THEN 'Escalate to security manager'
+          WHEN base_score + asset_factor + vuln_factor + threat_factor + alert_factor + time_factor >= 50
+            THEN 'Assign to dedicated analyst'
+          ELSE 'Follow standard procedures'
+        END
+    ) STORED,
+    computed_at   TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_incident_risk_score_open
+    ON incident_risk_score (risk_score DESC, incident_id DESC)
+    WHERE {OPEN_STATUS_PREDICATE};
+
+-- Incidents whose stored score is out of date, filled by mark_incident_risk_dirty()
+CREATE TABLE IF NOT EXISTS incident_risk_dirty (
+    incident_id INTEGER PRIMARY KEY,
+    queued_at   TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_incident_risk_dirty_queued ON incident_risk_dirty (queued_at);
+
+CREATE TABLE IF NOT EXISTS incident_risk_sweep (
+    id          BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    swept_at    TIMESTAMPTZ,
+    swept_rows  INTEGER,
+    duration_ms DOUBLE PRECISION
+);
+""")
+
+
+# Set-based equivalent of calculate_incident_risk_score for many incidents at
+# once: each factor is one grouped aggregate over the selected incidents
+# instead of six queries per incident. Factors are rounded to NUMERIC(5,2)
+# exactly like the plpgsql variables, so both functions return the same rows.
+# NULL `p_statuses` / `p_incident_ids` do not filter.
+#
+# Installing a new version queues every incident for rescoring, so the
+# persisted scores follow weight changes.
+RISK_FACTORS_FUNCTION = db_objects.register("incident_risk_factors", "function", """
+CREATE OR REPLACE FUNCTION public.incident_risk_factors(
+    p_statuses     VARCHAR[] DEFAULT NULL,
+    p_incident_ids INTEGER[] DEFAULT NULL
+)
+RETURNS TABLE (
+    incident_id   INTEGER,
+    incident_type VARCHAR,
+    severity      VARCHAR,
+    status        VARCHAR,
+    reported_date TIMESTAMP,
+    base_score    NUMERIC(5,2),
+    asset_factor  NUMERIC(5,2),
+    vuln_factor   NUMERIC(5,2),
+    threat_factor NUMERIC(5,2),
+    alert_factor  NUMERIC(5,2),
+    time_factor   NUMERIC(5,2)
+)
+LANGUAGE sql STABLE AS $$
+    WITH inc AS (
+        SELECT i.incident_id, i.incident_type, i.severity, i.status, i.reported_date
+        FROM api_incident i
+        WHERE (p_statuses IS NULL OR i.status = ANY (p_statuses))
+          AND (p_incident_ids IS NULL OR i.incident_id = ANY (p_incident_ids))
+    ),
+    asset_f AS (
+        SELECT ia.incident_id,
+               5 * COUNT(*) *
+                   CASE
+                     WHEN MAX(a.criticality_level) = 'critical' THEN 2
+                     WHEN MAX(a.criticality_level) = 'high'     THEN 1.5
+                     WHEN MAX(a.criticality_level) = 'medium'   THEN 1
+                     ELSE 0.5
+                   END AS factor
+        FROM inc
+        JOIN incident_assets ia ON ia.incident_id = inc.incident_id
+        JOIN api_asset a ON a.asset_id = ia.asset_id
+        GROUP BY ia.incident_id
+    ),
+    vuln_f AS (
+        SELECT ia.incident_id,
+               3 * COUNT(*) *
+                   CASE
+                     WHEN bool_or(v.severity = 'critical') THEN 2
+                     WHEN bool_or(v.severity = 'high')     THEN 1.5
+                     ELSE 1
+                   END AS factor
+        FROM inc
+        JOIN incident_assets ia ON ia.incident_id = inc.incident_id
+        JOIN asset_vulnerabilities av ON av.asset_id = ia.asset_id
+        JOIN api_vulnerability v ON v.vulnerability_id = av.vulnerability_id
+        GROUP BY ia.incident_id
+    ),
+    threat_f AS (
+        SELECT tia.incident_id,
+               10 * COUNT(*) *
+                   CASE
+                     WHEN MAX(ti.confidence_level) = 'very_high' THEN 1.5
+                     WHEN MAX(ti.confidence_level) = 'high'      THEN 1.0
+                     WHEN MAX(ti.confidence_level) = 'medium'    THEN 0.5
+                     ELSE 0.25
+                   END AS factor
+        FROM inc
+        JOIN threat_incident_association tia ON tia.incident_id = inc.incident_id
+        JOIN api_threatintelligence ti ON ti.threat_id = tia.threat_id
+        GROUP BY tia.incident_id
+    ),
+    alert_f AS (
+        SELECT a.incident_id,
+               5 * COUNT(*) *
+                   CASE
+                     WHEN bool_or(a.severity = 'critical') THEN 2
+                     WHEN bool_or(a.severity = 'high')     THEN 1.5
+                     WHEN bool_or(a.severity = 'medium')   THEN 1
+                     ELSE 0.5
+                   END AS factor
+        FROM inc
+        JOIN api_alert a ON a.incident_id = inc.incident_id
+        GROUP BY a.incident_id
+    )
+    SELECT inc.incident_id, inc.incident_type, inc.severity, inc.status, inc.reported_date,
+           (CASE inc.severity
+              WHEN 'critical' THEN 80
+              WHEN 'high'     THEN 60
+              WHEN 'medium'   THEN 40
+              WHEN 'low'      THEN 20
+              ELSE 10
+            END)::NUMERIC(5,2) AS base_score,
+           LEAST(COALESCE(asset_f.factor, 0), 50)::NUMERIC(5,2) AS asset_factor,
+           LEAST(COALESCE(vuln_f.factor, 0), 40)::NUMERIC(5,2) AS vuln_factor,
+           LEAST(COALESCE(threat_f.factor, 0), 30)::NUMERIC(5,2) AS threat_factor,
+           LEAST(COALESCE(alert_f.factor, 0), 30)::NUMERIC(5,2) AS alert_factor,
+           (CASE WHEN inc.status IN ('resolved','closed') THEN 0
+                 ELSE LEAST(
+                     EXTRACT(EPOCH FROM (LOCALTIMESTAMP - inc.reported_date)) / 86400,
+                     30
+                 )
+            END)::NUMERIC(5,2) AS time_factor
+    FROM inc
+    LEFT JOIN asset_f  ON asset_f.incident_id  = inc.incident_id
+    LEFT JOIN vuln_f   ON vuln_f.incident_id   = inc.incident_id
+    LEFT JOIN threat_f ON threat_f.incident_id = inc.incident_id
+    LEFT JOIN alert_f  ON alert_f.incident_id  = inc.incident_id
+$$;
+
+INSERT INTO incident_risk_dirty (incident_id)
+SELECT incident_id FROM api_incident
+ON CONFLICT (incident_id) DO NOTHING;
+""")
+
+
+# Risk scores computed from scratch, assembled from the factors the same way
+# the plpgsql function does it.
+BULK_RISK_SCORE_FUNCTION = db_objects.register("calculate_incident_risk_scores", "function", """
+CREATE OR REPLACE FUNCTION public.calculate_incident_risk_scores(p_statuses VARCHAR[] DEFAULT NULL)
+RETURNS TABLE (
+    incident_id        INTEGER,
+    incident_type      VARCHAR,
+    severity           VARCHAR,
+    risk_score         NUMERIC(5,2),
+    risk_factors       JSONB,
+    recommended_action VARCHAR
+)
+LANGUAGE sql STABLE AS $$
+    SELECT
+        f.incident_id,
+        f.incident_type,
+        f.severity,
+        LEAST(t.total, 100)::NUMERIC(5,2) AS risk_score,
+        jsonb_build_object(
+            'asset_factor',         f.asset_factor,
+            'vulnerability_factor', f.vuln_factor,
+            'threat_factor',        f.threat_factor,
+            'alert_factor',         f.alert_factor,
+            'time_factor',          f.time_factor
+        ) AS risk_factors,
+        CASE
+          WHEN t.total >= 90 THEN 'Immediate executive response required'::VARCHAR
+          WHEN t.total >= 75 THEN 'Escalate to security manager'::VARCHAR
+          WHEN t.total >= 50 THEN 'Assign to dedicated analyst'::VARCHAR
+          ELSE 'Follow standard procedures'::VARCHAR
+        END AS recommended_action
+    FROM public.incident_risk_factors(p_statuses) AS f
+    CROSS JOIN LATERAL (
+        SELECT f.base_score + f.asset_factor + f.vuln_factor
+             + f.threat_factor + f.alert_factor + f.time_factor AS total
+    ) AS t
+$$;
+""")
+
+
+
+# Statement-level trigger function queueing the incidents a write affects.
+# TG_ARGV[0] is the changed table's key column; lookup tables also pass the
+# one column the score reads (TG_ARGV[1]), so other updates queue nothing.
+RISK_DIRTY_FUNCTION = db_objects.register("mark_incident_risk_dirty", "function", """
+CREATE OR REPLACE FUNCTION mark_incident_risk_dirty()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_key     TEXT := TG_ARGV[0];
+  v_lookup  TEXT;
+  v_changed TEXT;
+  v_rows    BIGINT;
+  v_queued  BIGINT := 0;
+BEGIN
+  v_lookup := CASE v_key
+    WHEN 'incident_id'      THEN 'SELECT c.incident_id FROM %s c'
+    WHEN 'asset_id'         THEN 'SELECT ia.incident_id FROM %s c'
+                              || ' JOIN incident_assets ia ON ia.asset_id = c.asset_id'
+    WHEN 'vulnerability_id' THEN 'SELECT ia.incident_id FROM %s c'
+                              || ' JOIN asset_vulnerabilities av ON av.vulnerability_id = c.vulnerability_id'
+                              || ' JOIN incident_assets ia ON ia.asset_id = av.asset_id'
+    WHEN 'threat_id'        THEN 'SELECT tia.incident_id FROM %s c'
+                              || ' JOIN threat_incident_association tia ON tia.threat_id = c.threat_id'
+  END;
+
+  FOREACH v_changed IN ARRAY CASE
+      WHEN TG_NARGS > 1 THEN ARRAY[format(
+        '(SELECT n.* FROM new_rows n JOIN old_rows o USING (%1$I) WHERE n.%2$I IS DISTINCT FROM o.%2$I)',
+        v_key, TG_ARGV[1]
+      )]
+      WHEN TG_OP = 'INSERT' THEN ARRAY['new_rows']
+      WHEN TG_OP = 'DELETE' THEN ARRAY['old_rows']
+      ELSE ARRAY['new_rows', 'old_rows']
+    END
+  LOOP
+    EXECUTE 'INSERT INTO incident_risk_dirty (incident_id) '
+         || 'SELECT DISTINCT incident_id FROM (' || format(v_lookup, v_changed) || ') AS q '
+         || 'WHERE incident_id IS NOT NULL '
+         || 'ON CONFLICT (incident_id) DO NOTHING';
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    v_queued := v_queued + v_rows;
+  END LOOP;
+
+  IF v_queued > 0 THEN
+    PERFORM pg_notify('incident_risk_dirty', '');
+  END IF;
+  RETURN NULL;
+END;
+$$;
+""")
+
+# (table, key column, column the score reads). Incident-side tables queue on
+# every insert, update and delete; lookup tables only when that column is
+# updated, since deleting their rows cascades into the association tables.
+RISK_SOURCE_TABLES = [
+    ("api_incident", "incident_id", None),
+    ("incident_assets", "incident_id", None),
+    ("threat_incident_association", "incident_id", None),
+    ("api_alert", "incident_id", None),
+    ("asset_vulnerabilities", "asset_id", None),
+    ("api_asset", "asset_id", "criticality_level"),
+    ("api_vulnerability", "vulnerability_id", "severity"),
+    ("api_threatintelligence", "threat_id", "confidence_level"),
+]
+
+# Transition tables allow a single event per trigger.
+_TRANSITION_TABLES = {
+    "INSERT": "REFERENCING NEW TABLE AS new_rows",
+    "UPDATE": "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "DELETE": "REFERENCING OLD TABLE AS old_rows",
+}
+
+RISK_DIRTY_TRIGGERS = [
+    db_objects.register(f"tr_risk_dirty_{table}_{event.lower()}", "trigger", f"""
+        DROP TRIGGER IF EXISTS tr_risk_dirty_{table}_{event.lower()} ON {table};
+        CREATE TRIGGER tr_risk_dirty_{table}_{event.lower()}
+          AFTER {event} ON {table}
+          {_TRANSITION_TABLES[event]}
+          FOR EACH STATEMENT
+          EXECUTE FUNCTION mark_incident_risk_dirty({", ".join(repr(arg) for arg in (key, column) if arg)});
+    """)
+    for table, key, column in RISK_SOURCE_TABLES
+    for event in (("UPDATE",) if column else ("INSERT", "UPDATE", "DELETE"))
+]
+
+# Score history (app/api/risk/history.py): raw delta snapshots, the values each
+# incident was last snapshotted with, and daily buckets per incident and for the
+# open-incident portfolio. Bucket days are UTC dates.
+RISK_HISTORY_TABLES = db_objects.register("incident_risk_snapshot", "table", """
+CREATE TABLE IF NOT EXISTS incident_risk_snapshot (
+    incident_id   INTEGER NOT NULL REFERENCES api_incident (incident_id) ON DELETE CASCADE,
+    taken_at      TIMESTAMPTZ NOT NULL,
+    risk_score    NUMERIC(5,2),
+    base_score    NUMERIC(5,2),
+    asset_factor  NUMERIC(5,2),
+    vuln_factor   NUMERIC(5,2),
+    threat_factor NUMERIC(5,2),
+    alert_factor  NUMERIC(5,2),
+    time_factor   NUMERIC(5,2),
+    PRIMARY KEY (incident_id, taken_at)
+);
+CREATE INDEX IF NOT EXISTS idx_incident_risk_snapshot_taken ON incident_risk_snapshot (taken_at);
+
+CREATE TABLE IF NOT EXISTS incident_risk_snapshot_last (
+    incident_id   INTEGER PRIMARY KEY REFERENCES api_incident (incident_id) ON DELETE CASCADE,
+    taken_at      TIMESTAMPTZ NOT NULL,
+    risk_score    NUMERIC(5,2),
+    base_score    NUMERIC(5,2),
+    asset_factor  NUMERIC(5,2),
+    vuln_factor   NUMERIC(5,2),
+    threat_factor NUMERIC(5,2),
+    alert_factor  NUMERIC(5,2)
+);
+
+CREATE TABLE IF NOT EXISTS incident_risk_daily (
+    incident_id   INTEGER NOT NULL REFERENCES api_incident (incident_id) ON DELETE CASCADE,
+    day           DATE NOT NULL,
+    samples       INTEGER NOT NULL,
+    open_score    NUMERIC(5,2),
+    min_score     NUMERIC(5,2),
+    max_score     NUMERIC(5,2),
+    close_score   NUMERIC(5,2),
+    base_score    NUMERIC(5,2),
+    asset_factor  NUMERIC(5,2),
+    vuln_factor   NUMERIC(5,2),
+    threat_factor NUMERIC(5,2),
+    alert_factor  NUMERIC(5,2),
+    time_factor   NUMERIC(5,2),
+    PRIMARY KEY (incident_id, day)
+);
+CREATE INDEX IF NOT EXISTS idx_incident_risk_daily_day ON incident_risk_daily (day);
+
+CREATE TABLE IF NOT EXISTS risk_portfolio_snapshot (
+    taken_at   TIMESTAMPTZ PRIMARY KEY,
+    incidents  INTEGER NOT NULL,
+    mean_score NUMERIC(5,2),
+    max_score  NUMERIC(5,2),
+    critical   INTEGER NOT NULL,
+    high       INTEGER NOT NULL,
+    medium     INTEGER NOT NULL,
+    low        INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS risk_portfolio_daily (
+    day            DATE PRIMARY KEY,
+    samples        INTEGER NOT NULL,
+    sum_mean_score NUMERIC NOT NULL,
+    min_mean_score NUMERIC(5,2),
+    max_mean_score NUMERIC(5,2),
+    max_score      NUMERIC(5,2),
+    incidents      INTEGER NOT NULL,
+    critical       INTEGER NOT NULL,
+    high           INTEGER NOT NULL,
+    medium         INTEGER NOT NULL,
+    low            INTEGER NOT NULL
+);
+""")
+
+# Columns of incident_risk_score and the history tables, as risk_factors.
+RISK_FACTORS_JSON = """
+    jsonb_build_object(
+        'asset_factor',         asset_factor,
+        'vulnerability_factor', vuln_factor,
+        'threat_factor',        threat_factor,
+        'alert_factor',         alert_factor,
+        'time_factor',          time_factor
+    )
+"""
+
+# Open incidents by stored score; served by idx_incident_risk_score_open.
+STORED_RISK_SCORES_QUERY = f"""
+    SELECT incident_id, incident_type, severity, risk_score,
+           {RISK_FACTORS_JSON} AS risk_factors,
+           recommended_action
+    FROM incident_risk_score
+    WHERE {OPEN_STATUS_PREDICATE}
+    ORDER BY risk_score DESC, incident_id DESC
+"""
+
+# Points of GET /history/{incident_id} and GET /trend/ by resolution.
+RISK_HISTORY_QUERIES = {
+    "raw": f"""
+        SELECT taken_at AS bucket, 1 AS samples, risk_score, risk_score AS min_score,
+               risk_score AS max_score, {RISK_FACTORS_JSON} AS risk_factors
+        FROM incident_risk_snapshot
+        WHERE incident_id = %s AND taken_at >= NOW() - make_interval(days => %s::INTEGER)
+        ORDER BY taken_at
+    """,
+    "day": f"""
+        SELECT day::TIMESTAMP AT TIME ZONE 'UTC' AS bucket, samples, close_score AS risk_score,
+               min_score, max_score, {RISK_FACTORS_JSON} AS risk_factors
+        FROM incident_risk_daily
+        WHERE incident_id = %s AND day >= (NOW() AT TIME ZONE 'UTC')::DATE - %s::INTEGER
+        ORDER BY day
+    """,
+}
+
+RISK_TREND_QUERIES = {
+    "raw": """
+        SELECT taken_at AS bucket, 1 AS samples, incidents, mean_score, mean_score AS min_mean_score,
+               mean_score AS max_mean_score, max_score, critical, high, medium, low
+        FROM risk_portfolio_snapshot
+        WHERE taken_at >= NOW() - make_interval(days => %s::INTEGER)
+        ORDER BY taken_at
+    """,
+    "day": """
+        SELECT day::TIMESTAMP AT TIME ZONE 'UTC' AS bucket, samples, incidents,
+               ROUND(sum_mean_score / samples, 2) AS mean_score, min_mean_score, max_mean_score,
+               max_score, critical, high, medium, low
+        FROM risk_portfolio_daily
+        WHERE day >= (NOW() AT TIME ZONE 'UTC')::DATE - %s::INTEGER
+        ORDER BY day
+    """,
+}
+
+
+def _pending_rescores(cursor):
+    cursor.execute("SELECT COUNT(*) FROM incident_risk_dirty")
+    return cursor.fetchone()[0]
+
+
+async def _stream_risk_scores():
+    async for r in astream_rows(STORED_RISK_SCORES_QUERY):
+        yield {
+            "incident_id": r[0],
+            "incident_type": r[1],
+            "severity": r[2],
+            "risk_score": float(r[3]),
+            "risk_factors": r[4],
+            "recommended_action": r[5]
+        }
+
+
 @router.get("/risk_scores/")
-def get_risk_scores(request):
+def get_risk_scores(request, stream: bool = False):
     """
     Endpoint to get risk scores for all open incidents, ordered by priority.
+    Reads the persisted scores; X-Risk-Scores-Pending counts incidents queued for rescoring.
+    With `stream`, the scores are sent as NDJSON (one object per line) straight from a
+    server-side cursor instead of as one JSON array.
     """
     try:
-        # First ensure the risk score function exists
-        create_result = create_risk_score_function(request)
-        if not create_result.get("success", False):
-            return JsonResponse({"error": "Could not create risk score function"}, status=500)
-        connection = get_connection()
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT i.incident_id, i.incident_type, i.severity, 
-                       f.risk_score, f.risk_factors, f.recommended_action
-                FROM api_incident i
-                CROSS JOIN LATERAL (
-                    SELECT * FROM public.calculate_incident_risk_score(i.incident_id)
-                ) AS f
-                WHERE i.status IN ('open', 'investigating')
-                ORDER BY f.risk_score DESC            
-            """)
+        if stream:
+            with db_connection() as connection, connection.cursor() as cursor:
+                pending = _pending_rescores(cursor)
+            return ndjson_response(_stream_risk_scores(), headers={"X-Risk-Scores-Pending": str(pending)})
+
+        with db_connection() as connection, connection.cursor() as cursor:
+            cursor.execute(STORED_RISK_SCORES_QUERY)
             results = cursor.fetchall()
+            pending = _pending_rescores(cursor)
             results_list = []
             for r in results:
                 results_list.append({
@@ -57,196 +668,19 @@ def get_risk_scores(request):
                     "risk_factors": r[4],
                     "recommended_action": r[5]
                 })
-        return JsonResponse(results_list, safe=False)
+        response = JsonResponse(results_list, safe=False)
+        response["X-Risk-Scores-Pending"] = str(pending)
+        return response
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
 
 @router.post("/create_risk_score_function/", response=SimpleMessage)
 def create_risk_score_function(request) -> Dict:
-    """Creates the calculate_incident_risk_score function in PostgreSQL"""
+    """Reinstalls the calculate_incident_risk_score function in PostgreSQL"""
     try:
-
-        # First check if function already exists
-        check_sql = """
-        SELECT COUNT(*) FROM pg_proc 
-        WHERE proname = 'calculate_incident_risk_score'
-        """
-        conn = get_connection()
-        with conn.cursor() as cur:
-            cur.execute(check_sql)
-            function_exists = cur.fetchone()[0] > 0
-
-        create_sql = """
-        CREATE OR REPLACE FUNCTION public.calculate_incident_risk_score(p_incident_id INTEGER)
-        RETURNS TABLE (
-            incident_id        INTEGER,
-            incident_type      VARCHAR,
-            severity           VARCHAR,
-            risk_score         NUMERIC(5,2),
-            risk_factors       JSONB,
-            recommended_action VARCHAR
-        )
-        LANGUAGE plpgsql AS $$
-        DECLARE
-            -- rename the timestamp var so it doesn't clash
-            v_now       TIMESTAMP   := NOW();
-            v_severity  VARCHAR;
-            asset_factor      NUMERIC(5,2) := 0;
-            vuln_factor       NUMERIC(5,2) := 0;
-            threat_factor     NUMERIC(5,2) := 0;
-            alert_factor      NUMERIC(5,2) := 0;
-            time_factor       NUMERIC(5,2) := 0;
-            base_score        NUMERIC(5,2);
-            risk_factors_json JSONB;
-        BEGIN
-            -- grab the incident's severity
-            SELECT i.severity
-              INTO v_severity
-            FROM api_incident i
-            WHERE i.incident_id = p_incident_id;            
-
-            -- CASE expression to set base_score
-            base_score := CASE v_severity
-                WHEN 'critical' THEN 80
-                WHEN 'high'     THEN 60
-                WHEN 'medium'   THEN 40
-                WHEN 'low'      THEN 20
-                ELSE 10
-            END;
-
-            -- asset factor
-            SELECT
-              CASE WHEN COUNT(*) = 0 THEN 0
-                   ELSE 5 * COUNT(*) *
-                       CASE
-                         WHEN MAX(a.criticality_level) = 'critical' THEN 2
-                         WHEN MAX(a.criticality_level) = 'high'     THEN 1.5
-                         WHEN MAX(a.criticality_level) = 'medium'   THEN 1
-                         ELSE 0.5
-                       END
-              END
-              INTO asset_factor
-            FROM incident_assets ia
-            JOIN api_asset a ON a.asset_id = ia.asset_id
-            WHERE ia.incident_id = p_incident_id;
-            asset_factor := LEAST(asset_factor, 50);
-
-            -- vulnerability factor
-            SELECT
-              CASE WHEN COUNT(*) = 0 THEN 0
-                   ELSE 3 * COUNT(*) *
-                       CASE
-                         WHEN bool_or(v.severity = 'critical') THEN 2
-                         WHEN bool_or(v.severity = 'high')     THEN 1.5
-                         ELSE 1
-                       END
-              END
-              INTO vuln_factor
-            FROM incident_assets ia
-            JOIN asset_vulnerabilities av ON av.asset_id = ia.asset_id
-            JOIN api_vulnerability v ON v.vulnerability_id = av.vulnerability_id
-            WHERE ia.incident_id = p_incident_id;
-            vuln_factor := LEAST(vuln_factor, 40);
-
-            -- threat intelligence factor
-            SELECT
-              CASE WHEN COUNT(*) = 0 THEN 0
-                   ELSE 10 * COUNT(*) *
-                       CASE
-                         WHEN MAX(ti.confidence_level) = 'very_high' THEN 1.5
-                         WHEN MAX(ti.confidence_level) = 'high'      THEN 1.0
-                         WHEN MAX(ti.confidence_level) = 'medium'    THEN 0.5
-                         ELSE 0.25
-                       END
-              END
-              INTO threat_factor
-            FROM threat_incident_association tia
-            JOIN api_threatintelligence ti ON ti.threat_id = tia.threat_id
-            WHERE tia.incident_id = p_incident_id;
-            threat_factor := LEAST(threat_factor, 30);
-
-            -- alert factor
-            SELECT
-              CASE WHEN COUNT(*) = 0 THEN 0
-                   ELSE 5 * COUNT(*) *
-                       CASE
-                         WHEN bool_or(a.severity = 'critical') THEN 2
-                         WHEN bool_or(a.severity = 'high')     THEN 1.5
-                         WHEN bool_or(a.severity = 'medium')   THEN 1
-                         ELSE 0.5
-                       END
-              END
-              INTO alert_factor
-            FROM api_alert a
-            WHERE a.incident_id = p_incident_id;
-            alert_factor := LEAST(alert_factor, 30);
-
-            -- time factor (days since reported, capped at 30)
-            SELECT
-              CASE WHEN status IN ('resolved','closed') THEN 0
-                   ELSE LEAST(
-                       EXTRACT(EPOCH FROM (v_now - reported_date)) / 86400,
-                       30
-                   )
-              END
-              INTO time_factor
-            FROM api_incident i
-            WHERE i.incident_id = p_incident_id;
-
-            -- assemble JSON
-            risk_factors_json := jsonb_build_object(
-                'asset_factor',         asset_factor,
-                'vulnerability_factor', vuln_factor,
-                'threat_factor',        threat_factor,
-                'alert_factor',         alert_factor,
-                'time_factor',          time_factor
-            );
-
-            -- final RETURN QUERY
-            RETURN QUERY
-            SELECT
-                i.incident_id,
-                i.incident_type,
-                i.severity,
-                LEAST(
-                    base_score + asset_factor + vuln_factor
-                  + threat_factor + alert_factor + time_factor,
-                    100
-                )::NUMERIC(5,2) AS risk_score,
-                risk_factors_json,
-                CASE
-                  WHEN base_score + asset_factor + vuln_factor
-                     + threat_factor + alert_factor + time_factor >= 90
-                    THEN 'Immediate executive response required'::VARCHAR
-                  WHEN base_score + asset_factor + vuln_factor
-                     + threat_factor + alert_factor + time_factor >= 75
-                    THEN 'Escalate to security manager'::VARCHAR
-                  WHEN base_score + asset_factor + vuln_factor
-                     + threat_factor + alert_factor + time_factor >= 50
-                    THEN 'Assign to dedicated analyst'::VARCHAR
-                  ELSE 'Follow standard procedures'::VARCHAR
-                END AS recommended_action                
-            FROM api_incident i
-            WHERE i.incident_id = p_incident_id;
-        END;
-        $$;
-        """
-
-        with conn.cursor() as cur:
-            cur.execute(create_sql)
-        conn.commit()
-
-        # Verify function creation was successful
-        with conn.cursor() as cur:
-            cur.execute("SELECT proname FROM pg_proc WHERE proname = 'calculate_incident_risk_score'")
-            if cur.fetchone() is None:
-                conn.close()
-                return {"success": False, "detail": "Function creation failed - not found after creation"}
-
-        conn.close()
-        status = "updated" if function_exists else "created"
-        return {"success": True, "detail": f"Risk score function successfully {status}"}
+        db_objects.install([RISK_SCORE_FUNCTION.name], force=True)
+        return {"success": True, "detail": f"Risk score function installed (checksum {RISK_SCORE_FUNCTION.checksum[:12]})"}
     except OperationalError as e:
         return {"success": False, "detail": f"Database operation failed: {str(e)}"}
     except Exception as e:
@@ -259,13 +693,7 @@ def calculate_risk_score(request, incident_id: int):
     Calculates the risk score for a specific incident based on multiple factors.
     """
     try:
-        # First ensure the risk score function exists
-        create_result = create_risk_score_function(request)
-        if not create_result.get("success", False):
-            return JsonResponse({"error": "Could not create risk score function"}, status=500)
-
-        conn = get_connection()
-        with conn.cursor() as cursor:
+        with db_connection() as conn, conn.cursor() as cursor:
             cursor.execute("SELECT * FROM public.calculate_incident_risk_score(%s)", (incident_id,))
             result = cursor.fetchone()
 
@@ -282,45 +710,27 @@ def calculate_risk_score(request, incident_id: int):
                 "recommended_action": result[5]
             }
 
-        conn.close()
         return response
     except OperationalError as e:
         return JsonResponse({"error": f"Database operation failed: {str(e)}"}, status=500)
     except Exception as e:
         return JsonResponse({"error": f"Unexpected error: {str(e)}"}, status=500)
-    finally:
-        if 'conn' in locals() and conn:
-            conn.close()
 
 @router.get("/risk_scores/open/", response=List[RiskScoreResponse])
-def list_open_incident_risk_scores(request):
+def list_open_incident_risk_scores(request, response: HttpResponse):
     """
     Lists risk scores for all open incidents, ordered by priority (highest risk first).
     """
     try:
-        # First ensure the risk score function exists
-        create_result = create_risk_score_function(request)
-        if not create_result.get("success", False):
-            return JsonResponse({"error": "Could not create risk score function"}, status=500)
-
-        conn = get_connection()
-
-        with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT r.*
-                FROM api_incident i
-                CROSS JOIN LATERAL (
-                    SELECT * FROM public.calculate_incident_risk_score(i.incident_id)
-                ) AS r                
-                WHERE i.status IN ('open', 'investigating')
-                ORDER BY r.risk_score DESC
-            """)
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(STORED_RISK_SCORES_QUERY)
             results = cursor.fetchall()
+            response["X-Risk-Scores-Pending"] = str(_pending_rescores(cursor))
 
             # Map to response objects
-            response = []
+            scores = []
             for row in results:
-                response.append({
+                scores.append({
                     "incident_id": row[0],
                     "incident_type": row[1],
                     "severity": row[2],
@@ -329,12 +739,102 @@ def list_open_incident_risk_scores(request):
                     "recommended_action": row[5]
                 })
 
-        conn.close()
-        return response
+        return scores
     except OperationalError as e:
         return JsonResponse({"error": f"Database operation failed: {str(e)}"}, status=500)
     except Exception as e:
         return JsonResponse({"error": f"Unexpected error: {str(e)}"}, status=500)
-    finally:
-        if 'conn' in locals() and conn:
-                conn.close()
\ No newline at end of file
+
+
+@router.post("/risk_scores/refresh/", response=SimpleMessage)
+def refresh_risk_scores(request, full: bool = False):
+    """
+    Rescores queued incidents and ages the stored time factors now, without waiting
+    for the background refresher. `full` queues every incident first.
+    """
+    try:
+        if full:
+            with db_connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO incident_risk_dirty (incident_id)
+                    SELECT incident_id FROM api_incident
+                    ON CONFLICT (incident_id) DO NOTHING
+                """)
+        refreshed = refresh_scores()
+        swept = sweep_time_factors(force=True)
+        return {"success": True, "detail": f"Rescored {refreshed} incidents, updated {swept or 0} time factors"}
+    except OperationalError as e:
+        return {"success": False, "detail": f"Database operation failed: {str(e)}"}
+
+
+@router.post("/simulate/", response=RiskSimulationResponse)
+def simulate_risk_weights(request, payload: RiskSimulationRequest, reload: bool = False):
+    """
+    Ranks incidents under a what-if weight profile and reports how each moved against
+    the production weights. Factors are loaded once per process and reused for
+    RISK_SIMULATION["MAX_AGE"] seconds; `reload` loads them again now.
+    """
+    try:
+        engine = get_engine(reload=reload)
+        return engine.simulate(
+            payload.profile.dict(exclude_none=True),
+            payload.statuses if payload.statuses is not None else OPEN_STATUSES,
+            payload.limit,
+        )
+    except OperationalError as e:
+        return JsonResponse({"error": f"Database operation failed: {str(e)}"}, status=500)
+
+
+@router.get("/history/{incident_id}", response=RiskHistoryResponse)
+def get_risk_history(
+    request,
+    incident_id: int,
+    resolution: str = Query("day", pattern="^(raw|day)$"),
+    days: int = Query(30, ge=1, le=366),
+):
+    """
+    Risk score history of an incident over the last `days` days, from the daily buckets
+    or, within the raw retention, from the individual snapshots. Snapshots are only
+    taken when the score changed, so a missing bucket means the score held.
+    """
+    try:
+        with db_connection() as conn, conn.cursor(row_factory=schema_rows(RiskHistoryPoint)) as cursor:
+            cursor.execute(RISK_HISTORY_QUERIES[resolution], [incident_id, days])
+            points = cursor.fetchall()
+            cursor.execute(
+                f"""
+                SELECT computed_at AS bucket, 1 AS samples, risk_score, risk_score AS min_score,
+                       risk_score AS max_score, {RISK_FACTORS_JSON} AS risk_factors
+                FROM incident_risk_score
+                WHERE incident_id = %s
+                """,
+                [incident_id]
+            )
+            current = cursor.fetchone()
+            if current is None and not points:
+                cursor.execute("SELECT 1 FROM api_incident WHERE incident_id = %s", [incident_id])
+                if cursor.fetchone() is None:
+                    return JsonResponse({"error": "Incident not found"}, status=404)
+
+        return {"incident_id": incident_id, "resolution": resolution, "current": current, "points": points}
+    except OperationalError as e:
+        return JsonResponse({"error": f"Database operation failed: {str(e)}"}, status=500)
+
+
+@router.get("/trend/", response=RiskTrendResponse)
+def get_risk_trend(
+    request,
+    resolution: str = Query("day", pattern="^(raw|day)$"),
+    days: int = Query(30, ge=1, le=366),
+):
+    """
+    Open-incident portfolio over the last `days` days: mean and maximum score and the
+    number of incidents per score band, read from the pre-aggregated portfolio rows.
+    """
+    try:
+        with db_connection() as conn, conn.cursor(row_factory=schema_rows(RiskTrendPoint)) as cursor:
+            cursor.execute(RISK_TREND_QUERIES[resolution], [days])
+            points = cursor.fetchall()
+        return {"resolution": resolution, "points": points}
+    except OperationalError as e:
+        return JsonResponse({"error": f"Database operation failed: {str(e)}"}, status=500)
@@ -0,0 +1,98 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from ninja import Schema
+from pydantic import Field
+
+from app.api.common.pagination import MAX_LIMIT
+
+
+# Any field left out keeps the production value (app/api/risk/engine.py).
+class BaseScoreWeights(Schema):
+    levels: Optional[Dict[str, float]] = None  # base score by incident severity
+    default: Optional[float] = None  # severities not listed
+
+
+class FactorWeights(Schema):
+    weight: Optional[float] = None  # points per related row
+    cap: Optional[float] = None
+    levels: Optional[Dict[str, float]] = None  # multiplier by level label; merged into the production levels
+    default: Optional[float] = None  # multiplier for labels not listed
+
+
+class TimeWeights(Schema):
+    weight: Optional[float] = None  # points per day since reported
+    cap: Optional[float] = None
+
+
+class RiskWeightProfile(Schema):
+    base: Optional[BaseScoreWeights] = None
+    asset: Optional[FactorWeights] = None
+    vulnerability: Optional[FactorWeights] = None
+    threat: Optional[FactorWeights] = None
+    alert: Optional[FactorWeights] = None
+    time: Optional[TimeWeights] = None
+    max_score: Optional[float] = None
+
+
+class RiskSimulationRequest(Schema):
+    profile: RiskWeightProfile = RiskWeightProfile()
+    statuses: Optional[List[str]] = Field(None, description="Incidents to rank; defaults to the open statuses")
+    limit: int = Field(50, ge=1, le=MAX_LIMIT)
+
+
+class RiskRankChange(Schema):
+    incident_id: int
+    severity: Optional[str] = None
+    status: Optional[str] = None
+    production_score: Optional[float] = None
+    simulated_score: Optional[float] = None
+    production_rank: int
+    simulated_rank: int
+    rank_change: int  # positive: the incident moved up
+
+
+class RiskSimulationResponse(Schema):
+    profile: Dict  # the effective profile, production values filled in
+    incidents: int
+    moved: int
+    max_rank_change: int
+    mean_abs_rank_change: float
+    loaded_at: datetime  # when the incident factors were loaded
+    simulate_ms: float
+    items: List[RiskRankChange]  # highest simulated risk first
+
+
+class RiskHistoryPoint(Schema):
+    bucket: datetime  # snapshot time, or the start of the UTC day
+    samples: int
+    risk_score: Optional[float] = None  # at the end of the bucket
+    min_score: Optional[float] = None
+    max_score: Optional[float] = None
+    risk_factors: Optional[Dict] = None  # at the end of the bucket
+
+
+class RiskHistoryResponse(Schema):
+    incident_id: int
+    resolution: str
+    current: Optional[RiskHistoryPoint] = None  # the stored score now
+    points: List[RiskHistoryPoint]  # oldest first; no bucket means the score held
+
+
+class RiskTrendPoint(Schema):
+    bucket: datetime
+    samples: int
+    incidents: int  # open incidents at the end of the bucket
+    mean_score: Optional[float] = None
+    min_mean_score: Optional[float] = None
+    max_mean_score: Optional[float] = None
+    max_score: Optional[float] = None
+    critical: int  # score bands of the recommended actions: >= 90, >= 75, >= 50, below
+    high: int
+    medium: int
+    low: int
+
+
+class RiskTrendResponse(Schema):
+    resolution: str
+    points: List[RiskTrendPoint]  # oldest first
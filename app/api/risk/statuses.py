@@ -0,0 +1,4 @@
+# Statuses scored by the "open incidents" endpoints and the portfolio trend.
+OPEN_STATUSES = ["open", "investigating"]
+# The same filter as SQL; the partial index on incident_risk_score is built on it.
+OPEN_STATUS_PREDICATE = "status IN ({})".format(", ".join(f"'{status}'" for status in OPEN_STATUSES))
@@ -1,12 +1,17 @@
 
+from datetime import datetime, timezone
 from ninja import Schema
-from typing import Dict
+from pydantic import Field
+from typing import Any, Dict, List, Optional
+import psycopg
 from psycopg import OperationalError
 
 from ninja import Router
 
 from app import settings
-from app.api.common.utils import get_connection
+from app.api.alerts import partitions
+from app.api.common import cache, db_objects, statements, synthetic
+from app.api.common.utils import db_connection, get_connection, pool_stats
 
 router = Router(tags=["settings"])
 
@@ -14,12 +19,75 @@ class MessageResponse(Schema):
     message: str
     success: bool
 
+
+class SyntheticDataRequest(Schema):
+    incidents: int = Field(10_000, ge=1, le=10_000_000)
+    seed: int = 0
+    end: Optional[datetime] = None  # newest timestamp in the data (UTC); today 00:00 by default
+    reset: bool = False  # truncate every table first
+    sizes: Dict[str, int] = {}  # per-table overrides, keys of synthetic.RATIOS
+
+
+# Triggers deployed by app.api.common.db_objects; they are skipped until the tables exist.
+THREAT_TIMESTAMP_OBJECTS = [
+    db_objects.register("trg_threat_update_timestamp", "function", """
+        CREATE OR REPLACE FUNCTION trg_threat_update_timestamp()
+        RETURNS TRIGGER AS $$
+        BEGIN
+          NEW.last_updated := NOW();
+          RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """),
+    db_objects.register("tr_threat_timestamp", "trigger", """
+        DROP TRIGGER IF EXISTS tr_threat_timestamp ON api_threatintelligence;
+        CREATE TRIGGER tr_threat_timestamp
+          BEFORE INSERT OR UPDATE
+          ON api_threatintelligence
+          FOR EACH ROW
+          EXECUTE FUNCTION trg_threat_update_timestamp();
+    """),
+]
+
+ASSOC_TOUCH_OBJECTS = [
+    db_objects.register("trg_assoc_touch_threat", "function", """
+        CREATE OR REPLACE FUNCTION trg_assoc_touch_threat()
+        RETURNS TRIGGER AS $$
+        DECLARE
+          tid INTEGER;
+        BEGIN
+          IF TG_OP = 'DELETE' THEN
+            tid := OLD.threat_id;
+          ELSE
+            tid := NEW.threat_id;
+          END IF;
+          UPDATE api_threatintelligence
+            SET last_updated = NOW()
+            WHERE threat_id = tid;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """),
+] + [
+    db_objects.register(trigger, "trigger", f"""
+        DROP TRIGGER IF EXISTS {trigger} ON {table};
+        CREATE TRIGGER {trigger}
+          AFTER INSERT OR UPDATE OR DELETE
+          ON {table}
+          FOR EACH ROW
+          EXECUTE FUNCTION trg_assoc_touch_threat();
+    """)
+    for trigger, table in [
+        ("tr_asset_assoc_touch", "threat_asset_association"),
+        ("tr_vuln_assoc_touch", "threat_vulnerability_association"),
+        ("tr_incident_assoc_touch", "threat_incident_association"),
+    ]
+]
+
 @router.post("/create_tables/", response=MessageResponse)
 def create_and_execute_tables(request) -> Dict:
     """Creates all tables in the cyber_db database directly without using a stored procedure"""
     try:
-        conn = get_connection()
-
         create_tables_sql = """
         -- --------------------------------------------------------------------------------
         -- 1) Users
@@ -99,16 +167,18 @@ def create_and_execute_tables(request) -> Dict:
         -- --------------------------------------------------------------------------------
         -- 7) Alerts
         -- --------------------------------------------------------------------------------
+        -- Range partitioned by alert_time; partitions are managed by app/api/alerts/partitions.py
         CREATE TABLE IF NOT EXISTS api_alert (
-          alert_id    SERIAL       PRIMARY KEY,
+          alert_id    SERIAL,
           source      VARCHAR(100),
           name        VARCHAR(255),
           alert_type  VARCHAR(100),
-          alert_time  TIMESTAMP,
+          alert_time  TIMESTAMP     NOT NULL,
           severity    VARCHAR(50),
           status      VARCHAR(50),
-          incident_id INT           REFERENCES api_incident(incident_id) ON DELETE SET NULL ON UPDATE CASCADE
-        );
+          incident_id INT           REFERENCES api_incident(incident_id) ON DELETE SET NULL ON UPDATE CASCADE,
+          PRIMARY KEY (alert_id, alert_time)
+        ) PARTITION BY RANGE (alert_time);
         
         -- --------------------------------------------------------------------------------
         -- 8) Threat Intelligence
@@ -169,6 +239,7 @@ def create_and_execute_tables(request) -> Dict:
 
         -- Create indexes
         CREATE INDEX IF NOT EXISTS idx_alert_incident_id ON api_alert(incident_id);
+        CREATE INDEX IF NOT EXISTS idx_alert_time_id ON api_alert(alert_time DESC NULLS LAST, alert_id DESC);
         CREATE INDEX IF NOT EXISTS idx_av_asset_id ON asset_vulnerabilities(asset_id);
         CREATE INDEX IF NOT EXISTS idx_asset_vulnerability_id ON asset_vulnerabilities(vulnerability_id);
         CREATE INDEX IF NOT EXISTS idx_incident_id ON incident_assets(incident_id);
@@ -181,16 +252,20 @@ def create_and_execute_tables(request) -> Dict:
         CREATE INDEX IF NOT EXISTS idx_tia_incident_id ON threat_incident_association(incident_id);
         CREATE INDEX IF NOT EXISTS idx_ual_user_id ON user_activity_logs(user_id);
         CREATE INDEX IF NOT EXISTS idx_ual_activity_type ON user_activity_logs(activity_type);
-        CREATE INDEX IF NOT EXISTS idx_ual_timestamp ON user_activity_logs(timestamp);
+        DROP INDEX IF EXISTS idx_ual_timestamp;
+        CREATE INDEX IF NOT EXISTS idx_ual_timestamp_id ON user_activity_logs(timestamp DESC NULLS LAST, log_id DESC);
         """
 
-        with conn.cursor() as cur:
+        with db_connection() as conn, conn.cursor() as cur:
             cur.execute(create_tables_sql)
-        conn.commit()
-        conn.close()
+        # Triggers on these tables were skipped while they did not exist
+        db_objects.install()
+        # The default alert partition and those of the current and upcoming
+        # periods; an older, plain api_alert is left to `manage.py partition_alerts`
+        partitions.maintain()
 
         return {"message": "Database tables created successfully", "success": True}
-    except OperationalError as e:
+    except psycopg.Error as e:
         return {"message": f"Database operation failed: {str(e)}", "success": False}
 
 
@@ -200,27 +275,9 @@ def create_threat_update_trigger(request) -> Dict:
     Creates or replaces the trigger function and trigger that stamps last_updated on api_threatintelligence.
     """
     try:
-        conn = get_connection()
-        sql = """
-        CREATE OR REPLACE FUNCTION trg_threat_update_timestamp()
-        RETURNS TRIGGER AS $$
-        BEGIN
-          NEW.last_updated := NOW();
-          RETURN NEW;
-        END;
-        $$ LANGUAGE plpgsql;
-
-        DROP TRIGGER IF EXISTS tr_threat_timestamp ON api_threatintelligence;
-        CREATE TRIGGER tr_threat_timestamp
-          BEFORE INSERT OR UPDATE
-          ON api_threatintelligence
-          FOR EACH ROW
-          EXECUTE FUNCTION trg_threat_update_timestamp();
-        """
-        with conn.cursor() as cur:
-            cur.execute(sql)
-        conn.commit()
-        conn.close()
+        result = db_objects.install([obj.name for obj in THREAT_TIMESTAMP_OBJECTS], force=True)
+        if result["skipped"]:
+            return {"message": f"Create the tables first: {'; '.join(result['skipped'].values())}", "success": False}
         return {"message": "Threat update trigger created successfully", "success": True}
     except OperationalError as e:
         return {"message": f"Database operation failed: {str(e)}", "success": False}
@@ -229,50 +286,9 @@ def create_threat_update_trigger(request) -> Dict:
 def create_assoc_touch_triggers(request) -> Dict:
     """Creates or replaces triggers that bump last_updated on threat associations."""
     try:
-        conn = get_connection()
-        sql = """
-        CREATE OR REPLACE FUNCTION trg_assoc_touch_threat()
-        RETURNS TRIGGER AS $$
-        DECLARE
-          tid INTEGER;
-        BEGIN
-          IF TG_OP = 'DELETE' THEN
-            tid := OLD.threat_id;
-          ELSE
-            tid := NEW.threat_id;
-          END IF;
-          UPDATE api_threatintelligence
-            SET last_updated = NOW()
-            WHERE threat_id = tid;
-          RETURN NULL;
-        END;
-        $$ LANGUAGE plpgsql;
-
-        DROP TRIGGER IF EXISTS tr_asset_assoc_touch ON threat_asset_association;
-        CREATE TRIGGER tr_asset_assoc_touch
-          AFTER INSERT OR UPDATE OR DELETE
-          ON threat_asset_association
-          FOR EACH ROW
-          EXECUTE FUNCTION trg_assoc_touch_threat();
-
-        DROP TRIGGER IF EXISTS tr_vuln_assoc_touch ON threat_vulnerability_association;
-        CREATE TRIGGER tr_vuln_assoc_touch
-          AFTER INSERT OR UPDATE OR DELETE
-          ON threat_vulnerability_association
-          FOR EACH ROW
-          EXECUTE FUNCTION trg_assoc_touch_threat();
-
-        DROP TRIGGER IF EXISTS tr_incident_assoc_touch ON threat_incident_association;
-        CREATE TRIGGER tr_incident_assoc_touch
-          AFTER INSERT OR UPDATE OR DELETE
-          ON threat_incident_association
-          FOR EACH ROW
-          EXECUTE FUNCTION trg_assoc_touch_threat();
-        """
-        with conn.cursor() as cur:
-            cur.execute(sql)
-        conn.commit()
-        conn.close()
+        result = db_objects.install([obj.name for obj in ASSOC_TOUCH_OBJECTS], force=True)
+        if result["skipped"]:
+            return {"message": f"Create the tables first: {'; '.join(result['skipped'].values())}", "success": False}
         return {"message": "Association triggers created successfully", "success": True}
     except OperationalError as e:
         return {"message": f"Database operation failed: {str(e)}", "success": False}
@@ -284,8 +300,6 @@ def create_seed_procedure(request):
     which inserts all of your initial seed rows.
     """
     try:
-        conn = get_connection()
-
         create_sql = """
         CREATE OR REPLACE PROCEDURE insert_seed_data()
         LANGUAGE plpgsql
@@ -424,10 +438,8 @@ def create_seed_procedure(request):
         $$;
         """
 
-        with conn.cursor() as cursor:
+        with db_connection() as conn, conn.cursor() as cursor:
             cursor.execute(create_sql)
-        conn.commit()
-        conn.close()
 
         return {"message": "Seed-data procedure created or replaced successfully", "success": True}
     except OperationalError as e:
@@ -439,11 +451,8 @@ def execute_seed_procedure(request):
     Calls the `insert_seed_data()` procedure to populate all of your tables.
     """
     try:
-        conn = get_connection()
-        with conn.cursor() as cursor:
+        with db_connection() as conn, conn.cursor() as cursor:
             cursor.execute("CALL insert_seed_data()")
-        conn.commit()
-        conn.close()
         return {"message": "Data inserted successfully", "success": True}
     except OperationalError as e:
         return {"message": f"Data insertion failed: {str(e)}", "success": False}
@@ -452,7 +461,6 @@ def execute_seed_procedure(request):
 def create_truncate_procedure(request) -> Dict:
     """Creates the database truncate procedure in PostgreSQL"""
     try:
-        conn = get_connection()
         create_sql = """
         CREATE OR REPLACE PROCEDURE truncate_cybersecurity_db()
         LANGUAGE plpgsql
@@ -476,10 +484,8 @@ def create_truncate_procedure(request) -> Dict:
         $$;
         """
 
-        with conn.cursor() as cur:
+        with db_connection() as conn, conn.cursor() as cur:
             cur.execute(create_sql)
-        conn.commit()
-        conn.close()
 
         return {"message": "Truncate procedure created successfully", "success": True}
     except OperationalError as e:
@@ -489,11 +495,9 @@ def create_truncate_procedure(request) -> Dict:
 def execute_truncate_procedure(request) -> Dict:
     """Executes the database truncate procedure"""
     try:
-        conn = get_connection()
-        with conn.cursor() as cur:
+        with db_connection() as conn, conn.cursor() as cur:
             cur.execute("CALL truncate_cybersecurity_db();")
-        conn.commit()
-        conn.close()
+        cache.invalidate_all()
 
         return {"message": "Database truncated successfully", "success": True}
     except OperationalError as e:
@@ -517,7 +521,50 @@ def drop_database(request) -> Dict:
             # Then drop the database
             cur.execute(f"DROP DATABASE IF EXISTS {database}")
         conn.close()
+        cache.invalidate_all()
         return {"message": "Database dropped successfully", "success": True}
     except OperationalError as e:
         return {"message": f"Database operation failed: {str(e)}", "success": False}
 
+
+@router.get("/pool_stats/", response=Dict[str, float])
+def get_pool_stats(request) -> Dict:
+    """Returns connection pool usage: waiting clients, checkout latency and connections in use"""
+    return pool_stats()
+
+
+@router.get("/cache_stats/", response=Dict[str, float])
+def get_cache_stats(request) -> Dict:
+    """Returns entity cache hit/miss counters and the size of the in-process tier"""
+    return cache.cache_stats()
+
+
+@router.get("/statement_stats/", response=Dict[str, Dict[str, float]])
+def get_statement_stats(request) -> Dict:
+    """Returns call counts and mean/max latency (ms) for each registered prepared statement"""
+    return statements.statement_stats()
+
+
+@router.get("/db_objects/", response=List[Dict[str, Any]])
+def get_db_objects(request) -> List:
+    """Lists the functions and triggers managed by the installer with their checksums"""
+    return db_objects.status()
+
+
+@router.post("/install_db_objects/", response=Dict[str, Any])
+def install_db_objects(request, force: bool = False) -> Dict:
+    """Installs database functions and triggers whose definition changed (or all of them with force)"""
+    return db_objects.install(force=force)
+
+
+@router.post("/generate_synthetic_data/", response={200: Dict[str, Any], 400: MessageResponse})
+def generate_synthetic_data(request, payload: SyntheticDataRequest):
+    """Loads a deterministic synthetic data set at the requested scale (see app.api.common.synthetic)"""
+    unknown = set(payload.sizes) - set(synthetic.RATIOS)
+    if unknown:
+        return 400, {"message": f"Unknown sizes: {', '.join(sorted(unknown))}", "success": False}
+    end = payload.end.astimezone(timezone.utc).replace(tzinfo=None) if payload.end and payload.end.tzinfo else payload.end
+    try:
+        return synthetic.generate(payload.incidents, seed=payload.seed, end=end, reset=payload.reset, **payload.sizes)
+    except OperationalError as e:
+        return 400, {"message": f"Data generation failed: {str(e)}", "success": False}
@@ -0,0 +1,81 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from app.api.risk.engine import PRODUCTION_PROFILE, RiskEngine, merge_profile
+
+# incident_id, severity, status, age_days, then (count, level) of assets,
+# vulnerabilities, threats and alerts, as FEATURES_QUERY returns them.
+ROWS = [
+    # 40 + 5*1*0.5 + 0 + 10*1*0.5 + 5*2*0.5 + 2.5
+    (1, "medium", "open", 2.5, 1, "low", 0, None, 1, "medium", 2, None),
+    # 80 + min(5*20*2, 50), no time factor once resolved, capped at 100
+    (2, "critical", "resolved", 400.0, 20, "critical", 0, None, 0, None, 0, None),
+    # 20 + the time cap for an unknown age
+    (3, "low", "investigating", None, 0, None, 0, None, 0, None, 0, None),
+    # Default base, and an age that rounds away
+    (4, "unknown", "open", 0.004, 0, None, 0, None, 0, None, 0, None),
+    # As incident 1
+    (5, "medium", "open", 2.5, 1, "low", 0, None, 1, "medium", 2, None),
+    # 60 + 5*2*1.5 + 3*3*2 + 10*1*1.5 + min(5*4*2, 30) + min(40, 30) = 60 + 15 + 18 + 15 + 30 + 30
+    (6, "high", "contained", 40.0, 2, "high", 3, "critical", 1, "very_high", 4, "critical"),
+    # 20 + 3*1*1 + 10*1*0.25, no time factor once closed
+    (7, "low", "closed", 1.0, 0, None, 1, None, 1, "low", 0, None),
+]
+
+
+class MergeProfileTests(SimpleTestCase):
+    def test_no_overrides(self):
+        self.assertEqual(merge_profile(None), PRODUCTION_PROFILE)
+        self.assertIsNot(merge_profile({}), PRODUCTION_PROFILE)
+
+    def test_nested_overrides(self):
+        profile = merge_profile({"asset": {"cap": 10, "levels": {"low": 1}}, "max_score": 90})
+        self.assertEqual(profile["asset"]["cap"], 10)
+        self.assertEqual(profile["asset"]["weight"], 5)
+        self.assertEqual(profile["asset"]["levels"], {"critical": 2, "high": 1.5, "medium": 1, "low": 1})
+        self.assertEqual(profile["max_score"], 90)
+        self.assertEqual(profile["base"], PRODUCTION_PROFILE["base"])
+
+    def test_production_profile_untouched(self):
+        merge_profile({"asset": {"levels": {"low": 1}}})
+        self.assertNotIn("low", PRODUCTION_PROFILE["asset"]["levels"])
+
+    def test_replaced_values(self):
+        profile = merge_profile({"time": 5, "base": {"levels": 3}})
+        self.assertEqual(profile["time"], 5)
+        self.assertEqual(profile["base"]["levels"], 3)
+
+
+class ScoreTests(SimpleTestCase):
+    def setUp(self):
+        self.engine = RiskEngine(ROWS)
+
+    def test_production_scores(self):
+        np.testing.assert_array_equal(
+            self.engine.production_scores, [55.0, 100.0, 50.0, 10.0, 55.0, 100.0, 25.5]
+        )
+
+    def test_under_a_profile(self):
+        profile = merge_profile({"asset": {"cap": 10, "levels": {"low": 1}}, "max_score": 90})
+        np.testing.assert_array_equal(self.engine.score(profile), [57.5, 90.0, 50.0, 10.0, 57.5, 90.0, 25.5])
+
+    def test_no_incidents(self):
+        engine = RiskEngine([])
+        self.assertEqual(len(engine), 0)
+        self.assertEqual(len(engine.production_scores), 0)
+
+
+class RanksTests(SimpleTestCase):
+    def setUp(self):
+        self.engine = RiskEngine(ROWS)
+
+    def test_highest_first_ties_to_higher_id(self):
+        selected, ranks = self.engine.ranks(self.engine.production_scores, self.engine.status_mask(None))
+        by_id = dict(zip(self.engine.incident_ids[selected].tolist(), ranks.tolist()))
+        self.assertEqual(by_id, {6: 1, 2: 2, 5: 3, 1: 4, 3: 5, 7: 6, 4: 7})
+
+    def test_masked(self):
+        mask = self.engine.status_mask(["open", "investigating"])
+        selected, ranks = self.engine.ranks(self.engine.production_scores, mask)
+        by_id = dict(zip(self.engine.incident_ids[selected].tolist(), ranks.tolist()))
+        self.assertEqual(by_id, {5: 1, 1: 2, 3: 3, 4: 4})
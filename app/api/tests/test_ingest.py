@@ -0,0 +1,35 @@
+import hashlib
+from datetime import datetime
+
+from django.test import SimpleTestCase
+
+from app.api.alerts.ingest import fingerprint, window_start
+
+
+class WindowStartTests(SimpleTestCase):
+    def test_aligned_to_the_epoch(self):
+        self.assertEqual(window_start(datetime(2026, 3, 1, 0, 7, 30), 300), datetime(2026, 3, 1, 0, 5))
+        self.assertEqual(window_start(datetime(2026, 3, 1, 0, 5), 300), datetime(2026, 3, 1, 0, 5))
+        self.assertEqual(window_start(datetime(2026, 3, 1, 0, 4, 59, 999999), 300), datetime(2026, 3, 1))
+
+    def test_windows_wider_than_a_day(self):
+        # Epoch days: 1970-01-01 is a Thursday, so weekly windows start on Thursdays
+        self.assertEqual(window_start(datetime(2026, 3, 1, 13), 7 * 86400), datetime(2026, 2, 26))
+
+    def test_before_the_epoch(self):
+        self.assertEqual(window_start(datetime(1969, 12, 31, 23, 59, 59), 60), datetime(1969, 12, 31, 23, 59))
+
+
+class FingerprintTests(SimpleTestCase):
+    def test_value(self):
+        self.assertEqual(fingerprint("SIEM", "Login", "Auth"), hashlib.md5(b"SIEM\x1fLogin\x1fAuth").hexdigest())
+        self.assertEqual(
+            fingerprint("SIEM", "Login", "Auth", 12), hashlib.md5(b"SIEM\x1fLogin\x1fAuth\x1f12").hexdigest()
+        )
+
+    def test_asset_distinguishes(self):
+        self.assertNotEqual(fingerprint("SIEM", "Login", "Auth"), fingerprint("SIEM", "Login", "Auth", 1))
+        self.assertNotEqual(fingerprint("SIEM", "Login", "Auth", 1), fingerprint("SIEM", "Login", "Auth", 2))
+
+    def test_fields_do_not_run_together(self):
+        self.assertNotEqual(fingerprint("ab", "c", "d"), fingerprint("a", "bc", "d"))
@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from app.api.common import metrics
+from app.api.common.utils import RequestScope
+
+
+class FingerprintTests(SimpleTestCase):
+    def test_literals_and_lists_folded(self):
+        key, text = metrics.fingerprint(
+            "SELECT *  FROM t -- note\nWHERE a = 5 AND b = 'it''s' AND c IN (1, 2, 3) AND d = 1.5"
+        )
+        self.assertEqual(text, "SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...) AND d = ?")
+        self.assertEqual(len(key), 12)
+
+    def test_equal_for_every_parameter_set(self):
+        self.assertEqual(
+            metrics.fingerprint("SELECT * FROM t WHERE a = 1 AND b IN (1, 2)")[0],
+            metrics.fingerprint("SELECT * FROM t WHERE a = 99 AND b IN (7, 8, 9, 10)")[0],
+        )
+
+    def test_placeholders_folded(self):
+        self.assertEqual(
+            metrics.fingerprint("SELECT %s, %(name)s, $1 /* why */ FROM t")[1], "SELECT ?, ?, ? FROM t"
+        )
+
+    def test_identifiers_kept(self):
+        self.assertNotEqual(
+            metrics.fingerprint("SELECT * FROM t1")[0], metrics.fingerprint("SELECT * FROM t2")[0]
+        )
+
+
+class RenderTests(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def tearDown(self):
+        metrics.reset()
+
+    def test_empty(self):
+        text = metrics.render()
+        self.assertIn("# TYPE cyber_http_request_duration_seconds histogram", text)
+        self.assertNotIn("_bucket", text)
+        self.assertTrue(text.endswith("\n"))
+
+    def test_requests(self):
+        scope = RequestScope()
+        scope.queries, scope.db_seconds, scope.rows = 3, 0.02, 7
+        metrics.observe_request("GET", "app/v1/cyber/alerts/", 200, 0.03, scope)
+        metrics.observe_request("GET", "app/v1/cyber/alerts/", 200, 2.0, scope)
+        lines = metrics.render().splitlines()
+        labels = 'method="GET",route="app/v1/cyber/alerts/"'
+        self.assertIn(f'cyber_http_request_duration_seconds_bucket{{{labels},status="200",le="0.05"}} 1', lines)
+        self.assertIn(f'cyber_http_request_duration_seconds_bucket{{{labels},status="200",le="2.5"}} 2', lines)
+        self.assertIn(f'cyber_http_request_duration_seconds_bucket{{{labels},status="200",le="+Inf"}} 2', lines)
+        self.assertIn(f"cyber_http_request_duration_seconds_count{{{labels},status=\"200\"}} 2", lines)
+        self.assertIn(f'cyber_http_request_db_queries_bucket{{{labels},le="3"}} 2', lines)
+        self.assertIn(f"cyber_http_request_db_seconds_total{{{labels}}} 0.04", lines)
+        self.assertIn(f"cyber_http_request_db_rows_total{{{labels}}} 14", lines)
+
+    def test_statements(self):
+        key = metrics.fingerprint('SELECT "a\\b" FROM t WHERE x = 1')
+        metrics.record_statement(key, 0.5, 4, False)
+        metrics.record_statement(key, 0.25, 0, True)
+        lines = metrics.render().splitlines()
+        labels = f'fingerprint="{key[0]}",statement="SELECT \\"a\\\\b\\" FROM t WHERE x = ?"'
+        self.assertIn(f"cyber_db_statement_calls_total{{{labels}}} 2", lines)
+        self.assertIn(f"cyber_db_statement_errors_total{{{labels}}} 1", lines)
+        self.assertIn(f"cyber_db_statement_seconds_total{{{labels}}} 0.75", lines)
+        self.assertIn(f"cyber_db_statement_rows_total{{{labels}}} 4", lines)
+
+    @override_settings(METRICS=dict(settings.METRICS, MAX_STATEMENTS=1))
+    def test_statements_past_the_limit_are_other(self):
+        metrics.record_statement(metrics.fingerprint("SELECT 1 FROM a"), 0.1, 1, False)
+        metrics.record_statement(metrics.fingerprint("SELECT 1 FROM b"), 0.1, 1, False)
+        metrics.record_statement(metrics.fingerprint("SELECT 1 FROM c"), 0.1, 1, False)
+        self.assertIn(
+            'cyber_db_statement_calls_total{fingerprint="other",statement="other"} 2',
+            metrics.render().splitlines(),
+        )
+
+    def test_extra_series(self):
+        lines = metrics.render(gauges={"cyber_pool_size": ("Pool size.", 4)},
+                               counters={"cyber_cache_hits_total": ("Cache hits.", 9)}).splitlines()
+        self.assertIn("# TYPE cyber_pool_size gauge", lines)
+        self.assertIn("cyber_pool_size 4", lines)
+        self.assertIn("# TYPE cyber_cache_hits_total counter", lines)
+        self.assertIn("cyber_cache_hits_total 9", lines)
@@ -0,0 +1,93 @@
+import base64
+from datetime import datetime
+
+from django.test import SimpleTestCase
+
+from app.api.common.pagination import InvalidCursor, Keyset, decode_cursor, encode_cursor
+
+
+def raw_cursor(text):
+    return base64.urlsafe_b64encode(text.encode()).rstrip(b"=").decode()
+
+
+class DecodeCursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        token = encode_cursor([datetime(2026, 3, 1, 12, 30), 42])
+        self.assertEqual(decode_cursor(token, 2), ["2026-03-01T12:30:00", 42])
+
+    def test_malformed(self):
+        for token in ("!!!", "a", raw_cursor("not json"), raw_cursor("{\"a\": 1}"), raw_cursor("[1, 2, 3]")):
+            with self.subTest(token=token), self.assertRaises(InvalidCursor):
+                decode_cursor(token, 2)
+
+
+class KeysetWhereTests(SimpleTestCase):
+    keyset = Keyset("i.incident_id", "i.reported_date", descending=True, nullable=True)
+
+    def test_no_cursor(self):
+        self.assertEqual(self.keyset.where(None), (None, []))
+        self.assertEqual(self.keyset.where(""), (None, []))
+
+    def test_sorted_cursor(self):
+        sql, params = self.keyset.where(encode_cursor([datetime(2026, 3, 1), 7]))
+        self.assertEqual(
+            sql, "((i.reported_date, i.incident_id) < (%s, %s) OR i.reported_date IS NULL)"
+        )
+        self.assertEqual(params, [datetime(2026, 3, 1), 7])
+
+    def test_cursor_in_null_group(self):
+        sql, params = self.keyset.where(encode_cursor([None, 7]))
+        self.assertEqual(sql, "(i.reported_date IS NULL AND i.incident_id < %s)")
+        self.assertEqual(params, [7])
+
+    def test_ascending_not_nullable(self):
+        keyset = Keyset("alert_id", "alert_time", descending=False)
+        sql, _ = keyset.where(encode_cursor([datetime(2026, 3, 1), 7]))
+        self.assertEqual(sql, "(alert_time, alert_id) > (%s, %s)")
+
+    def test_id_only(self):
+        keyset = Keyset("user_id")
+        self.assertEqual(keyset.where(encode_cursor([9])), ("user_id < %s", [9]))
+        self.assertEqual(keyset.order_by, "user_id DESC")
+
+    def test_wrong_types(self):
+        for values in (["2026-03-01T00:00:00", "7"], ["2026-03-01T00:00:00", True],
+                       ["2026-03-01T00:00:00", 7.5], ["yesterday", 7], [20260301, 7]):
+            with self.subTest(values=values), self.assertRaises(InvalidCursor):
+                self.keyset.where(encode_cursor(values))
+
+    def test_wrong_size(self):
+        with self.assertRaises(InvalidCursor):
+            self.keyset.where(encode_cursor([7]))
+        with self.assertRaises(InvalidCursor):
+            Keyset("user_id").where(encode_cursor([None, 7]))
+
+    def test_order_by(self):
+        self.assertEqual(self.keyset.order_by, "i.reported_date DESC NULLS LAST, i.incident_id DESC")
+
+
+class KeysetPaginateTests(SimpleTestCase):
+    keyset = Keyset("alert_id", "alert_time", descending=True, nullable=True)
+
+    def rows(self, count):
+        return [{"alert_id": 10 - i, "alert_time": datetime(2026, 3, 10 - i)} for i in range(count)]
+
+    def test_last_page(self):
+        rows = self.rows(2)
+        self.assertEqual(self.keyset.paginate(rows, 2, "alert_id", "alert_time"), (rows, None))
+
+    def test_next_cursor_continues_after_the_page(self):
+        page, cursor = self.keyset.paginate(self.rows(3), 2, "alert_id", "alert_time")
+        self.assertEqual([row["alert_id"] for row in page], [10, 9])
+        self.assertEqual(self.keyset.where(cursor)[1], [datetime(2026, 3, 9), 9])
+
+    def test_next_cursor_in_null_group(self):
+        rows = [{"alert_id": 5, "alert_time": None}, {"alert_id": 4, "alert_time": None}]
+        _, cursor = self.keyset.paginate(rows, 1, "alert_id", "alert_time")
+        self.assertEqual(self.keyset.where(cursor), ("(alert_time IS NULL AND alert_id < %s)", [5]))
+
+    def test_tuple_rows(self):
+        keyset = Keyset("user_id")
+        page, cursor = keyset.paginate([(3,), (2,), (1,)], 2, id_key=0)
+        self.assertEqual(page, [(3,), (2,)])
+        self.assertEqual(decode_cursor(cursor, 1), [2])
@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from django.test import SimpleTestCase
+
+from app.api.alerts.partitions import time_slices
+
+MAR, FEB, JAN = datetime(2026, 3, 1), datetime(2026, 2, 1), datetime(2026, 1, 1)
+NOW = datetime(2026, 2, 15)
+
+
+class TimeSlicesTests(SimpleTestCase):
+    def test_not_partitioned(self):
+        self.assertEqual(time_slices(None, NOW), [(None, None)])
+        self.assertEqual(time_slices(None, NOW, JAN, FEB), [(JAN, FEB)])
+
+    def test_newest_first_open_at_both_ends(self):
+        # MAR is premade and still empty: the first slice covers it
+        self.assertEqual(time_slices([MAR, FEB, JAN], NOW), [(FEB, None), (JAN, FEB), (None, JAN)])
+
+    def test_since_stops_early(self):
+        since = datetime(2026, 1, 15)
+        self.assertEqual(time_slices([MAR, FEB, JAN], NOW, since=since), [(FEB, None), (since, FEB)])
+
+    def test_since_on_a_bound(self):
+        self.assertEqual(time_slices([MAR, FEB, JAN], NOW, since=FEB), [(FEB, None)])
+
+    def test_until_skips_newer(self):
+        until = datetime(2026, 1, 20)
+        self.assertEqual(time_slices([MAR, FEB, JAN], NOW, until=until), [(JAN, until), (None, JAN)])
+
+    def test_since_and_until_in_one_partition(self):
+        since, until = datetime(2026, 1, 5), datetime(2026, 1, 20)
+        self.assertEqual(time_slices([MAR, FEB, JAN], NOW, since, until), [(since, until)])
+
+    def test_now_before_every_partition(self):
+        self.assertEqual(time_slices([MAR, FEB, JAN], datetime(2025, 12, 1)), [(None, None)])
@@ -0,0 +1,81 @@
+import asyncio
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from app.api.alerts.stream import StreamState, _read_lines
+
+STREAM = dict(
+    settings.ALERT_STREAM, BATCH_SIZE=2, BATCH_BYTES=1 << 20, FLUSH_MS=60_000, MAX_LINE_BYTES=10,
+    MAX_BODY_BYTES=1 << 20,
+)
+
+
+def read(chunks, disconnect=False):
+    """Run _read_lines over the body `chunks`; returns (connected, batches, state)."""
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": disconnect or i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+    if disconnect:
+        messages.append({"type": "http.disconnect"})
+
+    async def receive():
+        return messages.pop(0)
+
+    async def run():
+        batches, state = asyncio.Queue(), StreamState()
+        connected = await _read_lines(receive, batches, state)
+        return connected, [batches.get_nowait() for _ in range(batches.qsize())], state
+
+    return asyncio.run(run())
+
+
+@override_settings(ALERT_STREAM=STREAM)
+class ReadLinesTests(SimpleTestCase):
+    def test_batches_of_batch_size(self):
+        connected, batches, state = read([b"a\nb\nc\nd\ne\n"])
+        self.assertTrue(connected)
+        self.assertEqual(batches, [[(1, b"a"), (2, b"b")], [(3, b"c"), (4, b"d")], [(5, b"e")]])
+        self.assertEqual(state.lines, 5)
+
+    def test_lines_across_chunks(self):
+        _, batches, _ = read([b"ab", b"c\nd", b"e\n", b"f"])
+        self.assertEqual(batches, [[(1, b"abc"), (2, b"de")], [(3, b"f")]])
+
+    def test_blank_lines_keep_numbers(self):
+        _, batches, state = read([b"a\n\n  \nb\r\n"])
+        self.assertEqual(batches, [[(1, b"a"), (4, b"b\r")]])
+        self.assertEqual(state.lines, 2)
+
+    @override_settings(ALERT_STREAM=dict(STREAM, BATCH_BYTES=4))
+    def test_batches_of_batch_bytes(self):
+        _, batches, _ = read([b"abcd\nef\ngh\n"])
+        self.assertEqual(batches, [[(1, b"abcd")], [(2, b"ef"), (3, b"gh")]])
+
+    def test_over_long_line(self):
+        _, batches, state = read([b"a\n" + b"x" * 11 + b"\nb\n"])
+        self.assertEqual(batches, [[(1, b"a"), (2, None)], [(3, b"b")]])
+        self.assertEqual(state.lines, 3)
+
+    def test_over_long_line_across_chunks(self):
+        # Rejected as soon as the unfinished line passes the limit; its rest is skipped
+        _, batches, _ = read([b"a\n" + b"x" * 8, b"x" * 8, b"x" * 8, b"x\nb"])
+        self.assertEqual(batches, [[(1, b"a"), (2, None)], [(3, b"b")]])
+
+    def test_over_long_last_line(self):
+        _, batches, _ = read([b"a\n", b"x" * 11])
+        self.assertEqual(batches, [[(1, b"a"), (2, None)]])
+
+    def test_disconnect(self):
+        connected, batches, _ = read([b"a\nb"], disconnect=True)
+        self.assertFalse(connected)
+        self.assertEqual(batches, [[(1, b"a")]])
+
+    @override_settings(ALERT_STREAM=dict(STREAM, MAX_BODY_BYTES=6))
+    def test_body_too_large(self):
+        connected, batches, state = read([b"a\nb", b"\nc\nd\n"])
+        self.assertTrue(connected)
+        self.assertTrue(state.too_large)
+        # The unfinished "b" is not written once the body is cut off
+        self.assertEqual(batches, [[(1, b"a")]])
@@ -4,9 +4,12 @@ from typing import List, Optional
 from django.db import transaction
 from django.http import HttpResponse
 
-from ninja import Router
+from ninja import Query, Router
 
-from app.api.common.utils import get_connection
+from app.api.common import cache, statements
+from app.api.common.pagination import DEFAULT_LIMIT, MAX_LIMIT, InvalidCursor, Keyset
+from app.api.common.renderers import trusted_response
+from app.api.common.utils import async_db_connection, db_connection
 from app.api.schemas import ErrorSchema
 from app.api.threat_intelligence.schemas import (
     ThreatIntelligenceSchema,
@@ -19,6 +22,8 @@ from app.api.threat_intelligence.schemas import (
 
 router = Router(tags=["threat_intelligence"])
 
+THREAT_KEYSET = Keyset("t.threat_id", descending=False)
+
 
 def dictfetchall(cursor):
     """Return all rows from a cursor as a list of dictionaries"""
@@ -26,33 +31,28 @@ def dictfetchall(cursor):
     return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
 
+async def adictfetchall(cursor):
+    """Async variant of dictfetchall for cursors from async_db_connection"""
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in await cursor.fetchall()]
+
+
 @router.get("/", response=ThreatIntelligenceListResponseSchema)
-def list_threats(
+async def list_threats(
         request,
         threat_actor_name: str = None,
         indicator_type: str = None,
         confidence_level: str = None,
-        related_cve: str = None
+        related_cve: str = None,
+        limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+        cursor: Optional[str] = None
 ):
-    connection = get_connection()
-    with connection.cursor() as cursor:
-        query = """
-            SELECT
-                t.threat_id, t.threat_actor_name, t.indicator_type, t.indicator_value,
-                t.confidence_level, t.description, t.related_cve, t.date_identified, t.last_updated,
-                ARRAY_AGG(DISTINCT a.asset_id) FILTER (WHERE a.asset_id IS NOT NULL) as asset_ids,
-                ARRAY_AGG(DISTINCT v.vulnerability_id) FILTER (WHERE v.vulnerability_id IS NOT NULL) as vulnerability_ids,
-                ARRAY_AGG(DISTINCT i.incident_id) FILTER (WHERE i.incident_id IS NOT NULL) as incident_ids
-            FROM api_threatintelligence t
-            LEFT JOIN threat_asset_association taa ON t.threat_id = taa.threat_id
-            LEFT JOIN api_asset a ON taa.asset_id = a.asset_id
-            LEFT JOIN threat_vulnerability_association tva ON t.threat_id = tva.threat_id
-            LEFT JOIN api_vulnerability v ON tva.vulnerability_id = v.vulnerability_id
-            LEFT JOIN threat_incident_association ita ON t.threat_id = ita.threat_id
-            LEFT JOIN api_incident i ON ita.incident_id = i.incident_id
-            GROUP BY t.threat_id, t.threat_actor_name, t.indicator_type, t.indicator_value,
-                     t.confidence_level, t.description, t.related_cve, t.date_identified, t.last_updated
-        """
+    try:
+        after_sql, after_params = THREAT_KEYSET.where(cursor)
+    except InvalidCursor:
+        return HttpResponse(status=400, content=json.dumps({"detail": "Invalid cursor"}))
+
+    async with async_db_connection() as connection, connection.cursor() as cursor:
         where_clauses = []
         params = []
 
@@ -68,16 +68,40 @@ def list_threats(
         if related_cve:
             where_clauses.append("t.related_cve LIKE %s")
             params.append(f"%{related_cve}%")
-
-        if where_clauses:
-            query += " WHERE " + " AND ".join(where_clauses)
-
-        query += """
-            ORDER BY t.threat_id
+        if after_sql:
+            where_clauses.append(after_sql)
+            params.extend(after_params)
+        params.append(limit + 1)
+
+        # Pick the page of threats first, then aggregate associations for those ids only
+        query = f"""
+            WITH page AS (
+                SELECT t.*
+                FROM api_threatintelligence t
+                {"WHERE " + " AND ".join(where_clauses) if where_clauses else ""}
+                ORDER BY {THREAT_KEYSET.order_by}
+                LIMIT %s
+            )
+            SELECT
+                t.threat_id, t.threat_actor_name, t.indicator_type, t.indicator_value,
+                t.confidence_level, t.description, t.related_cve, t.date_identified, t.last_updated,
+                ARRAY_AGG(DISTINCT a.asset_id) FILTER (WHERE a.asset_id IS NOT NULL) as asset_ids,
+                ARRAY_AGG(DISTINCT v.vulnerability_id) FILTER (WHERE v.vulnerability_id IS NOT NULL) as vulnerability_ids,
+                ARRAY_AGG(DISTINCT i.incident_id) FILTER (WHERE i.incident_id IS NOT NULL) as incident_ids
+            FROM page t
+            LEFT JOIN threat_asset_association taa ON t.threat_id = taa.threat_id
+            LEFT JOIN api_asset a ON taa.asset_id = a.asset_id
+            LEFT JOIN threat_vulnerability_association tva ON t.threat_id = tva.threat_id
+            LEFT JOIN api_vulnerability v ON tva.vulnerability_id = v.vulnerability_id
+            LEFT JOIN threat_incident_association ita ON t.threat_id = ita.threat_id
+            LEFT JOIN api_incident i ON ita.incident_id = i.incident_id
+            GROUP BY t.threat_id, t.threat_actor_name, t.indicator_type, t.indicator_value,
+                     t.confidence_level, t.description, t.related_cve, t.date_identified, t.last_updated
+            ORDER BY {THREAT_KEYSET.order_by}
         """
 
-        cursor.execute(query, params)
-        threats_raw = dictfetchall(cursor)
+        await cursor.execute(query, params)
+        threats_raw, next_cursor = THREAT_KEYSET.paginate(await adictfetchall(cursor), limit, id_key="threat_id")
         # Process the results to handle array data
         threats = []
         for threat in threats_raw:
@@ -108,10 +132,11 @@ def list_threats(
             }
             threats.append(processed_threat)
 
-    return {
+    return trusted_response({
         "threats": threats,
-        "count": len(threats)
-    }
+        "count": len(threats),
+        "next_cursor": next_cursor
+    })
 
 
 
@@ -129,8 +154,7 @@ def create_threat(request, payload: ThreatIntelligenceSchema):
             return 400, {"message": "Confidence level is required"}
 
         with transaction.atomic():
-            connection = get_connection()
-            with connection.cursor() as cursor:
+            with db_connection() as connection, connection.cursor() as cursor:
                 cursor.execute("""
                     INSERT INTO api_threatintelligence
                     (threat_actor_name, indicator_type, indicator_value, confidence_level,
@@ -173,6 +197,7 @@ def create_threat(request, payload: ThreatIntelligenceSchema):
                             INSERT INTO threat_incident_association (threat_id, incident_id)
                             VALUES (%s, %s)
                         """, [threat_id, incident_id])
+                    cache.invalidate("incident", *payload.incidents)
 
         return 201, {
             "threat_id": threat_id,
@@ -184,10 +209,10 @@ def create_threat(request, payload: ThreatIntelligenceSchema):
 
 
 @router.get("/{threat_id}", response={200: ThreatIntelligenceSchema, 404: ErrorSchema})
-def get_threat(request, threat_id: int):
-    connection = get_connection()
-    with connection.cursor() as cursor:
-        cursor.execute("""
+@cache.cached_entity("threat", "threat_id")
+async def get_threat(request, threat_id: int):
+    async with async_db_connection() as connection, connection.cursor() as cursor:
+        await cursor.execute("""
             SELECT 
                 t.threat_id, t.threat_actor_name, t.indicator_type, t.indicator_value,
                 t.confidence_level, t.description, t.related_cve, t.date_identified, t.last_updated,
@@ -204,7 +229,7 @@ def get_threat(request, threat_id: int):
             WHERE t.threat_id = %s
             GROUP BY t.threat_id
         """, [threat_id])
-        threat = cursor.fetchone()
+        threat = await cursor.fetchone()
 
     if not threat:
         return 404, {"message": "Threat intelligence not found"}
@@ -247,9 +272,8 @@ def update_threat(request, threat_id: int, payload: ThreatIntelligenceSchema):
             return 400, {"message": "Indicator value is required"}
         if not payload.confidence_level:
             return 400, {"message": "Confidence level is required"}
-        connection = get_connection()
         with transaction.atomic():
-            with connection.cursor() as cursor:
+            with db_connection() as connection, connection.cursor() as cursor:
                 # Check if threat exists
                 cursor.execute("SELECT 1 FROM api_threatintelligence WHERE threat_id = %s", [threat_id])
                 if not cursor.fetchone():
@@ -264,6 +288,11 @@ def update_threat(request, threat_id: int, payload: ThreatIntelligenceSchema):
                 """, [payload.threat_actor_name, payload.indicator_type, payload.indicator_value,
                       payload.confidence_level, payload.description, payload.related_cve, threat_id])
                 last_updated = cursor.fetchone()[0]
+                cache.invalidate("threat", threat_id)
+                cache.invalidate_related(
+                    cursor, "incident",
+                    "SELECT incident_id FROM threat_incident_association WHERE threat_id = %s", [threat_id]
+                )
 
                 # First, delete all existing associations
                 cursor.execute("DELETE FROM threat_asset_association WHERE threat_id = %s", [threat_id])
@@ -296,6 +325,7 @@ def update_threat(request, threat_id: int, payload: ThreatIntelligenceSchema):
                             VALUES (%s, %s)
                             ON CONFLICT (threat_id, incident_id) DO NOTHING
                         """, [threat_id, incident_id])
+                    cache.invalidate("incident", *payload.incidents)
 
         return 200, {"threat_id": threat_id, "last_updated": last_updated}
     except Exception as e:
@@ -305,14 +335,19 @@ def update_threat(request, threat_id: int, payload: ThreatIntelligenceSchema):
 
 @router.delete("/{threat_id}", response={200: ThreatIntelligenceDeleteResponseSchema, 404: ErrorSchema})
 def delete_threat(request, threat_id: int):
-    connection = get_connection()
     with transaction.atomic():
-        with connection.cursor() as cursor:
+        with db_connection() as connection, connection.cursor() as cursor:
             # Check if threat exists
             cursor.execute("SELECT 1 FROM api_threatintelligence WHERE threat_id = %s", [threat_id])
             if not cursor.fetchone():
                 return 404, {"message": "Threat intelligence not found"}
 
+            cache.invalidate("threat", threat_id)
+            cache.invalidate_related(
+                cursor, "incident",
+                "SELECT incident_id FROM threat_incident_association WHERE threat_id = %s", [threat_id]
+            )
+
             # Delete associations first to avoid foreign key constraint violations
             cursor.execute("DELETE FROM threat_asset_association WHERE threat_id = %s", [threat_id])
             cursor.execute("DELETE FROM threat_vulnerability_association WHERE threat_id = %s", [threat_id])
@@ -329,9 +364,8 @@ def delete_threat(request, threat_id: int):
 @router.get("/assets/{threat_id}", response={200: List[ThreatAssetAssociationResponseSchema], 400: ErrorSchema})
 def get_threat_assets(request, threat_id: int):
     assets = []
-    connection = get_connection()
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT threat_id FROM api_threatintelligence WHERE threat_id = %s", [threat_id])
+    with db_connection() as connection, connection.cursor() as cursor:
+        statements.execute(cursor, "threat_exists", [threat_id])
         if not cursor.fetchone():
             return HttpResponse(
                 status=404,
@@ -362,9 +396,8 @@ def get_threat_assets(request, threat_id: int):
 # Create a new association
 @router.post("/assets/", response={201: ThreatAssetAssociationResponseSchema, 400: ErrorSchema})
 def add_asset_to_threat(request, threat_asset_data: ThreatAssetAssociationSchema):
-    connection = get_connection()
     with transaction.atomic():
-        with connection.cursor() as cursor:
+        with db_connection() as connection, connection.cursor() as cursor:
             # Check if association already exists
             cursor.execute(
                     "SELECT threat_id FROM threat_asset_association WHERE threat_id = %s AND asset_id = %s",
@@ -377,8 +410,7 @@ def add_asset_to_threat(request, threat_asset_data: ThreatAssetAssociationSchema
                 )
 
             # Validate that the threat and asset exist
-            cursor.execute("SELECT threat_id FROM api_threatintelligence WHERE threat_id = %s",
-                           [threat_asset_data.threat_id])
+            statements.execute(cursor, "threat_exists", [threat_asset_data.threat_id])
             if not cursor.fetchone():
                 return HttpResponse(
                     status=400,
@@ -386,8 +418,7 @@ def add_asset_to_threat(request, threat_asset_data: ThreatAssetAssociationSchema
                 )
 
             # Verify asset exists
-            cursor.execute("SELECT asset_id FROM api_asset WHERE asset_id = %s",
-                           [threat_asset_data.asset_id])
+            statements.execute(cursor, "asset_exists", [threat_asset_data.asset_id])
             if not cursor.fetchone():
                 return HttpResponse(
                     status=400,
@@ -395,6 +426,7 @@ def add_asset_to_threat(request, threat_asset_data: ThreatAssetAssociationSchema
                 )
 
             # Create the association
+            cache.invalidate("threat", threat_asset_data.threat_id)
             cursor.execute("""
                     INSERT INTO threat_asset_association (threat_id, asset_id, notes) VALUES (%s, %s, %s)
                     RETURNING id, threat_id, asset_id, notes    
@@ -408,8 +440,7 @@ def add_asset_to_threat(request, threat_asset_data: ThreatAssetAssociationSchema
 def update_threat_asset(request, threat_asset_data: ThreatAssetAssociationSchema,
                         original_threat_id: Optional[int] = None,
                         original_asset_id: Optional[int] = None):
-    connection = get_connection()
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if association exists
         cursor.execute("SELECT threat_id FROM threat_asset_association WHERE threat_id = %s AND asset_id = %s",
                        [original_threat_id, original_asset_id]
@@ -422,8 +453,7 @@ def update_threat_asset(request, threat_asset_data: ThreatAssetAssociationSchema
             )
 
         # Validate that the threat and asset exist
-        cursor.execute("SELECT threat_id FROM api_threatintelligence WHERE threat_id = %s",
-                       [threat_asset_data.threat_id])
+        statements.execute(cursor, "threat_exists", [threat_asset_data.threat_id])
 
         if not cursor.fetchone():
             return HttpResponse(
@@ -431,14 +461,14 @@ def update_threat_asset(request, threat_asset_data: ThreatAssetAssociationSchema
                 content=json.dumps({"detail": "Referenced threat not found"})
             )
 
-        cursor.execute("SELECT asset_id FROM api_asset WHERE asset_id = %s",
-                       [threat_asset_data.asset_id])
+        statements.execute(cursor, "asset_exists", [threat_asset_data.asset_id])
         if not cursor.fetchone():
             return HttpResponse(
                 status=400,
                 content=json.dumps({"detail": "Referenced asset not found"})
             )
 
+        cache.invalidate("threat", original_threat_id, threat_asset_data.threat_id)
         if ((original_threat_id != threat_asset_data.threat_id) or (original_asset_id != threat_asset_data.asset_id)):
             # Update the association (either same pair with new impact_level or completely new pair)
             cursor.execute(
@@ -474,8 +504,7 @@ def update_threat_asset(request, threat_asset_data: ThreatAssetAssociationSchema
 # Delete association
 @router.delete("/assets/{threat_id}/{asset_id}", response={200: dict, 404: ErrorSchema})
 def remove_asset_from_threat(request, threat_id: int, asset_id: int):
-    connection = get_connection()
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if association exists
         cursor.execute("SELECT threat_id FROM threat_asset_association WHERE threat_id = %s AND asset_id = %s",
                        [threat_id, asset_id]
@@ -488,6 +517,7 @@ def remove_asset_from_threat(request, threat_id: int, asset_id: int):
 
 
         # Delete the association
+        cache.invalidate("threat", threat_id)
         cursor.execute(
             "DELETE FROM threat_asset_association WHERE threat_id = %s AND asset_id = %s",
             [threat_id, asset_id]
@@ -499,9 +529,8 @@ def remove_asset_from_threat(request, threat_id: int, asset_id: int):
 @router.get("/vulnerabilities/{threat_id}", response=list[ThreatVulnerabilityAssociationSchema])
 def get_vulnerabilities_from_threat(request, threat_id: int):
     vulnerabilities = []
-    connection = get_connection()
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT threat_id FROM api_threatintelligence WHERE threat_id = %s", [threat_id])
+    with db_connection() as connection, connection.cursor() as cursor:
+        statements.execute(cursor, "threat_exists", [threat_id])
         if not cursor.fetchone():
             return HttpResponse(
                 status=404,
@@ -524,19 +553,16 @@ def get_vulnerabilities_from_threat(request, threat_id: int):
 
 @router.post("/vulnerabilities/", response=ThreatVulnerabilityAssociationSchema)
 def add_vulnerability_to_threat(request, threat_vuln_data: ThreatVulnerabilityAssociationSchema):
-    connection = get_connection()
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Verify that both threat and vulnerability exist
-        cursor.execute("SELECT threat_id FROM api_threatintelligence WHERE threat_id = %s",
-                       [threat_vuln_data.threat_id])
+        statements.execute(cursor, "threat_exists", [threat_vuln_data.threat_id])
         if not cursor.fetchone():
             return HttpResponse(
                 status=400,
                 content=json.dumps({"detail": "Referenced threat not found"})
             )
 
-        cursor.execute("SELECT vulnerability_id FROM api_vulnerability WHERE vulnerability_id = %s",
-                       [threat_vuln_data.vulnerability_id])
+        statements.execute(cursor, "vulnerability_exists", [threat_vuln_data.vulnerability_id])
 
         if not cursor.fetchone():
             return HttpResponse(
@@ -557,6 +583,7 @@ def add_vulnerability_to_threat(request, threat_vuln_data: ThreatVulnerabilityAs
             )
 
         # Create new association
+        cache.invalidate("threat", threat_vuln_data.threat_id)
         notes = threat_vuln_data.notes or ""
         cursor.execute(
             "INSERT INTO threat_vulnerability_association (threat_id, vulnerability_id, notes) VALUES (%s, %s, %s)",
@@ -569,21 +596,18 @@ def add_vulnerability_to_threat(request, threat_vuln_data: ThreatVulnerabilityAs
 def update_vulnerability_in_threat(request, threat_vuln_data: ThreatVulnerabilityAssociationSchema,
                                             original_threat_id: Optional[int] = None,
                                             original_vulnerability_id: Optional[int] = None):
-    connection = get_connection()
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if we're updating an existing association
         if original_threat_id and original_vulnerability_id:
             # Verify that the new threat and vulnerability exist
-            cursor.execute("SELECT threat_id FROM api_threatintelligence WHERE threat_id = %s",
-                           [threat_vuln_data.threat_id])
+            statements.execute(cursor, "threat_exists", [threat_vuln_data.threat_id])
             if not cursor.fetchone():
                 return HttpResponse(
                     status=400,
                     content=json.dumps({"detail": "Referenced threat not found"})
                 )
 
-            cursor.execute("SELECT vulnerability_id FROM api_vulnerability WHERE vulnerability_id = %s",
-                           [threat_vuln_data.vulnerability_id])
+            statements.execute(cursor, "vulnerability_exists", [threat_vuln_data.vulnerability_id])
             if not cursor.fetchone():
                 return HttpResponse(
                     status=400,
@@ -615,6 +639,7 @@ def update_vulnerability_in_threat(request, threat_vuln_data: ThreatVulnerabilit
                     )
 
                 # Update the association with new threat/vulnerability pair
+                cache.invalidate("threat", original_threat_id, threat_vuln_data.threat_id)
                 cursor.execute(
                     """DELETE FROM threat_vulnerability_association 
                        WHERE threat_id = %s AND vulnerability_id = %s""",
@@ -657,9 +682,8 @@ def update_vulnerability_in_threat(request, threat_vuln_data: ThreatVulnerabilit
 
 @router.delete("/vulnerabilities/{threat_id}/{vulnerability_id}")
 def remove_vulnerability_from_threat(request, threat_id: int, vulnerability_id: int):
-    connection = get_connection()
     # Check if association exists
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         cursor.execute(
             "SELECT threat_id FROM threat_vulnerability_association WHERE threat_id = %s AND vulnerability_id = %s",
             [threat_id, vulnerability_id]
@@ -671,6 +695,7 @@ def remove_vulnerability_from_threat(request, threat_id: int, vulnerability_id:
             )
 
         # Delete association
+        cache.invalidate("threat", threat_id)
         cursor.execute(
             "DELETE FROM threat_vulnerability_association WHERE threat_id = %s AND vulnerability_id = %s",
             [threat_id, vulnerability_id]
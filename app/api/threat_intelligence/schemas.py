@@ -47,6 +47,7 @@ class ThreatIntelligenceUpdateResponseSchema(Schema):
 class ThreatIntelligenceListResponseSchema(Schema):
     threats: List[ThreatIntelligenceSchema] = Field(..., description="List of threat intelligence items")
     count: int = Field(..., description="Total count of threat intelligence items")
+    next_cursor: Optional[str] = Field(None, description="Pass as `cursor` to fetch the next page")
 
 class ThreatIntelligenceDeleteResponseSchema(Schema):
     message: str = Field("Threat intelligence deleted successfully", description="Success message")
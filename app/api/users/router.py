@@ -1,44 +1,50 @@
 from datetime import timezone, datetime
 
 from django.contrib.auth.hashers import make_password
-from ninja import Router
+from ninja import Query, Router
 
 from django.http import HttpResponse
-from typing import List
+from typing import List, Optional
 import json
 
 from .schemas import UserSchema, UserCreateSchema, UserUpdateSchema, UserActivityLogFullSchema, \
     UserActivityLogCreateSchema, UserActivityLogFilterSchema, UserActivityLogUpdateSchema
-from ..common.utils import get_connection
+from ..common import cache, statements
+from ..common.pagination import DEFAULT_LIMIT, MAX_LIMIT, InvalidCursor, Keyset
+from ..common.renderers import schema_rows, trusted_response
+from ..common.utils import async_db_connection, db_connection
 
 router = Router(tags=["users"])
 
+USER_KEYSET = Keyset("user_id", descending=False)
+ACTIVITY_LOG_KEYSET = Keyset("log_id", "timestamp", descending=True, nullable=True)
+
 @router.get("/", response=List[UserSchema])
-def list_users(request):
-    print("list_users")
-    connection = get_connection()
-    """Get all users"""
-    with connection.cursor() as cursor:
-        cursor.execute(f"SELECT user_id, username, email, role, last_login, is_active, date_joined FROM api_user")
-        users = []
-        for row in cursor.fetchall():
-            user = {
-                "user_id": row[0],
-                "username": row[1],
-                "email": row[2],
-                "role": row[3],
-                "last_login": row[4],
-                "is_active": row[5],
-                "date_joined": row[6],
-            }
-            users.append(user)
-        return users
+async def list_users(
+    request,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None
+):
+    """Get users by id; the next page's cursor is sent in X-Next-Cursor"""
+    try:
+        after_sql, after_params = USER_KEYSET.where(cursor)
+    except InvalidCursor:
+        return HttpResponse(status=400, content=json.dumps({"detail": "Invalid cursor"}))
+
+    query = "SELECT user_id, username, email, role, last_login, is_active, date_joined FROM api_user"
+    if after_sql:
+        query += " WHERE " + after_sql
+    query += f" ORDER BY {USER_KEYSET.order_by} LIMIT %s"
+
+    async with async_db_connection() as connection, connection.cursor(row_factory=schema_rows(UserSchema)) as cursor:
+        await cursor.execute(query, after_params + [limit + 1])
+        users, next_cursor = USER_KEYSET.paginate(await cursor.fetchall(), limit, id_key="user_id")
+    return trusted_response(users, headers={"X-Next-Cursor": next_cursor})
 
 
 @router.post("/", response=UserSchema)
 def create_user(request, user_data: UserCreateSchema):
-    connection = get_connection()
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if username or email already exists
         cursor.execute(
             "SELECT user_id FROM api_user WHERE username = %s OR email = %s",
@@ -72,7 +78,6 @@ def create_user(request, user_data: UserCreateSchema):
         )
 
         row = cursor.fetchone()
-        print("user_id", row[0])
         user = {
             "user_id": row[0],
             "username": row[1],
@@ -86,15 +91,12 @@ def create_user(request, user_data: UserCreateSchema):
 
 
 @router.get("/{user_id}", response=UserSchema)
-def get_user(request, user_id: int):
-    connection = get_connection()
+@cache.cached_entity("user", "user_id")
+async def get_user(request, user_id: int):
     """Get user by ID"""
-    with connection.cursor() as cursor:
-        cursor.execute(
-            "SELECT user_id, username, email, role, last_login, is_active, date_joined FROM api_user WHERE user_id = %s",
-            [user_id]
-        )
-        row = cursor.fetchone()
+    async with async_db_connection() as connection, connection.cursor() as cursor:
+        await statements.aexecute(cursor, "user_by_id", [user_id])
+        row = await cursor.fetchone()
         if not row:
             return HttpResponse(status=404, content=json.dumps({"detail": "User not found"}))
 
@@ -112,10 +114,9 @@ def get_user(request, user_id: int):
 
 @router.put("/{user_id}", response=UserSchema)
 def update_user(request, user_id: int, user_data: UserUpdateSchema):
-    connection = get_connection()
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if user exists
-        cursor.execute("SELECT user_id FROM api_user WHERE user_id = %s", [user_id])
+        statements.execute(cursor, "user_exists", [user_id])
         if not cursor.fetchone():
             return HttpResponse(status=404, content=json.dumps({"detail": "User not found"}))
 
@@ -145,10 +146,7 @@ def update_user(request, user_id: int, user_data: UserUpdateSchema):
 
         if not update_fields:
             # If no fields to update, just return the current user
-            cursor.execute(
-                "SELECT user_id, username, email, role, last_login, is_active, date_joined FROM api_user WHERE user_id = %s",
-                [user_id]
-            )
+            statements.execute(cursor, "user_by_id", [user_id])
             row = cursor.fetchone()
             user = {
                 "user_id": row[0],
@@ -176,6 +174,10 @@ def update_user(request, user_id: int, user_data: UserUpdateSchema):
         )
 
         row = cursor.fetchone()
+        cache.invalidate("user", user_id)
+        cache.invalidate_related(
+            cursor, "incident", "SELECT incident_id FROM api_incident WHERE assigned_to_id = %s", [user_id]
+        )
         user = {
             "user_id": row[0],
             "username": row[1],
@@ -190,14 +192,19 @@ def update_user(request, user_id: int, user_data: UserUpdateSchema):
 
 @router.delete("/{user_id}")
 def delete_user(request, user_id: int):
-    connection = get_connection()
     """Delete a user"""
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if user exists
-        cursor.execute("SELECT user_id FROM api_user WHERE user_id = %s", [user_id])
+        statements.execute(cursor, "user_exists", [user_id])
         if not cursor.fetchone():
             return HttpResponse(status=404, content=json.dumps({"detail": "User not found"}))
 
+        # Cached incidents show the assignee; drop them before it is unset
+        cache.invalidate_related(
+            cursor, "incident", "SELECT incident_id FROM api_incident WHERE assigned_to_id = %s", [user_id]
+        )
+        cache.invalidate("user", user_id)
+
         # Delete user
         cursor.execute("DELETE FROM api_user WHERE user_id = %s", [user_id])
         return {"success": True}
@@ -205,9 +212,8 @@ def delete_user(request, user_id: int):
 
 @router.post("/activity/log", response=dict)
 def log_user_activity(request, activity: dict):
-    connection = get_connection()
     """Log user activity"""
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         cursor.execute(
             """
             INSERT INTO user_activity_logs
@@ -227,10 +233,9 @@ def log_user_activity(request, activity: dict):
 
 @router.post("/activity-logs/", response=UserActivityLogFullSchema)
 def create_activity_log(request, payload: UserActivityLogCreateSchema):
-    connection = get_connection()
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if user exists
-        cursor.execute("SELECT user_id FROM api_user WHERE user_id = %s", [payload.user_id])
+        statements.execute(cursor, "user_exists", [payload.user_id])
         if not cursor.fetchone():
             return HttpResponse(status=404, content=json.dumps({"detail": "User not found"}))
 
@@ -267,9 +272,20 @@ def create_activity_log(request, payload: UserActivityLogCreateSchema):
 
 
 @router.get("/activity-logs/", response=List[UserActivityLogFullSchema])
-def list_activity_logs(request, filters: UserActivityLogFilterSchema = None):
-    connection = get_connection()
-    with connection.cursor() as cursor:
+async def list_activity_logs(
+    request,
+    filters: UserActivityLogFilterSchema = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None
+):
+    """List activity logs, newest first; the next page's cursor is sent in X-Next-Cursor"""
+    try:
+        after_sql, after_params = ACTIVITY_LOG_KEYSET.where(cursor)
+    except InvalidCursor:
+        return HttpResponse(status=400, content=json.dumps({"detail": "Invalid cursor"}))
+
+    async with async_db_connection() as connection, \
+            connection.cursor(row_factory=schema_rows(UserActivityLogFullSchema)) as cursor:
         query = "SELECT log_id, user_id, activity_type, timestamp, description FROM user_activity_logs"
         conditions = []
         params = []
@@ -293,41 +309,35 @@ def list_activity_logs(request, filters: UserActivityLogFilterSchema = None):
                 conditions.append("timestamp <= %s")
                 params.append(to_date)
 
+        if after_sql:
+            conditions.append(after_sql)
+            params.extend(after_params)
+
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
 
-        query += " ORDER BY timestamp DESC"
+        query += f" ORDER BY {ACTIVITY_LOG_KEYSET.order_by} LIMIT %s"
+        params.append(limit + 1)
 
-        cursor.execute(query, params)
-
-        results = []
-        for row in cursor.fetchall():
-            results.append({
-                "log_id": row[0],
-                "user_id": row[1],
-                "activity_type": row[2],
-                "timestamp": row[3],
-                "description": row[4],
-                "ip_address": row[5],
-                "resource_type": row[6],
-                "resource_id": row[7]
-            })
+        await cursor.execute(query, params)
+        results, next_cursor = ACTIVITY_LOG_KEYSET.paginate(
+            await cursor.fetchall(), limit, id_key="log_id", sort_key="timestamp"
+        )
 
-        return results
+    return trusted_response(results, headers={"X-Next-Cursor": next_cursor})
 
 
 @router.get("/activity-logs/{log_id}", response=UserActivityLogFullSchema)
-def get_activity_log(request, log_id: int):
-    connection = get_connection()
-    with connection.cursor() as cursor:
-        cursor.execute(
+async def get_activity_log(request, log_id: int):
+    async with async_db_connection() as connection, connection.cursor() as cursor:
+        await cursor.execute(
             """
             SELECT log_id, user_id, activity_type, timestamp, description
             FROM user_activity_logs WHERE log_id = %s
             """,
             [log_id]
         )
-        row = cursor.fetchone()
+        row = await cursor.fetchone()
         if not row:
             return HttpResponse(status=404, content=json.dumps({"detail": "Activity log not found"}))
 
@@ -345,8 +355,7 @@ def get_activity_log(request, log_id: int):
 
 @router.put("/activity-logs/{log_id}", response=UserActivityLogFullSchema)
 def update_activity_log(request, log_id: int, payload: UserActivityLogUpdateSchema):
-    connection = get_connection()
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if activity log exists
         cursor.execute("SELECT log_id FROM user_activity_logs WHERE log_id = %s", [log_id])
         if not cursor.fetchone():
@@ -411,8 +420,7 @@ def update_activity_log(request, log_id: int, payload: UserActivityLogUpdateSche
 
 @router.delete("/activity-logs/{log_id}", response={204: None})
 def delete_activity_log(request, log_id: int):
-    connection = get_connection()
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         cursor.execute("SELECT log_id FROM user_activity_logs WHERE log_id = %s", [log_id])
         if not cursor.fetchone():
             return HttpResponse(status=404, content=json.dumps({"detail": "Activity log not found"}))
@@ -1,40 +1,47 @@
-from ninja import Router
+from ninja import Query, Router
 from django.http import HttpResponse
-from typing import List
+from typing import List, Optional
 import json
 
-from app.api.common.utils import get_connection
+from app.api.common import cache, statements
+from app.api.common.pagination import DEFAULT_LIMIT, MAX_LIMIT, InvalidCursor, Keyset
+from app.api.common.renderers import schema_rows, trusted_response
+from app.api.common.utils import async_db_connection, db_connection
 from app.api.vulnerabilities.schemas import VulnerabilitySchema, VulnerabilityCreateSchema, VulnerabilityUpdateSchema
 
 router = Router(tags=["vulnerabilities"])
 
+VULNERABILITY_KEYSET = Keyset("vulnerability_id", descending=False)
+
 
 @router.get("/", response=List[VulnerabilitySchema])
-def list_vulnerabilities(request):
-    connection = get_connection()
-    """Get all vulnerabilities"""
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT vulnerability_id, title, description, severity, cve_reference, remediation_steps, discovery_date, patch_available FROM api_vulnerability")
-        vulnerabilities = []
-        for row in cursor.fetchall():
-            vulnerability = {
-                "vulnerability_id": row[0],
-                "title": row[1],
-                "description": row[2],
-                "severity": row[3],
-                "cve_reference": row[4],
-                "remediation_steps": row[5],
-                "discovery_date": row[6],
-                "patch_available": row[7],
-            }
-            vulnerabilities.append(vulnerability)
-        return vulnerabilities
+async def list_vulnerabilities(
+    request,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None
+):
+    """Get vulnerabilities by id; the next page's cursor is sent in X-Next-Cursor"""
+    try:
+        after_sql, after_params = VULNERABILITY_KEYSET.where(cursor)
+    except InvalidCursor:
+        return HttpResponse(status=400, content=json.dumps({"detail": "Invalid cursor"}))
+
+    query = "SELECT vulnerability_id, title, description, severity, cve_reference, remediation_steps, discovery_date, patch_available FROM api_vulnerability"
+    if after_sql:
+        query += " WHERE " + after_sql
+    query += f" ORDER BY {VULNERABILITY_KEYSET.order_by} LIMIT %s"
+
+    async with async_db_connection() as connection, connection.cursor(row_factory=schema_rows(VulnerabilitySchema)) as cursor:
+        await cursor.execute(query, after_params + [limit + 1])
+        vulnerabilities, next_cursor = VULNERABILITY_KEYSET.paginate(
+            await cursor.fetchall(), limit, id_key="vulnerability_id"
+        )
+    return trusted_response(vulnerabilities, headers={"X-Next-Cursor": next_cursor})
 
 @router.post("/", response=VulnerabilitySchema)
 def create_vulnerability(request, vulnerability_data: VulnerabilityCreateSchema):
-    connection = get_connection()
     """Create a new vulnerability"""
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if vulnerability_name already exists
         cursor.execute(
             "SELECT vulnerability_id FROM api_vulnerability WHERE title = %s",
@@ -70,15 +77,12 @@ def create_vulnerability(request, vulnerability_data: VulnerabilityCreateSchema)
         return vulnerability
 
 @router.get("/{vulnerability_id}", response=VulnerabilitySchema)
-def get_vulnerability(request, vulnerability_id: int):
-    connection = get_connection()
+@cache.cached_entity("vulnerability", "vulnerability_id")
+async def get_vulnerability(request, vulnerability_id: int):
     """Get vulnerability by ID"""
-    with connection.cursor() as cursor:
-        cursor.execute(
-            "SELECT vulnerability_id, title, description, severity, cve_reference, remediation_steps, discovery_date, patch_available FROM api_vulnerability WHERE vulnerability_id = %s",
-            [vulnerability_id]
-        )
-        row = cursor.fetchone()
+    async with async_db_connection() as connection, connection.cursor() as cursor:
+        await statements.aexecute(cursor, "vulnerability_by_id", [vulnerability_id])
+        row = await cursor.fetchone()
         if not row:
             return HttpResponse(status=404, content=json.dumps({"detail": "Vulnerability not found"}))
 
@@ -96,11 +100,10 @@ def get_vulnerability(request, vulnerability_id: int):
 
 @router.put("/{vulnerability_id}", response=VulnerabilitySchema)
 def update_vulnerability(request, vulnerability_id: int, vulnerability_data: VulnerabilityUpdateSchema):
-    connection = get_connection()
     """Update an existing vulnerability"""
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if vulnerability exists
-        cursor.execute("SELECT vulnerability_id FROM api_vulnerability WHERE vulnerability_id = %s", [vulnerability_id])
+        statements.execute(cursor, "vulnerability_exists", [vulnerability_id])
         if not cursor.fetchone():
             return HttpResponse(status=404, content=json.dumps({"detail": "Vulnerability not found"}))
 
@@ -138,10 +141,7 @@ def update_vulnerability(request, vulnerability_id: int, vulnerability_data: Vul
 
         if not update_fields:
             # If no fields to update, just return the current vulnerability
-            cursor.execute(
-                "SELECT vulnerability_id, title, description, severity, cve_reference, remediation_steps, discovery_date, patch_available FROM api_vulnerability WHERE vulnerability_id = %s",
-                [vulnerability_id]
-            )
+            statements.execute(cursor, "vulnerability_by_id", [vulnerability_id])
             row = cursor.fetchone()
             vulnerability = {
                 "vulnerability_id": row[0],
@@ -170,6 +170,7 @@ def update_vulnerability(request, vulnerability_id: int, vulnerability_data: Vul
         )
 
         row = cursor.fetchone()
+        cache.invalidate("vulnerability", vulnerability_id)
         vulnerability = {
             "vulnerability_id": row[0],
             "title": row[1],
@@ -184,14 +185,21 @@ def update_vulnerability(request, vulnerability_id: int, vulnerability_data: Vul
 
 @router.delete("/{vulnerability_id}")
 def delete_vulnerability(request, vulnerability_id: int):
-    connection = get_connection()
     """Delete a vulnerability"""
-    with connection.cursor() as cursor:
+    with db_connection() as connection, connection.cursor() as cursor:
         # Check if vulnerability exists
-        cursor.execute("SELECT vulnerability_id FROM api_vulnerability WHERE vulnerability_id = %s", [vulnerability_id])
+        statements.execute(cursor, "vulnerability_exists", [vulnerability_id])
         if not cursor.fetchone():
             return HttpResponse(status=404, content=json.dumps({"detail": "Vulnerability not found"}))
 
+        # Cached threats list the vulnerability; drop them before the cascade
+        cache.invalidate_related(
+            cursor, "threat",
+            "SELECT threat_id FROM threat_vulnerability_association WHERE vulnerability_id = %s",
+            [vulnerability_id]
+        )
+        cache.invalidate("vulnerability", vulnerability_id)
+
         # Delete vulnerability
         cursor.execute("DELETE FROM api_vulnerability WHERE vulnerability_id = %s", [vulnerability_id])
         return {"success": True}
\ No newline at end of file
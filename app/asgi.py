@@ -14,3 +14,21 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
 
 application = get_asgi_application()
+
+# Daphne serves every request from one event loop, so async handlers can
+# share a connection pool bound to it.
+from app.api.alerts.stream import AlertStreamApp  # noqa: E402
+from app.api.common.background import start_background_workers  # noqa: E402
+from app.api.common.db_objects import install_on_startup  # noqa: E402
+from app.api.common.utils import enable_async_pool  # noqa: E402
+
+enable_async_pool()
+
+# Alert streams are read as they arrive, ahead of Django's body buffering.
+application = AlertStreamApp(application)
+
+# Deploy database functions and triggers whose definition changed.
+install_on_startup()
+
+# Dashboard and risk score refreshers, alert partition maintenance.
+start_background_workers()
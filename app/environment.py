@@ -9,9 +9,78 @@ class Settings(BaseSettings):
     POSTGRES_PORT: int = Field(validation_alias="POSTGRES_PORT")
     POSTGRES_DATABASE: str = Field(validation_alias="POSTGRES_DATABASE")
 
+    POSTGRES_POOL_MIN_SIZE: int = Field(2, validation_alias="POSTGRES_POOL_MIN_SIZE")
+    POSTGRES_POOL_MAX_SIZE: int = Field(20, validation_alias="POSTGRES_POOL_MAX_SIZE")
+    POSTGRES_ASYNC_POOL_MAX_SIZE: int = Field(50, validation_alias="POSTGRES_ASYNC_POOL_MAX_SIZE")
+    POSTGRES_POOL_MAX_IDLE: float = Field(300.0, validation_alias="POSTGRES_POOL_MAX_IDLE")
+    POSTGRES_POOL_MAX_LIFETIME: float = Field(3600.0, validation_alias="POSTGRES_POOL_MAX_LIFETIME")
+    POSTGRES_POOL_TIMEOUT: float = Field(10.0, validation_alias="POSTGRES_POOL_TIMEOUT")
+
     REDIS_PASSWORD: str = Field(validation_alias="REDIS_PASSWORD")
     REDIS_PORT: int = Field(validation_alias="REDIS_PORT")
 
+    ENTITY_CACHE_TIMEOUT: int = Field(300, validation_alias="ENTITY_CACHE_TIMEOUT")
+    ENTITY_CACHE_L1_MAX_ENTRIES: int = Field(2048, validation_alias="ENTITY_CACHE_L1_MAX_ENTRIES")
+    ENTITY_CACHE_L1_TIMEOUT: float = Field(5.0, validation_alias="ENTITY_CACHE_L1_TIMEOUT")
+
+    DASHBOARD_REFRESH_INTERVAL: float = Field(60.0, validation_alias="DASHBOARD_REFRESH_INTERVAL")
+    DASHBOARD_REFRESH_DEBOUNCE: float = Field(2.0, validation_alias="DASHBOARD_REFRESH_DEBOUNCE")
+    DASHBOARD_REFRESH_MAX_AGE: float = Field(300.0, validation_alias="DASHBOARD_REFRESH_MAX_AGE")
+
+    RISK_SCORE_REFRESH_INTERVAL: float = Field(60.0, validation_alias="RISK_SCORE_REFRESH_INTERVAL")
+    RISK_SCORE_REFRESH_DEBOUNCE: float = Field(1.0, validation_alias="RISK_SCORE_REFRESH_DEBOUNCE")
+    RISK_SCORE_BATCH_SIZE: int = Field(500, validation_alias="RISK_SCORE_BATCH_SIZE")
+    RISK_SCORE_SWEEP_INTERVAL: float = Field(900.0, validation_alias="RISK_SCORE_SWEEP_INTERVAL")
+    RISK_SIMULATION_MAX_AGE: float = Field(300.0, validation_alias="RISK_SIMULATION_MAX_AGE")
+    RISK_HISTORY_INTERVAL: float = Field(3600.0, validation_alias="RISK_HISTORY_INTERVAL")
+    RISK_HISTORY_MIN_CHANGE: float = Field(1.0, validation_alias="RISK_HISTORY_MIN_CHANGE")
+    RISK_HISTORY_RAW_RETENTION_DAYS: int = Field(14, validation_alias="RISK_HISTORY_RAW_RETENTION_DAYS")
+    RISK_HISTORY_DAILY_RETENTION_DAYS: int = Field(365, validation_alias="RISK_HISTORY_DAILY_RETENTION_DAYS")
+
+    REQUEST_RECORDING_PATH: str = Field("", validation_alias="REQUEST_RECORDING_PATH")
+    REQUEST_RECORDING_SAMPLE_RATE: float = Field(1.0, validation_alias="REQUEST_RECORDING_SAMPLE_RATE")
+    REQUEST_RECORDING_MAX_BODY_BYTES: int = Field(65536, validation_alias="REQUEST_RECORDING_MAX_BODY_BYTES")
+    REQUEST_RECORDING_REDACT_KEYS: str = Field(
+        "password,new_password,old_password,current_password,token,access_token,refresh_token,secret,api_key",
+        validation_alias="REQUEST_RECORDING_REDACT_KEYS",
+    )
+
+    METRICS_ENABLED: bool = Field(True, validation_alias="METRICS_ENABLED")
+    METRICS_MAX_STATEMENTS: int = Field(500, validation_alias="METRICS_MAX_STATEMENTS")
+    METRICS_STATEMENT_LABEL_LENGTH: int = Field(200, validation_alias="METRICS_STATEMENT_LABEL_LENGTH")
+
+    ALERT_BULK_MAX_ALERTS: int = Field(10000, validation_alias="ALERT_BULK_MAX_ALERTS")
+    DATA_UPLOAD_MAX_MEMORY_SIZE: int = Field(16 * 1024 * 1024, validation_alias="DATA_UPLOAD_MAX_MEMORY_SIZE")
+
+    ALERT_STREAM_BATCH_SIZE: int = Field(1000, validation_alias="ALERT_STREAM_BATCH_SIZE")
+    ALERT_STREAM_BATCH_BYTES: int = Field(1024 * 1024, validation_alias="ALERT_STREAM_BATCH_BYTES")
+    ALERT_STREAM_FLUSH_MS: int = Field(250, validation_alias="ALERT_STREAM_FLUSH_MS")
+    ALERT_STREAM_MAX_PENDING_BATCHES: int = Field(2, validation_alias="ALERT_STREAM_MAX_PENDING_BATCHES")
+    ALERT_STREAM_MAX_LINE_BYTES: int = Field(65536, validation_alias="ALERT_STREAM_MAX_LINE_BYTES")
+    ALERT_STREAM_MAX_ERRORS: int = Field(100, validation_alias="ALERT_STREAM_MAX_ERRORS")
+    ALERT_STREAM_MAX_BODY_BYTES: int = Field(64 * 1024 * 1024, validation_alias="ALERT_STREAM_MAX_BODY_BYTES")
+
+    ALERT_DEDUP_ENABLED: bool = Field(True, validation_alias="ALERT_DEDUP_ENABLED")
+    ALERT_DEDUP_WINDOW_SECONDS: int = Field(300, validation_alias="ALERT_DEDUP_WINDOW_SECONDS")
+    ALERT_DEDUP_LRU_SIZE: int = Field(10000, validation_alias="ALERT_DEDUP_LRU_SIZE")
+    ALERT_DEDUP_KEY_RETENTION_SECONDS: int = Field(86400, validation_alias="ALERT_DEDUP_KEY_RETENTION_SECONDS")
+
+    ALERT_CORRELATION_ENABLED: bool = Field(True, validation_alias="ALERT_CORRELATION_ENABLED")
+    ALERT_CORRELATION_KEYS: str = Field("source,alert_type", validation_alias="ALERT_CORRELATION_KEYS")
+    ALERT_CORRELATION_WINDOW_SECONDS: int = Field(3600, validation_alias="ALERT_CORRELATION_WINDOW_SECONDS")
+    ALERT_CORRELATION_OPEN_STATUSES: str = Field(
+        "open,investigating,contained", validation_alias="ALERT_CORRELATION_OPEN_STATUSES"
+    )
+    ALERT_CORRELATION_OPEN_MIN_SEVERITY: str = Field("high", validation_alias="ALERT_CORRELATION_OPEN_MIN_SEVERITY")
+
+    ALERT_PARTITIONS_PERIOD: str = Field("month", validation_alias="ALERT_PARTITIONS_PERIOD")
+    ALERT_PARTITIONS_PREMAKE: int = Field(3, validation_alias="ALERT_PARTITIONS_PREMAKE")
+    ALERT_PARTITIONS_RETENTION_PERIODS: int = Field(0, validation_alias="ALERT_PARTITIONS_RETENTION_PERIODS")
+    ALERT_PARTITIONS_RETENTION_ACTION: str = Field("detach", validation_alias="ALERT_PARTITIONS_RETENTION_ACTION")
+    ALERT_PARTITIONS_MAINTENANCE_INTERVAL: int = Field(
+        3600, validation_alias="ALERT_PARTITIONS_MAINTENANCE_INTERVAL"
+    )
+
     class Config:
         env_file = ".env"
 
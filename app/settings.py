@@ -57,6 +57,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "app.api.common.middleware.RequestRecorderMiddleware",
+    "app.api.common.middleware.RequestScopeMiddleware",
 ]
 
 CORS_ORIGIN_ALLOW_ALL = True
@@ -126,6 +128,19 @@ DATABASES = {
     }
 }
 
+# Process-wide psycopg pool shared by the API routers (app/api/common/utils.py).
+# Idle connections above MIN_SIZE are closed after MAX_IDLE seconds and every
+# connection is recycled after MAX_LIFETIME seconds; TIMEOUT bounds checkout.
+# ASYNC_MAX_SIZE sizes the pool used by `async def` handlers under Daphne.
+DB_POOL = {
+    "MIN_SIZE": SETTINGS.POSTGRES_POOL_MIN_SIZE,
+    "MAX_SIZE": SETTINGS.POSTGRES_POOL_MAX_SIZE,
+    "ASYNC_MAX_SIZE": SETTINGS.POSTGRES_ASYNC_POOL_MAX_SIZE,
+    "MAX_IDLE": SETTINGS.POSTGRES_POOL_MAX_IDLE,
+    "MAX_LIFETIME": SETTINGS.POSTGRES_POOL_MAX_LIFETIME,
+    "TIMEOUT": SETTINGS.POSTGRES_POOL_TIMEOUT,
+}
+
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.redis.RedisCache",
@@ -134,6 +149,136 @@ CACHES = {
     }
 }
 
+# Read-through cache for entity GET endpoints (app/api/common/cache.py).
+# Entries live in Redis for TIMEOUT seconds; each process also keeps up to
+# L1_MAX_ENTRIES in memory for L1_TIMEOUT seconds, which bounds how long another
+# process can serve an entry after a write invalidated it.
+ENTITY_CACHE = {
+    "TIMEOUT": SETTINGS.ENTITY_CACHE_TIMEOUT,
+    "L1_MAX_ENTRIES": SETTINGS.ENTITY_CACHE_L1_MAX_ENTRIES,
+    "L1_TIMEOUT": SETTINGS.ENTITY_CACHE_L1_TIMEOUT,
+}
+
+# Background refresh of the materialized incident dashboard
+# (app/api/dashboard/refresh.py). Writes to the underlying tables trigger a
+# refresh DEBOUNCE seconds later; otherwise the view is checked every INTERVAL
+# seconds and refreshed when it has pending changes or is older than MAX_AGE.
+DASHBOARD_REFRESH = {
+    "INTERVAL": SETTINGS.DASHBOARD_REFRESH_INTERVAL,
+    "DEBOUNCE": SETTINGS.DASHBOARD_REFRESH_DEBOUNCE,
+    "MAX_AGE": SETTINGS.DASHBOARD_REFRESH_MAX_AGE,
+}
+
+# Persisted incident risk scores (app/api/risk/refresh.py). Incidents queued by
+# writes are rescored BATCH_SIZE at a time DEBOUNCE seconds after a change, or
+# within INTERVAL seconds; stored time factors are brought up to date every
+# SWEEP_INTERVAL seconds (the stored factor moves by 0.01 every 864 seconds).
+RISK_SCORES = {
+    "INTERVAL": SETTINGS.RISK_SCORE_REFRESH_INTERVAL,
+    "DEBOUNCE": SETTINGS.RISK_SCORE_REFRESH_DEBOUNCE,
+    "BATCH_SIZE": SETTINGS.RISK_SCORE_BATCH_SIZE,
+    "SWEEP_INTERVAL": SETTINGS.RISK_SCORE_SWEEP_INTERVAL,
+}
+
+# What-if risk weights (app/api/risk/engine.py): each process loads every
+# incident's factors once and reuses them for MAX_AGE seconds.
+RISK_SIMULATION = {
+    "MAX_AGE": SETTINGS.RISK_SIMULATION_MAX_AGE,
+}
+
+# Risk score history (app/api/risk/history.py), recorded every INTERVAL seconds
+# by the risk score refresher. An incident is snapshotted when a factor other
+# than its age changed or its score moved by MIN_CHANGE points; raw snapshots
+# are kept RAW_RETENTION_DAYS, daily buckets DAILY_RETENTION_DAYS.
+RISK_HISTORY = {
+    "INTERVAL": SETTINGS.RISK_HISTORY_INTERVAL,
+    "MIN_CHANGE": SETTINGS.RISK_HISTORY_MIN_CHANGE,
+    "RAW_RETENTION_DAYS": SETTINGS.RISK_HISTORY_RAW_RETENTION_DAYS,
+    "DAILY_RETENTION_DAYS": SETTINGS.RISK_HISTORY_DAILY_RETENTION_DAYS,
+}
+
+# Traffic recording for load replay (benchmarks/replay.py). When PATH is set,
+# SAMPLE_RATE of the requests are appended there as JSON lines; bodies larger
+# than MAX_BODY_BYTES are not kept, and JSON body fields named in REDACT_KEYS
+# (case-insensitive) are recorded as "REDACTED". Off by default.
+REQUEST_RECORDING = {
+    "PATH": SETTINGS.REQUEST_RECORDING_PATH,
+    "SAMPLE_RATE": SETTINGS.REQUEST_RECORDING_SAMPLE_RATE,
+    "MAX_BODY_BYTES": SETTINGS.REQUEST_RECORDING_MAX_BODY_BYTES,
+    "REDACT_KEYS": {key.strip().lower() for key in SETTINGS.REQUEST_RECORDING_REDACT_KEYS.split(",") if key.strip()},
+}
+
+# Prometheus metrics served at /metrics (app/api/common/metrics.py): per-route
+# latency and DB usage, and per-statement-fingerprint counters. Fingerprints
+# past MAX_STATEMENTS are counted together as "other"; the statement label is
+# cut at STATEMENT_LABEL_LENGTH characters.
+METRICS = {
+    "ENABLED": SETTINGS.METRICS_ENABLED,
+    "MAX_STATEMENTS": SETTINGS.METRICS_MAX_STATEMENTS,
+    "STATEMENT_LABEL_LENGTH": SETTINGS.METRICS_STATEMENT_LABEL_LENGTH,
+}
+
+# Bulk alert ingestion (POST /alerts/bulk/): alerts accepted per request. The
+# request body limit is raised to fit a full batch.
+ALERT_BULK = {
+    "MAX_ALERTS": SETTINGS.ALERT_BULK_MAX_ALERTS,
+}
+DATA_UPLOAD_MAX_MEMORY_SIZE = SETTINGS.DATA_UPLOAD_MAX_MEMORY_SIZE
+
+# Streaming alert ingestion (POST /alerts/stream/, app/api/alerts/stream.py).
+# Lines are written in micro-batches of BATCH_SIZE lines or BATCH_BYTES, or
+# every FLUSH_MS; the body is not read while MAX_PENDING_BATCHES wait for the
+# database. Longer lines than MAX_LINE_BYTES are rejected unread, and the
+# response lists the first MAX_ERRORS rejections. That backpressure bounds
+# memory only on a server that streams request bodies (e.g. uvicorn); Daphne
+# holds a whole body in memory before the application reads it, so bodies over
+# MAX_BODY_BYTES are refused (413) on every server.
+ALERT_STREAM = {
+    "BATCH_SIZE": SETTINGS.ALERT_STREAM_BATCH_SIZE,
+    "BATCH_BYTES": SETTINGS.ALERT_STREAM_BATCH_BYTES,
+    "FLUSH_MS": SETTINGS.ALERT_STREAM_FLUSH_MS,
+    "MAX_PENDING_BATCHES": SETTINGS.ALERT_STREAM_MAX_PENDING_BATCHES,
+    "MAX_LINE_BYTES": SETTINGS.ALERT_STREAM_MAX_LINE_BYTES,
+    "MAX_ERRORS": SETTINGS.ALERT_STREAM_MAX_ERRORS,
+    "MAX_BODY_BYTES": SETTINGS.ALERT_STREAM_MAX_BODY_BYTES,
+}
+
+# Alert deduplication (app/api/alerts/ingest.py): alerts with the same source,
+# name and type within a WINDOW_SECONDS window are counted on the first one.
+# Each process remembers LRU_SIZE recent windows; the database keeps their
+# keys for KEY_RETENTION_SECONDS.
+ALERT_DEDUP = {
+    "ENABLED": SETTINGS.ALERT_DEDUP_ENABLED,
+    "WINDOW_SECONDS": SETTINGS.ALERT_DEDUP_WINDOW_SECONDS,
+    "LRU_SIZE": SETTINGS.ALERT_DEDUP_LRU_SIZE,
+    "KEY_RETENTION_SECONDS": SETTINGS.ALERT_DEDUP_KEY_RETENTION_SECONDS,
+}
+
+# Alert correlation (app/api/alerts/correlation.py): new alerts without an
+# incident join the incident of alerts with the same KEYS seen within
+# WINDOW_SECONDS, or of their asset, while it is in OPEN_STATUSES. Unmatched
+# alerts of OPEN_MIN_SEVERITY or above open a new incident.
+ALERT_CORRELATION = {
+    "ENABLED": SETTINGS.ALERT_CORRELATION_ENABLED,
+    "KEYS": [key.strip() for key in SETTINGS.ALERT_CORRELATION_KEYS.split(",") if key.strip()],
+    "WINDOW_SECONDS": SETTINGS.ALERT_CORRELATION_WINDOW_SECONDS,
+    "OPEN_STATUSES": [status.strip() for status in SETTINGS.ALERT_CORRELATION_OPEN_STATUSES.split(",")],
+    "OPEN_MIN_SEVERITY": SETTINGS.ALERT_CORRELATION_OPEN_MIN_SEVERITY,
+}
+
+# Alert partitions (app/api/alerts/partitions.py): one partition of api_alert
+# per PERIOD ("day", "week" or "month"), created PREMAKE periods ahead every
+# MAINTENANCE_INTERVAL seconds. Partitions older than RETENTION_PERIODS
+# (0: keep all) are detached, or dropped with RETENTION_ACTION "drop"; expired
+# alerts in the default partition are moved to an archive table, or deleted.
+ALERT_PARTITIONS = {
+    "PERIOD": SETTINGS.ALERT_PARTITIONS_PERIOD,
+    "PREMAKE": SETTINGS.ALERT_PARTITIONS_PREMAKE,
+    "RETENTION_PERIODS": SETTINGS.ALERT_PARTITIONS_RETENTION_PERIODS,
+    "RETENTION_ACTION": SETTINGS.ALERT_PARTITIONS_RETENTION_ACTION,
+    "MAINTENANCE_INTERVAL": SETTINGS.ALERT_PARTITIONS_MAINTENANCE_INTERVAL,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -22,8 +22,10 @@ from django.urls import path
 from django.conf import settings
 
 from app.api.api import api
+from app.api.common.views import prometheus_metrics
 
 urlpatterns = [
     path('app/v1/cyber/', api.urls),
+    path('metrics', prometheus_metrics, name='metrics'),
     path('admin/', admin.site.urls),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
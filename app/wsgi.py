@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
 
 application = get_wsgi_application()
+
+# Deploy database functions and triggers whose definition changed.
+from app.api.common.background import start_background_workers  # noqa: E402
+from app.api.common.db_objects import install_on_startup  # noqa: E402
+
+install_on_startup()
+
+# Dashboard and risk score refreshers, alert partition maintenance.
+start_background_workers()
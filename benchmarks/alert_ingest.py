@@ -0,0 +1,132 @@
+"""
+Alert ingestion throughput: one POST /alerts/ per alert against
+POST /alerts/bulk/ at several batch sizes, in alerts per second.
+
+Requests go through Django's test client, so they run the same middleware,
+validation and handlers as in production, without a network hop; the
+numbers are for a single client. Alerts are spread over existing incidents
+(plus a share with none); repeats of a name within the dedup window
+(ALERT_DEDUP) are counted rather than stored. Every alert the run created,
+and every incident correlation opened for them, is deleted at the end.
+
+Usage (from the repository root, with the POSTGRES_* variables set):
+
+    python -m benchmarks.alert_ingest --alerts 20000 --batch-sizes 100 1000 10000
+    python -m benchmarks.alert_ingest --single-alerts 500 --output ingest.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+django.setup()
+
+from django.test import Client  # noqa: E402
+
+from app.api.common.utils import close_pool, db_connection  # noqa: E402
+
+SOURCE = "benchmark.alert_ingest"
+SEVERITIES = ["low", "medium", "high", "critical"]
+
+
+def make_alerts(count, incident_ids, rng):
+    alerts = []
+    for i in range(count):
+        severity = rng.choice(SEVERITIES)
+        # Critical alerts must reference an incident; a third of the rest have none
+        incident_id = rng.choice(incident_ids) if severity == "critical" or rng.random() > 0.33 else None
+        alerts.append({
+            "source": SOURCE, "name": f"Benchmark alert {i}", "type": rng.choice(["network", "endpoint", "auth"]),
+            "severity": severity, "incident_id": incident_id,
+        })
+    return alerts
+
+
+def single(client, alerts):
+    samples, round_trips = [], 0
+    started = time.perf_counter()
+    for alert in alerts:
+        sent = time.perf_counter()
+        response = client.post("/app/v1/cyber/alerts/", alert, content_type="application/json")
+        samples.append((time.perf_counter() - sent) * 1000)
+        if response.status_code != 200:
+            raise SystemExit(f"POST /alerts/ returned {response.status_code}: {response.content[:200]}")
+        round_trips += int(response.get("X-DB-Round-Trips", 0))
+    elapsed = time.perf_counter() - started
+    return {
+        "alerts": len(alerts),
+        "requests": len(alerts),
+        "alerts_per_s": round(len(alerts) / elapsed, 1),
+        "request_p50_ms": round(statistics.median(samples), 3),
+        "round_trips_per_alert": round(round_trips / len(alerts), 4),
+    }
+
+
+def bulk(client, alerts, batch_size):
+    samples, round_trips = [], 0
+    started = time.perf_counter()
+    for offset in range(0, len(alerts), batch_size):
+        batch = alerts[offset:offset + batch_size]
+        sent = time.perf_counter()
+        response = client.post("/app/v1/cyber/alerts/bulk/", {"alerts": batch}, content_type="application/json")
+        samples.append((time.perf_counter() - sent) * 1000)
+        body = response.json() if response.status_code == 200 else {}
+        if body.get("created", 0) + body.get("deduplicated", 0) != len(batch):
+            raise SystemExit(f"POST /alerts/bulk/ returned {response.status_code}: {response.content[:200]}")
+        round_trips += int(response.get("X-DB-Round-Trips", 0))
+    elapsed = time.perf_counter() - started
+    return {
+        "alerts": len(alerts),
+        "requests": len(samples),
+        "alerts_per_s": round(len(alerts) / elapsed, 1),
+        "request_p50_ms": round(statistics.median(samples), 3),
+        "round_trips_per_alert": round(round_trips / len(alerts), 4),
+    }
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    with db_connection() as connection, connection.cursor() as cursor:
+        cursor.execute("SELECT incident_id FROM api_incident ORDER BY incident_id LIMIT 1000")
+        incident_ids = [row[0] for row in cursor.fetchall()]
+    if not incident_ids:
+        raise SystemExit("No incidents to attach alerts to; load data first (generate_synthetic_data)")
+
+    client = Client(HTTP_HOST="localhost")
+    results = {}
+    try:
+        results["single"] = single(client, make_alerts(args.single_alerts, incident_ids, rng))
+        for batch_size in args.batch_sizes:
+            results[f"bulk_{batch_size}"] = bulk(client, make_alerts(args.alerts, incident_ids, rng), batch_size)
+    finally:
+        with db_connection() as connection, connection.cursor() as cursor:
+            cursor.execute("DELETE FROM api_alert WHERE source = %s", [SOURCE])
+            # Incidents opened for the run's alerts by correlation
+            cursor.execute("DELETE FROM api_incident WHERE description LIKE %s", [f"Opened by alert correlation: % ({SOURCE})"])
+        close_pool()
+
+    baseline = results["single"]["alerts_per_s"]
+    for result in results.values():
+        result["speedup"] = round(result["alerts_per_s"] / baseline, 1)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--alerts", type=int, default=20_000, help="alerts per bulk run")
+    parser.add_argument("--single-alerts", type=int, default=1_000, help="alerts sent one per request")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the results here")
+    logging.getLogger("django.request").setLevel(logging.CRITICAL)
+    main(parser.parse_args())
@@ -0,0 +1,108 @@
+"""
+Compare the sync and async database paths used by the API handlers.
+
+The sync path runs a query through `db_connection()` inside
+`sync_to_async(thread_sensitive=True)` under a per-request
+`ThreadSensitiveContext`, which is how Django drives sync views under Daphne.
+The async path awaits the same query through `async_db_connection()` on the
+shared async pool. `--db-latency-ms` adds a server-side `pg_sleep` so the run
+reflects a remote database rather than a local socket.
+
+Usage (from the repository root, with the POSTGRES_* variables set):
+
+    python -m benchmarks.async_vs_sync --concurrency 200 --requests 4000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+django.setup()
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async  # noqa: E402
+
+from app.api.common.utils import (  # noqa: E402
+    async_db_connection,
+    close_pool,
+    db_connection,
+    enable_async_pool,
+)
+
+QUERY = "SELECT asset_id, asset_name, asset_type, location, owner, criticality_level FROM api_asset"
+
+
+def sync_request(latency):
+    with db_connection() as connection, connection.cursor() as cursor:
+        if latency:
+            cursor.execute("SELECT pg_sleep(%s)", [latency])
+        cursor.execute(QUERY)
+        return len(cursor.fetchall())
+
+
+async def sync_path(latency):
+    async with ThreadSensitiveContext():
+        return await sync_to_async(sync_request, thread_sensitive=True)(latency)
+
+
+async def async_path(latency):
+    async with async_db_connection() as connection, connection.cursor() as cursor:
+        if latency:
+            await cursor.execute("SELECT pg_sleep(%s)", [latency])
+        await cursor.execute(QUERY)
+        return len(await cursor.fetchall())
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(path, total, concurrency, latency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await path(latency)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    # Warm the pools so connection setup is not part of the measurement
+    await asyncio.gather(*(path(latency) for _ in range(concurrency * 2)))
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "req_per_s": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+async def main(args):
+    enable_async_pool()
+    latency = args.db_latency_ms / 1000
+    results = {
+        "sync": await run(sync_path, args.requests, args.concurrency, latency),
+        "async": await run(async_path, args.requests, args.concurrency, latency),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--db-latency-ms", type=float, default=5.0)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    finally:
+        close_pool()
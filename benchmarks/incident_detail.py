@@ -0,0 +1,109 @@
+"""
+Per-request DB time of GET /incidents/{id}: the previous four-query fetch
+(incident, alerts, threats, assets) against the single aggregated statement
+now used by `get_incident`, with and without a prepared plan.
+
+`--db-latency-ms` adds a client-side sleep per round trip so the numbers
+reflect a database across the network rather than a local socket.
+
+Usage (from the repository root, with the POSTGRES_* variables set):
+
+    python -m benchmarks.incident_detail --requests 2000 --db-latency-ms 0.5
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+django.setup()
+
+from app.api.common.utils import close_pool, db_connection  # noqa: E402
+from app.api.incidents.router import INCIDENT_DETAIL_QUERY  # noqa: E402
+
+LEGACY_QUERIES = [
+    """
+    SELECT i.incident_id, i.incident_type, i.description, i.severity, i.status,
+           i.reported_date, i.resolved_date, i.assigned_to_id, u.username
+    FROM api_incident i
+    LEFT JOIN api_user u ON i.assigned_to_id = u.user_id
+    WHERE i.incident_id = %s
+    """,
+    """
+    SELECT alert_id, source, name, alert_type, alert_time, severity, status
+    FROM api_alert
+    WHERE incident_id = %s
+    """,
+    """
+    SELECT ti.threat_id, ti.threat_actor_name, ti.indicator_type,
+           ti.indicator_value, ti.confidence_level, ti.description, ti.related_cve
+    FROM api_threatintelligence ti
+    JOIN threat_incident_association tia ON ti.threat_id = tia.threat_id
+    WHERE tia.incident_id = %s
+    """,
+    """
+    SELECT a.asset_id, a.asset_name, a.asset_type, a.location, a.owner, a.criticality_level, ia.impact_level
+    FROM api_asset a
+    JOIN incident_assets ia ON a.asset_id = ia.asset_id
+    WHERE ia.incident_id = %s
+    """,
+]
+
+
+def legacy(cursor, incident_id, latency):
+    for query in LEGACY_QUERIES:
+        time.sleep(latency)
+        cursor.execute(query, [incident_id])
+        cursor.fetchall()
+
+
+def single(cursor, incident_id, latency, prepare=False):
+    time.sleep(latency)
+    cursor.execute(INCIDENT_DETAIL_QUERY, [incident_id], prepare=prepare)
+    cursor.fetchone()
+
+
+def measure(fetch, incident_ids, total, latency, **kwargs):
+    samples = []
+    with db_connection() as connection, connection.cursor() as cursor:
+        for incident_id in incident_ids:
+            fetch(cursor, incident_id, latency, **kwargs)
+        for i in range(total):
+            started = time.perf_counter()
+            fetch(cursor, incident_ids[i % len(incident_ids)], latency, **kwargs)
+            samples.append((time.perf_counter() - started) * 1000)
+    ordered = sorted(samples)
+    return {
+        "mean_ms": round(statistics.mean(samples), 3),
+        "p50_ms": round(statistics.median(samples), 3),
+        "p99_ms": round(ordered[int(0.99 * (len(ordered) - 1))], 3),
+    }
+
+
+def main(args):
+    with db_connection() as connection, connection.cursor() as cursor:
+        cursor.execute("SELECT incident_id FROM api_incident ORDER BY incident_id LIMIT 500")
+        incident_ids = [row[0] for row in cursor.fetchall()]
+    if not incident_ids:
+        raise SystemExit("No incidents found; seed the database first.")
+
+    latency = args.db_latency_ms / 1000
+    results = {
+        "four_queries": measure(legacy, incident_ids, args.requests, latency),
+        "single_statement": measure(single, incident_ids, args.requests, latency),
+        "single_statement_prepared": measure(single, incident_ids, args.requests, latency, prepare=True),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--db-latency-ms", type=float, default=0.5)
+    try:
+        main(parser.parse_args())
+    finally:
+        close_pool()
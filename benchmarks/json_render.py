@@ -0,0 +1,104 @@
+"""
+CPU cost of turning alert rows into a GET /alerts/ response body: the previous
+path (dict built from tuple indexes, Pydantic validation of the response
+schema, stdlib json with Ninja's encoder) against the current one
+(`schema_rows` row factory and the orjson renderer, no re-validation).
+
+Rows are generated with generate_series, so no seed data is needed; only the
+Python side is timed.
+
+Usage (from the repository root, with the POSTGRES_* variables set):
+
+    python -m benchmarks.json_render --rows 1000 10000 50000 --repeat 5
+"""
+import argparse
+import json
+import os
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+django.setup()
+
+from ninja.responses import NinjaJSONEncoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from app.api.alerts.router import transform_alert_data  # noqa: E402
+from app.api.alerts.schemas import AlertListSchema, AlertSchema  # noqa: E402
+from app.api.common.renderers import dumps, schema_rows  # noqa: E402
+from app.api.common.utils import close_pool, db_connection  # noqa: E402
+
+ROWS_QUERY = """
+    SELECT g AS alert_id,
+           'sensor-' || (g %% 40) AS source,
+           'Alert ' || g AS name,
+           (ARRAY['IDS', 'EDR', 'SIEM', 'WAF'])[g %% 4 + 1] AS alert_type,
+           NOW() - make_interval(secs => g) AS alert_time,
+           (ARRAY['Low', 'Medium', 'High', 'Critical'])[g %% 4 + 1] AS severity,
+           (ARRAY['Active', 'Acknowledged', 'Resolved', 'Closed'])[g %% 4 + 1] AS status,
+           g %% 500 + 1 AS incident_id
+    FROM generate_series(1, %s) AS g
+"""
+
+_list_adapter = TypeAdapter(AlertListSchema)
+
+
+def validated(rows, make_row):
+    alerts = [
+        transform_alert_data({
+            "alert_id": row[0],
+            "source": row[1],
+            "name": row[2],
+            "alert_type": row[3],
+            "alert_time": row[4],
+            "severity": row[5],
+            "status": row[6],
+            "incident_id": row[7]
+        })
+        for row in rows
+    ]
+    model = _list_adapter.validate_python({"alerts": alerts, "count": len(alerts), "next_cursor": None})
+    return json.dumps(model.model_dump(), cls=NinjaJSONEncoder).encode()
+
+
+def trusted(rows, make_row):
+    alerts = [transform_alert_data(make_row(row)) for row in rows]
+    return dumps({"alerts": alerts, "count": len(alerts), "next_cursor": None})
+
+
+def measure(render, rows, make_row, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.process_time()
+        body = render(rows, make_row)
+        elapsed = (time.process_time() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return {"cpu_ms": round(best, 2), "bytes": len(body)}
+
+
+def main(args):
+    results = {}
+    for size in args.rows:
+        with db_connection() as connection, connection.cursor() as cursor:
+            cursor.execute(ROWS_QUERY, [size])
+            rows = cursor.fetchall()
+            make_row = schema_rows(AlertSchema)(cursor)
+        before = measure(validated, rows, make_row, args.repeat)
+        after = measure(trusted, rows, make_row, args.repeat)
+        results[size] = {
+            "validated_stdlib_json": before,
+            "row_factory_orjson": after,
+            "speedup": round(before["cpu_ms"] / after["cpu_ms"], 1) if after["cpu_ms"] else None,
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    try:
+        main(parser.parse_args())
+    finally:
+        close_pool()
@@ -0,0 +1,383 @@
+"""
+Replay a recorded request log against a running API.
+
+The log is JSON lines as written by RequestRecorderMiddleware (set
+REQUEST_RECORDING_PATH on the server): one object per request with
+request_id, ts, method, path, query, headers and body. Lines without a
+method and path (such as a backlog file) and requests whose body was not
+recorded are skipped and counted.
+
+Closed loop (`--concurrency N`): N clients, each sending its next request
+as soon as the previous one answered; throughput is what the server
+sustains. Open loop (`--rate R`, or `--speed X` to keep the recorded
+spacing X times faster): requests are sent on schedule, whether or not
+earlier ones have answered, by up to `--max-inflight` clients. Open-loop
+latency is measured from the scheduled send time, so time spent waiting
+for a free client counts (no coordinated omission).
+
+Reports throughput, a latency histogram and percentiles, error rates (4xx,
+5xx, transport), client connections opened, and the server's pool usage
+sampled from /settings/pool_stats/ during the run, overall and per
+endpoint (paths with numeric ids folded into {id}).
+
+Usage (from the repository root):
+
+    python -m benchmarks.replay traffic.jsonl --base-url http://127.0.0.1:8000 --concurrency 16
+    python -m benchmarks.replay traffic.jsonl --rate 200 --duration 60 --poisson --output replay.json
+    python -m benchmarks.replay traffic.jsonl --speed 2 --methods GET
+"""
+import argparse
+import http.client
+import itertools
+import json
+import queue
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open.
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+POOL_STATS_PATH = "/app/v1/cyber/settings/pool_stats/"
+
+# Path segments folded into {id} when grouping per endpoint.
+ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def load_log(path, methods=None):
+    """Replayable entries of the log, in order, plus counts of what was skipped."""
+    entries, skipped = [], {"not_a_request": 0, "body_omitted": 0, "method_filtered": 0}
+    with open(path, encoding="utf-8") as log:
+        for line in log:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if not entry.get("method") or not entry.get("path"):
+                skipped["not_a_request"] += 1
+            elif entry.get("body_omitted"):
+                skipped["body_omitted"] += 1
+            elif methods and entry["method"].upper() not in methods:
+                skipped["method_filtered"] += 1
+            else:
+                entries.append(entry)
+    return entries, skipped
+
+
+def endpoint_of(entry):
+    return f"{entry['method'].upper()} {ID_SEGMENT.sub('/{id}', entry['path'])}"
+
+
+class Client:
+    """One keep-alive HTTP connection, reopened after errors."""
+
+    def __init__(self, base_url, timeout, stats):
+        self.url = urlsplit(base_url)
+        self.timeout = timeout
+        self.stats = stats
+        self.connection = None
+
+    def _connect(self):
+        factory = http.client.HTTPSConnection if self.url.scheme == "https" else http.client.HTTPConnection
+        self.connection = factory(self.url.hostname, self.url.port, timeout=self.timeout)
+        self.stats.connection_opened()
+
+    def send(self, entry):
+        """Returns (status, response body); status None on a transport error."""
+        body = entry.get("body")
+        headers = dict(entry.get("headers") or {})
+        if body is not None and not isinstance(body, str):
+            body = json.dumps(body)
+            headers.setdefault("content-type", "application/json")
+        path = entry["path"] + (f"?{entry['query']}" if entry.get("query") else "")
+        for attempt in (1, 2):
+            if self.connection is None:
+                self._connect()
+            try:
+                self.connection.request(entry["method"].upper(), path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                content = response.read()
+                if response.getheader("connection", "").lower() == "close":
+                    self.close()
+                return response.status, content
+            except (OSError, http.client.HTTPException):
+                self.close()
+                # A kept-alive connection the server already closed: retry once on a fresh one
+                if attempt == 2:
+                    return None, b""
+        return None, b""
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.by_endpoint = {}
+        self.statuses = {}
+        self.transport_errors = 0
+        self.connections = 0
+        self.bytes = 0
+        self.late = 0
+
+    def connection_opened(self):
+        with self.lock:
+            self.connections += 1
+
+    def add(self, entry, status, content, latency_ms):
+        with self.lock:
+            self.latencies.append(latency_ms)
+            self.by_endpoint.setdefault(endpoint_of(entry), []).append((latency_ms, status))
+            self.bytes += len(content)
+            if status is None:
+                self.transport_errors += 1
+            else:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+class PoolSampler(threading.Thread):
+    """Polls the server's pool_stats while the run lasts."""
+
+    def __init__(self, base_url, path, interval):
+        super().__init__(daemon=True)
+        self.client = Client(base_url, 5, Stats())
+        self.path = path
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def sample(self):
+        status, content = self.client.send({"method": "GET", "path": self.path})
+        if status != 200:
+            return None
+        try:
+            return json.loads(content)
+        except ValueError:
+            return None
+
+    def run(self):
+        while not self.stopped.is_set():
+            stats = self.sample()
+            if stats is not None:
+                self.samples.append(stats)
+            self.stopped.wait(self.interval)
+
+    def summary(self):
+        self.stopped.set()
+        self.join()
+        if len(self.samples) < 2:
+            return None
+        first, last = self.samples[0], self.samples[-1]
+        checkouts = last.get("checkouts", 0) - first.get("checkouts", 0)
+        checkout_ms = last.get("checkout_ms_total", 0) - first.get("checkout_ms_total", 0)
+        return {
+            "samples": len(self.samples),
+            "in_use_max": max(sample.get("in_use", 0) for sample in self.samples),
+            "waiting_max": max(sample.get("waiting", 0) for sample in self.samples),
+            "pool_size_max": max(sample.get("pool_size", 0) for sample in self.samples),
+            "checkouts": checkouts,
+            "checkout_errors": last.get("checkout_errors", 0) - first.get("checkout_errors", 0),
+            "checkout_ms_avg": round(checkout_ms / checkouts, 3) if checkouts else 0.0,
+        }
+
+
+def closed_loop(entries, args, stats):
+    source = itertools.cycle(entries) if args.duration else iter(entries * args.loops)
+    source_lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration if args.duration else None
+
+    def worker():
+        client = Client(args.base_url, args.timeout, stats)
+        while deadline is None or time.perf_counter() < deadline:
+            with source_lock:
+                entry = next(source, None)
+            if entry is None:
+                break
+            started = time.perf_counter()
+            status, content = client.send(entry)
+            stats.add(entry, status, content, (time.perf_counter() - started) * 1000)
+        client.close()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def schedule(entries, args):
+    """(offset in seconds from the start, entry) in send order."""
+    if args.speed:
+        base = entries[0].get("ts", 0)
+        # Later passes start right after the previous one ended
+        span = (entries[-1].get("ts", 0) - base) / args.speed
+        for loop in itertools.count() if args.duration else range(args.loops):
+            for entry in entries:
+                yield loop * span + (entry.get("ts", 0) - base) / args.speed, entry
+        return
+    rng = random.Random(args.seed)
+    offset = 0.0
+    for entry in itertools.cycle(entries) if args.duration else entries * args.loops:
+        yield offset, entry
+        offset += rng.expovariate(args.rate) if args.poisson else 1 / args.rate
+
+
+def open_loop(entries, args, stats):
+    pending = queue.Queue()
+    late_after = args.late_ms / 1000
+
+    def worker():
+        client = Client(args.base_url, args.timeout, stats)
+        while True:
+            item = pending.get()
+            if item is None:
+                break
+            scheduled, entry = item
+            if time.perf_counter() - scheduled > late_after:
+                with stats.lock:
+                    stats.late += 1
+            status, content = client.send(entry)
+            stats.add(entry, status, content, (time.perf_counter() - scheduled) * 1000)
+        client.close()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(args.max_inflight)]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    for offset, entry in schedule(entries, args):
+        if args.duration and offset >= args.duration:
+            break
+        delay = started + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pending.put((started + offset, entry))
+    for _ in threads:
+        pending.put(None)
+    for thread in threads:
+        thread.join()
+
+
+def latency_summary(latencies):
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+    cuts = statistics.quantiles(ordered, n=100, method="inclusive") if len(ordered) > 1 else [ordered[0]] * 99
+    return {
+        "mean_ms": round(statistics.fmean(ordered), 2),
+        "p50_ms": round(cuts[49], 2),
+        "p90_ms": round(cuts[89], 2),
+        "p95_ms": round(cuts[94], 2),
+        "p99_ms": round(cuts[98], 2),
+        "max_ms": round(ordered[-1], 2),
+    }
+
+
+def histogram(latencies):
+    counts = {f"<={bound}ms": 0 for bound in BUCKETS_MS}
+    counts[f">{BUCKETS_MS[-1]}ms"] = 0
+    for latency in latencies:
+        for bound in BUCKETS_MS:
+            if latency <= bound:
+                counts[f"<={bound}ms"] += 1
+                break
+        else:
+            counts[f">{BUCKETS_MS[-1]}ms"] += 1
+    return counts
+
+
+def report(stats, elapsed, args, skipped, pool):
+    total = len(stats.latencies)
+    client_errors = sum(count for status, count in stats.statuses.items() if 400 <= status < 500)
+    server_errors = sum(count for status, count in stats.statuses.items() if status >= 500)
+    endpoints = {}
+    for name, results in sorted(stats.by_endpoint.items()):
+        failed = sum(1 for _, status in results if status is None or status >= 500)
+        endpoints[name] = {
+            "requests": len(results),
+            "error_rate": round(failed / len(results), 4),
+            **latency_summary([latency for latency, _ in results]),
+        }
+    return {
+        "mode": "closed" if args.concurrency else "open",
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        "speed": args.speed,
+        "max_inflight": None if args.concurrency else args.max_inflight,
+        "skipped": skipped,
+        "requests": total,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "bytes_received": stats.bytes,
+        "statuses": {str(status): count for status, count in sorted(stats.statuses.items())},
+        "error_rates": {
+            "4xx": round(client_errors / total, 4) if total else 0.0,
+            "5xx": round(server_errors / total, 4) if total else 0.0,
+            "transport": round(stats.transport_errors / total, 4) if total else 0.0,
+        },
+        "late_starts": stats.late if not args.concurrency else None,
+        "latency": latency_summary(stats.latencies),
+        "histogram": histogram(stats.latencies),
+        "client_connections": stats.connections,
+        "server_pool": pool,
+        "endpoints": endpoints,
+    }
+
+
+def main(args):
+    entries, skipped = load_log(args.log, {method.upper() for method in args.methods} if args.methods else None)
+    if not entries:
+        raise SystemExit(f"{args.log}: no replayable requests ({skipped})")
+
+    stats = Stats()
+    sampler = None
+    if args.pool_stats_path:
+        sampler = PoolSampler(args.base_url, args.pool_stats_path, args.pool_interval)
+        sampler.start()
+    started = time.perf_counter()
+    if args.concurrency:
+        closed_loop(entries, args, stats)
+    else:
+        open_loop(entries, args, stats)
+    elapsed = time.perf_counter() - started
+    pool = sampler.summary() if sampler else None
+
+    result = report(stats, elapsed, args, skipped, pool)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(result, output, indent=2)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="JSON lines request log")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--concurrency", type=int, help="closed loop with this many clients")
+    mode.add_argument("--rate", type=float, help="open loop at this many requests per second")
+    mode.add_argument("--speed", type=float, help="open loop on the recorded timestamps, this many times faster")
+    parser.add_argument("--poisson", action="store_true", help="exponential gaps around --rate instead of fixed")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the --poisson gaps")
+    parser.add_argument("--max-inflight", type=int, default=64, help="open loop: clients sending scheduled requests")
+    parser.add_argument("--late-ms", type=float, default=10.0, help="open loop: count sends later than this")
+    parser.add_argument("--duration", type=float, help="run this many seconds, cycling through the log")
+    parser.add_argument("--loops", type=int, default=1, help="passes over the log when no --duration is given")
+    parser.add_argument("--methods", nargs="+", help="only replay these methods (e.g. GET)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--pool-stats-path", default=POOL_STATS_PATH, help="empty to skip sampling the server pool")
+    parser.add_argument("--pool-interval", type=float, default=0.5)
+    parser.add_argument("--output", help="also write the report here")
+    args = parser.parse_args()
+    if args.speed and args.rate:
+        parser.error("--speed and --rate are exclusive")
+    try:
+        main(args)
+    except KeyboardInterrupt:
+        sys.exit(130)
@@ -0,0 +1,223 @@
+"""
+Scoring every open incident: the per-incident plpgsql function
+(`CROSS JOIN LATERAL calculate_incident_risk_score(...)`, six queries per
+incident) against the set-based `calculate_incident_risk_scores(...)`, and
+both against reading the persisted scores the risk list endpoints serve
+(`incident_risk_score`, after draining the rescoring queue in batches).
+The outputs are compared row for row.
+
+For each size the synthetic incidents (with assets, vulnerabilities, threats
+and alerts) are generated inside a transaction that is rolled back, so the
+database is left as it was. Use a scratch database: the inserted rows lock
+the tables until the run for that size finishes.
+
+Usage (from the repository root, with the POSTGRES_* variables set and the
+database objects installed via `manage.py install_db_objects`):
+
+    python -m benchmarks.risk_scoring --incidents 10000 100000 1000000
+    python -m benchmarks.risk_scoring --incidents 1000000 --per-incident-max 100000
+"""
+import argparse
+import json
+import os
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+django.setup()
+
+from app.api.common.utils import close_pool, db_connection  # noqa: E402
+from app.api.risk.refresh import DEQUEUE_SQL, RESCORE_SQL  # noqa: E402
+from app.api.risk.router import OPEN_STATUSES, STORED_RISK_SCORES_QUERY  # noqa: E402
+
+PER_INCIDENT_QUERY = """
+    SELECT r.*
+    FROM api_incident i
+    CROSS JOIN LATERAL public.calculate_incident_risk_score(i.incident_id) AS r
+    WHERE i.status = ANY (%(statuses)s)
+"""
+
+BULK_QUERY = "SELECT * FROM public.calculate_incident_risk_scores(%(statuses)s)"
+
+
+
+def diff_query(a, b):
+    return f"""
+        SELECT COUNT(*) FROM (
+            ({a} EXCEPT ALL {b})
+            UNION ALL
+            ({b} EXCEPT ALL {a})
+        ) AS diff
+    """
+
+
+# ORDER BY is not allowed inside EXCEPT operands
+STORED_QUERY = STORED_RISK_SCORES_QUERY.split("ORDER BY")[0]
+
+
+def _insert_range(cursor, insert_sql, params):
+    """Run an INSERT ... RETURNING id and return the (first, last) id created."""
+    cursor.execute(f"WITH ins AS ({insert_sql}) SELECT MIN(id), MAX(id) FROM ins", params)
+    return cursor.fetchone()
+
+
+def generate(cursor, incidents):
+    """Insert `incidents` synthetic incidents plus related rows."""
+    sizes = {
+        "incidents": incidents,
+        "assets": max(incidents // 10, 100),
+        "vulnerabilities": 500,
+        "threats": max(incidents // 100, 50),
+    }
+    # Association triggers would touch a threat row per insert; skip them if allowed.
+    cursor.execute("SAVEPOINT triggers")
+    try:
+        cursor.execute("SET LOCAL session_replication_role = replica")
+        cursor.execute("RELEASE SAVEPOINT triggers")
+    except Exception:
+        cursor.execute("ROLLBACK TO SAVEPOINT triggers")
+
+    # Seed data inserts explicit ids, so move each sequence past the existing rows.
+    for table, column in (("api_asset", "asset_id"), ("api_vulnerability", "vulnerability_id"),
+                          ("api_threatintelligence", "threat_id"), ("api_incident", "incident_id"),
+                          ("api_alert", "alert_id")):
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), COALESCE(MAX({column}), 0) + 1, false) "
+            f"FROM {table}"
+        )
+
+    asset_lo, _ = _insert_range(cursor, """
+        INSERT INTO api_asset (asset_name, asset_type, location, criticality_level)
+        SELECT 'bench-asset-' || g, 'Server', 'DC',
+               (ARRAY['critical', 'high', 'medium', 'low', 'Critical'])[g %% 5 + 1]
+        FROM generate_series(1, %(assets)s) AS g
+        RETURNING asset_id AS id
+    """, sizes)
+    vuln_lo, _ = _insert_range(cursor, """
+        INSERT INTO api_vulnerability (title, severity)
+        SELECT 'bench-vuln-' || g, (ARRAY['critical', 'high', 'medium', 'low'])[g %% 4 + 1]
+        FROM generate_series(1, %(vulnerabilities)s) AS g
+        RETURNING vulnerability_id AS id
+    """, sizes)
+    threat_lo, _ = _insert_range(cursor, """
+        INSERT INTO api_threatintelligence (threat_actor_name, confidence_level)
+        SELECT 'bench-actor-' || g, (ARRAY['very_high', 'high', 'medium', 'low'])[g %% 4 + 1]
+        FROM generate_series(1, %(threats)s) AS g
+        RETURNING threat_id AS id
+    """, sizes)
+    incident_lo, _ = _insert_range(cursor, """
+        INSERT INTO api_incident (incident_type, description, severity, status, reported_date)
+        SELECT 'Benchmark', 'bench',
+               (ARRAY['critical', 'high', 'medium', 'low', 'High'])[g %% 5 + 1],
+               (ARRAY['open', 'investigating', 'resolved', 'closed', 'open'])[g %% 5 + 1],
+               LOCALTIMESTAMP - make_interval(hours => g %% 1500)
+        FROM generate_series(1, %(incidents)s) AS g
+        RETURNING incident_id AS id
+    """, sizes)
+
+    ids = dict(sizes, asset_lo=asset_lo, vuln_lo=vuln_lo, threat_lo=threat_lo, incident_lo=incident_lo)
+    cursor.execute("""
+        INSERT INTO asset_vulnerabilities (asset_id, vulnerability_id, status)
+        SELECT %(asset_lo)s + a, %(vuln_lo)s + (a * 11 + j * 17) %% %(vulnerabilities)s, 'open'
+        FROM generate_series(0, %(assets)s - 1) AS a, generate_series(0, 3) AS j
+        WHERE j < a %% 4
+    """, ids)
+    cursor.execute("""
+        INSERT INTO incident_assets (incident_id, asset_id, impact_level)
+        SELECT %(incident_lo)s + k, %(asset_lo)s + (k * 7 + j * 13) %% %(assets)s, 'medium'
+        FROM generate_series(0, %(incidents)s - 1) AS k, generate_series(0, 3) AS j
+        WHERE j < k %% 4
+    """, ids)
+    cursor.execute("""
+        INSERT INTO threat_incident_association (threat_id, incident_id)
+        SELECT %(threat_lo)s + (k + j * 7) %% %(threats)s, %(incident_lo)s + k
+        FROM generate_series(0, %(incidents)s - 1) AS k, generate_series(0, 1) AS j
+        WHERE j < k %% 3
+    """, ids)
+    cursor.execute("""
+        INSERT INTO api_alert (source, name, alert_type, alert_time, severity, status, incident_id)
+        SELECT 'bench', 'bench-alert', 'IDS', LOCALTIMESTAMP,
+               (ARRAY['critical', 'high', 'medium', 'low'])[(k + j) %% 4 + 1], 'new', %(incident_lo)s + k
+        FROM generate_series(0, %(incidents)s - 1) AS k, generate_series(0, 4) AS j
+        WHERE j < k %% 5
+    """, ids)
+    for table in ("api_asset", "api_vulnerability", "api_threatintelligence", "api_incident",
+                  "asset_vulnerabilities", "incident_assets", "threat_incident_association", "api_alert"):
+        cursor.execute(f"ANALYZE {table}")
+
+
+def timed(cursor, query, params):
+    started = time.perf_counter()
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    return round(time.perf_counter() - started, 3), len(rows)
+
+
+def server_ms(cursor, query, params):
+    """Execution time inside PostgreSQL, without sending and decoding the rows."""
+    cursor.execute(f"EXPLAIN (ANALYZE, TIMING OFF, FORMAT JSON) {query}", params)
+    return round(cursor.fetchone()[0][0]["Execution Time"], 1)
+
+
+def rescore_all(cursor, incidents, batch_size):
+    """Queue the generated incidents and drain the queue like the refresher does."""
+    cursor.execute("""
+        INSERT INTO incident_risk_dirty (incident_id)
+        SELECT incident_id FROM api_incident WHERE incident_type = 'Benchmark'
+        ON CONFLICT (incident_id) DO NOTHING
+    """)
+    started = time.perf_counter()
+    while True:
+        cursor.execute(DEQUEUE_SQL, [batch_size])
+        incident_ids = [row[0] for row in cursor.fetchall()]
+        if incident_ids:
+            cursor.execute(RESCORE_SQL, [incident_ids], prepare=False)
+        if len(incident_ids) < batch_size:
+            break
+    elapsed = time.perf_counter() - started
+    cursor.execute("ANALYZE incident_risk_score")
+    return round(elapsed, 3), round(incidents / elapsed)
+
+
+def run(incidents, per_incident_max, batch_size):
+    params = {"statuses": OPEN_STATUSES}
+    result = {}
+    with db_connection() as conn, conn.cursor() as cursor:
+        try:
+            started = time.perf_counter()
+            generate(cursor, incidents)
+            result["generate_s"] = round(time.perf_counter() - started, 1)
+
+            result["bulk_s"], result["scored"] = timed(cursor, BULK_QUERY, params)
+            result["bulk_server_ms"] = server_ms(cursor, BULK_QUERY + " ORDER BY risk_score DESC", params)
+            result["rescore_queue_s"], result["rescored_per_s"] = rescore_all(cursor, incidents, batch_size)
+            result["stored_s"], _ = timed(cursor, STORED_RISK_SCORES_QUERY, None)
+            result["stored_server_ms"] = server_ms(cursor, STORED_RISK_SCORES_QUERY, None)
+            cursor.execute(diff_query(BULK_QUERY, STORED_QUERY), params)
+            result["stored_mismatched_rows"] = cursor.fetchone()[0]
+            if incidents <= per_incident_max:
+                result["per_incident_s"], _ = timed(cursor, PER_INCIDENT_QUERY, params)
+                result["speedup"] = round(result["per_incident_s"] / result["bulk_s"], 1)
+                cursor.execute(diff_query(PER_INCIDENT_QUERY, BULK_QUERY), params)
+                result["mismatched_rows"] = cursor.fetchone()[0]
+        finally:
+            conn.rollback()
+    return result
+
+
+def main(args):
+    results = {size: run(size, args.per_incident_max, args.batch_size) for size in args.incidents}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incidents", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--per-incident-max", type=int, default=1_000_000,
+                        help="skip the per-incident function (and the comparison) above this size")
+    parser.add_argument("--batch-size", type=int, default=500, help="incidents rescored per queue batch")
+    try:
+        main(parser.parse_args())
+    finally:
+        close_pool()
@@ -0,0 +1,325 @@
+"""
+Latency, query count and memory of every read endpoint, at several data sizes.
+
+For each router in `app.api.api.routers` every GET operation (plus the
+read-only POSTs in POST_BODIES) is driven through Django's test client, so
+requests go through the same middleware, handlers and renderers as in
+production, without a network hop. Path parameters cycle through a fixed
+sample of existing ids. Per endpoint the run records p50/p95/p99 latency,
+the database round trips of a request (`X-DB-Round-Trips`, see
+RequestScopeMiddleware), the response size and the peak RSS of the process
+while the endpoint ran. Mutating operations are listed as skipped.
+
+Each scale tier resets the tables and loads `app.api.common.synthetic` data
+for that many incidents (same seed every run), then brings the stored risk
+scores, risk history and dashboard up to date before measuring. The data is
+replaced, so point it at a scratch database, or let `--start-postgres` run a
+throwaway server (initdb + pg_ctl from `--pg-bin`, as a non-root user).
+
+Results are written as JSON (`--output`); `--compare` prints the change of
+every endpoint's p95 and round trips against an earlier results file.
+
+Usage (from the repository root, with the POSTGRES_* variables set):
+
+    python -m benchmarks.routers --tiers 1000 10000 100000 --output bench.json
+    python -m benchmarks.routers --start-postgres --pg-bin /usr/lib/postgresql/16/bin
+    python -m benchmarks.routers --tiers 10000 --compare bench.json
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Ids for path parameters, by parameter name.
+PARAM_SOURCES = {
+    "user_id": ("api_user", "user_id"),
+    "asset_id": ("api_asset", "asset_id"),
+    "vulnerability_id": ("api_vulnerability", "vulnerability_id"),
+    "alert_id": ("api_alert", "alert_id"),
+    "incident_id": ("api_incident", "incident_id"),
+    "threat_id": ("api_threatintelligence", "threat_id"),
+    "log_id": ("user_activity_logs", "log_id"),
+}
+
+# POST operations that only read, with the body they are driven with.
+POST_BODIES = {
+    "simulate_risk_weights": {"profile": {"asset": {"weight": 8}, "time": {"cap": 10}}, "limit": 50},
+}
+
+SAMPLE_IDS = 50
+
+
+def start_postgres(pg_bin, port):
+    """initdb and start a throwaway server in a temporary directory; returns (data dir, env)."""
+    if os.geteuid() == 0:
+        raise SystemExit("--start-postgres: initdb refuses to run as root")
+    data_dir = tempfile.mkdtemp(prefix="cyber-bench-")
+
+    def tool(name):
+        return os.path.join(pg_bin, name) if pg_bin else shutil.which(name) or name
+
+    subprocess.run([tool("initdb"), "-D", data_dir, "-U", "postgres", "--auth=trust", "-E", "UTF8"],
+                   check=True, stdout=subprocess.DEVNULL)
+    subprocess.run([tool("pg_ctl"), "-D", data_dir, "-w", "-l", os.path.join(data_dir, "server.log"), "-o",
+                    f"-k {data_dir} -c listen_addresses='' -p {port} -c fsync=off -c shared_buffers=256MB",
+                    "start"], check=True, stdout=subprocess.DEVNULL)
+    subprocess.run([tool("createdb"), "-h", data_dir, "-p", str(port), "-U", "postgres", "cyber_bench"], check=True)
+    return data_dir, {
+        "POSTGRES_HOST": data_dir,
+        "POSTGRES_PORT": str(port),
+        "POSTGRES_USERNAME": "postgres",
+        "POSTGRES_PASSWORD": "",
+        "POSTGRES_DATABASE": "cyber_bench",
+    }
+
+
+def stop_postgres(pg_bin, data_dir):
+    pg_ctl = os.path.join(pg_bin, "pg_ctl") if pg_bin else shutil.which("pg_ctl") or "pg_ctl"
+    subprocess.run([pg_ctl, "-D", data_dir, "-m", "fast", "stop"], check=False, stdout=subprocess.DEVNULL)
+    shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def peak_rss_kb():
+    """Peak RSS of this process (VmHWM), or None where /proc is not available."""
+    try:
+        with open("/proc/self/status") as status:
+            return int(re.search(r"VmHWM:\s+(\d+)", status.read()).group(1))
+    except (OSError, AttributeError):
+        return None
+
+
+def reset_peak_rss():
+    # Linux resets VmHWM to the current RSS on "5"
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def percentiles(samples):
+    if len(samples) < 2:
+        return {"p50_ms": samples[0], "p95_ms": samples[0], "p99_ms": samples[0]} if samples else {}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50_ms": round(cuts[49], 2), "p95_ms": round(cuts[94], 2), "p99_ms": round(cuts[98], 2)}
+
+
+def operations():
+    """(router prefix, method, path, view name) of every operation in app.api.api.routers."""
+    from app.api.api import routers
+
+    for prefix, module_path, _ in routers:
+        module_name, attribute = module_path.rsplit(".", 1)
+        router = getattr(importlib.import_module(module_name), attribute)
+        for path, path_view in router.path_operations.items():
+            for operation in path_view.operations:
+                for method in operation.methods:
+                    yield prefix, method, re.sub("/+", "/", f"{prefix}/{path}"), operation.view_func.__name__
+
+
+def sample_ids(cursor):
+    ids = {}
+    for param, (table, column) in PARAM_SOURCES.items():
+        cursor.execute(f"SELECT {column} FROM {table} ORDER BY md5({column}::text) LIMIT %s", [SAMPLE_IDS])
+        ids[param] = [row[0] for row in cursor.fetchall()]
+    return ids
+
+
+def prepare_tier(client, root, incidents, seed):
+    """Load the tier's data and bring the derived tables up to date."""
+    from app.api.common import synthetic
+    from app.api.dashboard.refresh import refresh_dashboard
+    from app.api.risk.history import take_snapshot
+    from app.api.risk.refresh import refresh_scores, sweep_time_factors
+
+    started = time.perf_counter()
+    generated = synthetic.generate(incidents, seed=seed, reset=True)
+    refresh_scores()
+    sweep_time_factors(force=True)
+    take_snapshot(force=True)
+    if not refresh_dashboard(force=True):
+        client.post(f"{root}dashboard/create_view/")
+    return {"rows": generated["rows"], "prepare_s": round(time.perf_counter() - started, 1)}
+
+
+def measure(client, method, urls, body, requests, warmup):
+    """Drive one endpoint `requests` times, cycling through `urls`."""
+    cycle = iter(urls * ((requests + warmup) // len(urls) + 1))
+
+    def call():
+        url = next(cycle)
+        if method == "POST":
+            response = client.post(url, data=json.dumps(body), content_type="application/json")
+        else:
+            response = client.get(url)
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, len(content)
+
+    for _ in range(warmup):
+        call()
+    reset_peak_rss()
+    rss_before = peak_rss_kb()
+    latencies, round_trips, sizes, statuses = [], [], [], set()
+    for _ in range(requests):
+        started = time.perf_counter()
+        response, size = call()
+        latencies.append((time.perf_counter() - started) * 1000)
+        round_trips.append(int(response.get("X-DB-Round-Trips", 0)))
+        sizes.append(size)
+        statuses.add(response.status_code)
+    rss_after = peak_rss_kb()
+
+    result = {
+        "requests": requests,
+        "statuses": sorted(statuses),
+        **percentiles(latencies),
+        "mean_ms": round(statistics.fmean(latencies), 2),
+        "round_trips": statistics.median(round_trips),
+        "bytes": statistics.median(sizes),
+    }
+    if rss_before is not None:
+        result["peak_rss_mb"] = round(rss_after / 1024, 1)
+        result["rss_growth_mb"] = round((rss_after - rss_before) / 1024, 1)
+    return result
+
+
+def run_tier(client, root, incidents, args):
+    from app.api.common.utils import db_connection
+
+    tier = prepare_tier(client, root, incidents, args.seed)
+    with db_connection() as conn, conn.cursor() as cursor:
+        ids = sample_ids(cursor)
+
+    endpoints, skipped = {}, []
+    for prefix, method, path, view in operations():
+        name = f"{method} {path}"
+        if args.only and not any(pattern in name for pattern in args.only):
+            continue
+        if method != "GET" and view not in POST_BODIES:
+            skipped.append(name)
+            continue
+        params = re.findall(r"{(\w+)}", path)
+        if any(not ids.get(param) for param in params):
+            skipped.append(name)
+            continue
+
+        # Cycle path parameters through the sampled ids
+        urls = []
+        for i in range(SAMPLE_IDS):
+            url = path
+            for param in params:
+                url = url.replace(f"{{{param}}}", str(ids[param][i % len(ids[param])]))
+            urls.append(root + url.lstrip("/"))
+        endpoints[name] = measure(client, method, urls, POST_BODIES.get(view), args.requests, args.warmup)
+        print(f"  {incidents:>9} {name:<60} p50 {endpoints[name]['p50_ms']:>9.2f} ms  "
+              f"p95 {endpoints[name]['p95_ms']:>9.2f} ms  {endpoints[name]['round_trips']} round trips",
+              file=sys.stderr)
+    tier.update(endpoints=endpoints, skipped=skipped)
+    return tier
+
+
+def compare(results, baseline_path):
+    """Print each endpoint's p95 and round trips against an earlier run."""
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    for tier, current in results["tiers"].items():
+        before = baseline.get("tiers", {}).get(tier)
+        if before is None:
+            print(f"tier {tier}: not in {baseline_path}")
+            continue
+        print(f"tier {tier} (vs {baseline['meta'].get('commit', '?')[:10]})")
+        for name, now in current["endpoints"].items():
+            then = before["endpoints"].get(name)
+            if then is None:
+                print(f"  {name:<60} new")
+                continue
+            ratio = now["p95_ms"] / then["p95_ms"] if then["p95_ms"] else float("inf")
+            print(f"  {name:<60} p95 {then['p95_ms']:>9.2f} -> {now['p95_ms']:>9.2f} ms ({ratio:5.2f}x)  "
+                  f"round trips {then['round_trips']} -> {now['round_trips']}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args):
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+    django.setup()
+
+    from django.test import Client
+    from django.urls import reverse
+
+    from app.api.common.utils import close_pool
+
+    # Failing endpoints are recorded by status; keep their tracebacks out of the output
+    logging.getLogger("django.request").setLevel(logging.CRITICAL)
+    client = Client(HTTP_HOST="localhost")
+    root = reverse("api:api-root")
+    try:
+        # Tables, functions and triggers, as /settings/create_tables/ installs them
+        client.post(f"{root}settings/create_tables/")
+        results = {
+            "meta": {
+                "commit": git_commit(),
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "seed": args.seed,
+                "requests": args.requests,
+                "warmup": args.warmup,
+            },
+            "tiers": {},
+        }
+        for incidents in args.tiers:
+            results["tiers"][str(incidents)] = run_tier(client, root, incidents, args)
+    finally:
+        close_pool()
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tiers", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="incidents per tier")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=50, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="only endpoints whose 'METHOD /path' contains one of these")
+    parser.add_argument("--output", help="write the results here instead of stdout")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--start-postgres", action="store_true", help="run against a throwaway local server")
+    parser.add_argument("--pg-bin", help="directory of initdb/pg_ctl/createdb (default: PATH)")
+    parser.add_argument("--pg-port", type=int, default=55432)
+    args = parser.parse_args()
+
+    data_dir = None
+    if args.start_postgres:
+        # Before Django reads the POSTGRES_* settings
+        data_dir, env = start_postgres(args.pg_bin, args.pg_port)
+        os.environ.update(env)
+    try:
+        main(args)
+    finally:
+        if data_dir:
+            stop_postgres(args.pg_bin, data_dir)